@@ -43,8 +43,16 @@ def create_app(config_name=None):
         Attendance,
         Registration,
         AppSetting,
+        AppSettingsVersion,
+        Job,
+        ActivityCounter,
+        ExternalStudent,
+        CacheGeneration,
     )
 
+    # Eventos de sesión que mantienen activity_counters
+    from app.services import activity_counter_service  # noqa: F401
+
     # Registrar blueprints
     from app.api.auth_bp import auth_bp
     from app.api.events_bp import events_bp
@@ -58,6 +66,7 @@ def create_app(config_name=None):
     from app.api.public_registrations_bp import public_registrations_bp
     from app.api.public_event_bp import public_event_bp
     from app.api.admin_settings_bp import admin_settings_bp
+    from app.api.jobs_bp import jobs_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(events_bp)
@@ -71,6 +80,7 @@ def create_app(config_name=None):
     app.register_blueprint(public_registrations_bp)
     app.register_blueprint(public_event_bp)
     app.register_blueprint(admin_settings_bp)
+    app.register_blueprint(jobs_bp)
 
     # Registrar filtros Jinja útiles
     try:
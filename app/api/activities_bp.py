@@ -1,5 +1,5 @@
-from flask import Blueprint, request, jsonify, send_file
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from app import db
 from app.schemas import activity_schema
@@ -8,6 +8,7 @@ from sqlalchemy import func
 from app.models.event import Event
 from app.models.registration import Registration
 from app.services import activity_service
+from app.services.activity_counter_service import get_activity_counters
 from app.models import activity_relations
 from app.utils.slug_utils import slugify, generate_unique_slug
 from app.utils.auth_helpers import require_admin, get_user_or_403
@@ -15,9 +16,7 @@ from datetime import datetime, timezone
 from typing import cast, Iterable
 from app.utils.datetime_utils import parse_datetime_with_timezone
 import traceback
-import io
 import re
-import pandas as pd
 
 activities_bp = Blueprint("activities", __name__, url_prefix="/api/activities")
 
@@ -170,24 +169,10 @@ def get_activities():
 
         total = activities.total or 0
 
-        # Obtener conteo de preregistros por actividad en una sola consulta
-        activity_ids = [a.id for a in activities.items]
-        counts = {}
-        if activity_ids:
-            rows = (
-                db.session.query(
-                    Registration.activity_id, db.func.count(Registration.id)
-                )
-                .filter(
-                    Registration.activity_id.in_(activity_ids),
-                    # Contar registros que no estén cancelados ni marcados como ausente
-                    ~Registration.status.in_(["Ausente", "Cancelado"]),
-                )
-                .group_by(Registration.activity_id)
-                .all()
-            )
-
-            counts = {r[0]: int(r[1]) for r in rows}
+        # Preregistros por actividad (sin cancelados ni ausentes) desde
+        # activity_counters
+        counters = get_activity_counters(a.id for a in activities.items)
+        counts = {aid: c["active_registrations"] for aid, c in counters.items()}
 
         dumped = _safe_dump_activities(activities.items)
         # Añadir public_url si existe public_slug en la representación
@@ -300,15 +285,9 @@ def get_activity(activity_id):
         dumped = activity_schema.dump(activity)
         # Añadir conteo real de preregistros (excluyendo 'Ausente' y 'Cancelado')
         try:
-            count = (
-                db.session.query(db.func.count(Registration.id))
-                .filter(
-                    Registration.activity_id == activity_id,
-                    ~Registration.status.in_(["Ausente", "Cancelado"]),
-                )
-                .scalar()
-                or 0
-            )
+            count = get_activity_counters([activity_id])[activity_id][
+                "active_registrations"
+            ]
             if isinstance(dumped, dict):
                 dumped["current_capacity"] = int(count)
                 dumped["current_registrations"] = int(count)
@@ -510,6 +489,7 @@ def get_activity_registrations(activity_id):
 
 
 @activities_bp.route("/<int:activity_id>/export_registrations.xlsx", methods=["GET"])
+@activities_bp.route("/<int:activity_id>/export_registrations", methods=["GET"])
 @jwt_required()
 @require_admin
 def export_activity_registrations_xlsx(activity_id):
@@ -517,35 +497,41 @@ def export_activity_registrations_xlsx(activity_id):
 
     El archivo contiene columnas: control_number, full_name, email, career.
     Nombre del archivo: <slug(activity_name[:50])>-YYYYmmdd_HHMMSS.xlsx
+
+    Con ``?format=csv`` o ``?format=ndjson`` se entregan las mismas columnas
+    en ese formato.
     """
     try:
+        from app.utils.export_utils import (
+            get_export_format,
+            iter_query_rows,
+            styled,
+            tabular_response,
+            xlsx_response,
+        )
+
+        fmt = get_export_format()
+        if not fmt:
+            return jsonify({"message": "Formato no soportado"}), 400
+
         activity = db.session.get(Activity, activity_id)
         if not activity:
             return jsonify({"message": "Actividad no encontrada"}), 404
-        # Recolectar preregistros (incluye student relationship si existe)
-        regs = list(cast(Iterable, getattr(activity, "registrations", []) or []))
-
-        rows = []
-        for r in regs:
-            try:
-                s = getattr(r, "student", None)
-                rows.append(
-                    {
-                        "control_number": getattr(s, "control_number", None)
-                        if s
-                        else None,
-                        "full_name": getattr(s, "full_name", None) if s else None,
-                        "email": getattr(s, "email", None) if s else None,
-                        "career": getattr(s, "career", None) if s else None,
-                    }
-                )
-            except Exception:
-                # skip problematic row but continue
-                continue
-
-        # Build DataFrame
-        df = pd.DataFrame(
-            rows, columns=["control_number", "full_name", "email", "career"]
+        from app.models.student import Student
+
+        columns = ["control_number", "full_name", "email", "career"]
+        # Preregistros con los datos del estudiante, leídos en lotes
+        query = (
+            db.select(
+                Student.control_number,
+                Student.full_name,
+                Student.email,
+                Student.career,
+            )
+            .select_from(Registration)
+            .outerjoin(Student, Student.id == Registration.student_id)
+            .where(Registration.activity_id == activity_id)
+            .order_by(Registration.id)
         )
 
         # generate filename: slug of activity name (first 50 chars) + timestamp
@@ -561,19 +547,24 @@ def export_activity_registrations_xlsx(activity_id):
 
         ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
         slug = slugify(getattr(activity, "name", "")[:50])
-        filename = f"{slug}-{ts}.xlsx"
-
-        # write to BytesIO with openpyxl engine (installed)
-        bio = io.BytesIO()
-        with pd.ExcelWriter(bio, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="registrations")
-        bio.seek(0)
-
-        return send_file(
-            bio,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=filename,
+        filename = f"{slug}-{ts}"
+
+        if fmt != "xlsx":
+            return tabular_response(
+                fmt, [(c, c) for c in columns], iter_query_rows(query), filename
+            )
+
+        def rows(result):
+            yield styled(columns, "header")
+            for r in result:
+                yield list(r)
+
+        # La consulta se ejecuta aquí: sus errores responden 500 en vez de
+        # cortar una descarga ya iniciada
+        return xlsx_response(
+            rows(iter_query_rows(query)),
+            f"{filename}.xlsx",
+            sheet_title="registrations",
         )
     except Exception as e:
         tb = traceback.format_exc()
@@ -758,6 +749,40 @@ def remove_related_activity(activity_id, related_id):
     return jsonify({"message": "Actividades desenlazadas exitosamente"}), 200
 
 
+@activities_bp.route("/<int:activity_id>/recalculate-all", methods=["POST"])
+@jwt_required()
+@require_admin
+def recalculate_all_attendances(activity_id):
+    """Recalcula porcentaje y estado de todas las asistencias cerradas de la
+    actividad (p. ej. tras corregir su horario o duration_hours).
+
+    Body JSON opcional: ``{"dry_run": true|false}`` (default false).
+    """
+    from app.services.attendance_service import recalculate_activity_attendances
+
+    activity = db.session.get(Activity, activity_id)
+    if not activity:
+        return jsonify({"message": "Actividad no encontrada"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    dry_run = bool(payload.get("dry_run", False))
+    try:
+        summary = recalculate_activity_attendances(activity_id, dry_run=dry_run)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify(
+            {"message": "Error al recalcular asistencias", "error": str(e)}
+        ), 500
+
+    return jsonify(
+        {
+            "message": "Asistencias recalculadas",
+            "dry_run": dry_run,
+            "summary": summary,
+        }
+    ), 200
+
+
 @activities_bp.route("/relations", methods=["GET"])
 def get_activity_relations():
     try:
@@ -798,6 +823,8 @@ def batch_upload_activities():
       - file: the XLSX file (required)
       - event_id: optional; if provided, used for rows that lack event_id
       - dry_run: optional (1/0) default 1 -> if 1 only validate and return report
+      - async: optional (1/0) default 0 -> if 1 run as a background job and
+        return 202 with ``job_id`` (poll ``GET /api/jobs/<job_id>``)
     """
     try:
         if "file" not in request.files:
@@ -807,6 +834,29 @@ def batch_upload_activities():
         event_id = request.form.get("event_id")
         dry_run = request.form.get("dry_run", "1")
         dry = str(dry_run).strip() in ("1", "true", "yes")
+        run_async = str(request.form.get("async", "0")).strip() in ("1", "true", "yes")
+
+        if run_async:
+            from app.services.job_service import submit_job
+
+            job = submit_job(
+                "activities_batch",
+                activity_service.create_activities_from_xlsx,
+                upload=file.stream,
+                user_id=int(get_jwt_identity()),
+                event_id=event_id,
+                dry_run=dry,
+            )
+            return (
+                jsonify(
+                    {
+                        "message": "Batch in progress",
+                        "job_id": job.id,
+                        "job": job.to_dict(),
+                    }
+                ),
+                202,
+            )
 
         # Call service
         report = activity_service.create_activities_from_xlsx(
@@ -85,6 +85,18 @@ def list_all_settings():
         return jsonify({"error": "Error al obtener configuraciones"}), 500
 
 
+@admin_settings_bp.route("/cache-stats", methods=["GET"])
+@jwt_required()
+@require_admin
+def settings_cache_stats():
+    """Métricas de la caché de configuraciones de este worker.
+
+    ``?reset=1`` reinicia los contadores después de leerlos.
+    """
+    reset = request.args.get("reset", "").lower() in ("1", "true", "yes")
+    return jsonify({"cache": SettingsManager.cache_stats(reset=reset)}), 200
+
+
 @admin_settings_bp.route("/<key>", methods=["GET"])
 @jwt_required()
 @require_admin
@@ -1,5 +1,5 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
 from marshmallow import ValidationError
 from app.utils.datetime_utils import parse_datetime_with_timezone
@@ -9,8 +9,10 @@ from app.models.attendance import Attendance
 from app.models.student import Student
 from app.models.activity import Activity
 from app.utils.auth_helpers import require_admin, get_user_or_403
+from app.utils.ttl_cache import TTLCache
 from app.services.attendance_service import calculate_attendance_percentage
 from app.models.registration import Registration
+from sqlalchemy.orm import joinedload
 import traceback
 
 
@@ -285,6 +287,109 @@ def bulk_create_attendances():
         return jsonify({"message": "Error al crear asistencias", "error": str(e)}), 400
 
 
+# Estados que cuentan como "convertidos" (preregistro que terminó en asistencia)
+_CONVERTED_STATUSES = [
+    "Asistió",
+    "Parcial",
+    "Registrado",
+    "Confirmado",
+    "present",
+    "registered",
+]
+
+# Estadísticas del listado por combinación de filtros (TTL corto, por proceso)
+_listing_stats_cache = TTLCache(ttl=5.0, maxsize=256)
+
+
+def _attendance_listing_stats(base_query, cache_key=None):
+    """Total y estadísticas del listado con una sola consulta agregada.
+
+    Calcula con ``SUM(CASE ...)`` sobre la consulta filtrada (sin paginar):
+    total, creadas hoy, walk-ins (sin preregistro), convertidas (con
+    preregistro y estado de asistencia) y errores (ausente o < 50%). El
+    resultado se cachea unos segundos por ``cache_key``
+    (``ATTENDANCE_STATS_CACHE_SECONDS``; 0 desactiva la caché); con la caché
+    vigente solo se vuelve a contar el total.
+    """
+    from datetime import date
+
+    ttl = float(current_app.config.get("ATTENDANCE_STATS_CACHE_SECONDS", 5) or 0)
+    if cache_key is not None:
+        cached = _listing_stats_cache.get(cache_key, ttl=ttl)
+        if cached is not None:
+            # El total se mantiene exacto para que la paginación no se desfase
+            return dict(cached, total=base_query.order_by(None).count())
+
+    has_registration = (
+        db.select(Registration.id)
+        .where(
+            Registration.student_id == Attendance.student_id,
+            Registration.activity_id == Attendance.activity_id,
+        )
+        .exists()
+    )
+
+    def _count_if(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+    row = (
+        base_query.order_by(None)
+        .with_entities(
+            db.func.count(Attendance.id),
+            _count_if(db.func.date(Attendance.created_at) == date.today()),
+            _count_if(~has_registration),
+            _count_if(
+                db.and_(has_registration, Attendance.status.in_(_CONVERTED_STATUSES))
+            ),
+            _count_if(
+                db.or_(
+                    Attendance.status == "Ausente",
+                    Attendance.attendance_percentage < 50,
+                )
+            ),
+        )
+        .one()
+    )
+    stats = {
+        "total": int(row[0] or 0),
+        "today": int(row[1] or 0),
+        "walkins": int(row[2] or 0),
+        "converted": int(row[3] or 0),
+        "errors": int(row[4] or 0),
+    }
+    if cache_key is not None and ttl > 0:
+        _listing_stats_cache.set(cache_key, dict(stats))
+    return stats
+
+
+def _registrations_for_attendances(attendances):
+    """Preregistros que corresponden a una página de asistencias.
+
+    Devuelve ``{(student_id, activity_id): Registration}`` con una sola
+    consulta. ``student`` y ``activity`` de cada preregistro se resuelven desde
+    el identity map, porque ya se cargaron junto con las asistencias.
+    """
+    pairs = {(a.student_id, a.activity_id) for a in attendances}
+    if not pairs:
+        return {}
+
+    registrations = (
+        Registration.query.filter(
+            Registration.student_id.in_({sid for sid, _ in pairs}),
+            Registration.activity_id.in_({aid for _, aid in pairs}),
+        )
+        .order_by(Registration.id)
+        .all()
+    )
+
+    by_pair = {}
+    for reg in registrations:
+        key = (reg.student_id, reg.activity_id)
+        if key in pairs:
+            by_pair.setdefault(key, reg)
+    return by_pair
+
+
 @attendances_bp.route("/", methods=["GET"])
 @jwt_required()
 def get_attendances():
@@ -335,68 +440,40 @@ def get_attendances():
         # Mantener una referencia a la consulta sin paginar para cálculos agregados
         base_query = query
 
-        total = base_query.count()
-        items = query.limit(per_page).offset((page - 1) * per_page).all()
-        pages = (total + per_page - 1) // per_page if per_page else 1
-
-        # Estadísticas agregadas sobre toda la consulta (no solo la página)
-        try:
-            from datetime import date
-
-            # contar asistencias creadas hoy
-            stats_today = base_query.filter(
-                db.func.date(Attendance.created_at) == date.today()
-            ).count()
-        except Exception:
-            stats_today = 0
-
-        try:
-            # walkins: attendances without a matching registration (left outer join)
-            walkins_q = base_query.outerjoin(
-                Registration,
-                db.and_(
-                    Registration.student_id == Attendance.student_id,
-                    Registration.activity_id == Attendance.activity_id,
-                ),
-            )
-            walkins = walkins_q.filter(Registration.id is None).count()  # type: ignore
-        except Exception:
-            walkins = 0
-
-        try:
-            # converted: attendances with registration and considered present/registered
-            converted_q = base_query.join(
-                Registration,
-                db.and_(
-                    Registration.student_id == Attendance.student_id,
-                    Registration.activity_id == Attendance.activity_id,
+        # total y estadísticas sobre toda la consulta (no solo la página) en
+        # una sola pasada agregada
+        stats_key = (
+            student_id,
+            activity_id,
+            status,
+            event_id,
+            activity_type,
+            search,
+        )
+        stats = _attendance_listing_stats(base_query, stats_key)
+        total = stats["total"]
+        # Cargar student, activity y event en la misma consulta (evita lazy
+        # loads por fila al serializar)
+        items = (
+            query.options(
+                joinedload(Attendance.student),  # type: ignore[attr-defined]
+                joinedload(Attendance.activity).joinedload(  # type: ignore[attr-defined]
+                    Activity.event  # type: ignore[attr-defined]
                 ),
             )
-            converted = converted_q.filter(
-                Attendance.status.in_(
-                    [
-                        "Asistió",
-                        "Parcial",
-                        "Registrado",
-                        "Confirmado",
-                        "present",
-                        "registered",
-                    ]
-                )
-            ).count()
-        except Exception:
-            converted = 0
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+            .all()
+        )
+        pages = (total + per_page - 1) // per_page if per_page else 1
 
+        # Preregistros de la página en una sola consulta indexada por
+        # (student_id, activity_id)
         try:
-            # errors: status 'Ausente' or low percentage (<50)
-            errors = base_query.filter(
-                db.or_(
-                    Attendance.status == "Ausente",
-                    Attendance.attendance_percentage < 50,
-                )
-            ).count()
+            registrations_by_pair = _registrations_for_attendances(items)
         except Exception:
-            errors = 0
+            # No romper la respuesta si por alguna razón falla la consulta
+            registrations_by_pair = {}
 
         # Serializar y adjuntar objetos relacionados (student, activity) para
         # facilitar el consumo en el frontend sin múltiples requests.
@@ -434,18 +511,10 @@ def get_attendances():
             except Exception:
                 pass
 
-            # Intentar adjuntar información de preregistro (registration)
+            # Adjuntar información de preregistro (registration)
             try:
-                # `Registration` fue importado en el módulo
-                from sqlalchemy.orm import joinedload
-
-                registration = (
-                    Registration.query.options(
-                        joinedload(getattr(Registration, "student")),
-                        joinedload(getattr(Registration, "activity")),
-                    )
-                    .filter_by(student_id=att.student_id, activity_id=att.activity_id)
-                    .first()
+                registration = registrations_by_pair.get(
+                    (att.student_id, att.activity_id)
                 )
                 if registration:
                     d["registration_id"] = registration.id
@@ -498,10 +567,10 @@ def get_attendances():
                 "pages": pages,
                 "current_page": page,
                 "stats": {
-                    "today": stats_today,
-                    "walkins": walkins,
-                    "converted": converted,
-                    "errors": errors,
+                    "today": stats["today"],
+                    "walkins": stats["walkins"],
+                    "converted": stats["converted"],
+                    "errors": stats["errors"],
                 },
             }
         ), 200
@@ -960,143 +1029,17 @@ def batch_checkout():
             return jsonify({"message": "activity_id es requerido"}), 400
 
         from app.services.attendance_service import (
-            calculate_attendance_percentage,
-            create_related_attendances,
+            batch_checkout as run_batch_checkout,
         )
-        from app.models.attendance import Attendance
         from app.models.activity import Activity
 
         activity = db.session.get(Activity, activity_id)
         if not activity:
             return jsonify({"message": "Actividad no encontrada"}), 404
 
-        query = Attendance.query.filter_by(activity_id=activity_id)
-        if student_ids:
-            query = query.filter(Attendance.student_id.in_(student_ids))
-
-        att_list = query.all()
-
-        summary = {"processed": 0, "updated": 0, "related_created": 0, "details": []}
-
-        for att in att_list:
-            summary["processed"] += 1
-            # If there's no check_in_time, skip (cannot calculate)
-            if not att.check_in_time:
-                summary["details"].append(
-                    {
-                        "attendance_id": att.id,
-                        "action": "skipped",
-                        "reason": "no_check_in",
-                    }
-                )
-                continue
-
-            # If check_out_time missing, set it to now for the purpose of calculation
-            from datetime import datetime, timezone
-
-            now = datetime.now(timezone.utc)
-            if not att.check_out_time:
-                if not dry_run:
-                    att.check_out_time = now
-                # otherwise, emulate for calculation
-                emulate_check_out = now
-            else:
-                emulate_check_out = att.check_out_time
-
-            # Calculate percentage.
-            # - If dry_run: compute in-memory without mutating DB/session.
-            # - If not dry_run: use the service which updates the attendance and persists below.
-            perc = None
-            if dry_run:
-                # Local calculation (mirror logic from service.calculate_net_duration_seconds)
-                try:
-                    # normalize timezone-aware datetimes
-                    def _ensure_tz(dt):
-                        if dt is None:
-                            return None
-                        if dt.tzinfo is not None:
-                            return dt.astimezone(timezone.utc)
-                        # interpret naive DB datetimes in app timezone
-                        from flask import current_app
-                        from app.utils.datetime_utils import localize_naive_datetime
-
-                        app_timezone = current_app.config.get(
-                            "APP_TIMEZONE", "America/Mexico_City"
-                        )
-                        return localize_naive_datetime(dt, app_timezone)
-
-                    start = _ensure_tz(att.check_in_time)
-                    end = _ensure_tz(emulate_check_out)
-
-                    total_paused_seconds = 0
-                    if getattr(att, "pause_time", None):
-                        resume_or_now = getattr(att, "resume_time", None) or now
-                        resume_or_now = _ensure_tz(resume_or_now)
-                        pause_time = _ensure_tz(att.pause_time)
-                        if resume_or_now and pause_time:
-                            total_paused_seconds = (
-                                resume_or_now - pause_time
-                            ).total_seconds()
-
-                    if not start or not end:
-                        net_duration_seconds = 0
-                    else:
-                        net_duration_seconds = max(
-                            0, (end - start).total_seconds() - total_paused_seconds
-                        )
-
-                    expected_duration_seconds = 0
-                    if getattr(activity, "duration_hours", None) is not None:
-                        expected_duration_seconds = activity.duration_hours * 3600
-
-                    if expected_duration_seconds > 0:
-                        percentage = (
-                            net_duration_seconds / expected_duration_seconds
-                        ) * 100
-                        perc = round(max(0, percentage), 2)
-                    else:
-                        # If no expected duration, assume 100% if had both times
-                        perc = 100.0 if start and end else 0.0
-                except Exception:
-                    perc = 0.0
-            else:
-                # Persist check_out time if missing, then calculate via service which mutates the attendance
-                if not att.check_out_time:
-                    att.check_out_time = now
-                db.session.add(att)
-                try:
-                    db.session.flush()
-                except Exception:
-                    pass
-
-                perc = calculate_attendance_percentage(att.id)
-
-                # Persist updates from service
-                db.session.add(att)
-                db.session.commit()
-                db.session.refresh(att)
-
-            # If the recalculated percentage meets threshold, create related attendances
-            created_related = 0
-            if (perc or 0) >= 80:
-                # Only create related attendances when not dry_run
-                if not dry_run and getattr(activity, "related_activities", None):
-                    create_related_attendances(att.student_id, activity_id)
-                    created_related = 1
-
-            summary["details"].append(
-                {
-                    "attendance_id": att.id,
-                    "percentage": perc or 0,
-                    "related_created": created_related,
-                }
-            )
-            summary["updated"] += 1
-            summary["related_created"] += created_related
-
-        if not dry_run:
-            # commit already performed per-attendance
-            pass
+        summary = run_batch_checkout(
+            activity_id, student_ids=student_ids, dry_run=dry_run
+        )
 
         return jsonify(
             {
@@ -1121,6 +1064,8 @@ def batch_upload_attendances():
       - file: the TXT or XLSX file (required)
       - activity_id: the activity ID (required)
       - dry_run: optional (1/0) default 1 -> if 1 only validate and return report
+      - async: optional (1/0) default 0 -> if 1 run as a background job and
+        return 202 with ``job_id`` (poll ``GET /api/jobs/<job_id>``)
     """
     try:
         if "file" not in request.files:
@@ -1128,6 +1073,7 @@ def batch_upload_attendances():
 
         file = request.files["file"]
         activity_id = request.form.get("activity_id")
+        run_async = str(request.form.get("async", "0")).strip() in ("1", "true", "yes")
         dry_run = request.form.get("dry_run", "1")
         dry = str(dry_run).strip() in ("1", "true", "yes")
 
@@ -1141,16 +1087,40 @@ def batch_upload_attendances():
         if mode == "exit":
             from app.services.attendance_service import process_exit_from_file
 
-            report = process_exit_from_file(
-                file.stream, activity_id=int(activity_id), dry_run=dry, action=action
-            )
+            job_kind = "attendances_exit"
+            func = process_exit_from_file
+            kwargs = {"activity_id": int(activity_id), "dry_run": dry, "action": action}
         else:
             # default: create attendances (existing behavior)
             from app.services.attendance_service import create_attendances_from_file
 
-            report = create_attendances_from_file(
-                file.stream, activity_id=int(activity_id), dry_run=dry
+            job_kind = "attendances_batch"
+            func = create_attendances_from_file
+            kwargs = {"activity_id": int(activity_id), "dry_run": dry}
+
+        if run_async:
+            from app.services.job_service import submit_job
+
+            job = submit_job(
+                job_kind,
+                func,
+                upload=file.stream,
+                user_id=int(get_jwt_identity()),
+                **kwargs,
             )
+            return (
+                jsonify(
+                    {
+                        "message": "Batch en proceso",
+                        "job_id": job.id,
+                        "job": job.to_dict(),
+                        "dry_run": bool(dry),
+                    }
+                ),
+                202,
+            )
+
+        report = func(file.stream, **kwargs)
 
         status_code = 200 if dry else 201
         # Exponer explicitamente si la operación fue dry_run en la respuesta
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
-import requests
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 from app import db
 from app.schemas import user_login_schema
 from app.models.user import User
 from app.models.student import Student
+from app.services.student_service import StudentAuthError, authenticate_student
+from app.utils.auth_helpers import STUDENT, create_admin_token, create_student_token
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
@@ -30,7 +31,7 @@ def login():
         # Validar contraseña
         if user and user.check_password(password):
             # Generar token JWT
-            access_token = create_access_token(identity=str(user.id))
+            access_token = create_admin_token(user)
             return jsonify(
                 {
                     "access_token": access_token,
@@ -65,91 +66,38 @@ def student_login():
                 {"message": "Número de control y contraseña son requeridos"}
             ), 400
 
-        external_api_url = "http://apps.tecvalles.mx:8091/api/validate/student"
-
         try:
-            # Enviar credenciales al sistema externo
-            external_response = requests.post(
-                external_api_url,
-                json={
-                    "username": control_number,  # Asumiendo que username es el número de control
-                    "password": password,
-                },
-                timeout=10,
-            )
-
-            if external_response.status_code == 200:
-                external_data = external_response.json()
-
-                # Verificar que la respuesta sea exitosa
-                if external_data.get("success") and external_data.get("data"):
-                    student_info = external_data["data"]
-
-                    # Crear o actualizar estudiante en nuestra base de datos
-                    student = Student.query.filter_by(
-                        control_number=control_number
-                    ).first()
-
-                    if not student:
-                        # Crear nuevo estudiante con todos los datos disponibles
-                        # Usar asignaciones explícitas para evitar constructor kwargs
-                        student = Student()
-                        student.control_number = control_number
-                        student.full_name = student_info.get("name", "") or ""
-                        student.career = (
-                            student_info.get("career", {}).get("name", "")
-                            if student_info.get("career")
-                            else ""
-                        )
-                        student.email = student_info.get("email", "") or ""
-                        db.session.add(student)
-                    else:
-                        # Actualizar información si es necesario
-                        student.full_name = student_info.get("name", student.full_name)
-                        if student_info.get("career"):
-                            student.career = student_info["career"].get(
-                                "name", student.career
-                            )
-                        student.email = student_info.get("email", student.email)
-
-                    db.session.commit()
-
-                    # Generar token para estudiante
-                    access_token = create_access_token(identity=str(student.id))
-                    return jsonify(
-                        {
-                            "access_token": access_token,
-                            "student": {
-                                "id": student.id,
-                                "control_number": student.control_number,
-                                "full_name": student.full_name,
-                                "career": student.career,
-                                "email": student.email,
-                                "type": "student",
-                            },
-                        }
-                    ), 200
-                else:
-                    return jsonify({"message": "Credenciales inválidas"}), 401
-            else:
-                # Manejar diferentes códigos de error del sistema externo
-                if external_response.status_code == 401:
-                    return jsonify({"message": "Credenciales inválidas"}), 401
-                else:
-                    return jsonify(
-                        {"message": "Error en la validación con sistema externo"}
-                    ), 503
-
-        except requests.exceptions.RequestException as e:
-            return jsonify(
-                {"message": "Error de conexión con sistema externo", "error": str(e)}
-            ), 503
+            # Validar en el sistema externo y crear/actualizar el estudiante
+            student = authenticate_student(control_number, password)
+            db.session.commit()
+        except StudentAuthError as e:
+            db.session.rollback()
+            body = {"message": e.message}
+            if e.error:
+                body["error"] = e.error
+            return jsonify(body), e.status_code
         except Exception as e:
             db.session.rollback()
             return jsonify(
                 {"message": "Error en el login de estudiante", "error": str(e)}
             ), 400
 
+        # Generar token para estudiante
+        access_token = create_student_token(student)
+        return jsonify(
+            {
+                "access_token": access_token,
+                "student": {
+                    "id": student.id,
+                    "control_number": student.control_number,
+                    "full_name": student.full_name,
+                    "career": student.career,
+                    "email": student.email,
+                    "type": "student",
+                },
+            }
+        ), 200
+
     except Exception as e:
         return jsonify(
             {"message": "Error en el login de estudiante", "error": str(e)}
@@ -165,9 +113,10 @@ def profile():
     try:
         user_id = int(get_jwt_identity())
 
-        user_type = request.args.get("type")
+        # El tipo viene en el token; ?type= solo para tokens sin ese claim
+        user_type = get_jwt().get("type") or request.args.get("type")
 
-        if user_type == "student":
+        if user_type == STUDENT:
             # Buscar específicamente en Student
             student = db.session.get(Student, user_id)
             if student:
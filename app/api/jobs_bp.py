@@ -0,0 +1,24 @@
+"""Consulta de trabajos en segundo plano (importaciones batch)."""
+
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+
+from app.services.job_service import get_job
+from app.utils.auth_helpers import require_admin
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/jobs")
+
+
+@jobs_bp.route("/<string:job_id>", methods=["GET"])
+@jwt_required()
+@require_admin
+def get_job_status(job_id):
+    """Estado, progreso parcial y reporte final de un trabajo.
+
+    ``status`` es queued | running | succeeded | failed; ``result`` contiene el
+    mismo reporte que devuelve el endpoint síncrono cuando el trabajo termina.
+    """
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"message": "Trabajo no encontrado"}), 404
+    return jsonify({"job": job.to_dict()}), 200
@@ -1,19 +1,18 @@
-from flask import Blueprint, request, jsonify, render_template, current_app, send_file
+from flask import Blueprint, request, jsonify, render_template, current_app
 from app import db
 from app.models.activity import Activity
 from app.models.registration import Registration
 from app.models.attendance import Attendance
 from app.models.student import Student
 from app.services.settings_manager import AppSettings
+from app.services.student_lookup_service import ERROR, NOT_FOUND, lookup_student
+from app.services.student_service import upsert_student
 from datetime import datetime, timedelta, timezone
-import requests
 from app.utils.slug_utils import slugify as canonical_slugify
 from app.utils.datetime_utils import localize_naive_datetime, safe_iso
 from sqlalchemy.exc import IntegrityError
-import io
 import re
 import traceback
-import pandas as pd
 
 public_registrations_bp = Blueprint("public_registrations", __name__, url_prefix="")
 
@@ -198,162 +197,30 @@ def api_list_registrations():
         return jsonify({"message": "Actividad no encontrada"}), 404
 
     # Merge registrations and attendance-only records so the UI can display
-    # participants coming from either source. Strategy:
-    #  - Load all registrations for the activity
-    #  - Load all attendances for the activity and map them by student_id
-    #  - For registrations, attach attendance info if present
-    #  - For attendances without a registration, synthesize a row
-    #  - Merge, sort by control_number (fallback by name), and apply pagination in Python
-
-    regs_all = Registration.query.filter_by(activity_id=activity.id).all()
-    atts_all = Attendance.query.filter_by(activity_id=activity.id).all()
-
-    # Map attendances by student_id for quick lookup
-    atts_by_student = {}
-    for a in atts_all:
-        if a.student_id:
-            # prefer the first attendance per student for display
-            if a.student_id not in atts_by_student:
-                atts_by_student[a.student_id] = a
-
-    items = []
-    registration_student_ids = set()
-
-    def _is_excluded_status(status_obj):
-        """Return True if status_obj represents an excluded status (ausente/cancelado).
-
-        Handles strings, Enum members (checking .name and .value) and falls back
-        to str(). Comparison is case-insensitive and tolerant (checks substring
-        'ausente' or 'cancel').
-        """
-        try:
-            if not status_obj:
-                return False
-            candidates = []
-            if isinstance(status_obj, str):
-                candidates.append(status_obj)
-            else:
-                # Enum-like: try value and name
-                val = getattr(status_obj, "value", None)
-                name = getattr(status_obj, "name", None)
-                if val is not None:
-                    candidates.append(val)
-                if name is not None:
-                    candidates.append(name)
-                # fallback to str()
-                candidates.append(str(status_obj))
-
-            for c in candidates:
-                if not c:
-                    continue
-                s = str(c).strip().lower()
-                if "ausente" in s or "cancel" in s:
-                    return True
-            return False
-        except Exception:
-            return False
-
-    for r in regs_all:
-        # skip registrations explicitly marked as Ausente or Cancelado
-        if _is_excluded_status(getattr(r, "status", None)):
-            continue
-        student = r.student
-        registration_student_ids.add(r.student_id)
-        attendance = atts_by_student.get(r.student_id)
-        items.append(
-            {
-                "id": r.id,
-                "registration_id": r.id,
-                "attendance_id": attendance.id if attendance else None,
-                "student_id": student.id if student else None,
-                "control_number": student.control_number if student else None,
-                "student_name": student.full_name if student else r.name or None,
-                "email": student.email if student else None,
-                "status": r.status,
-                "attended": bool(r.attended),
-                "registration_date": safe_iso(getattr(r, "registration_date", None)),
-                "check_in_time": safe_iso(getattr(attendance, "check_in_time", None))
-                if attendance
-                else None,
-                "notes": getattr(r, "notes", None),
-                "source": "registration",
-            }
-        )
+    # participants coming from either source. The merge (UNION of visible
+    # registrations and attendances without a registration), the search, the
+    # ordering by control number and the pagination all run in SQL. Pass
+    # `cursor` (the `next_cursor` of the previous page) for keyset paging.
+    from app.services.registration_service import list_activity_participants
 
-    # Add attendance-only rows (those students without a registration)
-    for a in atts_all:
-        if a.student_id in registration_student_ids:
-            continue
-        # also skip attendance rows where status is ausente/cancelado
-        try:
-            if _is_excluded_status(getattr(a, "status", None)):
-                continue
-        except Exception:
-            pass
-        student = a.student
-        items.append(
-            {
-                "id": None,
-                "registration_id": None,
-                "attendance_id": a.id,
-                "student_id": student.id if student else None,
-                "control_number": student.control_number if student else None,
-                "student_name": student.full_name if student else None,
-                "email": student.email if student else None,
-                "status": getattr(a, "status", "Asistió"),
-                "attended": True,
-                "registration_date": None,
-                "check_in_time": safe_iso(getattr(a, "check_in_time", None)),
-                "notes": None,
-                "source": "attendance",
-            }
+    try:
+        result = list_activity_participants(
+            activity.id,
+            q=request.args.get("q"),
+            page=page,
+            per_page=per_page,
+            cursor=request.args.get("cursor") or None,
         )
-
-    # Sort by control_number if present, fallback to student_name
-    def sort_key(it):
-        cn = it.get("control_number") or ""
-        # pad numeric-like values for better lexicographic order
-        try:
-            return (cn.zfill(20), it.get("student_name") or "")
-        except Exception:
-            return (cn, it.get("student_name") or "")
-
-    items.sort(key=sort_key)
-
-    # Apply server-side search filter (if provided)
-    q = (request.args.get("q") or "").strip()
-    if q:
-        q_lower = q.lower()
-
-        def matches_query(it):
-            # check control_number (as substring) and student_name (case-insensitive)
-            cn = it.get("control_number")
-            name = it.get("student_name")
-            try:
-                if cn and q_lower in str(cn).lower():
-                    return True
-            except Exception:
-                pass
-            try:
-                if name and q_lower in str(name).lower():
-                    return True
-            except Exception:
-                pass
-            return False
-
-        items = [it for it in items if matches_query(it)]
-
-    total = len(items)
-    start = (page - 1) * per_page
-    end = start + per_page
-    page_items = items[start:end]
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     return jsonify(
         {
-            "registrations": page_items,
-            "total": total,
+            "registrations": result["items"],
+            "total": result["total"],
             "page": page,
             "per_page": per_page,
+            "next_cursor": result["next_cursor"],
         }
     ), 200
 
@@ -404,54 +271,24 @@ def api_public_lookup_student():
             }
         ), 200
 
-    # Not found locally -> try external API (reuse same endpoint used by walkin)
-    external_api = (
-        f"http://apps.tecvalles.mx:8091/api/validate/student?username={control_number}"
-    )
-    try:
-        resp = requests.get(external_api, timeout=5)
-    except requests.exceptions.RequestException:
-        current_app.logger.exception(
-            "Error contacting external student API for %s", control_number
+    # Not found locally -> external directory (local mirror first, then API)
+    result = lookup_student(control_number)
+    if result["status"] == ERROR:
+        current_app.logger.warning(
+            "External student lookup failed for %s: %s",
+            control_number,
+            result.get("error"),
         )
         return jsonify({"found": False}), 200
-
-    if resp.status_code == 404:
+    if result["status"] == NOT_FOUND:
         current_app.logger.debug("External API returned 404 for %s", control_number)
         return jsonify({"found": False}), 200
 
-    if resp.status_code != 200:
-        current_app.logger.warning(
-            "External API returned status %s for %s", resp.status_code, control_number
-        )
-        # log response body truncated for debugging (avoid huge logs)
-        try:
-            txt = resp.text or ""
-            current_app.logger.debug("External API body: %s", txt[:1000])
-        except Exception:
-            pass
-        return jsonify({"found": False}), 200
-
-    try:
-        data = resp.json() if resp.text else {}
-    except Exception:
-        current_app.logger.exception(
-            "Invalid JSON from external student API for %s", control_number
-        )
-        data = {}
-
-    # Normalize response similar to walkin behavior
-    d = data if isinstance(data, dict) else {}
-    career = d.get("career") or d.get("carrera") or {}
-    career_name = None
-    if isinstance(career, dict):
-        career_name = career.get("name") or career.get("nombre")
-    else:
-        career_name = career
-
-    ext_control = d.get("username") or d.get("control_number") or control_number
-    ext_full_name = d.get("name") or d.get("full_name") or d.get("nombre")
-    ext_email = d.get("email") or ""
+    ext = result["student"] or {}
+    ext_control = ext.get("control_number") or control_number
+    ext_full_name = ext.get("full_name")
+    ext_email = ext.get("email") or ""
+    career_name = ext.get("career")
 
     if not ext_control or not ext_full_name:
         current_app.logger.warning(
@@ -462,14 +299,16 @@ def api_public_lookup_student():
         )
         return jsonify({"found": False}), 200
 
-    # Create local Student safely inside a transaction
+    # Create local Student (upsert: concurrent lookups may create it too)
     try:
-        student = Student()
-        student.control_number = ext_control
-        student.full_name = ext_full_name
-        student.email = ext_email
-        student.career = career_name
-        db.session.add(student)
+        student = upsert_student(
+            {
+                "control_number": ext_control,
+                "full_name": ext_full_name,
+                "career": career_name,
+                "email": ext_email,
+            }
+        )
         db.session.commit()
         current_app.logger.info(
             "Created local student %s (%s) from external API",
@@ -653,71 +492,39 @@ def api_walkin():
     # find existing student locally
     student = Student.query.filter_by(control_number=control_number).first()
     if not student:
-        # Backend will call the external validation API to fetch student data
-        # and create the Student locally. This prevents trusting client payloads.
-        external_api = f"http://apps.tecvalles.mx:8091/api/validate/student?username={control_number}"
-        try:
-            resp = requests.get(external_api, timeout=8)
-        except requests.exceptions.RequestException:
+        # Backend resolves the student from the external directory (local
+        # mirror first, then the validation API) and creates it locally.
+        # This prevents trusting client payloads.
+        result = lookup_student(control_number)
+        if result["status"] == ERROR:
             return jsonify({"message": "Error conectando al servicio externo"}), 503
-
-        if resp.status_code == 404:
+        if result["status"] == NOT_FOUND:
             return jsonify(
                 {"message": "Estudiante no encontrado en sistema externo"}
             ), 404
-        if resp.status_code != 200:
-            return jsonify({"message": "Error desde servicio externo"}), 503
 
-        try:
-            data = resp.json()
-        except Exception:
-            return jsonify({"message": "Respuesta externa inválida"}), 502
-
-        # Normalize payload similar to students_bp.validate_student_proxy
-        if (
-            isinstance(data, dict)
-            and "data" in data
-            and isinstance(data.get("data"), dict)
-        ):
-            data = data.get("data")
-
-        d = data if isinstance(data, dict) else {}
-
-        career = d.get("career") or d.get("carrera") or {}
-        career_name = None
-        if isinstance(career, dict):
-            career_name = career.get("name") or career.get("nombre") or None
-        else:
-            career_name = career
-
-        ext_control = d.get("username") or d.get("control_number") or control_number
-        ext_full_name = d.get("name") or d.get("full_name") or d.get("nombre")
-        ext_email = d.get("email") or ""
+        ext = result["student"] or {}
+        ext_control = ext.get("control_number") or control_number
+        ext_full_name = ext.get("full_name")
+        ext_email = ext.get("email") or ""
+        career_name = ext.get("career")
 
         if not ext_control or not ext_full_name:
             return jsonify(
                 {"message": "Datos externos incompletos para crear estudiante"}
             ), 502
 
-        # Create student inside DB transaction below (so registration+attendance are atomic)
-        # We'll create it here but don't commit until the outer try/commit
-        try:
-            student = Student()
-            student.control_number = ext_control
-            student.full_name = ext_full_name
-            student.career = career_name
-            student.email = ext_email
-            db.session.add(student)
-            db.session.flush()
-        except IntegrityError:
-            db.session.rollback()
-            # Concurrent creation: try to load again
-            student = Student.query.filter_by(control_number=control_number).first()
-            if not student:
-                current_app.logger.exception(
-                    "IntegrityError creating student during walk-in"
-                )
-                return jsonify({"message": "Conflicto al crear estudiante"}), 409
+        # Create student inside DB transaction below (so registration+attendance
+        # are atomic). Upsert: a concurrent walk-in/lookup of the same control
+        # number may be creating it at the same time.
+        student = upsert_student(
+            {
+                "control_number": ext_control,
+                "full_name": ext_full_name,
+                "career": career_name,
+                "email": ext_email,
+            }
+        )
 
     # perform all DB changes in a single transaction for atomicity
     try:
@@ -1411,40 +1218,34 @@ def api_export_registrations_xlsx():
     if not activity:
         return jsonify({"message": "Actividad no encontrada"}), 400
 
-    # Collect registrations
-    regs = list(getattr(activity, "registrations", []) or [])
-    rows = []
-    for r in regs:
-        # Exclude registrations with status Ausente or Cancelado
-        try:
-            st = getattr(r, "status", None)
-            if st and str(st).strip().lower() in ("ausente", "cancelado"):
-                continue
-        except Exception:
-            pass
-        try:
-            s = getattr(r, "student", None)
-            rows.append(
-                {
-                    "Número de control": getattr(s, "control_number", None)
-                    if s
-                    else None,
-                    "Nombre completo": getattr(s, "full_name", None) if s else None,
-                    "Correo": getattr(s, "email", None) if s else None,
-                    "Carrera": getattr(s, "career", None) if s else None,
-                }
-            )
-        except Exception:
-            continue
+    from app.utils.export_utils import iter_query_rows, styled, xlsx_response
 
-    # Build DataFrame with Spanish columns
-    try:
-        df = pd.DataFrame(
-            rows, columns=["Número de control", "Nombre completo", "Correo", "Carrera"]
+    # Preregistros (excluye Ausente/Cancelado) leídos en lotes
+    query = (
+        db.select(
+            Student.control_number,
+            Student.full_name,
+            Student.email,
+            Student.career,
         )
-    except Exception:
-        # Fallback: create DataFrame directly from rows
-        df = pd.DataFrame(rows)
+        .select_from(Registration)
+        .outerjoin(Student, Student.id == Registration.student_id)
+        .where(
+            Registration.activity_id == activity.id,
+            db.or_(
+                Registration.status.is_(None),
+                Registration.status.notin_(["Ausente", "Cancelado"]),
+            ),
+        )
+        .order_by(Registration.id)
+    )
+
+    def rows(result):
+        yield styled(
+            ["Número de control", "Nombre completo", "Correo", "Carrera"], "header"
+        )
+        for r in result:
+            yield list(r)
 
     # generate filename using activity name (slugify) + timestamp
     def slugify(text, maxlen=50):
@@ -1462,16 +1263,11 @@ def api_export_registrations_xlsx():
     slug = slugify(getattr(activity, "name", "")[:50])
     filename = f"{slug}-{ts}.xlsx"
 
-    bio = io.BytesIO()
     try:
-        with pd.ExcelWriter(bio, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="preregistros")
-        bio.seek(0)
-        return send_file(
-            bio,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=filename,
+        # La consulta se ejecuta aquí: sus errores responden 500 en vez de
+        # cortar una descarga ya iniciada
+        return xlsx_response(
+            rows(iter_query_rows(query)), filename, sheet_title="preregistros"
         )
     except Exception as e:
         tb = traceback.format_exc()
@@ -7,6 +7,7 @@ from app.models.student import Student
 from app.models.activity import Activity
 from app.models.attendance import Attendance
 from app.utils.auth_helpers import get_user_or_403
+from app.services.activity_counter_service import get_activity_counters
 from sqlalchemy import cast, String
 from sqlalchemy import or_
 from sqlalchemy.orm import aliased
@@ -80,19 +81,14 @@ def create_registration():
                     # 409 Conflict
                     return jsonify({"message": conflict_message}), 409
 
-                # Verificar cupo
-                from app.services.registration_service import is_registration_allowed
-
-                if not is_registration_allowed(activity_id):
-                    return jsonify({"message": "Cupo lleno para esta actividad."}), 400
-
-                # ✨ Re-registrar: actualizar estado y datos
-                existing_registration.status = "Registrado"
-                existing_registration.registration_date = db.func.now()
-                existing_registration.confirmation_date = None
-                existing_registration.attended = False
+                # Reservar cupo y reactivar en una sola transacción
+                from app.services.registration_service import (
+                    create_registration_atomic,
+                )
 
-                db.session.commit()
+                ok, result = create_registration_atomic(student_id, activity_id)
+                if not ok:
+                    return jsonify({"message": result}), 400
 
                 return jsonify(
                     {
@@ -118,16 +114,10 @@ def create_registration():
         if conflict_exists:
             return jsonify({"message": conflict_message}), 409  # 409 Conflict
 
-        # Verificar cupo
-        from app.services.registration_service import is_registration_allowed
-
-        if not is_registration_allowed(activity_id):
-            return jsonify({"message": "Cupo lleno para esta actividad."}), 400
+        # Reservar cupo y crear el preregistro (UPDATE condicional, sin bloqueos)
+        from app.services.registration_service import create_registration_atomic
 
-        # Intentar crear preregistro.
-        from app.services.registration_service import create_registration_simple
-
-        ok, result = create_registration_simple(student_id, activity_id)
+        ok, result = create_registration_atomic(student_id, activity_id)
         if not ok:
             return jsonify({"message": result}), 400
 
@@ -251,21 +241,8 @@ def get_registrations():
                 )
 
         # Calcular conteos de preregistros por actividad para las actividades en esta página
-        activity_ids = [r.activity_id for r in registrations.items if r.activity_id]
-        counts = {}
-        if activity_ids:
-            rows = (
-                db.session.query(
-                    Registration.activity_id, db.func.count(Registration.id)
-                )
-                .filter(
-                    Registration.activity_id.in_(activity_ids),
-                    ~Registration.status.in_(["Ausente", "Cancelado"]),
-                )
-                .group_by(Registration.activity_id)
-                .all()
-            )
-            counts = {r[0]: int(r[1]) for r in rows}
+        counters = get_activity_counters(r.activity_id for r in registrations.items)
+        counts = {aid: c["active_registrations"] for aid, c in counters.items()}
 
         dumped_regs = registrations_schema.dump(registrations.items)
 
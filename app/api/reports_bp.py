@@ -7,10 +7,11 @@ from app.utils.auth_helpers import require_admin
 from app.utils.datetime_utils import localize_naive_datetime
 from app.models.registration import Registration
 from app.models.activity import Activity
+from app.models.activity_counter import ActivityCounter
 from app.models.event import Event
 from app.models.student import Student
+from app.services.report_service import get_participation_matrix
 from sqlalchemy import func
-from typing import Any, List
 
 reports_bp = Blueprint("reports", __name__, url_prefix="/api/reports")
 
@@ -156,205 +157,16 @@ def participation_matrix():
 
     Regla para generación: se extraen los primeros dos dígitos que aparezcan en el `control_number`.
     Si no se encuentran dígitos, se toma la cadena vacía.
+
+    El cálculo vive en ``report_service`` y se guarda en caché hasta que
+    cambian los preregistros.
     """
     try:
-        import re
-
         event_id = request.args.get("event_id", type=int)
         activity_id = request.args.get("activity_id", type=int)
 
-        # Obtener los preregistros con datos relevantes
-        q = db.session.query(Registration, Student).join(
-            Student, Registration.student_id == Student.id
-        )
-
-        if activity_id:
-            q = q.filter(Registration.activity_id == activity_id)
-        elif event_id:
-            # join Activity to filter by event
-            q = q.join(Activity, Activity.id == Registration.activity_id).filter(
-                Activity.event_id == event_id
-            )
-
-        rows = q.all()
-
-        # Determinar la fecha de referencia para calcular semestre
-        # Use timezone-aware UTC now as reference date and localize DB datetimes
-        ref_date = datetime.now(timezone.utc)
-        app_tz = current_app.config.get("APP_TIMEZONE", "America/Mexico_City")
-        if activity_id:
-            try:
-                act = db.session.get(Activity, activity_id)
-                if act and getattr(act, "start_datetime", None):
-                    rd = localize_naive_datetime(act.start_datetime, app_tz)
-                    if rd is not None:
-                        ref_date = rd
-            except Exception:
-                pass
-        elif event_id:
-            try:
-                ev = db.session.get(Event, event_id)
-                if ev and getattr(ev, "start_date", None):
-                    rd = localize_naive_datetime(ev.start_date, app_tz)
-                    if rd is not None:
-                        ref_date = rd
-            except Exception:
-                pass
-
-        # Agregar conteos por career/generation pero contando estudiantes únicos
-        # Excluir registros con status 'Ausente' o 'Cancelado'
-        unique_sets = {}  # { career: { gen: set(student_id) } }
-        careers_set = set()
-        generations_set = set()
-        matrix_semester_sets = {}
-
-        for reg, student in rows:
-            # Excluir estados no participativos
-            if getattr(reg, "status", None) in ("Ausente", "Cancelado"):
-                continue
-
-            career = student.career or "Sin Especificar"
-            cn = student.control_number or ""
-            m = re.search(r"(\d{2})", cn)
-            gen = m.group(1) if m else ""
-
-            # Calcular semestre estimado a partir de la generación y la fecha de referencia
-            semester = ""
-            if gen:
-                try:
-                    gy = int(gen)
-                    ingreso_year = 2000 + gy
-                    month = getattr(ref_date, "month", datetime.utcnow().month)
-                    # Definimos: semestre 1 = Ago-Dic del año de ingreso; semestre 2 = Ene-Jun siguiente
-                    event_sem_offset = 1 if 8 <= month <= 12 else 2
-                    years_since = max(0, ref_date.year - ingreso_year)
-                    sem_number = years_since * 2 + event_sem_offset
-                    semester = str(sem_number)
-                except Exception:
-                    semester = ""
-
-            careers_set.add(career)
-            generations_set.add(gen)
-
-            unique_sets.setdefault(career, {})
-            unique_sets[career].setdefault(gen, set())
-            unique_sets[career][gen].add(student.id)
-
-            # También almacenar por semestre en una estructura similar
-            # matrix_semester_sets: { career: { semester: set(student_id) } }
-            if semester:
-                matrix_semester_sets.setdefault(career, {})
-                matrix_semester_sets[career].setdefault(semester, set())
-                matrix_semester_sets[career][semester].add(student.id)
-
-        # Convertir sets a contadores
-        matrix = {}
-        for career, gens in unique_sets.items():
-            matrix[career] = {}
-            for gen, students_set in gens.items():
-                matrix[career][gen] = len(students_set)
-
-        # Convertir sets de semestres a contadores (si existen)
-        matrix_semester = {}
-        semesters_set = set()
-        for career, sems in matrix_semester_sets.items():
-            matrix_semester[career] = {}
-            for sem, students_set in sems.items():
-                matrix_semester[career][sem] = len(students_set)
-                semesters_set.add(sem)
-
-        # Ordenar generaciones numéricamente cuando sea posible
-        def gen_key(g):
-            try:
-                return int(g)
-            except Exception:
-                return 0
-
-        generations = sorted([g for g in generations_set if g != ""], key=gen_key)
-        if "" in generations_set:
-            generations.insert(0, "")
-
-        careers = sorted(careers_set)
-
-        # Ordenar semestres numéricamente
-        semesters = sorted([s for s in semesters_set if s != ""], key=lambda x: int(x))
-
-        # **NUEVO: Calcular rowSubtotals y columnSubtotals en el backend**
-        # rowSubtotals: suma de cada fila (por carrera)
-        # columnSubtotals: suma de cada columna (por semestre)
-        rowSubtotals = {}
-        columnSubtotals = {}
-        grandTotal = 0
-
-        if semesters:
-            # Usar matrix_semester si hay semestres
-            for career in careers:
-                row_sum = 0
-                for sem in semesters:
-                    val = matrix_semester.get(career, {}).get(sem, 0)
-                    row_sum += val
-                    columnSubtotals.setdefault(sem, 0)
-                    columnSubtotals[sem] += val
-                rowSubtotals[career] = row_sum
-                grandTotal += row_sum
-        else:
-            # Usar matrix si solo hay generaciones
-            for career in careers:
-                row_sum = 0
-                for gen in generations:
-                    val = matrix.get(career, {}).get(gen, 0)
-                    row_sum += val
-                    columnSubtotals.setdefault(gen, 0)
-                    columnSubtotals[gen] += val
-                rowSubtotals[career] = row_sum
-                grandTotal += row_sum
-
-        # Build a simple tabular structure for easier rendering in the UI
-        # headers: list of semester/generation labels (strings)
-        # rows: list of arrays -> [ career, v1, v2, ..., subtotal ]
-        # footer: array -> [ 'Total', c1, c2, ..., grandTotal ]
-        matrix_headers = semesters if semesters else generations
-        matrix_rows = []
-        for career in careers:
-            row = [career]
-            if matrix_headers:
-                for h in matrix_headers:
-                    # prefer semester matrix when available, fallback to generation matrix
-                    v = (
-                        matrix_semester.get(career, {}).get(h)
-                        if matrix_semester
-                        else None
-                    )
-                    if v is None:
-                        v = matrix.get(career, {}).get(h, 0)
-                    row.append(v or 0)
-            # append subtotal per career
-            row.append(rowSubtotals.get(career, 0))
-            matrix_rows.append(row)
-
-        # annotated as List[Any] so static analyzers (Pylance) accept mixed types
-        matrix_footer: List[Any] = ["Total"]
-        if matrix_headers:
-            for h in matrix_headers:
-                matrix_footer.append(columnSubtotals.get(h, 0))
-        matrix_footer.append(grandTotal)
-
-        return jsonify(
-            {
-                "careers": careers,
-                "generations": generations,
-                "matrix": matrix,
-                "semesters": semesters,
-                "matrix_semester": matrix_semester,
-                "rowSubtotals": rowSubtotals,
-                "columnSubtotals": columnSubtotals,
-                "grandTotal": grandTotal,
-                # simplified table structure for frontend
-                "matrix_headers": matrix_headers,
-                "matrix_rows": matrix_rows,
-                "matrix_footer": matrix_footer,
-            }
-        ), 200
+        # Conteo columnar en SQL + caché por (event_id, activity_id)
+        return jsonify(get_participation_matrix(event_id, activity_id)), 200
     except Exception as e:
         return jsonify(
             {"message": "Error al generar la matriz de participación", "error": str(e)}
@@ -382,25 +194,20 @@ def activity_fill():
             "True",
         )
 
-        # Subquery: conteo de preregistros válidos por actividad
-        counts_q = (
-            db.session.query(
-                Registration.activity_id.label("aid"),
-                func.count(Registration.id).label("registered"),
-            )
-            .filter(~Registration.status.in_(["Ausente", "Cancelado"]))
-            .group_by(Registration.activity_id)
-            .subquery()
-        )
-
+        # Preregistros válidos (ni ausentes ni cancelados) desde activity_counters
         q = db.session.query(
             Activity.id.label("id"),
             Activity.name.label("name"),
             Activity.modality.label("modality"),
             Activity.event_id.label("event_id"),
-            func.coalesce(counts_q.c.registered, 0).label("current_registrations"),
+            func.coalesce(
+                ActivityCounter.registered
+                + ActivityCounter.confirmed
+                + ActivityCounter.attended,
+                0,
+            ).label("current_registrations"),
             Activity.max_capacity.label("capacity"),
-        ).outerjoin(counts_q, counts_q.c.aid == Activity.id)
+        ).outerjoin(ActivityCounter, ActivityCounter.activity_id == Activity.id)
 
         # join event for name
         q = q.outerjoin(Event, Event.id == Activity.event_id).add_columns(
@@ -537,6 +344,90 @@ def event_registrations_txt():
         return jsonify({"message": "Error generando archivo", "error": str(e)}), 500
 
 
+def _hours_compliance_select(event_id, career=None, search=None, min_hours=0):
+    """Consulta agregada de horas acumuladas por estudiante en un evento.
+
+    Una actividad cuenta una sola vez por estudiante si existe un
+    Registration Confirmado/Asistió o una Attendance 'Asistió' (walk-in): el
+    UNION elimina los pares (estudiante, actividad) repetidos en la base de
+    datos, el GROUP BY suma ``duration_hours`` y los filtros (carrera,
+    búsqueda y HAVING sobre horas mínimas) se aplican en SQL.
+
+    Retorna un Select con columnas id, control_number, full_name, career y
+    total_hours, ordenado por nombre.
+    """
+    from app.models.attendance import Attendance
+
+    pairs = db.union(
+        db.select(
+            Registration.student_id.label("sid"),
+            Registration.activity_id.label("aid"),
+        )
+        .join(Activity, Activity.id == Registration.activity_id)
+        .where(
+            Activity.event_id == event_id,
+            Registration.status.in_(["Confirmado", "Asistió"]),
+        ),
+        db.select(
+            Attendance.student_id.label("sid"),
+            Attendance.activity_id.label("aid"),
+        )
+        .join(Activity, Activity.id == Attendance.activity_id)
+        .where(
+            Activity.event_id == event_id,
+            Attendance.status == "Asistió",
+        ),
+    ).subquery("pairs")
+
+    total_hours = func.sum(func.coalesce(Activity.duration_hours, 0))
+    hours = (
+        db.select(pairs.c.sid, total_hours.label("total_hours"))
+        .join(Activity, Activity.id == pairs.c.aid)
+        .group_by(pairs.c.sid)
+    )
+    if min_hours:
+        hours = hours.having(func.round(total_hours, 2) >= min_hours)
+    hours = hours.subquery("hours")
+
+    career_col = func.coalesce(Student.career, "Sin especificar")
+    query = db.select(
+        Student.id,
+        Student.control_number,
+        Student.full_name,
+        career_col.label("career"),
+        hours.c.total_hours,
+    ).join(hours, hours.c.sid == Student.id)
+    if career:
+        query = query.where(career_col == career)
+    if search:
+        st = search.lower()
+        query = query.where(
+            db.or_(
+                func.lower(Student.control_number).contains(st, autoescape=True),
+                func.lower(Student.full_name).contains(st, autoescape=True),
+            )
+        )
+    return query.order_by(Student.full_name, Student.id)
+
+
+def _hours_compliance_filters():
+    return {
+        "career": request.args.get("career", type=str),
+        "search": request.args.get("search", type=str),
+        "min_hours": request.args.get("min_hours", type=float, default=0),
+    }
+
+
+def _hours_row(row):
+    return {
+        "id": row.id,
+        "control_number": row.control_number,
+        "full_name": row.full_name,
+        "career": row.career,
+        "total_hours": round(float(row.total_hours or 0), 2),
+    }
+
+
 @reports_bp.route("/hours_compliance", methods=["GET"])
 @jwt_required()
 @require_admin
@@ -548,6 +439,10 @@ def hours_compliance():
       - career (str, optional): Filtrar por carrera/programa educativo
       - search (str, optional): Buscar por número de control o nombre
       - min_hours (float, optional): Horas mínimas acumuladas (default: 0)
+      - page, per_page (int, optional): paginar el resultado; sin ellos se
+        devuelven todos los estudiantes
+      - format (str, optional): xlsx, csv o ndjson para descargar el reporte
+        completo en lugar de JSON
 
     Retorna lista de estudiantes con horas acumuladas basadas en participaciones confirmadas.
     """
@@ -556,132 +451,119 @@ def hours_compliance():
         if not event_id:
             return jsonify({"message": "event_id es requerido"}), 400
 
+        fmt = None
+        if request.args.get("format"):
+            from app.utils.export_utils import get_export_format
+
+            fmt = get_export_format()
+            if not fmt:
+                return jsonify({"message": "Formato no soportado"}), 400
+
         event = db.session.get(Event, event_id)
         if not event:
             return jsonify({"message": "Evento no encontrado"}), 404
 
-        career = request.args.get("career", type=str)
-        search = request.args.get("search", type=str)
-        min_hours = request.args.get("min_hours", type=float, default=0)
+        if fmt:
+            return _hours_compliance_export(event, fmt)
 
-        # Construir listado de participaciones por actividad evitando doble conteo
-        # Queremos contar una actividad por estudiante si existe either:
-        # - un Registration con status Confirmado/Asistió, o
-        # - una Attendance con status 'Asistió'
-        # Para evitar duplicados cuando ambos existen, guardamos activity_ids ya contadas por estudiante.
-        from app.models.attendance import Attendance
+        query = _hours_compliance_select(event_id, **_hours_compliance_filters())
 
-        # 1) Consultar participaciones desde Registration (por actividad)
-        reg_rows = (
-            db.session.query(
-                Student.id.label("sid"),
-                Student.control_number,
-                Student.full_name,
-                Student.career,
-                Activity.id.label("aid"),
-                Activity.duration_hours.label("dur"),
+        page = request.args.get("page", type=int)
+        per_page = request.args.get("per_page", type=int)
+        payload = {"event": {"id": event.id, "name": event.name}}
+        if page or per_page:
+            page = max(page or 1, 1)
+            per_page = min(max(per_page or 50, 1), 1000)
+            total = db.session.scalar(
+                db.select(func.count()).select_from(query.order_by(None).subquery())
             )
-            .join(Registration, Registration.student_id == Student.id)
-            .join(Activity, Activity.id == Registration.activity_id)
-            .filter(
-                Activity.event_id == event_id,
-                Registration.status.in_(["Confirmado", "Asistió"]),
+            rows = db.session.execute(
+                query.limit(per_page).offset((page - 1) * per_page)
             )
-            .all()
-        )
-
-        # 2) Consultar participaciones desde Attendance (walk-ins)
-        att_rows = (
-            db.session.query(
-                Attendance.student_id.label("sid"),
-                Student.control_number,
-                Student.full_name,
-                Student.career,
-                Activity.id.label("aid"),
-                Activity.duration_hours.label("dur"),
-            )
-            .join(Activity, Activity.id == Attendance.activity_id)
-            .join(Student, Student.id == Attendance.student_id)
-            .filter(
-                Activity.event_id == event_id,
-                Attendance.status == "Asistió",
-            )
-            .all()
-        )
-
-        # Mapear por estudiante: { sid: { activities: Set[aids], total_hours: float, full data... } }
-        students_map = {}
-
-        def ensure_student(sid, control_number, full_name, career):
-            if sid not in students_map:
-                students_map[sid] = {
-                    "id": sid,
-                    "control_number": control_number,
-                    "full_name": full_name,
-                    "career": career or "Sin especificar",
-                    "activities": set(),
-                    "total_hours": 0.0,
+            payload.update(
+                {
+                    "total": total,
+                    "page": page,
+                    "per_page": per_page,
+                    "pages": (total + per_page - 1) // per_page,
                 }
+            )
+        else:
+            rows = db.session.execute(query)
 
-        # Procesar registros (preregistrados/confirmados)
-        for r in reg_rows:
-            sid = getattr(r, "sid", None)
-            aid = getattr(r, "aid", None)
-            dur = float(getattr(r, "dur", 0) or 0)
-            ensure_student(sid, r.control_number, r.full_name, r.career)
-            if aid is not None and aid not in students_map[sid]["activities"]:
-                students_map[sid]["activities"].add(aid)
-                students_map[sid]["total_hours"] += dur
-
-        # Procesar asistencias (walk-ins), solo agregar actividades no contabilizadas aún
-        for a in att_rows:
-            sid = getattr(a, "sid", None)
-            aid = getattr(a, "aid", None)
-            dur = float(getattr(a, "dur", 0) or 0)
-            ensure_student(sid, a.control_number, a.full_name, a.career)
-            if aid is not None and aid not in students_map[sid]["activities"]:
-                students_map[sid]["activities"].add(aid)
-                students_map[sid]["total_hours"] += dur
-
-        # Aplicar filtros de búsqueda y min_hours
-        students_list = []
-        for sid, info in students_map.items():
-            # Filtros por career
-            if career and info.get("career") != career:
-                continue
-            # Filtros por search (control_number o full_name)
-            if search:
-                st = search.lower()
-                if not (
-                    (info.get("control_number") or "").lower().find(st) >= 0
-                    or (info.get("full_name") or "").lower().find(st) >= 0
-                ):
-                    continue
-            total = round(float(info["total_hours"] or 0), 2)
-            if total >= (min_hours or 0):
-                students_list.append(
-                    {
-                        "id": info["id"],
-                        "control_number": info["control_number"],
-                        "full_name": info["full_name"],
-                        "career": info["career"],
-                        "total_hours": total,
-                    }
-                )
-
-        # Ordenar por nombre
-        students_list.sort(key=lambda x: (x.get("full_name") or ""))
-
-        students = students_list
-
-        return jsonify(
-            {"students": students, "event": {"id": event.id, "name": event.name}}
-        ), 200
+        students = [_hours_row(r) for r in rows]
+        payload["students"] = students
+        payload.setdefault("total", len(students))
+        return jsonify(payload), 200
     except Exception as e:
         current_app.logger.error(f"Error generando reporte de horas: {str(e)}")
         return jsonify({"message": "Error generando reporte de horas"}), 500
 
 
+def _hours_compliance_export(event, fmt):
+    """Transmite el reporte de horas en ``fmt`` (xlsx, csv o ndjson)."""
+    from app.utils.export_utils import (
+        iter_query_rows,
+        styled,
+        tabular_response,
+        xlsx_response,
+    )
+    import re
+
+    # Agregado en SQL (mismo que /hours_compliance, sin paginar), leído
+    # en lotes mientras se transmite el archivo
+    query = _hours_compliance_select(event.id, **_hours_compliance_filters())
+    # Se ejecuta aquí (no al transmitir) para que sus errores lleguen a la vista
+    result = iter_query_rows(query)
+
+    def records():
+        for r in result:
+            row = _hours_row(r)
+            yield (
+                row["control_number"],
+                row["full_name"],
+                row["career"] or "Sin especificar",
+                row["total_hours"],
+            )
+
+    # Generar filename con slug del evento y timestamp
+    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Crear slug del nombre del evento
+    event_slug = re.sub(r"[^\w\s-]", "", event.name.lower())
+    event_slug = re.sub(r"[-\s]+", "-", event_slug).strip("-")
+    filename = f"{event_slug}_{ts}"
+
+    if fmt != "xlsx":
+        columns = [
+            ("control_number", "Número de Control"),
+            ("full_name", "Nombre Completo"),
+            ("career", "Carrera"),
+            ("total_hours", "Horas Acumuladas"),
+        ]
+        return tabular_response(fmt, columns, records(), filename)
+
+    def rows():
+        yield styled(
+            [
+                "ID",
+                "Número de Control",
+                "Nombre Completo",
+                "Carrera",
+                "Horas Acumuladas",
+            ],
+            "header",
+        )
+        for idx, record in enumerate(records(), start=1):
+            yield [idx, *record]
+
+    return xlsx_response(
+        rows(),
+        f"{filename}.xlsx",
+        sheet_title="Cumplimiento de Horas",
+        column_widths=[8, 18, 35, 30, 18],
+    )
+
+
 @reports_bp.route("/hours_compliance_excel", methods=["GET"])
 @jwt_required()
 @require_admin
@@ -693,188 +575,24 @@ def hours_compliance_excel():
       - career (str, optional)
       - search (str, optional)
       - min_hours (float, optional)
+      - format (str, optional): xlsx (default), csv o ndjson
     """
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment
-
-        # Pylance static typing: import Worksheet to annotate wb.active
-        from openpyxl.worksheet.worksheet import Worksheet
-        from typing import cast
-        import re
+        from app.utils.export_utils import get_export_format
 
         event_id = request.args.get("event_id", type=int)
         if not event_id:
             return jsonify({"message": "event_id es requerido"}), 400
 
+        fmt = get_export_format()
+        if not fmt:
+            return jsonify({"message": "Formato no soportado"}), 400
+
         event = db.session.get(Event, event_id)
         if not event:
             return jsonify({"message": "Evento no encontrado"}), 404
 
-        career = request.args.get("career", type=str)
-        search = request.args.get("search", type=str)
-        min_hours = request.args.get("min_hours", type=float, default=0)
-
-        # Construir el agregado combinando Registrations y Attendances (walk-ins)
-        # para evitar doble conteo por actividad por estudiante.
-        from app.models.attendance import Attendance
-
-        # 1) Consultar participaciones desde Registration (por actividad)
-        reg_rows = (
-            db.session.query(
-                Student.id.label("sid"),
-                Student.control_number,
-                Student.full_name,
-                Student.career,
-                Activity.id.label("aid"),
-                Activity.duration_hours.label("dur"),
-            )
-            .join(Registration, Registration.student_id == Student.id)
-            .join(Activity, Activity.id == Registration.activity_id)
-            .filter(
-                Activity.event_id == event_id,
-                Registration.status.in_(["Confirmado", "Asistió"]),
-            )
-            .all()
-        )
-
-        # 2) Consultar participaciones desde Attendance (walk-ins)
-        att_rows = (
-            db.session.query(
-                Attendance.student_id.label("sid"),
-                Student.control_number,
-                Student.full_name,
-                Student.career,
-                Activity.id.label("aid"),
-                Activity.duration_hours.label("dur"),
-            )
-            .join(Activity, Activity.id == Attendance.activity_id)
-            .join(Student, Student.id == Attendance.student_id)
-            .filter(
-                Activity.event_id == event_id,
-                Attendance.status == "Asistió",
-            )
-            .all()
-        )
-
-        # Mapear por estudiante: { sid: { activities: Set[aids], total_hours: float, control_number, full_name, career } }
-        students_map = {}
-
-        def ensure_student(sid, control_number, full_name, career):
-            if sid not in students_map:
-                students_map[sid] = {
-                    "id": sid,
-                    "control_number": control_number,
-                    "full_name": full_name,
-                    "career": career or "Sin especificar",
-                    "activities": set(),
-                    "total_hours": 0.0,
-                }
-
-        for r in reg_rows:
-            sid = getattr(r, "sid", None)
-            aid = getattr(r, "aid", None)
-            dur = float(getattr(r, "dur", 0) or 0)
-            ensure_student(sid, r.control_number, r.full_name, r.career)
-            if aid is not None and aid not in students_map[sid]["activities"]:
-                students_map[sid]["activities"].add(aid)
-                students_map[sid]["total_hours"] += dur
-
-        for a in att_rows:
-            sid = getattr(a, "sid", None)
-            aid = getattr(a, "aid", None)
-            dur = float(getattr(a, "dur", 0) or 0)
-            ensure_student(sid, a.control_number, a.full_name, a.career)
-            if aid is not None and aid not in students_map[sid]["activities"]:
-                students_map[sid]["activities"].add(aid)
-                students_map[sid]["total_hours"] += dur
-
-        # Aplicar filtros y construir resultados ordenados
-        results = []
-        for sid, info in students_map.items():
-            if career and info.get("career") != career:
-                continue
-            if search:
-                st = search.lower()
-                if not (
-                    (info.get("control_number") or "").lower().find(st) >= 0
-                    or (info.get("full_name") or "").lower().find(st) >= 0
-                ):
-                    continue
-            total = round(float(info["total_hours"] or 0), 2)
-            if total >= (min_hours or 0):
-                results.append(
-                    {
-                        "control_number": info["control_number"],
-                        "full_name": info["full_name"],
-                        "career": info["career"],
-                        "total_hours": total,
-                    }
-                )
-
-        # Ordenar por nombre
-        results.sort(key=lambda x: (x.get("full_name") or ""))
-
-        # Crear workbook
-        wb = Workbook()
-        # cast wb.active to Worksheet so static analyzer knows it's not None
-        ws = cast(Worksheet, wb.active)
-        ws.title = "Cumplimiento de Horas"
-
-        # Encabezados
-        headers = [
-            "ID",
-            "Número de Control",
-            "Nombre Completo",
-            "Carrera",
-            "Horas Acumuladas",
-        ]
-        ws.append(headers)
-
-        # Estilo para encabezados
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-
-        # Agregar datos
-        for idx, row in enumerate(results, start=1):
-            ws.append(
-                [
-                    idx,
-                    row.get("control_number"),
-                    row.get("full_name"),
-                    row.get("career") or "Sin especificar",
-                    round(float(row.get("total_hours") or 0), 2),
-                ]
-            )
-
-        # Ajustar ancho de columnas
-        ws.column_dimensions["A"].width = 8
-        ws.column_dimensions["B"].width = 18
-        ws.column_dimensions["C"].width = 35
-        ws.column_dimensions["D"].width = 30
-        ws.column_dimensions["E"].width = 18
-
-        # Generar filename con slug del evento y timestamp
-        ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        # Crear slug del nombre del evento
-        event_slug = re.sub(r"[^\w\s-]", "", event.name.lower())
-        event_slug = re.sub(r"[-\s]+", "-", event_slug).strip("-")
-        filename = f"{event_slug}_{ts}.xlsx"
-
-        # Guardar en memoria
-        from io import BytesIO
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        resp = Response(
-            output.getvalue(),
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return resp
+        return _hours_compliance_export(event, fmt)
     except Exception as e:
         current_app.logger.error(f"Error generando archivo Excel: {str(e)}")
         return jsonify({"message": "Error generando archivo Excel"}), 500
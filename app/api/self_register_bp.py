@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify, render_template, current_app
-import requests
 from app import db
-from app.models.student import Student
+from app.services.student_service import StudentAuthError, authenticate_student
 from app.models.activity import Activity
 from app.models.registration import Registration
 from app.models.attendance import Attendance
@@ -185,59 +184,17 @@ def self_register_api():
                 {"message": "La ventana de registro in situ ha terminado"}
             ), 400
 
-        # Authenticate student against external validation endpoint by calling internal auth route
-        # We call the existing student-login endpoint internally to reuse its logic.
-        auth_url = request.host_url.rstrip("/") + "/api/auth/student-login"
+        # Authenticate student against the external validation endpoint
+        # in-process (same service as /api/auth/student-login, no HTTP loopback)
         try:
-            r = requests.post(
-                auth_url,
-                json={"control_number": control_number, "password": password},
-                timeout=5,
-            )
-        except requests.RequestException as e:
-            return jsonify(
-                {
-                    "message": "Error conectando al servicio de validación de credenciales",
-                    "error": str(e),
-                }
-            ), 503
-
-        if r.status_code != 200:
-            # propagate 401 or 503 as appropriate
-            if r.status_code == 401:
-                return jsonify({"message": "Credenciales inválidas"}), 401
-            return jsonify({"message": "Error en la validación de credenciales"}), 503
-
-        auth_data = r.json()
-        student_info = auth_data.get("student")
-        if not student_info:
-            return jsonify(
-                {
-                    "message": "No se obtuvo información del estudiante tras validar credenciales"
-                }
-            ), 503
-
-        # Ensure student exists/updated in DB
-        student = Student.query.filter_by(control_number=control_number).first()
-        if not student:
-            student = Student()
-            student.control_number = control_number
-            student.full_name = (
-                student_info.get("full_name") or student_info.get("name") or ""
-            )
-            student.email = student_info.get("email") or ""
-            db.session.add(student)
-            db.session.commit()
-        else:
-            # update small fields
-            student.full_name = (
-                student_info.get("full_name")
-                or student_info.get("name")
-                or student.full_name
-            )
-            student.email = student_info.get("email") or student.email
-            db.session.add(student)
+            student = authenticate_student(control_number, password)
             db.session.commit()
+        except StudentAuthError as e:
+            db.session.rollback()
+            body = {"message": e.message}
+            if e.error:
+                body["error"] = e.error
+            return jsonify(body), e.status_code
 
         # Check existing attendance for this student+activity and refuse duplicates
         existing_att = Attendance.query.filter_by(
@@ -1,52 +1,75 @@
 # app/api/stats_bp.py
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
+from flask_jwt_extended import jwt_required
 from app import db
 from app.models.event import Event
 from app.models.attendance import Attendance
 from app.models.student import Student
+from app.utils.auth_helpers import require_admin
+from app.utils.ttl_cache import TTLCache
 from datetime import datetime
 
 
 stats_bp = Blueprint("stats", __name__, url_prefix="/api/stats")
 
+# Resumen general del tablero (TTL corto, por proceso)
+_general_stats_cache = TTLCache(ttl=10.0, maxsize=8)
+
 
 @stats_bp.route("/", methods=["GET"])
 def get_general_stats():
-    """Devuelve estadísticas generales del sistema."""
-    # Get the latest event (by start date or id)
-    active_events = Event.query.filter_by(is_active=True).all()
-
-    if len(active_events) == 1:
-        stats_data = Event.get_stats(active_events[0].id)
-    elif len(active_events) > 1:
-        stats_data = {
-            "total_activities": 0,
-            "total_registrations": 0,
-            "total_attendances": 0,
-        }
-        for event in active_events:
-            event_stats = Event.get_stats(event.id)
-            for key in stats_data:
-                stats_data[key] += event_stats.get(key, 0)
-    else:
-        stats_data = {
-            "total_activities": 0,
-            "total_registrations": 0,
-            "total_attendances": 0,
-        }
-
-    stats_data["active_events"] = Event.query.filter_by(is_active=True).count()
-
-    stats_data["total_students"] = Student.query.count()
-
-    # Agregar estadísticas específicas de registros
+    """Devuelve estadísticas generales del sistema.
+
+    Se calcula con tres consultas (eventos activos, contadores agrupados de
+    esos eventos y totales globales) y se cachea unos segundos
+    (``GENERAL_STATS_CACHE_SECONDS``; 0 desactiva la caché).
+    """
     from datetime import timezone as _tz
 
     today = datetime.now(_tz.utc).date()
+    ttl = float(current_app.config.get("GENERAL_STATS_CACHE_SECONDS", 10) or 0)
+    cached = _general_stats_cache.get(today, ttl=ttl)
+    if cached is not None:
+        return jsonify(cached), 200
+
+    active_ids = db.session.scalars(
+        db.select(Event.id).where(Event.is_active.is_(True))
+    ).all()
+
+    stats_data = {
+        "total_activities": 0,
+        "total_registrations": 0,
+        "total_attendances": 0,
+    }
+    for event_stats in Event.get_stats_many(active_ids).values():
+        for key in stats_data:
+            stats_data[key] += event_stats[key]
 
-    # Asistencias de hoy
-    stats_data["today_attendances"] = Attendance.query.filter(
-        db.func.date(Attendance.created_at) == today
-    ).count()
+    stats_data["active_events"] = len(active_ids)
 
+    # Totales globales y asistencias de hoy en una sola consulta
+    total_students, today_attendances = db.session.execute(
+        db.select(
+            db.select(db.func.count(Student.id)).scalar_subquery(),
+            db.select(db.func.count(Attendance.id))
+            .where(db.func.date(Attendance.created_at) == today)
+            .scalar_subquery(),
+        )
+    ).one()
+    stats_data["total_students"] = total_students
+    stats_data["today_attendances"] = today_attendances
+
+    if ttl > 0:
+        _general_stats_cache.set(today, stats_data)
     return jsonify(stats_data), 200
+
+
+@stats_bp.route("/school-api", methods=["GET"])
+@jwt_required()
+@require_admin
+def get_school_api_stats():
+    """Contadores del cliente de la API escolar en este worker: llamadas,
+    errores, llamadas rechazadas por el circuito abierto y latencia."""
+    from app.services.school_api_client import get_school_api
+
+    return jsonify(get_school_api().stats()), 200
@@ -1,15 +1,21 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
-from flask_jwt_extended import jwt_required
-import requests
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.schemas import student_schema, students_schema
 from app.models.student import Student
 from app.utils.auth_helpers import require_admin
 from app.services.settings_manager import AppSettings
-from openpyxl import Workbook
-from typing import Any
-from openpyxl.styles import Font, PatternFill, Alignment
-from io import BytesIO
+from app.services.student_service import upsert_student
+from app.services.school_api_client import SchoolApiUnavailable, get_school_api
+from app.services.student_lookup_service import (
+    ERROR,
+    FOUND,
+    INCOMPLETE,
+    NOT_FOUND,
+    lookup_student,
+    prefetch_event,
+    prefetch_roster,
+)
 from datetime import datetime, timezone
 from app.utils.datetime_utils import localize_naive_datetime, safe_iso
 
@@ -130,19 +136,15 @@ def search_external_student():
             return jsonify({"message": "Número de control es requerido"}), 400
 
         # Consultar sistema externo
-        external_api_url = (
-            f"http://apps.tecvalles.mx:8091/api/estudiantes?search={control_number}"
-        )
-
         try:
-            response = requests.get(external_api_url, timeout=10)
+            response = get_school_api().get("search", params={"search": control_number})
             if response.status_code == 200:
                 return jsonify({"student": response.json()}), 200
             else:
                 return jsonify(
                     {"message": "Estudiante no encontrado en sistema externo"}
                 ), 404
-        except requests.exceptions.RequestException:
+        except SchoolApiUnavailable:
             return jsonify({"message": "Error de conexión con sistema externo"}), 503
 
     except Exception as e:
@@ -157,54 +159,36 @@ def search_external_student():
 @require_admin
 def import_external_student(control_number):
     try:
-        # Consultar sistema externo
-        external_api_url = (
-            f"http://apps.tecvalles.mx:8091/api/estudiantes?search={control_number}"
-        )
+        # Verificar si ya existe
+        student = Student.query.filter_by(control_number=control_number).first()
+        if student:
+            return jsonify(
+                {
+                    "message": "Estudiante ya existe en el sistema",
+                    "student": student_schema.dump(student),
+                }
+            ), 200
 
-        try:
-            response = requests.get(external_api_url, timeout=10)
-            if response.status_code == 200:
-                external_data = response.json()
-
-                if external_data and len(external_data) > 0:
-                    student_info = external_data[0]
-
-                    # Verificar si ya existe
-                    student = Student.query.filter_by(
-                        control_number=control_number
-                    ).first()
-                    if not student:
-                        # Crear nuevo estudiante
-                        student = Student()
-                        student.control_number = control_number
-                        student.full_name = student_info.get("nombre", "")
-                        student.career = student_info.get("carrera", "")
-                        student.email = student_info.get("email", "")
-                        db.session.add(student)
-                        db.session.commit()
-
-                        return jsonify(
-                            {
-                                "message": "Estudiante importado exitosamente",
-                                "student": student_schema.dump(student),
-                            }
-                        ), 201
-                    else:
-                        return jsonify(
-                            {
-                                "message": "Estudiante ya existe en el sistema",
-                                "student": student_schema.dump(student),
-                            }
-                        ), 200
-                else:
-                    return jsonify(
-                        {"message": "Estudiante no encontrado en sistema externo"}
-                    ), 404
-            else:
-                return jsonify({"message": "Error al consultar sistema externo"}), 503
-        except requests.exceptions.RequestException:
+        # Consultar directorio externo (copia local primero)
+        result = lookup_student(control_number)
+        if result["status"] == ERROR:
             return jsonify({"message": "Error de conexión con sistema externo"}), 503
+        student_info = result["student"] or {}
+        if result["status"] == NOT_FOUND or not student_info.get("full_name"):
+            return jsonify(
+                {"message": "Estudiante no encontrado en sistema externo"}
+            ), 404
+
+        # Crear nuevo estudiante (upsert por si otra petición lo creó a la vez)
+        student = upsert_student({**student_info, "control_number": control_number})
+        db.session.commit()
+
+        return jsonify(
+            {
+                "message": "Estudiante importado exitosamente",
+                "student": student_schema.dump(student),
+            }
+        ), 201
 
     except Exception as e:
         db.session.rollback()
@@ -228,53 +212,68 @@ def validate_student_proxy():
     if not control:
         return jsonify({"message": "control_number es requerido"}), 400
 
-    external_api = (
-        f"http://apps.tecvalles.mx:8091/api/validate/student?username={control}"
-    )
-    try:
-        resp = requests.get(external_api, timeout=8)
-    except requests.exceptions.RequestException:
+    # Copia local del directorio externo primero; la API sólo si falta o venció
+    result = lookup_student(control)
+    if result["status"] in (FOUND, INCOMPLETE):
+        return jsonify({"student": result["student"]}), 200
+    elif result["status"] == NOT_FOUND:
+        return jsonify({"message": "Estudiante no encontrado"}), 404
+    else:
         return jsonify({"message": "Error conectando al servicio externo"}), 503
 
-    if resp.status_code == 200:
+
+# Precargar la copia local del directorio externo (external_students)
+@students_bp.route("/external-mirror/prefetch", methods=["POST"])
+@jwt_required()
+@require_admin
+def prefetch_external_mirror():
+    """Precarga en segundo plano estudiantes del directorio externo.
+
+    Form data (o JSON sin archivo):
+      - file: lista de números de control (primera columna XLSX o TXT), o
+      - event_id: estudiantes preregistrados en las actividades del evento
+      - refresh: optional (1/0) default 0 -> si 1 consulta también los vigentes
+
+    Retorna 202 con ``job_id`` (consultar ``GET /api/jobs/<job_id>``).
+    """
+    from app.services.job_service import submit_job
+
+    if request.files or request.form:
+        data = request.form
+    else:
+        data = request.get_json(silent=True) or {}
+    refresh = str(data.get("refresh", "0")).strip().lower() in ("1", "true", "yes")
+
+    if "file" in request.files:
+        job = submit_job(
+            "external_students_prefetch",
+            prefetch_roster,
+            upload=request.files["file"].stream,
+            user_id=int(get_jwt_identity()),
+            refresh=refresh,
+        )
+    elif data.get("event_id"):
         try:
-            data = resp.json()
-        except Exception:
-            return jsonify({"message": "Respuesta externa inválida"}), 502
-
-        if not isinstance(data, dict):
-            return jsonify({"message": "Respuesta externa inválida"}), 502
-
-        # Some external services wrap payload in { success: true, data: { ... } }
-        if (
-            isinstance(data, dict)
-            and "data" in data
-            and isinstance(data.get("data"), dict)
-        ):
-            data = data.get("data")
-
-        # Work with a local dict reference to satisfy static analysis
-        d = data if isinstance(data, dict) else {}
-
-        # Normalize keys if possible; career may be an object
-        career = d.get("career") or d.get("carrera") or {}
-        career_name = None
-        if isinstance(career, dict):
-            career_name = career.get("name") or career.get("nombre") or None
-        else:
-            career_name = career
-
-        student = {
-            "control_number": d.get("username") or d.get("control_number") or control,
-            "full_name": d.get("name") or d.get("full_name") or d.get("nombre"),
-            "career": career_name,
-            "email": d.get("email") or "",
-        }
-        return jsonify({"student": student}), 200
-    elif resp.status_code == 404:
-        return jsonify({"message": "Estudiante no encontrado"}), 404
+            event_id = int(data.get("event_id"))
+        except (TypeError, ValueError):
+            return jsonify({"message": "event_id inválido"}), 400
+        job = submit_job(
+            "external_students_prefetch",
+            prefetch_event,
+            user_id=int(get_jwt_identity()),
+            event_id=event_id,
+            refresh=refresh,
+        )
     else:
-        return jsonify({"message": "Error desde servicio externo"}), 503
+        return jsonify({"message": "Se requiere file o event_id"}), 400
+
+    return jsonify(
+        {
+            "message": "Precarga en proceso",
+            "job_id": job.id,
+            "job": job.to_dict(),
+        }
+    ), 202
 
 
 # Obtener actividades de un estudiante
@@ -861,14 +860,29 @@ def get_students_with_complementary_credits():
 def export_complementary_credits():
     """
     Exporta a Excel la lista de estudiantes con 10+ horas en un evento.
+
+    ``?format=csv|ndjson`` entrega solo las filas de datos, sin encabezado de
+    reporte, para integrarlas con otros sistemas.
     """
     try:
+        from app.utils.export_utils import (
+            get_export_format,
+            iter_query_rows,
+            styled,
+            tabular_response,
+            xlsx_response,
+        )
+
         event_id = request.args.get("event_id", type=int)
         career = request.args.get("career", "")
 
         if not event_id:
             return jsonify({"message": "event_id es requerido"}), 400
 
+        fmt = get_export_format()
+        if not fmt:
+            return jsonify({"message": "Formato no soportado"}), 400
+
         from app.models.registration import Registration
         from app.models.activity import Activity
         from app.models.event import Event
@@ -905,127 +919,94 @@ def export_complementary_credits():
             .order_by(Student.full_name)
         )
 
-        results = query.all()
-
         # Obtener información del evento
         event = db.session.get(Event, event_id)
         if not event:
             return jsonify({"message": "Evento no encontrado"}), 404
 
-        # Crear archivo Excel
-        wb: Workbook = Workbook()
-        ws: Any = wb.active
-        ws.title = "Créditos Complementarios"
-
-        # Estilos
-        header_fill = PatternFill(
-            start_color="4F46E5", end_color="4F46E5", fill_type="solid"
-        )
-        header_font = Font(color="FFFFFF", bold=True, size=12)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        # Título
-        ws.merge_cells("A1:G1")
-        title_cell = ws["A1"]
-        title_cell.value = f"Estudiantes con Crédito Complementario - {event.name}"
-        title_cell.font = Font(bold=True, size=14)
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        # Información adicional
-        ws.merge_cells("A2:G2")
-        info_cell = ws["A2"]
-        info_cell.value = (
-            f"Generado el: {datetime.now(timezone.utc).strftime('%d/%m/%Y %H:%M')}"
-        )
-        info_cell.alignment = Alignment(horizontal="center")
-
-        if career:
-            ws.merge_cells("A3:G3")
-            career_cell = ws["A3"]
-            career_cell.value = f"Filtrado por carrera: {career}"
-            career_cell.alignment = Alignment(horizontal="center")
-            header_row = 5
-        else:
-            header_row = 4
-
-        # Encabezados
-        headers = [
-            "No.",
-            "Número de Control",
-            "Nombre Completo",
-            "Carrera",
-            "Email",
-            "Horas Confirmadas",
-            "Actividades",
-        ]
-        for col_num, header in enumerate(headers, 1):
-            cell: Any = ws.cell(row=header_row, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-
-        # Datos
-        for idx, row in enumerate(results, 1):
-            data_row = header_row + idx
-            ws.cell(row=data_row, column=1, value=idx)
-            ws.cell(row=data_row, column=2, value=row.control_number)
-            ws.cell(row=data_row, column=3, value=row.full_name)
-            ws.cell(row=data_row, column=4, value=row.career or "Sin carrera")
-            ws.cell(row=data_row, column=5, value=row.email or "Sin email")
-            ws.cell(row=data_row, column=6, value=float(row.total_hours or 0))
-            ws.cell(row=data_row, column=7, value=row.activities_count)
-
-        # Ajustar ancho de columnas
-        ws.column_dimensions["A"].width = 8
-        ws.column_dimensions["B"].width = 20
-        ws.column_dimensions["C"].width = 35
-        ws.column_dimensions["D"].width = 40
-        ws.column_dimensions["E"].width = 30
-        ws.column_dimensions["F"].width = 18
-        ws.column_dimensions["G"].width = 15
-
-        # Resumen al final
-        summary_row = header_row + len(results) + 2
-        ws.merge_cells(f"A{summary_row}:E{summary_row}")
-        summary_cell: Any = ws.cell(row=summary_row, column=1)
-        summary_cell.value = f"Total de estudiantes: {len(results)}"
-        summary_cell.font = Font(bold=True)
-        summary_cell.alignment = Alignment(horizontal="right")
-
-        # Guardar en memoria
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
+        now = datetime.now(timezone.utc)
         # Generar nombre de archivo
-        filename = f"creditos_complementarios_{event.name.replace(' ', '_')}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.xlsx"
-
-        # Localizar fechas del evento antes de devolver metadatos en la exportación
-        try:
-            app_tz = AppSettings.app_timezone()
-            (
-                localize_naive_datetime(event.start_date, app_tz)
-                if getattr(event, "start_date", None) is not None
-                else None
+        filename = f"creditos_complementarios_{event.name.replace(' ', '_')}_{now.strftime('%Y%m%d_%H%M%S')}"
+
+        if fmt != "xlsx":
+            columns = [
+                ("control_number", "Número de Control"),
+                ("full_name", "Nombre Completo"),
+                ("career", "Carrera"),
+                ("email", "Email"),
+                ("total_hours", "Horas Confirmadas"),
+                ("activities_count", "Actividades"),
+            ]
+            records = (
+                (
+                    row.control_number,
+                    row.full_name,
+                    row.career,
+                    row.email,
+                    float(row.total_hours or 0),
+                    row.activities_count,
+                )
+                for row in iter_query_rows(query)
             )
-        except Exception:
-            pass
-        try:
-            (
-                localize_naive_datetime(event.end_date, app_tz)
-                if getattr(event, "end_date", None) is not None
-                else None
+            return tabular_response(fmt, columns, records, filename)
+
+        # La consulta se ejecuta aquí: sus errores responden 500 en vez de
+        # cortar una descarga ya iniciada
+        result = iter_query_rows(query)
+
+        def rows():
+            # Título e información (combinadas A:G)
+            yield styled(
+                [f"Estudiantes con Crédito Complementario - {event.name}"],
+                "title",
+                merge_to=7,
+            )
+            yield styled(
+                [f"Generado el: {now.strftime('%d/%m/%Y %H:%M')}"],
+                "center",
+                merge_to=7,
+            )
+            if career:
+                yield styled([f"Filtrado por carrera: {career}"], "center", merge_to=7)
+            yield []
+
+            # Encabezados
+            yield styled(
+                [
+                    "No.",
+                    "Número de Control",
+                    "Nombre Completo",
+                    "Carrera",
+                    "Email",
+                    "Horas Confirmadas",
+                    "Actividades",
+                ],
+                "header_fill",
             )
-        except Exception:
-            pass
 
-        # (filename ya fue generado arriba con UTC now)
-        return send_file(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=filename,
+            # Datos (en lotes mientras se transmite el archivo)
+            count = 0
+            for row in result:
+                count += 1
+                yield [
+                    count,
+                    row.control_number,
+                    row.full_name,
+                    row.career or "Sin carrera",
+                    row.email or "Sin email",
+                    float(row.total_hours or 0),
+                    row.activities_count,
+                ]
+
+            # Resumen al final
+            yield []
+            yield styled([f"Total de estudiantes: {count}"], "total", merge_to=5)
+
+        return xlsx_response(
+            rows(),
+            f"{filename}.xlsx",
+            sheet_title="Créditos Complementarios",
+            column_widths=[8, 20, 35, 40, 30, 18, 15],
         )
 
     except Exception as e:
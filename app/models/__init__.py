@@ -4,7 +4,11 @@ from app.models.student import Student
 from app.models.user import User  # NUEVO
 from app.models.attendance import Attendance
 from app.models.registration import Registration
-from app.models.app_setting import AppSetting
+from app.models.activity_counter import ActivityCounter
+from app.models.app_setting import AppSetting, AppSettingsVersion
+from app.models.job import Job
+from app.models.external_student import ExternalStudent
+from app.models.cache_generation import CacheGeneration
 
 # Tabla de relación muchos a muchos para actividades relacionadas
 from app import db
@@ -29,6 +33,11 @@ __all__ = [
     "User",
     "Attendance",
     "Registration",
+    "ActivityCounter",
     "AppSetting",
+    "AppSettingsVersion",
+    "Job",
+    "ExternalStudent",
+    "CacheGeneration",
     "activity_relations",
 ]
@@ -0,0 +1,72 @@
+from app import db
+
+
+# Estado -> columna del contador
+REGISTRATION_STATUS_COLUMNS = {
+    "Registrado": "registered",
+    "Confirmado": "confirmed",
+    "Asistió": "attended",
+    "Ausente": "absent",
+    "Cancelado": "cancelled",
+}
+ATTENDANCE_STATUS_COLUMNS = {
+    "Asistió": "attendances_present",
+    "Parcial": "attendances_partial",
+    "Ausente": "attendances_absent",
+}
+COUNTER_COLUMNS = (
+    *REGISTRATION_STATUS_COLUMNS.values(),
+    *ATTENDANCE_STATUS_COLUMNS.values(),
+    "walkins",
+)
+
+
+class ActivityCounter(db.Model):
+    """Contadores materializados de preregistros y asistencias por actividad.
+
+    Se mantienen de forma incremental en la misma transacción que las
+    escrituras de ``Registration``/``Attendance`` (ver
+    ``app.services.activity_counter_service``), de modo que listados y
+    validaciones de cupo leen una fila en lugar de hacer ``COUNT ... GROUP BY``.
+    ``tools/rebuild_activity_counters.py`` los recalcula si llegan a desfasarse.
+    """
+
+    __tablename__ = "activity_counters"
+
+    activity_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activities.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Preregistros por estado
+    registered = db.Column(db.Integer, default=0, nullable=False)
+    confirmed = db.Column(db.Integer, default=0, nullable=False)
+    attended = db.Column(db.Integer, default=0, nullable=False)
+    absent = db.Column(db.Integer, default=0, nullable=False)
+    cancelled = db.Column(db.Integer, default=0, nullable=False)
+    # Asistencias por estado
+    attendances_present = db.Column(db.Integer, default=0, nullable=False)
+    attendances_partial = db.Column(db.Integer, default=0, nullable=False)
+    attendances_absent = db.Column(db.Integer, default=0, nullable=False)
+    # Asistencias sin preregistro
+    walkins = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(
+        db.DateTime,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<ActivityCounter Activity:{self.activity_id}>"
+
+    @property
+    def active_registrations(self):
+        """Preregistros que ocupan lugar (ni ausentes ni cancelados)."""
+        return self.registered + self.confirmed + self.attended
+
+    def to_dict(self):
+        data = {column: getattr(self, column) for column in COUNTER_COLUMNS}
+        data["activity_id"] = self.activity_id
+        data["active_registrations"] = self.active_registrations
+        return data
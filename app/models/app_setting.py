@@ -65,3 +65,25 @@ class AppSetting(db.Model):
     def get_all_settings(cls) -> dict:
         """Return all settings as dict {key: setting_object}."""
         return {s.key: s for s in db.session.query(cls).all()}
+
+
+class AppSettingsVersion(db.Model):
+    """
+    Single-row generation counter for ``app_settings``.
+
+    Every write through ``SettingsManager.set_in_db`` bumps ``version`` in the
+    same transaction. Each worker compares it with the generation of its
+    in-memory snapshot and reloads all settings when it changed, so admin edits
+    apply across gunicorn workers without waiting for the cache TTL.
+    """
+
+    __tablename__ = "app_settings_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self):
+        return f"<AppSettingsVersion {self.version}>"
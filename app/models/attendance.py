@@ -37,19 +37,36 @@ class Attendance(db.Model):
         return f"<Attendance Student:{self.student_id} Activity:{self.activity_id}>"
 
     def to_dict(self):
-        from app.utils.datetime_utils import safe_iso
+        from app.utils.datetime_utils import safe_iso_many
 
+        (
+            check_in_time,
+            check_out_time,
+            pause_time,
+            resume_time,
+            created_at,
+            updated_at,
+        ) = safe_iso_many(
+            (
+                self.check_in_time,
+                self.check_out_time,
+                self.pause_time,
+                self.resume_time,
+                self.created_at,
+                self.updated_at,
+            )
+        )
         return {
             "id": self.id,
             "student_id": self.student_id,
             "activity_id": self.activity_id,
-            "check_in_time": safe_iso(self.check_in_time),
-            "check_out_time": safe_iso(self.check_out_time),
+            "check_in_time": check_in_time,
+            "check_out_time": check_out_time,
             "is_paused": self.is_paused,
-            "pause_time": safe_iso(self.pause_time),
-            "resume_time": safe_iso(self.resume_time),
+            "pause_time": pause_time,
+            "resume_time": resume_time,
             "attendance_percentage": self.attendance_percentage,
             "status": self.status,
-            "created_at": safe_iso(self.created_at),
-            "updated_at": safe_iso(self.updated_at),
+            "created_at": created_at,
+            "updated_at": updated_at,
         }
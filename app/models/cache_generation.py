@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from app import db
+
+
+class CacheGeneration(db.Model):
+    """Contador de generación compartido por las cachés en memoria.
+
+    Cada worker guarda junto a sus entradas la generación con la que las
+    calculó; quien modifica los datos incrementa el contador y los demás
+    workers descartan sus entradas al ver un valor distinto, sin esperar al
+    TTL. Una fila por caché (``name``), igual que ``app_settings_version``
+    para la configuración.
+    """
+
+    __tablename__ = "cache_generations"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        """Generación actual de ``name`` (0 si aún no tiene fila)."""
+        version = db.session.execute(
+            db.select(cls.version).where(cls.name == name)
+        ).scalar()
+        return int(version or 0)
+
+    @classmethod
+    def bump(cls, name: str, connection) -> None:
+        """Incrementa la generación de ``name`` en ``connection``."""
+        table = cls.__table__
+        now = datetime.utcnow()
+        result = connection.execute(
+            table.update()
+            .where(table.c.name == name)
+            .values(version=table.c.version + 1, updated_at=now)
+        )
+        if not result.rowcount:
+            connection.execute(
+                table.insert().values(name=name, version=1, updated_at=now)
+            )
+
+    def __repr__(self):
+        return f"<CacheGeneration {self.name}={self.version}>"
@@ -47,62 +47,83 @@ class Event(db.Model):
     @classmethod
     def get_stats(cls, event_id):
         """Obtiene estadísticas optimizadas para un evento."""
+        return cls.get_stats_many([event_id])[event_id]
+
+    @classmethod
+    def get_stats_many(cls, event_ids):
+        """Estadísticas de varios eventos con una sola consulta agrupada.
+
+        Devuelve ``{event_id: {total_activities, total_registrations,
+        total_attendances, total_students}}``; los eventos sin actividades
+        quedan en cero. ``total_students`` cuenta estudiantes distintos con
+        preregistro en el evento.
+        """
         from app.models.activity import Activity
         from app.models.registration import Registration
         from app.models.attendance import Attendance
-        from app.models.student import Student
 
-        # Usar subconsultas para mejor rendimiento
-        total_activities = (
-            db.session.query(func.count(Activity.id))
-            .filter(Activity.event_id == event_id)
-            .scalar()
-            or 0
-        )
+        event_ids = list(dict.fromkeys(event_ids))
+        stats = {
+            event_id: {
+                "total_activities": 0,
+                "total_registrations": 0,
+                "total_attendances": 0,
+                "total_students": 0,
+            }
+            for event_id in event_ids
+        }
+        if not event_ids:
+            return stats
 
-        total_registrations = (
-            db.session.query(func.count(Registration.id))
-            .filter(
-                Registration.activity_id.in_(
-                    db.session.query(Activity.id).filter(Activity.event_id == event_id)
-                )
+        in_events = Activity.event_id.in_(event_ids)
+        # Un agregado por tabla y evento, unidos por event_id: evita el
+        # producto actividades × preregistros × asistencias
+        activities = (
+            db.select(
+                Activity.event_id.label("event_id"),
+                func.count(Activity.id).label("n"),
             )
-            .scalar()
-            or 0
+            .where(in_events)
+            .group_by(Activity.event_id)
+            .subquery()
         )
-
-        total_attendances = (
-            db.session.query(func.count(Attendance.id))
-            .filter(
-                Attendance.activity_id.in_(
-                    db.session.query(Activity.id).filter(Activity.event_id == event_id)
-                ),
-                Attendance.status == "Asistió",
+        registrations = (
+            db.select(
+                Activity.event_id.label("event_id"),
+                func.count(Registration.id).label("n"),
+                func.count(func.distinct(Registration.student_id)).label("students"),
             )
-            .scalar()
-            or 0
+            .join(Activity, Activity.id == Registration.activity_id)
+            .where(in_events)
+            .group_by(Activity.event_id)
+            .subquery()
         )
-
-        total_students = (
-            db.session.query(func.count(func.distinct(Student.id)))
-            .filter(
-                Student.id.in_(
-                    db.session.query(Registration.student_id).filter(
-                        Registration.activity_id.in_(
-                            db.session.query(Activity.id).filter(
-                                Activity.event_id == event_id
-                            )
-                        )
-                    )
-                )
+        attendances = (
+            db.select(
+                Activity.event_id.label("event_id"),
+                func.count(Attendance.id).label("n"),
             )
-            .scalar()
-            or db.session.query(Student).count()
+            .join(Activity, Activity.id == Attendance.activity_id)
+            .where(in_events, Attendance.status == "Asistió")
+            .group_by(Activity.event_id)
+            .subquery()
         )
-
-        return {
-            "total_activities": total_activities,
-            "total_registrations": total_registrations,
-            "total_attendances": total_attendances,
-            "total_students": total_students,
-        }
+        rows = db.session.execute(
+            db.select(
+                activities.c.event_id,
+                activities.c.n,
+                func.coalesce(registrations.c.n, 0),
+                func.coalesce(attendances.c.n, 0),
+                func.coalesce(registrations.c.students, 0),
+            )
+            .outerjoin(registrations, registrations.c.event_id == activities.c.event_id)
+            .outerjoin(attendances, attendances.c.event_id == activities.c.event_id)
+        )
+        for event_id, n_act, n_reg, n_att, n_students in rows:
+            stats[event_id] = {
+                "total_activities": int(n_act or 0),
+                "total_registrations": int(n_reg or 0),
+                "total_attendances": int(n_att or 0),
+                "total_students": int(n_students or 0),
+            }
+        return stats
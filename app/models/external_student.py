@@ -0,0 +1,34 @@
+from app import db
+
+
+class ExternalStudent(db.Model):
+    """Copia local del directorio de estudiantes de la escuela.
+
+    Guarda la última respuesta de la API externa de validación por número de
+    control (incluidas las negativas) para que walk-ins, búsquedas públicas e
+    importaciones se resuelvan sin salir a la red. Ver
+    ``app.services.student_lookup_service`` (política de vigencia) y
+    ``tools/prefetch_external_students.py``.
+    """
+
+    __tablename__ = "external_students"
+
+    control_number = db.Column(db.String(20), primary_key=True)
+    # found | incomplete | not_found (los errores de red no se guardan)
+    status = db.Column(db.String(20), nullable=False)
+    full_name = db.Column(db.String(100))
+    career = db.Column(db.String(100))
+    email = db.Column(db.String(100))
+    fetched_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ExternalStudent {self.control_number} {self.status}>"
+
+    def to_student_dict(self):
+        """Datos normalizados con la forma de ``normalize_external_student``."""
+        return {
+            "control_number": self.control_number,
+            "full_name": self.full_name,
+            "career": self.career,
+            "email": self.email or "",
+        }
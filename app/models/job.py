@@ -0,0 +1,67 @@
+from app import db
+
+
+class Job(db.Model):
+    """Trabajo en segundo plano (p. ej. importaciones batch).
+
+    El progreso se guarda en la BD para que cualquier worker pueda responder
+    ``GET /api/jobs/<id>`` sin importar cuál ejecuta el trabajo.
+    """
+
+    __tablename__ = "jobs"
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(
+        db.Enum("queued", "running", "succeeded", "failed"),
+        default="queued",
+        nullable=False,
+    )
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    # Contadores parciales (JSON) con la misma forma que el resumen final
+    progress = db.Column(db.Text)
+    # Reporte final (JSON) devuelto por la importación
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_by_user_id = db.Column(db.Integer, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(
+        db.DateTime,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<Job {self.kind} {self.id} {self.status}>"
+
+    def to_dict(self):
+        import json as _json
+        from app.utils.datetime_utils import safe_iso
+
+        def _load(raw):
+            if not raw:
+                return None
+            try:
+                return _json.loads(raw)
+            except Exception:
+                return None
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "processed": self.processed or 0,
+            "total": self.total or 0,
+            "progress": _load(self.progress),
+            "result": _load(self.result),
+            "error": self.error,
+            "created_by_user_id": self.created_by_user_id,
+            "started_at": safe_iso(self.started_at),
+            "finished_at": safe_iso(self.finished_at),
+            "created_at": safe_iso(self.created_at),
+            "updated_at": safe_iso(self.updated_at),
+        }
@@ -0,0 +1,522 @@
+"""Mantenimiento incremental de ``activity_counters``.
+
+Los contadores por actividad (preregistros y asistencias por estado, walk-ins)
+se actualizan con eventos de sesión de SQLAlchemy en la misma transacción que
+la escritura que los cambia:
+
+- ``before_flush`` toma el estado previo de los preregistros/asistencias
+  modificados o eliminados (del historial de atributos o, si no estaba
+  cargado, de la fila en la BD);
+- ``after_flush`` suma el estado nuevo, calcula la variación de walk-ins de
+  los pares (estudiante, actividad) tocados y aplica un
+  ``UPDATE ... SET col = col + delta`` por actividad.
+
+Las sentencias en bloque (``db.update(...)``/``db.insert(...)`` ejecutadas
+directamente) no pasan por el flush: quien las usa debe llamar
+``touch_activity_counters(ids)`` y esas actividades se recalculan desde las
+tablas al hacer commit. ``rebuild_activity_counters`` (y
+``tools/rebuild_activity_counters.py``) corrige cualquier desfase.
+
+``reserve_registration_slot`` usa la misma fila como reserva de cupo: un
+``UPDATE`` condicional suma el preregistro sólo si queda lugar, y el flush
+siguiente no lo vuelve a sumar.
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.activity import Activity
+from app.models.activity_counter import (
+    ATTENDANCE_STATUS_COLUMNS,
+    COUNTER_COLUMNS,
+    REGISTRATION_STATUS_COLUMNS,
+    ActivityCounter,
+)
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+
+_CHANGES_KEY = "activity_counter_changes"
+_STALE_KEY = "activity_counters_stale"
+_RESERVED_KEY = "activity_counters_reserved"
+_TRACKED_FIELDS = ("activity_id", "student_id", "status")
+_STATUS_COLUMNS = {
+    Registration: REGISTRATION_STATUS_COLUMNS,
+    Attendance: ATTENDANCE_STATUS_COLUMNS,
+}
+_CHUNK_SIZE = 500
+_UNKNOWN = object()
+
+
+def _chunked(values, size=_CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def _default_status(cls):
+    default = cls.__table__.c.status.default
+    return default.arg if default is not None else None
+
+
+def _table():
+    return ActivityCounter.__table__
+
+
+# --- Estado de los objetos ----------------------------------------------------
+
+
+def _loaded_values(obj, previous=False):
+    """``{activity_id, student_id, status}`` desde el estado en memoria.
+
+    Con ``previous=True`` devuelve los valores anteriores a los cambios
+    pendientes. Un atributo no cargado queda como ``_UNKNOWN``.
+    """
+    attrs = sa_inspect(obj).attrs
+    values = {}
+    for name in _TRACKED_FIELDS:
+        hist = attrs[name].history
+        if previous:
+            source = hist.deleted or hist.unchanged
+        else:
+            source = hist.added or hist.unchanged
+        # Sin historial: se asignó sin haber cargado el valor anterior, o el
+        # atributo está expirado
+        values[name] = source[0] if source else _UNKNOWN
+    return values
+
+
+def _fill_from_db(session, cls, pending):
+    """Completa valores ``_UNKNOWN`` leyendo las filas actuales de la BD.
+
+    ``pending`` es una lista de ``(obj, old_values, new_values)``; los
+    valores nuevos desconocidos son atributos sin cambios (igual al anterior).
+    """
+    ids = {sa_inspect(obj).identity[0] for obj, _, _ in pending}
+    rows = {}
+    conn = session.connection()
+    for chunk in _chunked(ids):
+        for row in conn.execute(
+            db.select(cls.id, cls.activity_id, cls.student_id, cls.status).where(
+                cls.id.in_(chunk)
+            )
+        ):
+            rows[row.id] = row
+    for obj, old, new in pending:
+        row = rows.get(sa_inspect(obj).identity[0])
+        for name in _TRACKED_FIELDS:
+            db_value = getattr(row, name) if row is not None else None
+            if old[name] is _UNKNOWN:
+                old[name] = db_value
+            if new is not None and new[name] is _UNKNOWN:
+                new[name] = old[name]
+
+
+@sa_event.listens_for(Session, "before_flush")
+def _capture_previous_state(session, flush_context, instances):
+    removed = []  # (cls, valores) que dejan de contar
+    added = []  # (cls, valores) de objetos modificados que cuentan ahora
+    pending = defaultdict(list)
+
+    for obj in session.deleted:
+        cls = type(obj)
+        if cls not in _STATUS_COLUMNS:
+            continue
+        old = _loaded_values(obj, previous=True)
+        removed.append((cls, old))
+        if _UNKNOWN in old.values():
+            pending[cls].append((obj, old, None))
+
+    for obj in session.dirty:
+        cls = type(obj)
+        if cls not in _STATUS_COLUMNS or not session.is_modified(obj):
+            continue
+        attrs = sa_inspect(obj).attrs
+        if not any(attrs[name].history.has_changes() for name in _TRACKED_FIELDS):
+            continue
+        old = _loaded_values(obj, previous=True)
+        new = _loaded_values(obj)
+        removed.append((cls, old))
+        added.append((cls, new))
+        if _UNKNOWN in old.values() or _UNKNOWN in new.values():
+            pending[cls].append((obj, old, new))
+
+    for cls, items in pending.items():
+        _fill_from_db(session, cls, items)
+
+    session.info[_CHANGES_KEY] = {
+        "removed": removed,
+        "added": added,
+        "new": [obj for obj in session.new if type(obj) in _STATUS_COLUMNS],
+        "new_activities": [obj for obj in session.new if isinstance(obj, Activity)],
+        "deleted_activities": [
+            sa_inspect(obj).identity[0]
+            for obj in session.deleted
+            if isinstance(obj, Activity)
+        ],
+    }
+
+
+# --- Aplicación de deltas -----------------------------------------------------
+
+
+def _walkin_deltas(conn, removed, added):
+    """Variación de walk-ins (asistencia sin preregistro) por actividad.
+
+    Compara, para cada par (estudiante, actividad) tocado en el flush, si era
+    walk-in antes y si lo es ahora.
+    """
+    pairs = {Registration: (set(), set()), Attendance: (set(), set())}
+    for cls, values in removed:
+        pairs[cls][0].add((values["student_id"], values["activity_id"]))
+    for cls, values in added:
+        pairs[cls][1].add((values["student_id"], values["activity_id"]))
+    # Un cambio solo de estado quita y agrega el mismo par: no cambia nada
+    for cls, (before, after) in pairs.items():
+        same = before & after
+        pairs[cls] = (before - same, after - same)
+    touched = set().union(*pairs[Registration], *pairs[Attendance])
+    touched = {p for p in touched if None not in p}
+    if not touched:
+        return Counter()
+
+    def present(cls):
+        found = set()
+        for chunk in _chunked(touched):
+            found.update(
+                tuple(row)
+                for row in conn.execute(
+                    db.select(cls.student_id, cls.activity_id).where(
+                        db.tuple_(cls.student_id, cls.activity_id).in_(chunk)
+                    )
+                )
+            )
+        return found
+
+    reg_now = present(Registration)
+    att_now = present(Attendance)
+    reg_removed, reg_added = pairs[Registration]
+    att_removed, att_added = pairs[Attendance]
+
+    deltas = Counter()
+    for pair in touched:
+        reg_before = (pair in reg_now and pair not in reg_added) or pair in reg_removed
+        att_before = (pair in att_now and pair not in att_added) or pair in att_removed
+        before = att_before and not reg_before
+        after = pair in att_now and pair not in reg_now
+        if before != after:
+            deltas[pair[1]] += 1 if after else -1
+    return deltas
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _apply_counter_deltas(session, flush_context):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if not changes:
+        return
+
+    removed = list(changes["removed"])
+    added = list(changes["added"])
+    for obj in changes["new"]:
+        cls = type(obj)
+        status = obj.status if obj.status is not None else _default_status(cls)
+        added.append(
+            (
+                cls,
+                {
+                    "activity_id": obj.activity_id,
+                    "student_id": obj.student_id,
+                    "status": status,
+                },
+            )
+        )
+    new_activities = [a.id for a in changes["new_activities"]]
+    deleted_activities = set(changes["deleted_activities"])
+    if not (removed or added or new_activities or deleted_activities):
+        return
+
+    conn = session.connection()
+    table = _table()
+    if new_activities:
+        conn.execute(table.insert(), [{"activity_id": aid} for aid in new_activities])
+
+    deltas: Dict[int, Counter] = defaultdict(Counter)
+    for sign, items in ((-1, removed), (1, added)):
+        for cls, values in items:
+            column = _STATUS_COLUMNS[cls].get(values["status"])
+            if column and values["activity_id"] is not None:
+                deltas[values["activity_id"]][column] += sign
+    for aid, delta in _walkin_deltas(conn, removed, added).items():
+        deltas[aid]["walkins"] += delta
+    reserved = session.info.get(_RESERVED_KEY)
+    if reserved:
+        # Lugares ya sumados por reserve_registration_slot
+        for aid in list(reserved):
+            used = min(reserved[aid], max(deltas[aid]["registered"], 0))
+            deltas[aid]["registered"] -= used
+            reserved[aid] -= used
+            if reserved[aid] <= 0:
+                del reserved[aid]
+
+    missing = []
+    for aid, columns in deltas.items():
+        columns = {name: d for name, d in columns.items() if d}
+        if not columns or aid in deleted_activities:
+            continue
+        result = conn.execute(
+            table.update()
+            .where(table.c.activity_id == aid)
+            .values({name: table.c[name] + d for name, d in columns.items()})
+        )
+        if result.rowcount == 0:
+            missing.append(aid)
+    if missing:
+        # Actividad sin fila (anterior a la tabla): se calcula completa
+        _write_counts(conn, _source_counts(conn, missing))
+
+    if deleted_activities:
+        conn.execute(table.delete().where(table.c.activity_id.in_(deleted_activities)))
+
+
+def touch_activity_counters(activity_ids: Iterable[int], session=None) -> None:
+    """Marca actividades cuyos contadores se recalculan al hacer commit.
+
+    Para sentencias en bloque que no pasan por el flush del ORM.
+    """
+    session = session or db.session()
+    stale = session.info.setdefault(_STALE_KEY, set())
+    stale.update(int(aid) for aid in activity_ids if aid is not None)
+
+
+@sa_event.listens_for(Session, "before_commit")
+def _refresh_stale_counters(session):
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale:
+        conn = session.connection()
+        _write_counts(conn, _source_counts(conn, stale))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _forget_reservations(session):
+    session.info.pop(_RESERVED_KEY, None)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _forget_pending_counters(session):
+    session.info.pop(_CHANGES_KEY, None)
+    session.info.pop(_STALE_KEY, None)
+    session.info.pop(_RESERVED_KEY, None)
+
+
+def reserve_registration_slot(activity_id: int, capacity: int, session=None) -> bool:
+    """Reserva un lugar de cupo con un ``UPDATE`` condicional atómico.
+
+    ``registered = registered + 1 WHERE registered < capacity``: la BD decide
+    si queda lugar sin ``SELECT ... FOR UPDATE`` ni ``COUNT(*)``. Retorna
+    False si el cupo está lleno. El preregistro 'Registrado' que se agregue
+    después en la misma transacción no se vuelve a sumar al hacer flush; si
+    la transacción se revierte, el rollback devuelve el lugar.
+    """
+    session = session or db.session()
+    conn = session.connection()
+    table = _table()
+    reserve = (
+        table.update()
+        .where(table.c.activity_id == activity_id)
+        .where(table.c.registered < capacity)
+        .values(registered=table.c.registered + 1)
+    )
+    reserved = conn.execute(reserve).rowcount == 1
+    if not reserved:
+        exists = conn.execute(
+            db.select(table.c.activity_id).where(table.c.activity_id == activity_id)
+        ).first()
+        if exists is None:
+            # Actividad sin fila (anterior a la tabla): se crea y se reintenta
+            _write_counts(conn, _source_counts(conn, [activity_id]))
+            reserved = conn.execute(reserve).rowcount == 1
+    if reserved:
+        session.info.setdefault(_RESERVED_KEY, Counter())[int(activity_id)] += 1
+    return reserved
+
+
+# --- Cálculo desde las tablas -------------------------------------------------
+
+
+def _zero_counts():
+    return {column: 0 for column in COUNTER_COLUMNS}
+
+
+def _count_when(condition):
+    return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+
+def _source_counts(conn, activity_ids: Optional[Iterable[int]] = None):
+    """``{activity_id: {columna: n}}`` recalculado desde las tablas.
+
+    Una consulta (por bloque de ids) que une a ``activities`` los agregados
+    de preregistros y de asistencias. Sin ``activity_ids`` cubre todas las
+    actividades.
+    """
+    has_registration = (
+        db.select(Registration.id)
+        .where(
+            Registration.student_id == Attendance.student_id,
+            Registration.activity_id == Attendance.activity_id,
+        )
+        .exists()
+    )
+    reg_columns = [
+        _count_when(Registration.status == status).label(column)
+        for status, column in REGISTRATION_STATUS_COLUMNS.items()
+    ]
+    att_columns = [
+        _count_when(Attendance.status == status).label(column)
+        for status, column in ATTENDANCE_STATUS_COLUMNS.items()
+    ]
+    att_columns.append(_count_when(~has_registration).label("walkins"))
+
+    def counts_query(ids=None):
+        aggregates = []
+        for model, columns in ((Registration, reg_columns), (Attendance, att_columns)):
+            agg = db.select(model.activity_id.label("aid"), *columns)
+            if ids is not None:
+                agg = agg.where(model.activity_id.in_(ids))
+            aggregates.append(agg.group_by(model.activity_id).subquery())
+        reg_agg, att_agg = aggregates
+        query = (
+            db.select(
+                Activity.id,
+                *(
+                    db.func.coalesce(agg.c[c.name], 0).label(c.name)
+                    for agg, columns in ((reg_agg, reg_columns), (att_agg, att_columns))
+                    for c in columns
+                ),
+            )
+            .outerjoin(reg_agg, reg_agg.c.aid == Activity.id)
+            .outerjoin(att_agg, att_agg.c.aid == Activity.id)
+        )
+        if ids is not None:
+            query = query.where(Activity.id.in_(ids))
+        return query
+
+    if activity_ids is None:
+        queries = [counts_query()]
+    else:
+        ids = sorted({int(aid) for aid in activity_ids})
+        queries = [counts_query(chunk) for chunk in _chunked(ids)]
+
+    counts = {}
+    for query in queries:
+        for row in conn.execute(query):
+            counts[row.id] = {c: int(row._mapping[c]) for c in COUNTER_COLUMNS}
+    return counts
+
+
+def _write_counts(conn, counts):
+    """Sobrescribe las filas de ``counts`` (UPDATE en bloque; INSERT de las
+    que aún no existen)."""
+    if not counts:
+        return
+    table = _table()
+    params = [
+        {"aid": aid, **{f"v_{c}": n for c, n in values.items()}}
+        for aid, values in counts.items()
+    ]
+    result = conn.execute(
+        table.update()
+        .where(table.c.activity_id == db.bindparam("aid"))
+        .values({c: db.bindparam(f"v_{c}") for c in COUNTER_COLUMNS}),
+        params,
+    )
+    if conn.dialect.supports_sane_multi_rowcount and result.rowcount == len(params):
+        return
+    existing = set()
+    for chunk in _chunked(counts):
+        existing.update(
+            conn.execute(
+                db.select(table.c.activity_id).where(table.c.activity_id.in_(chunk))
+            ).scalars()
+        )
+    missing = [aid for aid in counts if aid not in existing]
+    if missing:
+        conn.execute(
+            table.insert(), [{"activity_id": aid, **counts[aid]} for aid in missing]
+        )
+
+
+def rebuild_activity_counters(activity_ids: Optional[Iterable[int]] = None) -> dict:
+    """Recalcula los contadores desde las tablas y corrige los desfasados.
+
+    No hace commit. Retorna ``{"checked": n, "fixed": [activity_id, ...]}``.
+    """
+    conn = db.session.connection()
+    expected = _source_counts(conn, activity_ids)
+    table = _table()
+
+    current = {}
+    for chunk in _chunked(expected):
+        for row in conn.execute(table.select().where(table.c.activity_id.in_(chunk))):
+            current[row.activity_id] = {c: row._mapping[c] for c in COUNTER_COLUMNS}
+
+    fixed = sorted(
+        aid for aid, counts in expected.items() if current.get(aid) != counts
+    )
+    _write_counts(conn, {aid: expected[aid] for aid in fixed})
+    if activity_ids is None:
+        # Filas de actividades que ya no existen
+        conn.execute(
+            table.delete().where(table.c.activity_id.notin_(db.select(Activity.id)))
+        )
+    return {"checked": len(expected), "fixed": fixed}
+
+
+# --- Lectura ------------------------------------------------------------------
+
+
+def _with_totals(activity_id, counts):
+    return {
+        **counts,
+        "activity_id": activity_id,
+        "active_registrations": counts["registered"]
+        + counts["confirmed"]
+        + counts["attended"],
+    }
+
+
+def get_activity_counters(activity_ids: Iterable[int]) -> Dict[int, dict]:
+    """Contadores de varias actividades (una lectura de ``activity_counters``).
+
+    Cada valor trae las columnas de ``COUNTER_COLUMNS`` más
+    ``active_registrations`` (preregistros que ocupan lugar). Las actividades
+    sin fila se calculan desde las tablas sin escribir nada.
+    """
+    ids = {int(aid) for aid in activity_ids if aid is not None}
+    table = _table()
+    result = {}
+    for chunk in _chunked(ids):
+        # Lectura directa de la tabla: los UPDATE de los eventos de sesión no
+        # pasan por el mapa de identidad del ORM
+        for row in db.session.execute(
+            table.select().where(table.c.activity_id.in_(chunk))
+        ):
+            counts = {c: row._mapping[c] for c in COUNTER_COLUMNS}
+            result[row.activity_id] = _with_totals(row.activity_id, counts)
+    missing = ids - set(result)
+    if missing:
+        for aid, counts in _source_counts(db.session.connection(), missing).items():
+            result[aid] = _with_totals(aid, counts)
+    return result
+
+
+def get_registered_count(activity_id: int) -> int:
+    """Preregistros en estado 'Registrado' (los que cuentan para el cupo)."""
+    return (
+        get_activity_counters([activity_id])
+        .get(int(activity_id), {})
+        .get("registered", 0)
+    )
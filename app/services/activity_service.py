@@ -4,18 +4,28 @@ from app.models.activity import Activity
 from app.models.event import Event
 from app.services.settings_manager import AppSettings
 from marshmallow import ValidationError
+import itertools
 import json
-from io import BytesIO
-
-try:
-    import pandas as pd
-except Exception:
-    pd = None
 import unicodedata
 import difflib
 import re
 from datetime import datetime
 from app.utils.slug_utils import slugify, generate_unique_slug
+from app.utils.upload_utils import iter_sheet_records
+
+
+def _load_pandas():
+    """Importa pandas solo cuando hace falta interpretar fechas en texto libre.
+
+    Las celdas de fecha reales llegan como ``datetime`` desde openpyxl, así que
+    la mayoría de las cargas nunca importan pandas.
+    """
+    try:
+        import pandas as pd
+
+        return pd
+    except Exception:
+        return None
 
 
 def validate_activity_dates(activity_data):
@@ -298,7 +308,9 @@ def update_activity(activity_id, activity_data):
     return activity
 
 
-def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
+def create_activities_from_xlsx(
+    file_stream, event_id=None, dry_run=True, progress=None
+):
     """
     Parse an XLSX (first sheet) and create activities in batch.
 
@@ -311,22 +323,14 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
     where each entry is degree|name|organization or name only.
 
     Returns a dict: { created: int, errors: [{row: n, message: str, data: {}}], rows: parsed_rows }
-    """
-    if pd is None:
-        raise RuntimeError(
-            "pandas is required for XLSX import (install pandas and openpyxl)"
-        )
-
-    # Ensure stream pointer at start
-    try:
-        file_stream.seek(0)
-    except Exception:
-        pass
 
-    # Use pandas to read the first sheet into a DataFrame
+    progress: optional callable ``progress(summary, processed=n, total=m)``
+    used by background jobs to publish partial counters.
+    """
+    # Stream the first sheet (openpyxl read-only) instead of loading a DataFrame
     try:
-        # pandas will use openpyxl engine for .xlsx by default when available
-        df = pd.read_excel(BytesIO(file_stream.read()), sheet_name=0, engine="openpyxl")
+        original_cols, records = iter_sheet_records(file_stream)
+        first = next(records, None)
     except Exception as e:
         return {
             "created": 0,
@@ -334,7 +338,7 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
             "rows": [],
         }
 
-    if df.shape[0] == 0:
+    if first is None:
         return {
             "created": 0,
             "errors": [{"row": 0, "message": "Archivo vacío o sin filas"}],
@@ -358,7 +362,6 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
             val = val.replace(ch, "")
         return val
 
-    original_cols = list(df.columns)
     normalized = [_normalize_raw(c) for c in original_cols]
 
     # Map of common Spanish (normalized) -> English field names used by the schema
@@ -441,8 +444,7 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
         if target and target != orig:
             renames[orig] = target
 
-    if renames:
-        df.rename(columns=renames, inplace=True)
+    columns = [renames.get(c, c) for c in original_cols]
 
     # Helper: parse composed activity date/time strings like
     # "[ 08 - OCT - 25 ] MIERCOLES / 11 a 13" or
@@ -576,6 +578,7 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
             # Fallbacks when no bracketed dates were found.
             # 1) If the text contains a recognizable full date (yyyy-mm-dd or dd/mm/yyyy etc.), try pandas parsing
             try:
+                pd = _load_pandas()
                 if pd is not None:
                     parsed = pd.to_datetime(txt, errors="coerce")
                     if parsed is not None and not pd.isna(parsed):
@@ -622,7 +625,7 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
     # and look for anything containing 'instituc' (covers 'INSTITUCION',
     # 'Institución', etc.) or an explicit 'organizacion' header.
     institution_col = None
-    for c in df.columns:
+    for c in columns:
         try:
             if "instituc" in _normalize_raw(c) or _normalize_raw(c) == "organizacion":
                 institution_col = c
@@ -630,11 +633,13 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
         except Exception:
             continue
 
-    # Iterate rows preserving original Excel row numbers starting at 2 (header row 1)
-    for idx, (_, row) in enumerate(df.iterrows(), start=2):
+    # Iterate rows preserving original Excel row numbers (header row 1)
+    total_rows = 0
+    for idx, record in itertools.chain([first], records):
+        total_rows += 1
         try:
-            # Convert row (Series) to dict; keep NaN as None
-            rowdict = {k: (None if pd.isna(v) else v) for k, v in row.to_dict().items()}
+            # Apply header renames; empty cells are already None
+            rowdict = {renames.get(k, k): v for k, v in record.items()}
 
             # Coerce and normalize into activity_data
             activity_data = {}
@@ -651,12 +656,18 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
             activity_data["name"] = str(rowdict.get("name") or "").strip()
             activity_data["description"] = rowdict.get("description")
 
-            # Dates: pandas may parse to Timestamp or leave strings
+            # Dates: openpyxl returns datetime for date cells, strings otherwise
             sd = rowdict.get("start_datetime")
             ed = rowdict.get("end_datetime")
 
-            # Normalize pandas Timestamp, numpy datetime64, floats or strings to Python datetime
+            # Normalize strings to Python datetime; pandas is only loaded when
+            # there is free text to parse (date cells are already datetime)
             try:
+                pd = (
+                    _load_pandas()
+                    if isinstance(sd, str) or isinstance(ed, str)
+                    else None
+                )
                 # If pandas is available, use to_datetime with errors='coerce' to parse strings
                 if pd is not None:
                     # pd.to_datetime handles Timestamps, numpy datetime64, and common string formats
@@ -1041,7 +1052,6 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
 
     # If dry_run, return validation result without committing with a richer report
     if dry_run:
-        total_rows = int(df.shape[0])
         valid = len(parsed_rows)
         invalid = len(errors)
 
@@ -1068,7 +1078,7 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
             )
 
         rows_report = sorted(
-            rows_report, key=lambda x: (x["row"] if x["row"] is not None else 999999)
+            rows_report, key=lambda x: x["row"] if x["row"] is not None else 999999
         )
 
         report = {
@@ -1082,7 +1092,13 @@ def create_activities_from_xlsx(file_stream, event_id=None, dry_run=True):
 
     # Otherwise create activities row-by-row (each its own transaction) and skip duplicates
     created_ids = []
-    for pr in parsed_rows:
+    for done, pr in enumerate(parsed_rows):
+        if progress:
+            progress(
+                {"created": created, "errors": len(errors)},
+                processed=done,
+                total=len(parsed_rows),
+            )
         data = pr["data"]
         # Ensure event id present
         if not data.get("event_id") and event_id:
@@ -1,32 +1,146 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from app.utils.datetime_utils import localize_naive_datetime
-from app.services.settings_manager import AppSettings
+from app.utils.upload_utils import iter_first_column
 from typing import Iterable, cast
 
 from app.models.attendance import Attendance
 from app.models.activity import Activity
+from app.services.activity_counter_service import touch_activity_counters
 
 
-def _normalize_external_json(obj):
-    """Normalize various shapes returned by external student APIs.
+# Filas por lote de consultas externas cuando se reporta progreso
+_LOOKUP_PROGRESS_CHUNK = 50
 
-    - If obj is a dict and contains a 'data' dict, return that dict.
-    - If obj is a dict and contains a 'student' dict, return that dict.
-    - If obj is a list whose first item is a dict, return that first dict.
-    - Otherwise return an empty dict or the dict itself when appropriate.
+
+def _resolve_external_rows(rows, on_progress=None):
+    """Resuelve en la API externa las filas de un batch no encontradas en BD.
+
+    Las variantes candidatas se consultan por rondas: primero la variante
+    principal de todas las filas y, solo para las que sigan sin resolverse,
+    la siguiente variante (p. ej. solo dígitos). Cada ronda se resuelve con
+    ``lookup_students`` (copia local ``external_students`` primero; lo que
+    falte o esté vencido se consulta de forma concurrente y deduplicada). Muta cada fila: ``external`` (dict normalizado o None),
+    ``lookup_attempts`` y ``lookup_errors`` para diagnóstico en la UI.
+
+    Si se indica ``on_progress``, cada ronda se consulta en lotes de
+    ``_LOOKUP_PROGRESS_CHUNK`` filas y tras cada lote se llama
+    ``on_progress(n)`` con el número de filas ya resueltas o agotadas.
     """
-    if isinstance(obj, dict):
-        # common wrapper: {"success": true, "data": {...}}
-        if isinstance(obj.get("data"), dict):
-            return obj.get("data")
-        # proxy shape: {"student": {...}}
-        if isinstance(obj.get("student"), dict):
-            return obj.get("student")
-        # already a useful dict
-        return obj
-    if isinstance(obj, list) and len(obj) > 0 and isinstance(obj[0], dict):
-        return obj[0]
-    return {}
+    from app.services.student_lookup_service import (
+        FOUND,
+        INCOMPLETE,
+        NOT_FOUND,
+        lookup_students,
+    )
+
+    max_len = max((len(r["candidates"]) for r in rows), default=0)
+    settled = 0
+    for pos in range(max_len):
+        pending = [
+            r for r in rows if r["external"] is None and pos < len(r["candidates"])
+        ]
+        if not pending:
+            break
+
+        chunk_size = _LOOKUP_PROGRESS_CHUNK if on_progress else len(pending)
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start : start + chunk_size]
+            results = lookup_students(r["candidates"][pos] for r in chunk)
+            for r in chunk:
+                cand = r["candidates"][pos]
+                res = results.get(cand) or {}
+                status = res.get("status")
+                ext = res.get("student") or {}
+                if status in (FOUND, INCOMPLETE):
+                    r["lookup_attempts"].append(
+                        {
+                            "candidate": cand,
+                            "external_name": ext.get("full_name"),
+                            "external_career": ext.get("career"),
+                            "source": "validate",
+                        }
+                    )
+                    if status == FOUND:
+                        r["external"] = ext
+                    else:
+                        r["lookup_errors"].append(
+                            (
+                                cand,
+                                "API devolvió datos incompletos (falta nombre o carrera)",
+                            )
+                        )
+                elif status == NOT_FOUND:
+                    r["lookup_errors"].append((cand, "No encontrado (404)"))
+                else:
+                    err = res.get("error") or "Error desconocido"
+                    r["lookup_errors"].append((cand, err))
+                    r["lookup_attempts"].append({"candidate": cand, "error": err})
+
+                # La fila ya no se consultará en rondas posteriores
+                if r["external"] is not None or pos + 1 >= len(r["candidates"]):
+                    settled += 1
+
+            if on_progress:
+                on_progress(settled)
+
+
+# Tamaño máximo de las listas IN (...) para no exceder límites de parámetros
+_IN_CHUNK_SIZE = 500
+
+
+def _chunked(values, size=_IN_CHUNK_SIZE):
+    """Divide una secuencia en bloques de a lo más ``size`` elementos."""
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def _students_by_control(control_numbers):
+    """Devuelve ``{control_number: Student}`` resolviendo todo con IN (...)."""
+    from app.models.student import Student
+
+    wanted = {str(c) for c in control_numbers if c}
+    found = {}
+    for chunk in _chunked(wanted):
+        for student in Student.query.filter(Student.control_number.in_(chunk)):
+            found[student.control_number] = student
+    return found
+
+
+def _attended_student_ids(activity_id, student_ids):
+    """Ids de estudiantes que ya tienen asistencia en la actividad."""
+    from app import db
+
+    wanted = {int(s) for s in student_ids if s is not None}
+    existing = set()
+    for chunk in _chunked(wanted):
+        existing.update(
+            sid
+            for (sid,) in db.session.query(Attendance.student_id).filter(
+                Attendance.activity_id == activity_id,
+                Attendance.student_id.in_(chunk),
+            )
+        )
+    return existing
+
+
+def _mark_registrations_attended(activity_id, student_ids):
+    """Marca como asistidos los preregistros de los estudiantes en una sola
+    sentencia UPDATE por bloque (sin cargar los objetos Registration)."""
+    from app import db
+    from app.models.registration import Registration
+
+    for chunk in _chunked(set(student_ids)):
+        db.session.execute(
+            db.update(Registration)
+            .where(
+                Registration.activity_id == activity_id,
+                Registration.student_id.in_(chunk),
+            )
+            .values(attended=True, status="Asistió", confirmation_date=db.func.now()),
+            execution_options={"synchronize_session": False},
+        )
+    touch_activity_counters([activity_id])
 
 
 def pause_attendance(attendance_id):
@@ -66,42 +180,135 @@ def resume_attendance(attendance_id):
 # Función auxiliar para calcular duración neta (considerando pausas)
 
 
+def _epoch_seconds(dt, app_tz):
+    """Segundos epoch de un datetime; los naive se interpretan en ``app_tz``."""
+    if dt is None:
+        return None
+    return localize_naive_datetime(dt, app_tz).timestamp()
+
+
 def calculate_net_duration_seconds(attendance):
     """Calcula la duración real en segundos, restando las pausas."""
+    from app.utils.datetime_utils import get_app_timezone
+
     if not attendance.check_in_time:
         return 0
 
+    app_tz = get_app_timezone()
+    now = datetime.now(timezone.utc).timestamp()
+    start = _epoch_seconds(attendance.check_in_time, app_tz)
     # Si no hay check-out, usar ahora
-    end_time = attendance.check_out_time or datetime.now(timezone.utc)
-
-    # Helper: ensure datetime is timezone-aware. If naive, interpret it in
-    # the app timezone and convert to UTC using localize_naive_datetime.
-    def _ensure_tz(dt):
-        if dt is None:
-            return None
-        if dt.tzinfo is not None:
-            return dt.astimezone(timezone.utc)
-        app_timezone = AppSettings.app_timezone()
-        return localize_naive_datetime(dt, app_timezone)
-
-    start = _ensure_tz(attendance.check_in_time)
-    end = _ensure_tz(end_time)
+    end = _epoch_seconds(attendance.check_out_time, app_tz) or now
 
+    # Sumar todas las pausas. Asumimos una sola pausa por ahora.
+    # Para múltiples pausas, se necesitaría una estructura diferente (ej: lista de pausas)
     total_paused_seconds = 0
     if attendance.pause_time:
-        # Sumar todas las pausas. Asumimos una sola pausa por ahora.
-        # Para múltiples pausas, se necesitaría una estructura diferente (ej: lista de pausas)
-        resume_or_now = attendance.resume_time or datetime.now(timezone.utc)
-        resume_or_now = _ensure_tz(resume_or_now)
-        pause_time = _ensure_tz(attendance.pause_time)
-        if resume_or_now and pause_time:
-            total_paused_seconds = (resume_or_now - pause_time).total_seconds()
-
-    if not start or not end:
-        return 0
+        resume_or_now = _epoch_seconds(attendance.resume_time, app_tz) or now
+        total_paused_seconds = resume_or_now - _epoch_seconds(
+            attendance.pause_time, app_tz
+        )
+
+    return max(0, (end - start) - total_paused_seconds)  # No permitir negativos
 
-    net_duration = (end - start).total_seconds() - total_paused_seconds
-    return max(0, net_duration)  # No permitir duraciones negativas
+
+def _status_for_percentage(percentage):
+    if percentage >= 80:
+        return "Asistió"
+    if percentage > 0:
+        return "Parcial"
+    return "Ausente"
+
+
+def _percentage_from_epochs(
+    check_in, check_out, pause, resume, act_start, duration_hours, now
+):
+    """Porcentaje y estado de una asistencia a partir de segundos epoch.
+
+    Ventana de presencia ∩ ventana programada, menos la pausa dentro de esa
+    intersección. Sin inicio o duración de la actividad usa la duración neta
+    (comportamiento legacy). Retorna ``(percentage, status)``.
+    """
+    expected = float(duration_hours) * 3600 if duration_hours is not None else None
+
+    if act_start is None or expected is None:
+        paused = 0
+        if pause is not None:
+            paused = (resume if resume is not None else now) - pause
+        net = max(0, (check_out - check_in) - paused)
+        if expected:
+            percentage = round(max(0, net / expected * 100), 2)
+            return percentage, _status_for_percentage(percentage)
+        return 100.0, "Asistió"
+
+    act_end = act_start + expected
+    window_start = max(check_in, act_start)
+    window_end = min(check_out, act_end)
+    overlap = max(0, window_end - window_start)
+
+    paused = 0
+    if pause is not None:
+        pause_end = resume if resume is not None else check_out
+        ps = max(pause, window_start)
+        pe = min(pause_end, window_end)
+        if pe > ps:
+            paused = pe - ps
+
+    if expected <= 0:
+        # fallback conservador
+        return 100.0, "Asistió"
+    # Una pausa mayor o igual a la duración de la actividad (p. ej. el
+    # estudiante salió y volvió al final) cuenta como ausencia aunque quede
+    # un fragmento sin pausa dentro de la ventana
+    if pause is not None and resume is not None and resume - pause >= expected:
+        return 0.0, "Ausente"
+    percentage = round(max(0, max(0, overlap - paused) / expected * 100), 2)
+    return percentage, _status_for_percentage(percentage)
+
+
+def compute_attendance_percentages(rows, app_tz=None, now=None):
+    """
+    Calcula porcentaje y estado de muchas asistencias en una sola pasada, sin
+    consultar la base de datos.
+
+    Args:
+        rows: iterable de tuplas ``(check_in, check_out, pause, resume,
+            activity_start, duration_hours)``. Los datetimes naive se
+            interpretan en la zona horaria de la app.
+        app_tz: zona horaria ya resuelta (por defecto ``get_app_timezone()``).
+        now: instante de referencia para pausas sin reanudar (default: ahora).
+
+    Returns:
+        Lista alineada con ``rows``: ``(percentage, status)`` o ``None`` si la
+        asistencia no tiene entrada y salida.
+    """
+    if app_tz is None:
+        from app.utils.datetime_utils import get_app_timezone
+
+        app_tz = get_app_timezone()
+    now_epoch = (now or datetime.now(timezone.utc)).timestamp()
+
+    # Las actividades se repiten entre filas: convertir su inicio una sola vez
+    act_start_epochs = {}
+    results = []
+    for check_in, check_out, pause, resume, act_start, duration_hours in rows:
+        if not check_in or not check_out:
+            results.append(None)
+            continue
+        if act_start not in act_start_epochs:
+            act_start_epochs[act_start] = _epoch_seconds(act_start, app_tz)
+        results.append(
+            _percentage_from_epochs(
+                _epoch_seconds(check_in, app_tz),
+                _epoch_seconds(check_out, app_tz),
+                _epoch_seconds(pause, app_tz),
+                _epoch_seconds(resume, app_tz),
+                act_start_epochs[act_start],
+                duration_hours,
+                now_epoch,
+            )
+        )
+    return results
 
 
 def calculate_attendance_percentage(attendance_id):
@@ -118,163 +325,269 @@ def calculate_attendance_percentage(attendance_id):
     if not activity:
         return None
 
-    # Calcular la superposición entre la ventana de presencia y la ventana programada
-    # Helper: ensure timezone-aware
-    def _ensure_tz(dt):
-        if dt is None:
-            return None
-        if dt.tzinfo is not None:
-            return dt.astimezone(timezone.utc)
-        app_timezone = AppSettings.app_timezone()
-        return localize_naive_datetime(dt, app_timezone)
-
-    pres_start = _ensure_tz(attendance.check_in_time)
-    pres_end = _ensure_tz(attendance.check_out_time)
-
-    # Si no hay tiempos válidos, no calcular
-    if not pres_start or not pres_end:
+    (result,) = compute_attendance_percentages(
+        [
+            (
+                attendance.check_in_time,
+                attendance.check_out_time,
+                attendance.pause_time,
+                attendance.resume_time,
+                getattr(activity, "start_datetime", None),
+                getattr(activity, "duration_hours", None),
+            )
+        ]
+    )
+    if result is None:
         return None
+    attendance.attendance_percentage, attendance.status = result
+    return attendance.attendance_percentage
+
+
+def _apply_percentages(activity_id, rows, dry_run, now=None, create_related=True):
+    """Núcleo común de cierre/recálculo en bloque de una actividad.
+
+    ``rows``: tuplas ``(id, student_id, check_in, check_out, pause, resume,
+    percentage, status)`` (ver ``_attendance_rows``). Las asistencias sin
+    salida se cierran con ``now``. Si no es dry-run escribe las que cambian
+    con un UPDATE en bloque por clave primaria, crea las relacionadas de
+    quienes alcanzan el 80% y hace un único commit.
+    """
+    from app import db
+
+    activity = db.session.get(Activity, activity_id)
+    now = now or datetime.now(timezone.utc)
+    act_start = getattr(activity, "start_datetime", None)
+    duration_hours = getattr(activity, "duration_hours", None)
+
+    results = compute_attendance_percentages(
+        [
+            (check_in, check_out or now, pause, resume, act_start, duration_hours)
+            for _id, _sid, check_in, check_out, pause, resume, *_prev in rows
+        ],
+        now=now,
+    )
+
+    summary = {
+        "processed": 0,
+        "updated": 0,
+        "changed": 0,
+        "related_created": 0,
+        "details": [],
+    }
+    updates = []
+    eligible_students = []
+    has_related = create_related and bool(getattr(activity, "related_activities", None))
+
+    for row, result in zip(rows, results):
+        att_id, student_id, check_in, check_out = row[:4]
+        prev_percentage, prev_status = row[6:8]
+        summary["processed"] += 1
+        if result is None:
+            summary["details"].append(
+                {"attendance_id": att_id, "action": "skipped", "reason": "no_check_in"}
+            )
+            continue
+
+        percentage, status = result
+        if check_out is None or percentage != prev_percentage or status != prev_status:
+            summary["changed"] += 1
+            updates.append(
+                {
+                    "id": att_id,
+                    "check_out_time": check_out or now,
+                    "attendance_percentage": percentage,
+                    "status": status,
+                }
+            )
+
+        created_related = 0
+        if percentage >= 80 and not dry_run and has_related:
+            eligible_students.append(student_id)
+            created_related = 1
+
+        summary["details"].append(
+            {
+                "attendance_id": att_id,
+                "percentage": percentage,
+                "status": status,
+                "related_created": created_related,
+            }
+        )
+        summary["updated"] += 1
+        summary["related_created"] += created_related
+
+    if dry_run:
+        return summary
 
-    act_start = _ensure_tz(getattr(activity, "start_datetime", None))
-    # Definir act_end según duración de la actividad si está disponible
-    act_end = None
     try:
-        if (
-            act_start is not None
-            and getattr(activity, "duration_hours", None) is not None
-        ):
-            act_end = act_start + timedelta(hours=float(activity.duration_hours))
+        for chunk in _chunked(updates):
+            db.session.execute(db.update(Attendance), chunk)
+        touch_activity_counters([activity_id])
+        if eligible_students:
+            create_related_attendances_bulk(eligible_students, activity_id)
+        db.session.commit()
     except Exception:
-        act_end = None
-
-    # Si no hay act_start o duration, caemos al comportamiento por defecto
-    if not act_start or not act_end:
-        # Fallback: usar duración neta completa (comportamiento legacy)
-        net_duration_seconds = calculate_net_duration_seconds(attendance)
-        expected_duration_seconds = (activity.duration_hours or 0) * 3600
-        if expected_duration_seconds > 0:
-            percentage = (net_duration_seconds / expected_duration_seconds) * 100
-            attendance.attendance_percentage = round(max(0, percentage), 2)
-            if attendance.attendance_percentage >= 80:
-                attendance.status = "Asistió"
-            elif attendance.attendance_percentage > 0:
-                attendance.status = "Parcial"
-            else:
-                attendance.status = "Ausente"
-            return attendance.attendance_percentage
-        else:
-            attendance.attendance_percentage = 100.0
-            attendance.status = "Asistió"
-            return 100.0
+        db.session.rollback()
+        raise
+    return summary
 
-    # calcular intersección
-    window_start = max(pres_start, act_start)
-    window_end = min(pres_end, act_end)
-    overlap_seconds = max(0, (window_end - window_start).total_seconds())
 
-    # calcular segundos de pausa que ocurran dentro de la superposición
-    paused_seconds = 0
-    if attendance.pause_time:
-        pause_start = _ensure_tz(attendance.pause_time)
-        pause_end = _ensure_tz(
-            attendance.resume_time
-            or attendance.check_out_time
-            or datetime.now(timezone.utc)
+def _attendance_rows(activity_id, student_ids=None, require_check_out=False):
+    from app import db
+
+    query = db.session.query(
+        Attendance.id,
+        Attendance.student_id,
+        Attendance.check_in_time,
+        Attendance.check_out_time,
+        Attendance.pause_time,
+        Attendance.resume_time,
+        Attendance.attendance_percentage,
+        Attendance.status,
+    ).filter(Attendance.activity_id == activity_id)
+    if student_ids:
+        query = query.filter(Attendance.student_id.in_(student_ids))
+    if require_check_out:
+        query = query.filter(
+            Attendance.check_in_time.isnot(None),
+            Attendance.check_out_time.isnot(None),
         )
-        # solapamiento entre pausa y ventana calculada
-        ps = max(pause_start, window_start) if pause_start and window_start else None
-        pe = min(pause_end, window_end) if pause_end and window_end else None
-        if ps and pe and pe > ps:
-            paused_seconds = (pe - ps).total_seconds()
-
-    net_seconds = max(0, overlap_seconds - paused_seconds)
-    expected_seconds = max(0, (act_end - act_start).total_seconds())
-
-    if expected_seconds > 0:
-        # If the raw pause duration (resume - pause) exceeds or equals the
-        # activity expected duration, treat as absent. This covers cases where
-        # the user paused for longer than the activity length (external long
-        # pause) even if a small non-paused slice remains inside the window.
-        try:
-            if attendance.pause_time and attendance.resume_time:
-                raw_pause = (
-                    attendance.resume_time - attendance.pause_time
-                ).total_seconds()
-                if raw_pause >= expected_seconds:
-                    attendance.attendance_percentage = 0.0
-                    attendance.status = "Ausente"
-                    return 0.0
-        except Exception:
-            # If any unexpected issue occurs computing raw pause, continue with
-            # the usual overlap-based calculation.
-            pass
-        percentage = (net_seconds / expected_seconds) * 100
-        attendance.attendance_percentage = round(max(0, percentage), 2)
-        if attendance.attendance_percentage >= 80:
-            attendance.status = "Asistió"
-        elif attendance.attendance_percentage > 0:
-            attendance.status = "Parcial"
-        else:
-            attendance.status = "Ausente"
-        return attendance.attendance_percentage
-    else:
-        # fallback conservador
-        attendance.attendance_percentage = 100.0
-        attendance.status = "Asistió"
-        return 100.0
+    return query.order_by(Attendance.id).all()
 
 
-def create_related_attendances(student_id, activity_id):
+def batch_checkout(activity_id, student_ids=None, dry_run=True):
     """
-    Crea registros de asistencia para actividades relacionadas automáticamente.
+    Cierra en bloque las asistencias de una actividad: asigna ``check_out_time``
+    (ahora) a las que no lo tienen, recalcula porcentaje/estado de todas y crea
+    las asistencias relacionadas de quienes alcanzan el 80%.
+
+    Carga la actividad y las asistencias una sola vez, calcula todo en una
+    pasada (mismo cálculo para dry-run y ejecución) y, si no es dry-run,
+    escribe los resultados con un UPDATE en bloque y un único commit.
+
+    Retorna ``{processed, updated, changed, related_created, details}``.
+    """
+    from app import db
+
+    if not db.session.get(Activity, activity_id):
+        raise ValueError("Actividad no encontrada")
+    return _apply_percentages(
+        activity_id, _attendance_rows(activity_id, student_ids), dry_run
+    )
+
+
+def recalculate_activity_attendances(activity_id, dry_run=False):
+    """
+    Recalcula porcentaje y estado de todas las asistencias cerradas (con
+    entrada y salida) de una actividad, p. ej. tras corregir su horario o
+    ``duration_hours``. No cierra asistencias abiertas.
+
+    Retorna el mismo resumen que ``batch_checkout``.
+    """
+    from app import db
+
+    if not db.session.get(Activity, activity_id):
+        raise ValueError("Actividad no encontrada")
+
+    return _apply_percentages(
+        activity_id, _attendance_rows(activity_id, require_check_out=True), dry_run
+    )
+
+
+def _insert_synced_attendances(rows):
+    """Inserta asistencias sincronizadas (100%, 'Asistió') en bloque.
+
+    ``rows``: dicts con student_id, activity_id y opcionalmente
+    check_in_time/check_out_time.
+    """
+    from app import db
+
+    if not rows:
+        return
+    values = [
+        {
+            "student_id": row["student_id"],
+            "activity_id": row["activity_id"],
+            "check_in_time": row.get("check_in_time"),
+            "check_out_time": row.get("check_out_time"),
+            "attendance_percentage": 100.0,
+            "status": "Asistió",
+        }
+        for row in rows
+    ]
+    for chunk in _chunked(values):
+        db.session.execute(db.insert(Attendance), chunk)
+    touch_activity_counters({row["activity_id"] for row in values})
+
+
+def _mark_registration_pairs_attended(pairs):
+    """Marca como asistidos los preregistros de los pares (student_id,
+    activity_id) con un UPDATE ... WHERE (student_id, activity_id) IN (...)
+    por bloque."""
+    from app import db
+    from app.models.registration import Registration
+
+    pairs = {(int(sid), int(aid)) for sid, aid in pairs}
+    for chunk in _chunked(pairs):
+        db.session.execute(
+            db.update(Registration)
+            .where(
+                db.tuple_(Registration.student_id, Registration.activity_id).in_(chunk)
+            )
+            .values(attended=True, status="Asistió", confirmation_date=db.func.now()),
+            execution_options={"synchronize_session": False},
+        )
+    touch_activity_counters({aid for _, aid in pairs})
+
+
+def create_related_attendances_bulk(student_ids, activity_id):
+    """
+    Versión en bloque de ``create_related_attendances``: crea las asistencias
+    automáticas de todas las actividades relacionadas para varios estudiantes
+    con una consulta de existentes, un INSERT en bloque y un UPDATE de
+    preregistros. No hace commit (lo hace quien llama).
+
+    Retorna el número de asistencias creadas.
     """
     from app import db
-    from app.models.attendance import Attendance
-    from app.models.activity import Activity
 
-    # Obtener la actividad principal
     main_activity = db.session.get(Activity, activity_id)
     if not main_activity:
-        # Si no se encuentra la actividad principal, lanzar excepción
         raise ValueError("Actividad principal no encontrada")
 
-    # Iterar por actividades relacionadas
-    # main_activity.related_activities es una RelationshipProperty; convertir a
-    # lista y castear para que Pylance entienda que es iterable.
-    related_iterable = list(
-        cast(Iterable, getattr(main_activity, "related_activities", []))
+    target_ids = [
+        r.id for r in cast(Iterable, getattr(main_activity, "related_activities", []))
+    ]
+    wanted = sorted({int(s) for s in student_ids if s is not None})
+    if not target_ids or not wanted:
+        return 0
+
+    existing = set()
+    for chunk in _chunked(wanted):
+        existing.update(
+            db.session.query(Attendance.student_id, Attendance.activity_id).filter(
+                Attendance.student_id.in_(chunk),
+                Attendance.activity_id.in_(target_ids),
+            )
+        )
+
+    missing = [
+        (sid, tid) for sid in wanted for tid in target_ids if (sid, tid) not in existing
+    ]
+    # La asistencia automática no copia tiempos: se deriva de una asistencia
+    # confirmada en la actividad principal
+    _insert_synced_attendances(
+        [{"student_id": sid, "activity_id": tid} for sid, tid in missing]
     )
-    for related_activity in related_iterable:
-        # Verificar si ya existe un registro de asistencia para esta relación
-        # para este estudiante específico.
-        existing_attendance = Attendance.query.filter_by(
-            student_id=student_id, activity_id=related_activity.id
-        ).first()
-
-        if not existing_attendance:
-            # Crear asistencia automática.
-            # La asistencia automática no copia tiempos de otra asistencia.
-            # Se marca como asistida por la relación.
-            auto_attendance = Attendance()
-            auto_attendance.student_id = student_id
-            auto_attendance.activity_id = related_activity.id
-            # Crear marcada como 'Asistió' y asumir 100% porque se deriva de
-            # una asistencia confirmada en la actividad principal.
-            auto_attendance.attendance_percentage = 100.0
-            auto_attendance.status = "Asistió"
-            db.session.add(auto_attendance)
-            # Sincronizar con preregistro si existe
-            from app.models.registration import Registration
-
-            registration = Registration.query.filter_by(
-                student_id=student_id, activity_id=related_activity.id
-            ).first()
-
-            if registration:
-                registration.attended = True
-                registration.status = "Asistió"
-                registration.confirmation_date = db.func.now()
-                db.session.add(registration)
+    _mark_registration_pairs_attended(missing)
+    return len(missing)
+
+
+def create_related_attendances(student_id, activity_id):
+    """
+    Crea registros de asistencia para actividades relacionadas automáticamente.
+    """
+    create_related_attendances_bulk([student_id], activity_id)
 
 
 def sync_related_attendances_from_source(
@@ -290,11 +603,14 @@ def sync_related_attendances_from_source(
 
     Retorna un dict con resumen: { created: int, skipped: int, details: [ ... ] }
     Cada detail contiene: student_id, target_activity_id, action ('created'|'skipped'), reason
+
+    Se resuelve por conjuntos: una sola consulta (asistencias fuente × destinos
+    con LEFT JOIN a las asistencias existentes) determina qué pares faltan; los
+    faltantes se insertan en bloque y sus preregistros se actualizan con un
+    UPDATE por bloque.
     """
     from app import db
-    from app.models.attendance import Attendance
-    from app.models.activity import Activity
-    from app.models.registration import Registration
+    from app.models.student import Student
 
     summary = {"created": 0, "skipped": 0, "details": []}
 
@@ -319,108 +635,101 @@ def sync_related_attendances_from_source(
         except Exception:
             # Si la conversión falla, ignorar el filtro y continuar con todos
             pass
+    if not related:
+        return summary
 
-    # Construir query de asistencias en la actividad fuente
-    query = Attendance.query.filter_by(activity_id=source_activity_id)
+    # Orden de los destinos igual al de la relación (para los detalles)
+    target_order = {r.id: idx for idx, r in enumerate(related)}
+    target_names = {r.id: getattr(r, "name", "") for r in related}
+
+    src = db.aliased(Attendance)
+    existing = db.aliased(Attendance)
+    query = (
+        db.session.query(
+            src.id,
+            src.student_id,
+            src.check_in_time,
+            src.check_out_time,
+            Activity.id,
+            existing.id,
+            Student.full_name,
+            Student.control_number,
+        )
+        .select_from(src)
+        .join(Activity, Activity.id.in_(list(target_order)))
+        .outerjoin(
+            existing,
+            db.and_(
+                existing.student_id == src.student_id,
+                existing.activity_id == Activity.id,
+            ),
+        )
+        .outerjoin(Student, Student.id == src.student_id)
+        .filter(src.activity_id == source_activity_id)
+    )
     if student_ids:
-        query = query.filter(Attendance.student_id.in_(student_ids))
-
-    source_attendances = query.all()
-
-    # Pre-cache student names and control numbers for efficiency (best-effort)
-    try:
-        student_ids_in_source = {s.student_id for s in source_attendances}
-        students_map = {}
-        if student_ids_in_source:
-            from app.models.student import Student
-
-            students = (
-                db.session.query(Student.id, Student.full_name, Student.control_number)
-                .filter(Student.id.in_(list(student_ids_in_source)))
-                .all()
-            )
-            for sid, full_name, control in students:
-                students_map[int(sid)] = {
-                    "full_name": full_name or "",
-                    "control_number": control or "",
-                }
-    except Exception:
-        students_map = {}
-
-    for src in source_attendances:
-        for target in related:
-            # Verificar si ya existe asistencia para el student/target
-            exists = Attendance.query.filter_by(
-                student_id=src.student_id, activity_id=target.id
-            ).first()
-            if exists:
-                summary["skipped"] += 1
-                # Build detail with explicit name and control (if available)
-                student_info = students_map.get(int(src.student_id), {}) or {}
-                summary["details"].append(
-                    {
-                        "student_id": src.student_id,
-                        "student_name": student_info.get("full_name", ""),
-                        "student_identifier": student_info.get("control_number", ""),
-                        "target_activity_id": target.id,
-                        "target_activity_name": getattr(target, "name", ""),
-                        "action": "skipped",
-                        "reason": "already_exists",
-                    }
-                )
-                continue
-
-            # Construir nueva asistencia copiando tiempos fuente.
-            # Requerimiento: las asistencias sincronizadas deben representar 100%.
-            new_att = Attendance()
-            new_att.student_id = src.student_id
-            new_att.activity_id = target.id
-            # Copiar tiempos si existen para referencia, pero marcar 100% explícitamente
-            new_att.check_in_time = src.check_in_time
-            new_att.check_out_time = src.check_out_time
-            new_att.attendance_percentage = 100.0
-            new_att.status = "Asistió"
-
-            if not dry_run:
-                db.session.add(new_att)
-                # Sincronizar preregistro si existe: marcar como asistido al 100%
-                reg = Registration.query.filter_by(
-                    student_id=src.student_id, activity_id=target.id
-                ).first()
-                if reg:
-                    reg.attended = True
-                    reg.status = "Asistió"
-                    reg.confirmation_date = db.func.now()
-                    db.session.add(reg)
-
-            summary["created"] += 1
-            student_info = students_map.get(int(src.student_id), {}) or {}
-            summary["details"].append(
+        query = query.filter(src.student_id.in_(student_ids))
+
+    rows = sorted(query.all(), key=lambda r: (r[0], target_order[r[4]]))
+
+    to_create = []
+    for (
+        _src_id,
+        student_id,
+        check_in,
+        check_out,
+        target_id,
+        existing_id,
+        full_name,
+        control,
+    ) in rows:
+        detail = {
+            "student_id": student_id,
+            "student_name": full_name or "",
+            "student_identifier": control or "",
+            "target_activity_id": target_id,
+            "target_activity_name": target_names.get(target_id, ""),
+        }
+        if existing_id is not None:
+            summary["skipped"] += 1
+            detail.update(action="skipped", reason="already_exists")
+        else:
+            # Requerimiento: las asistencias sincronizadas deben representar
+            # 100%; se copian los tiempos fuente como referencia
+            to_create.append(
                 {
-                    "student_id": src.student_id,
-                    "student_name": student_info.get("full_name", ""),
-                    "student_identifier": student_info.get("control_number", ""),
-                    "target_activity_id": target.id,
-                    "target_activity_name": getattr(target, "name", ""),
-                    "action": "created",
-                    "reason": "synced_from_source",
+                    "student_id": student_id,
+                    "activity_id": target_id,
+                    "check_in_time": check_in,
+                    "check_out_time": check_out,
                 }
             )
+            summary["created"] += 1
+            detail.update(action="created", reason="synced_from_source")
+        summary["details"].append(detail)
 
-    # Commit cuando no es dry_run
     if not dry_run:
+        _insert_synced_attendances(to_create)
+        _mark_registration_pairs_attended(
+            (row["student_id"], row["activity_id"]) for row in to_create
+        )
         db.session.commit()
 
     return summary
 
 
-def create_attendances_from_file(file_stream, activity_id, dry_run=True):
+def create_attendances_from_file(file_stream, activity_id, dry_run=True, progress=None):
     """
     Crea asistencias en batch desde un archivo TXT o XLSX.
 
     Archivo TXT: un número de control por línea
     Archivo XLSX: números de control en la primera columna
 
+    ``progress`` (opcional) se llama como ``progress(summary, processed=n,
+    total=m)`` mientras se resuelven los estudiantes; lo usan los trabajos en
+    segundo plano para publicar avance parcial. Solo se invoca antes de la
+    fase de escritura.
+
     Retorna un dict: {
         'created': int,
         'skipped': int,
@@ -432,9 +741,7 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
     from app import db
     from app.models.student import Student
     from app.models.attendance import Attendance
-    from app.models.registration import Registration
-    import requests
-    import io
+    from app.services.student_service import upsert_students
 
     summary = {
         "created": 0,
@@ -456,34 +763,10 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
         )
         return summary
 
-    # Leer números de control del archivo
-    control_numbers = []
+    # Leer números de control del archivo (streaming; el tipo se detecta por
+    # contenido: XLSX -> primera columna, TXT -> una línea por número)
     try:
-        # Intentar leer como XLSX primero
-        try:
-            import pandas as pd
-
-            file_stream.seek(0)
-            # Read without treating first row as header
-            df = pd.read_excel(
-                io.BytesIO(file_stream.read()),
-                sheet_name=0,
-                engine="openpyxl",
-                header=None,
-            )
-            # Tomar la primera columna
-            if df.shape[0] > 0:
-                control_numbers = [
-                    str(val).strip() for val in df.iloc[:, 0] if str(val).strip()
-                ]
-        except Exception:
-            # Si falla, intentar leer como TXT
-            file_stream.seek(0)
-            content = file_stream.read()
-            if isinstance(content, bytes):
-                content = content.decode("utf-8", errors="ignore")
-            lines = content.strip().split("\n")
-            control_numbers = [line.strip() for line in lines if line.strip()]
+        control_numbers = list(iter_first_column(file_stream))
     except Exception as e:
         summary["errors"].append(
             {"control_number": "", "message": f"Error al leer archivo: {str(e)}"}
@@ -506,7 +789,7 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
     # Mantener índice de fila para trazabilidad en la UI
     valid_controls = []
     pattern = re.compile(r"^(?:\d+|[BCbc]\d+)$")
-    for idx, raw in enumerate(control_numbers, start=1):
+    for idx, raw in control_numbers:
         val = str(raw).strip()
         if not val:
             continue
@@ -530,6 +813,8 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
         # Guardar como objeto con índice de fila para mantener trazabilidad
         valid_controls.append({"value": val, "row_index": idx})
 
+    # Fase 1: preparar variantes candidatas por fila
+    rows = []
     for control in valid_controls:
         control_number = control.get("value")
         row_index = control.get("row_index")
@@ -548,296 +833,214 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
         seen = set()
         candidates = [c for c in candidates if not (c in seen or seen.add(c))]
 
-        student = None
-        # fuente por defecto
-        student_source = None
-        # diagnostic placeholders - ensure variables exist for summary entries
-        lookup_attempts = []
-        external_name_used = None
-        external_career_used = None
-        # whether a Student was actually persisted in the DB for this row
-        persisted = False
-
-        # Try local DB for any candidate variant
-        for cand in candidates:
-            if not cand:
-                continue
-            student = Student.query.filter_by(control_number=cand).first()
+        rows.append(
+            {
+                "control_number": control_number,
+                "raw_cn": raw_cn,
+                "row_index": row_index,
+                "candidates": candidates,
+                "student": None,
+                "student_source": None,
+                "persisted": False,
+                "external": None,
+                "lookup_attempts": [],
+                "lookup_errors": [],
+            }
+        )
+
+    # Resolver todas las variantes en BD local con una sola consulta IN (...)
+    local_students = _students_by_control(c for r in rows for c in r["candidates"])
+    for row in rows:
+        for cand in row["candidates"]:
+            student = local_students.get(cand)
             if student:
-                student_source = "local"
-                persisted = True
+                row["student"] = student
+                row["student_source"] = "local"
+                row["persisted"] = True
                 break
 
-        # If not found locally, try external APIs (multiple fallbacks)
-        if not student:
-            lookup_errors = []
-            # collect what each external call returned (for diagnostics)
-            lookup_attempts = []
-            external_name_used = None
-            external_career_used = None
-            for cand in candidates:
-                if not cand:
-                    continue
+    total = len(control_numbers)
+    resolved_early = total - len(rows) + sum(1 for r in rows if r["student"])
+    if progress:
+        progress(summary, processed=resolved_early, total=total, force=True)
+
+    # Fase 2: resolver en la API externa (concurrente, deduplicado y cacheado)
+    # solo las filas que no existen localmente.
+    _resolve_external_rows(
+        [r for r in rows if r["student"] is None],
+        on_progress=(
+            (lambda n: progress(summary, processed=resolved_early + n, total=total))
+            if progress
+            else None
+        ),
+    )
+
+    # Fase 3: materializar estudiantes externos en bloque. Varias filas
+    # (p. ej. 'B123' y '123') pueden resolver al mismo número de control
+    # externo, y éste puede existir ya en BD con otra variante.
+    external_rows = [r for r in rows if r["student"] is None and r["external"]]
+    ext_students = {}
+    if external_rows:
+        ext_by_control = {}
+        for row in external_rows:
+            ext = row["external"]
+            ext_control = ext.get("control_number") or row["raw_cn"]
+            ext_by_control.setdefault(ext_control, ext)
+
+        ext_students = _students_by_control(ext_by_control.keys())
+        missing = [c for c in ext_by_control if c not in ext_students]
+        if missing:
+            new_students = [
+                {
+                    "control_number": c,
+                    "full_name": ext_by_control[c].get("full_name"),
+                    "career": ext_by_control[c].get("career"),
+                    "email": ext_by_control[c].get("email") or "",
+                }
+                for c in missing
+            ]
+            if dry_run:
+                for mapping in new_students:
+                    student = Student()
+                    for k, v in mapping.items():
+                        setattr(student, k, v)
+                    ext_students[mapping["control_number"]] = student
+            else:
                 try:
-                    # First, try the local proxy endpoint used by public UI (avoid duplicating normalization)
-                    try:
-                        from flask import request as _fl_req  # type: ignore
-
-                        proxy_url = f"{_fl_req.url_root.rstrip('/')}/api/students/validate?control_number={cand}"
-                        resp_proxy = requests.get(proxy_url, timeout=6)
-                        if resp_proxy.status_code == 200:
-                            try:
-                                pdata_raw = resp_proxy.json() if resp_proxy.text else {}
-                            except Exception:
-                                pdata_raw = {}
-                            # normalize shapes (dict with data/student, or list)
-                            pdata = _normalize_external_json(pdata_raw)
-                            # pdata may already be the inner student dict
-                            p_student = pdata if isinstance(pdata, dict) else {}
-                            external_name = (
-                                p_student.get("full_name")
-                                or p_student.get("name")
-                                or p_student.get("nombre")
-                            )
-                            career_field = p_student.get("career") or p_student.get(
-                                "carrera"
-                            )
-                            if isinstance(career_field, dict):
-                                external_career = career_field.get(
-                                    "name"
-                                ) or career_field.get("nombre")
-                            else:
-                                external_career = career_field
-                            lookup_attempts.append(
-                                {
-                                    "candidate": cand,
-                                    "external_name": external_name,
-                                    "external_career": external_career,
-                                    "source": "local_proxy",
-                                }
-                            )
-                            if external_name and external_career:
-                                if dry_run:
-                                    student_source = "external"
-                                    persisted = False
-                                else:
-                                    student_source = "created"
-                                    persisted = True
-                                student = Student()
-                                student.control_number = (
-                                    p_student.get("control_number")
-                                    or p_student.get("username")
-                                    or cand
-                                )
-                                student.full_name = external_name
-                                student.career = external_career
-                                student.email = p_student.get("email") or ""
-                                external_name_used = external_name
-                                external_career_used = external_career
-                                if not dry_run:
-                                    db.session.add(student)
-                                    db.session.flush()
-                                break
-                            else:
-                                # record incomplete result from proxy and continue to other sources
-                                lookup_errors.append(
-                                    (
-                                        cand,
-                                        "API proxy devolvió datos incompletos (falta nombre o carrera)",
-                                    )
-                                )
-                    except Exception:
-                        # if proxy fails, continue to other external attempts
-                        pass
-                    # First, try the validate endpoint used elsewhere in the app
-                    validate_url = f"http://apps.tecvalles.mx:8091/api/validate/student?username={cand}"
-                    resp = requests.get(validate_url, timeout=8)
-                    if resp.status_code == 200:
-                        try:
-                            external_raw = resp.json() if resp.text else {}
-                        except Exception:
-                            external_raw = {}
-                        external_data = _normalize_external_json(external_raw)
-                        # Ensure external_data is a dict before calling .get()
-                        if not isinstance(external_data, dict):
-                            external_data = {}
-                        # Only create a Student if the external API returned
-                        # at least a name and a career (policy requirement)
-                        external_name = (
-                            external_data.get("full_name")
-                            or external_data.get("nombre")
-                            or external_data.get("name")
-                        )
-                        external_career = external_data.get(
-                            "career"
-                        ) or external_data.get("carrera")
-                        # record attempt for diagnostics
-                        lookup_attempts.append(
-                            {
-                                "candidate": cand,
-                                "external_name": external_name,
-                                "external_career": external_career,
-                                "source": "validate",
-                            }
-                        )
-                        if external_name and external_career:
-                            # Mark source differently for dry-run vs actual persistence
-                            if dry_run:
-                                student_source = "external"
-                                persisted = False
-                            else:
-                                student_source = "created"
-                                persisted = True
-                            student = Student()
-                            student.control_number = (
-                                external_data.get("username")
-                                or external_data.get("control_number")
-                                or cand
-                            )
-                            student.full_name = external_name
-                            student.career = external_career
-                            student.email = external_data.get("email") or ""
-                            external_name_used = external_name
-                            external_career_used = external_career
-                            if not dry_run:
-                                db.session.add(student)
-                                db.session.flush()
-                            break
-                        else:
-                            # Record that API returned incomplete data and continue
-                            lookup_errors.append(
-                                (
-                                    cand,
-                                    "API devolvió datos incompletos (falta nombre o carrera)",
-                                )
-                            )
-                    # NOTE: We intentionally DO NOT call the general search endpoint
-                    # `/api/estudiantes?search=` as a validation fallback here because
-                    # that endpoint returns a LIST of candidates (intended for free
-                    # search / select UI) and can produce shapes that confuse the
-                    # single-record validation flow. For validating a single
-                    # control_number we prefer the dedicated single-result endpoint
-                    # `/api/validate/student?username=` (handled above) or the local
-                    # proxy. If additional heuristics are desired they should be
-                    # implemented explicitly and carefully.
-                    # If the external validate call returned 404, record it for diagnostics
-                    if resp.status_code == 404:
-                        lookup_errors.append((cand, "No encontrado (404)"))
+                    # Upsert: otra importación o un walk-in pudo crearlos ya
+                    ext_students.update(upsert_students(new_students))
                 except Exception as e:
-                    lookup_errors.append((cand, str(e)))
-                    lookup_attempts.append({"candidate": cand, "error": str(e)})
-
-            # If still not found, decide between 'not_found' (no external data)
-            # and 'incomplete' (external returned something but incomplete)
-            if not student:
-                # analyze lookup results
-                any_lookup_attempts = bool(lookup_attempts)
-                any_lookup_errors = bool(lookup_errors)
-                # consider partial if any lookup_attempts exist or any lookup_errors indicate incomplete data
-                lookup_indicates_incomplete = False
-                if any_lookup_attempts:
-                    # if any attempt returned a name or career (even if incomplete), mark incomplete
-                    for a in lookup_attempts:
-                        if (
-                            a.get("external_name")
-                            or a.get("external_career")
-                            or a.get("error")
-                        ):
-                            lookup_indicates_incomplete = True
-                            break
-                if not lookup_indicates_incomplete and any_lookup_errors:
-                    for c, m in lookup_errors:
-                        if "incomplet" in m.lower():
-                            lookup_indicates_incomplete = True
-                            break
-
-                if lookup_indicates_incomplete:
-                    summary["incomplete"] += 1
-                    # Prefer the best available name/career from attempts
-                    best_name = None
-                    best_career = None
-                    best_source = None
-                    for a in lookup_attempts:
-                        if not best_name and a.get("external_name"):
-                            best_name = a.get("external_name")
-                            best_source = a.get("source")
-                        if not best_career and a.get("external_career"):
-                            best_career = a.get("external_career")
-
-                    # Build a concise reason: falta carrera/nombre o genérico
-                    reasons = []
-                    if best_name and not best_career:
-                        reasons.append("falta carrera")
-                    elif best_career and not best_name:
-                        reasons.append("falta nombre")
-                    else:
-                        # fallback: use any unique error messages collected
-                        seen = set()
-                        for c, m in lookup_errors:
-                            if m and m not in seen:
-                                seen.add(m)
-                                reasons.append(m)
-                        if not reasons:
-                            reasons.append("Datos incompletos en API externa")
-
-                    msg = ", ".join(reasons)
-                    if best_source and best_name:
-                        msg = f"Encontrado en API ({best_source}) — {msg}"
-
-                    # If we have a name from external, show it in student_name
-                    summary["details"].append(
+                    db.session.rollback()
+                    summary["errors"].append(
                         {
-                            "control_number": raw_cn,
-                            "action": "external_incomplete",
-                            "student_name": best_name or "-",
-                            "row_index": row_index,
-                            "student_source": "external",
-                            "lookup_message": msg,
-                            "lookup_attempts": lookup_attempts or None,
-                            "persisted": False,
+                            "control_number": "",
+                            "message": f"Error al guardar estudiantes: {str(e)}",
                         }
                     )
+                    return summary
+
+        for row in external_rows:
+            ext = row["external"]
+            ext_control = ext.get("control_number") or row["raw_cn"]
+            row["student"] = ext_students.get(ext_control)
+            row["student_source"] = "external" if dry_run else "created"
+            row["persisted"] = not dry_run
+
+    # Asistencias ya existentes para la actividad: una sola consulta IN (...)
+    attended_ids = _attended_student_ids(
+        activity_id, [r["student"].id for r in rows if r["student"] is not None]
+    )
+
+    # Fase 4: construir el reporte y el lote de inserciones
+    new_attendances = []
+    claimed = set()
+    for row in rows:
+        control_number = row["control_number"]
+        raw_cn = row["raw_cn"]
+        row_index = row["row_index"]
+        student = row["student"]
+        student_source = row["student_source"]
+        persisted = row["persisted"]
+        lookup_attempts = row["lookup_attempts"]
+        lookup_errors = row["lookup_errors"]
+        external_name_used = (row["external"] or {}).get("full_name")
+        external_career_used = (row["external"] or {}).get("career")
+
+        # If still not found, decide between 'not_found' (no external data)
+        # and 'incomplete' (external returned something but incomplete)
+        if not student:
+            # consider partial if any attempt returned a name or career (even if
+            # incomplete) or any lookup error indicates incomplete data
+            lookup_indicates_incomplete = False
+            for a in lookup_attempts:
+                if a.get("external_name") or a.get("external_career") or a.get("error"):
+                    lookup_indicates_incomplete = True
+                    break
+            if not lookup_indicates_incomplete:
+                for c, m in lookup_errors:
+                    if "incomplet" in m.lower():
+                        lookup_indicates_incomplete = True
+                        break
+
+            if lookup_indicates_incomplete:
+                summary["incomplete"] += 1
+                # Prefer the best available name/career from attempts
+                best_name = None
+                best_career = None
+                best_source = None
+                for a in lookup_attempts:
+                    if not best_name and a.get("external_name"):
+                        best_name = a.get("external_name")
+                        best_source = a.get("source")
+                    if not best_career and a.get("external_career"):
+                        best_career = a.get("external_career")
+
+                # Build a concise reason: falta carrera/nombre o genérico
+                reasons = []
+                if best_name and not best_career:
+                    reasons.append("falta carrera")
+                elif best_career and not best_name:
+                    reasons.append("falta nombre")
                 else:
-                    # truly not found anywhere
-                    summary["not_found"] += 1
-                    msg_parts = []
+                    # fallback: use any unique error messages collected
                     seen = set()
-                    if lookup_errors:
-                        for c, m in lookup_errors:
-                            part = f"{c}: {m}".strip()
-                            if part and part not in seen:
-                                seen.add(part)
-                                msg_parts.append(part)
-                        msg = "; ".join(msg_parts)
-                    else:
-                        msg = "No encontrado en BD ni API externa"
-                    summary["errors"].append({"control_number": raw_cn, "message": msg})
-                    summary["details"].append(
-                        {
-                            "control_number": raw_cn,
-                            "action": "not_found",
-                            "student_name": "-",
-                            "row_index": row_index,
-                            "student_source": "not_found",
-                            "lookup_message": msg,
-                            "lookup_attempts": lookup_attempts or None,
-                            "persisted": False,
-                        }
-                    )
-                continue
+                    for c, m in lookup_errors:
+                        if m and m not in seen:
+                            seen.add(m)
+                            reasons.append(m)
+                    if not reasons:
+                        reasons.append("Datos incompletos en API externa")
+
+                msg = ", ".join(reasons)
+                if best_source and best_name:
+                    msg = f"Encontrado en API ({best_source}) — {msg}"
+
+                # If we have a name from external, show it in student_name
+                summary["details"].append(
+                    {
+                        "control_number": raw_cn,
+                        "action": "external_incomplete",
+                        "student_name": best_name or "-",
+                        "row_index": row_index,
+                        "student_source": "external",
+                        "lookup_message": msg,
+                        "lookup_attempts": lookup_attempts or None,
+                        "persisted": False,
+                    }
+                )
+            else:
+                # truly not found anywhere
+                summary["not_found"] += 1
+                msg_parts = []
+                seen = set()
+                if lookup_errors:
+                    for c, m in lookup_errors:
+                        part = f"{c}: {m}".strip()
+                        if part and part not in seen:
+                            seen.add(part)
+                            msg_parts.append(part)
+                    msg = "; ".join(msg_parts)
+                else:
+                    msg = "No encontrado en BD ni API externa"
+                summary["errors"].append({"control_number": raw_cn, "message": msg})
+                summary["details"].append(
+                    {
+                        "control_number": raw_cn,
+                        "action": "not_found",
+                        "student_name": "-",
+                        "row_index": row_index,
+                        "student_source": "not_found",
+                        "lookup_message": msg,
+                        "lookup_attempts": lookup_attempts or None,
+                        "persisted": False,
+                    }
+                )
+            continue
 
-        # Verificar si ya existe asistencia
-        existing = Attendance.query.filter_by(
-            student_id=student.id, activity_id=activity_id
-        ).first()
-        if existing:
+        # Verificar si ya existe asistencia (en BD o en una fila previa del archivo)
+        student_key = student.id if student.id is not None else student.control_number
+        if student.id in attended_ids or student_key in claimed:
             summary["skipped"] += 1
-            # determinar fuente: si student tiene id y fue encontrado localmente
-            det_source = student_source or (
-                "local"
-                if persisted
-                else ("external" if external_name_used else "unknown")
-            )
             summary["details"].append(
                 {
                     "control_number": control_number,
@@ -845,34 +1048,23 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
                     "student_name": student.full_name,
                     "reason": "Ya existe asistencia",
                     "row_index": row_index,
-                    "student_source": det_source,
+                    "student_source": student_source or "unknown",
                 }
             )
             continue
+        claimed.add(student_key)
 
-        # Crear asistencia
         if not dry_run:
-            attendance = Attendance()
-            attendance.student_id = student.id
-            attendance.activity_id = activity_id
-            attendance.attendance_percentage = 100.0
-            attendance.status = "Asistió"
-            db.session.add(attendance)
-
-            # Actualizar registro si existe
-            registration = Registration.query.filter_by(
-                student_id=student.id, activity_id=activity_id
-            ).first()
-            if registration:
-                registration.attended = True
-                registration.status = "Asistió"
-                registration.confirmation_date = db.func.now()
-                db.session.add(registration)
+            new_attendances.append(
+                {
+                    "student_id": student.id,
+                    "activity_id": activity_id,
+                    "attendance_percentage": 100.0,
+                    "status": "Asistió",
+                }
+            )
 
         summary["created"] += 1
-        det_source = student_source or (
-            "local" if persisted else ("external" if external_name_used else "created")
-        )
         # attach any external values we received (useful in dry-run for preview)
         summary["details"].append(
             {
@@ -880,7 +1072,7 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
                 "action": "created",
                 "student_name": student.full_name,
                 "row_index": row_index,
-                "student_source": det_source,
+                "student_source": student_source or "created",
                 "external_name": external_name_used,
                 "external_career": external_career_used,
                 "lookup_attempts": lookup_attempts or None,
@@ -888,9 +1080,15 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
             }
         )
 
-    # Commit si no es dry_run
+    # Fase 5: escritura en bloque (una inserción y una actualización de
+    # preregistros) y commit si no es dry_run
     if not dry_run:
         try:
+            if new_attendances:
+                db.session.bulk_insert_mappings(Attendance, new_attendances)
+                _mark_registrations_attended(
+                    activity_id, [m["student_id"] for m in new_attendances]
+                )
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -903,13 +1101,15 @@ def create_attendances_from_file(file_stream, activity_id, dry_run=True):
 
 
 def process_exit_from_file(
-    file_stream, activity_id, dry_run=True, action="mark_absent"
+    file_stream, activity_id, dry_run=True, action="mark_absent", progress=None
 ):
     """
     Procesa un archivo TXT o XLSX con números de control para marcar salidas.
 
     - action: 'mark_absent' (recommended, non-destructive) or 'delete'
     - dry_run: if True, only validate and return report
+    - progress: optional ``progress(summary, processed=n, total=m)`` callback
+      (background jobs)
 
     Returns dict similar to create_attendances_from_file with keys:
       created -> number of rows updated/deleted
@@ -918,7 +1118,6 @@ def process_exit_from_file(
       errors, details
     """
     from app import db
-    from app.models.student import Student
     from app.models.attendance import Attendance
 
     summary = {
@@ -939,31 +1138,9 @@ def process_exit_from_file(
         )
         return summary
 
-    # Read control numbers (reuse same strategy: try XLSX then TXT)
-    control_numbers = []
+    # Read control numbers (same streaming reader as the attendance import)
     try:
-        try:
-            import pandas as pd
-            import io
-
-            file_stream.seek(0)
-            df = pd.read_excel(
-                io.BytesIO(file_stream.read()),
-                sheet_name=0,
-                engine="openpyxl",
-                header=None,
-            )
-            if df.shape[0] > 0:
-                control_numbers = [
-                    str(val).strip() for val in df.iloc[:, 0] if str(val).strip()
-                ]
-        except Exception:
-            file_stream.seek(0)
-            content = file_stream.read()
-            if isinstance(content, bytes):
-                content = content.decode("utf-8", errors="ignore")
-            lines = content.strip().split("\n")
-            control_numbers = [line.strip() for line in lines if line.strip()]
+        control_numbers = list(iter_first_column(file_stream))
     except Exception as e:
         summary["errors"].append(
             {"control_number": "", "message": f"Error al leer archivo: {str(e)}"}
@@ -986,7 +1163,7 @@ def process_exit_from_file(
     # process
     seen = set()
     valid_controls = []
-    for idx, raw in enumerate(control_numbers, start=1):
+    for idx, raw in control_numbers:
         val = str(raw).strip()
         if not val:
             continue
@@ -1004,10 +1181,37 @@ def process_exit_from_file(
         valid_controls.append({"value": val, "row_index": idx})
 
     # For exit processing we only consider local DB students; do not create new students from external APIs
+    # Resolver estudiantes y asistencias con una consulta IN (...) cada uno
+    students_by_cn = _students_by_control(c.get("value") for c in valid_controls)
+    attendances_by_student = {}
+    student_ids = [s.id for s in students_by_cn.values()]
+    for chunk in _chunked(student_ids):
+        for att in Attendance.query.filter(
+            Attendance.activity_id == activity_id, Attendance.student_id.in_(chunk)
+        ):
+            attendances_by_student[att.student_id] = att
+
+    if progress:
+        progress(summary, processed=0, total=len(control_numbers), force=True)
+
+    # determine human-friendly action display
+    if action == "mark_absent":
+        action_display = (
+            "Se marcará como Ausente" if dry_run else "Marcado como Ausente"
+        )
+        action_token = "mark_absent"
+    elif action == "delete":
+        action_display = "Se eliminará" if dry_run else "Eliminado"
+        action_token = "delete"
+    else:
+        action_display = "Acción" if dry_run else "Aplicado"
+        action_token = action
+
+    matched_ids = []
     for control in valid_controls:
         cn = control.get("value")
         row_index = control.get("row_index")
-        student = Student.query.filter_by(control_number=cn).first()
+        student = students_by_cn.get(cn)
         if not student:
             summary["unmatched"] += 1
             summary["details"].append(
@@ -1022,9 +1226,7 @@ def process_exit_from_file(
             )
             continue
 
-        attendance = Attendance.query.filter_by(
-            student_id=student.id, activity_id=activity_id
-        ).first()
+        attendance = attendances_by_student.get(student.id)
         if not attendance:
             summary["not_found"] += 1
             summary["details"].append(
@@ -1043,19 +1245,6 @@ def process_exit_from_file(
             continue
 
         # matched attendance
-        # determine human-friendly action display
-        if action == "mark_absent":
-            action_display = (
-                "Se marcará como Ausente" if dry_run else "Marcado como Ausente"
-            )
-            action_token = "mark_absent"
-        elif action == "delete":
-            action_display = "Se eliminará" if dry_run else "Eliminado"
-            action_token = "delete"
-        else:
-            action_display = "Acción" if dry_run else "Aplicado"
-            action_token = action
-
         summary["details"].append(
             {
                 "control_number": cn,
@@ -1068,32 +1257,39 @@ def process_exit_from_file(
                 "action_display": action_display,
             }
         )
-
-        if not dry_run:
-            try:
-                if action == "mark_absent":
-                    attendance.status = "Ausente"
-                    attendance.attendance_percentage = 0.0
-                    attendance.check_in_time = None
-                    attendance.check_out_time = None
-                    attendance.is_paused = False
-                    attendance.pause_time = None
-                    attendance.resume_time = None
-                    db.session.add(attendance)
-                elif action == "delete":
-                    db.session.delete(attendance)
-                else:
-                    # unknown action -> skip
-                    summary["skipped"] += 1
-                    continue
-                summary["applied"] += 1
-            except Exception as e:
-                db.session.rollback()
-                summary["errors"].append({"control_number": cn, "message": str(e)})
+        matched_ids.append(attendance.id)
 
     if not dry_run:
+        if action not in ("mark_absent", "delete"):
+            # unknown action -> skip
+            summary["skipped"] += len(matched_ids)
+            matched_ids = []
         try:
+            # Aplicar la acción a todas las asistencias con una sentencia por bloque
+            for chunk in _chunked(matched_ids):
+                if action == "mark_absent":
+                    db.session.execute(
+                        db.update(Attendance)
+                        .where(Attendance.id.in_(chunk))
+                        .values(
+                            status="Ausente",
+                            attendance_percentage=0.0,
+                            check_in_time=None,
+                            check_out_time=None,
+                            is_paused=False,
+                            pause_time=None,
+                            resume_time=None,
+                        ),
+                        execution_options={"synchronize_session": "fetch"},
+                    )
+                else:
+                    db.session.execute(
+                        db.delete(Attendance).where(Attendance.id.in_(chunk)),
+                        execution_options={"synchronize_session": "fetch"},
+                    )
+            touch_activity_counters([activity_id])
             db.session.commit()
+            summary["applied"] = len(matched_ids)
         except Exception as e:
             db.session.rollback()
             summary["errors"].append(
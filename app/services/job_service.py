@@ -0,0 +1,204 @@
+"""Background jobs for long-running imports (local thread pool + ``jobs`` table).
+
+No external broker is needed: the request stores the upload in a temporary
+file, inserts a ``Job`` row and hands the work to a small in-process thread
+pool. Progress and the final report are written to the ``jobs`` table, so
+``GET /api/jobs/<id>`` can be answered by any gunicorn worker.
+
+Job functions receive the uploaded file (opened in binary mode) as first
+argument when there is one, a ``progress`` callable and their keyword
+arguments, and return the same summary dict the synchronous endpoint returns.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from flask import current_app
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Number of most recent detail rows kept in the progress snapshot
+PROGRESS_DETAILS_LIMIT = 50
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(app.config.get("JOB_WORKERS", 2) or 2)
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, workers), thread_name_prefix="eventostec-job"
+            )
+        return _executor
+
+
+def _update_job(job_id: str, **values) -> None:
+    """Write job columns on a dedicated connection (outside the ORM session).
+
+    The job function may be in the middle of its own transaction; progress
+    must not commit (or roll back) that work.
+    """
+    from app import db
+    from app.models.job import Job
+
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(Job)
+                .where(Job.id == job_id)
+                .values(updated_at=db.func.now(), **values)
+            )
+    except Exception as e:
+        current_app.logger.warning(f"[jobs] Could not update job {job_id}: {e}")
+
+
+def progress_snapshot(summary: dict) -> dict:
+    """Counters of a summary plus its most recent detail rows."""
+    snap = {
+        k: v
+        for k, v in summary.items()
+        if isinstance(v, (int, float, bool)) or v is None
+    }
+    details = summary.get("details")
+    if isinstance(details, list):
+        snap["details"] = details[-PROGRESS_DETAILS_LIMIT:]
+    return snap
+
+
+class JobProgress:
+    """Progress reporter passed to job functions as ``progress``.
+
+    Call it as ``progress(summary, processed=n, total=m)``; writes are
+    throttled to one every ``min_interval_seconds`` unless ``force=True``.
+    """
+
+    min_interval_seconds = 0.5
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def __call__(
+        self,
+        summary: Optional[dict] = None,
+        processed: Optional[int] = None,
+        total: Optional[int] = None,
+        force: bool = False,
+    ) -> None:
+        now = time.monotonic()
+        if not force and now - self._last < self.min_interval_seconds:
+            return
+        self._last = now
+
+        values: dict = {}
+        if processed is not None:
+            values["processed"] = int(processed)
+        if total is not None:
+            values["total"] = int(total)
+        if summary is not None:
+            values["progress"] = json.dumps(progress_snapshot(summary), default=str)
+        if values:
+            _update_job(self.job_id, **values)
+
+
+def submit_job(
+    kind: str,
+    func: Callable[..., Any],
+    upload=None,
+    user_id: Optional[int] = None,
+    **kwargs,
+):
+    """Create a queued job and run ``func`` in the background pool.
+
+    Args:
+        kind: Job type label (e.g. 'attendances_batch')
+        func: Callable returning the summary dict
+        upload: Optional binary stream; copied to a temp file before returning
+        user_id: Admin that launched the job (for audit)
+        **kwargs: Passed through to ``func``
+
+    Returns:
+        The persisted ``Job`` (status 'queued')
+    """
+    from app import db
+    from app.models.job import Job
+
+    upload_path = None
+    if upload is not None:
+        fd, upload_path = tempfile.mkstemp(prefix="eventostec-job-")
+        try:
+            upload.seek(0)
+        except Exception:
+            pass
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(upload, out)
+
+    job = Job()
+    job.id = uuid.uuid4().hex
+    job.kind = kind
+    job.status = "queued"
+    job.created_by_user_id = user_id
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _get_executor(app).submit(_run_job, app, job.id, func, upload_path, kwargs)
+    return job
+
+
+def _run_job(app, job_id, func, upload_path, kwargs) -> None:
+    from app import db
+    from app.models.job import Job
+
+    with app.app_context():
+        _update_job(job_id, status="running", started_at=db.func.now())
+        progress = JobProgress(job_id)
+        try:
+            if upload_path:
+                with open(upload_path, "rb") as fh:
+                    result = func(fh, progress=progress, **kwargs)
+            else:
+                result = func(progress=progress, **kwargs)
+
+            values = {
+                "status": "succeeded",
+                "processed": Job.total,
+                "result": json.dumps(result, default=str),
+                "finished_at": db.func.now(),
+            }
+            if isinstance(result, dict):
+                values["progress"] = json.dumps(progress_snapshot(result), default=str)
+            _update_job(job_id, **values)
+        except Exception as e:
+            current_app.logger.exception(f"[jobs] Job {job_id} failed")
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            _update_job(
+                job_id, status="failed", error=str(e), finished_at=db.func.now()
+            )
+        finally:
+            db.session.remove()
+            if upload_path:
+                try:
+                    os.remove(upload_path)
+                except OSError:
+                    pass
+
+
+def get_job(job_id: str):
+    """Return the ``Job`` row (fresh from the DB) or None."""
+    from app import db
+    from app.models.job import Job
+
+    job = db.session.get(Job, job_id, populate_existing=True)
+    return job
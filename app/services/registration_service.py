@@ -1,9 +1,34 @@
 from app.models.registration import Registration
 from app.models.activity import Activity
+from app.services.activity_counter_service import (
+    get_registered_count,
+    reserve_registration_slot,
+)
+from bisect import bisect_left
+from collections import defaultdict
 from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
 from app import db
 
 
+def _daily_range(day, activity_start, activity_end):
+    """Rango (inicio, fin) de una actividad en el día ``day`` (un ``date``)."""
+    range_start = datetime.combine(day, activity_start.time())
+    range_end = datetime.combine(day, activity_end.time())
+
+    # Horario diario que cruza la medianoche: termina al día siguiente
+    if range_end <= range_start:
+        range_end = range_end + timedelta(days=1)
+
+    # Respetar los datetimes exactos del primer/último día
+    if day == activity_start.date():
+        range_start = activity_start
+    if day == activity_end.date():
+        range_end = activity_end
+
+    return range_start, range_end
+
+
 def _get_daily_sessions(activity):
     """
     Genera una lista de tuplas (inicio, fin) para cada dia habil de una actividad.
@@ -16,21 +41,88 @@ def _get_daily_sessions(activity):
     start_date = activity.start_datetime.date()
     end_date = activity.end_datetime.date()
 
-    # Asumimos que la hora de inicio y fin diaria es la de start_datetime y end_datetime
-    daily_start_time = activity.start_datetime.time()
-    daily_end_time = activity.end_datetime.time()
-
     sessions = []
     current_date = start_date
     while current_date <= end_date:
-        session_start = datetime.combine(current_date, daily_start_time)
-        session_end = datetime.combine(current_date, daily_end_time)
-        sessions.append((session_start, session_end))
+        sessions.append(
+            _daily_range(current_date, activity.start_datetime, activity.end_datetime)
+        )
         current_date += timedelta(days=1)
 
     return sessions
 
 
+class ScheduleIndex:
+    """
+    Índice de las sesiones diarias de un conjunto de actividades.
+
+    Por cada día guarda las sesiones ordenadas por inicio junto con el máximo
+    acumulado de sus fines, de modo que saber si un rango se solapa con alguna
+    sesión de ese día cuesta una búsqueda binaria (O(log n)). Dos sesiones
+    sólo chocan si son del mismo día, igual que en ``check_multiday_overlap``.
+    """
+
+    def __init__(self, activities=()):
+        by_day = defaultdict(list)
+        for activity in activities:
+            for start, end in _get_daily_sessions(activity):
+                if start < end:
+                    by_day[start.date()].append((start, end, activity))
+
+        self._days = {}
+        for day, sessions in by_day.items():
+            sessions.sort(key=lambda session: session[0])
+            starts, max_ends, owners = [], [], []
+            latest = None
+            for start, end, activity in sessions:
+                if latest is None or end > latest[0]:
+                    latest = (end, activity)
+                starts.append(start)
+                max_ends.append(latest[0])
+                owners.append(latest[1])
+            self._days[day] = (starts, max_ends, owners)
+
+    def find_overlap(self, start, end):
+        """Actividad con una sesión del día de ``start`` que se solapa con el
+        rango, o None."""
+        entry = self._days.get(start.date())
+        if entry is None or end <= start:
+            return None
+        starts, max_ends, owners = entry
+        # Sesiones que empiezan antes de que termine el rango; basta con que
+        # la que termina más tarde siga abierta al inicio del rango
+        candidates = bisect_left(starts, end)
+        if candidates and max_ends[candidates - 1] > start:
+            return owners[candidates - 1]
+        return None
+
+    def find_conflict(self, activity):
+        """Primera actividad indexada que choca con alguna sesión de ``activity``."""
+        for start, end in _get_daily_sessions(activity):
+            conflict = self.find_overlap(start, end)
+            if conflict is not None:
+                return conflict
+        return None
+
+
+def _committed_activities_query(activity):
+    """Preregistros activos en actividades que pueden chocar con ``activity``.
+
+    Todas las sesiones de una actividad caen entre su inicio y su fin, así que
+    sólo se cargan las que se cruzan con ese intervalo.
+    """
+    return (
+        db.select(Registration.student_id, Activity)
+        .join(Activity, Registration.activity_id == Activity.id)
+        .where(
+            Registration.status.in_(["Registrado", "Confirmado"]),
+            Activity.id != activity.id,
+            Activity.start_datetime < activity.end_datetime,
+            Activity.end_datetime > activity.start_datetime,
+        )
+    )
+
+
 def has_schedule_conflict(student_id, new_activity_id):
     """
     Verifica si hay conflicto de horario para una nueva actividad.
@@ -41,45 +133,63 @@ def has_schedule_conflict(student_id, new_activity_id):
         if not new_activity:
             return False, "Actividad no encontrada"
 
-        # Obtener todas las actividades registradas del estudiante
-        # Usar el query del modelo (Flask-SQLAlchemy) en lugar de db.session.query
+        # Actividades registradas del estudiante que se cruzan con la nueva
         registered_activities = (
-            Activity.query.join(Registration)
-            .filter(
-                Registration.student_id == student_id,
-                Registration.status.in_(["Registrado", "Confirmado"]),
+            db.session.execute(
+                _committed_activities_query(new_activity).where(
+                    Registration.student_id == student_id
+                )
             )
+            .scalars(1)
             .all()
         )
 
-        new_start = new_activity.start_datetime
-        new_end = new_activity.end_datetime
-
-        for existing_activity in registered_activities:
-            existing_start = existing_activity.start_datetime
-            existing_end = existing_activity.end_datetime
-
-            # ✨ Manejar actividades multídias
-            if is_multi_day_activity(new_start, new_end) or is_multi_day_activity(
-                existing_start, existing_end
-            ):
-                # Verificar solapamiento día por día
-                if check_multiday_overlap(
-                    new_start, new_end, existing_start, existing_end
-                ):
-                    return True, f"Conflicto de horario con '{existing_activity.name}'"
-            else:
-                # Verificación de solapamiento normal
-                if check_normal_overlap(
-                    new_start, new_end, existing_start, existing_end
-                ):
-                    return True, f"Conflicto de horario con '{existing_activity.name}'"
+        existing_activity = ScheduleIndex(registered_activities).find_conflict(
+            new_activity
+        )
+        if existing_activity is not None:
+            return True, f"Conflicto de horario con '{existing_activity.name}'"
 
         return False, ""
     except Exception as e:
         return False, f"Error al verificar conflictos: {str(e)}"
 
 
+def find_schedule_conflicts(activity_id, student_ids=None):
+    """
+    Versión en bloque de ``has_schedule_conflict``: revisa una actividad
+    contra los preregistros de muchos estudiantes con una sola consulta.
+
+    Si ``student_ids`` es None revisa a todos los estudiantes. Retorna
+    ``{student_id: mensaje}`` sólo con los estudiantes que tienen conflicto.
+    """
+    activity = db.session.get(Activity, activity_id)
+    if not activity:
+        raise ValueError("Actividad no encontrada")
+
+    index = ScheduleIndex([activity])
+    query = _committed_activities_query(activity)
+    if student_ids is None:
+        chunks = [query]
+    else:
+        ids = list(dict.fromkeys(student_ids))
+        chunks = [
+            query.where(Registration.student_id.in_(ids[i : i + 500]))
+            for i in range(0, len(ids), 500)
+        ]
+
+    conflicts = {}
+    for chunk in chunks:
+        for student_id, existing_activity in db.session.execute(chunk):
+            if student_id in conflicts:
+                continue
+            if index.find_conflict(existing_activity) is not None:
+                conflicts[student_id] = (
+                    f"Conflicto de horario con '{existing_activity.name}'"
+                )
+    return conflicts
+
+
 def is_multi_day_activity(start_datetime, end_datetime):
     """Verifica si una actividad abarca múltiples días."""
     start_date = start_datetime.date()
@@ -135,30 +245,8 @@ def get_daily_range(target_date_str, activity_start, activity_end):
     Obtiene el rango de horas para una actividad en un día específico.
     target_date_str: 'YYYY-MM-DD'
     """
-    from datetime import datetime, timedelta
-
     target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date()
-
-    # Use the activity's time-of-day for the given target date.
-    start_time = activity_start.time()
-    end_time = activity_end.time()
-
-    # Base daily range: combine target date with activity times
-    range_start = datetime.combine(target_date, start_time)
-    range_end = datetime.combine(target_date, end_time)
-
-    # Handle activities that cross midnight within the same daily slot
-    if range_end <= range_start:
-        # If end time is earlier or equal to start time, assume it continues to next day
-        range_end = range_end + timedelta(days=1)
-
-    # Respect exact datetimes on first/last day to preserve potential partial-day edges
-    if target_date == activity_start.date():
-        range_start = activity_start
-    if target_date == activity_end.date():
-        range_end = activity_end
-
-    return range_start, range_end
+    return _daily_range(target_date, activity_start, activity_end)
 
 
 def check_normal_overlap(start1, end1, start2, end2):
@@ -184,10 +272,8 @@ def is_registration_allowed(activity_id):
     if activity.max_capacity is None:
         return True  # Sin cupo definido, permitir
 
-    # Contar preregistros confirmados
-    current_registrations = Registration.query.filter_by(
-        activity_id=activity_id, status="Registrado"
-    ).count()
+    # Preregistros en estado 'Registrado' (contador materializado)
+    current_registrations = get_registered_count(activity_id)
 
     return current_registrations < activity.max_capacity
 
@@ -212,9 +298,7 @@ def create_registration_simple(student_id, activity_id):
             activity.activity_type in ["Conferencia", "Taller", "Curso"]
             and activity.max_capacity is not None
         ):
-            current_registrations = Registration.query.filter_by(
-                activity_id=activity_id, status="Registrado"
-            ).count()
+            current_registrations = get_registered_count(activity_id)
             if current_registrations >= activity.max_capacity:
                 return False, "Cupo lleno para esta actividad."
 
@@ -256,106 +340,272 @@ def create_registration_atomic(student_id, activity_id):
     Retorna (True, registration) si se creó, (False, message) si no es posible.
 
     Implementación:
-    - Inicia una transacción.
-    - Bloquea la fila de Activity (SELECT FOR UPDATE) cuando el dialecto lo soporte.
-    - Recalcula la cantidad de registros y compara con max_capacity.
-    - Crea el Registration y hace commit.
-
-    Nota: en SQLite el FOR UPDATE no tiene efecto; aun así, la UniqueConstraint en
-    `registrations` evita duplicados del mismo estudiante, pero para evitar
-    sobrepasar el cupo en entornos concurrentes se recomienda usar una DB con
-    soporte de row-level locking (Postgres). Aquí se hace lo mejor posible con
-    SQLAlchemy y transacciones.
+    - Si el contador ya marca el cupo lleno, rechaza sin escribir nada.
+    - Reserva un lugar con un UPDATE condicional sobre `activity_counters`
+      (`registered = registered + 1 WHERE registered < max_capacity`); la base
+      de datos decide si queda cupo sin bloquear la actividad (FOR UPDATE) ni
+      contar los preregistros.
+    - Crea (o reactiva) el Registration en la misma transacción y hace commit.
+    - Si la escritura falla (p. ej. preregistro duplicado por una petición
+      concurrente), el rollback devuelve el lugar reservado.
     """
     from app import db
 
+    session = db.session
     try:
-        # Abrir transacción
-        with db.session.begin_nested():
-            # Intentar obtener la actividad con bloqueo de fila si está soportado
-            session = db.session
-            # Obtener el 'bind' de forma robusta: preferir session.get_bind()
-            # y caer a session.bind o al engine global si es necesario.
-            try:
-                bind = session.get_bind()
-            except Exception:
-                bind = getattr(session, "bind", None)
-
-            if bind is None:
-                # Fallback al engine global (por ejemplo en tests o contextos especiales)
-                from app import db as _db
-
-                bind = getattr(_db, "engine", None)
-
-            dialect_name = None
-            try:
-                dialect_name = bind.dialect.name if bind is not None else None
-            except Exception:
-                dialect_name = None
-
-            if dialect_name in ("postgresql", "mysql"):
-                # Usar FOR UPDATE para evitar race conditions
-                activity = session.execute(
-                    db.select(Activity)
-                    .where(Activity.id == activity_id)
-                    .with_for_update()
-                ).scalar_one_or_none()
-            else:
-                # Para SQLite y otros, caer al get normal
-                activity = session.get(Activity, activity_id)
-
-            if not activity:
-                return False, "Actividad no encontrada"
-
-            if activity.activity_type not in ["Conferencia", "Taller", "Curso"]:
-                # No aplica cupo
-                pass
+        activity = session.get(Activity, activity_id)
+        if not activity:
+            return False, "Actividad no encontrada"
 
-            if activity.max_capacity is None:
-                # No hay límite
-                pass
-            else:
-                # Recalcular cantidad de preregistros actuales dentro de la transacción
-                current_registrations = (
-                    session.query(Registration)
-                    .filter_by(activity_id=activity_id, status="Registrado")
-                    .count()
-                )
+        existing = (
+            session.query(Registration)
+            .filter_by(student_id=student_id, activity_id=activity_id)
+            .first()
+        )
+        if existing and existing.status != "Cancelado":
+            return False, "Ya existe un preregistro para esta actividad"
 
-                if current_registrations >= activity.max_capacity:
-                    return False, "Cupo lleno para esta actividad."
+        # Validar cupo si aplica (Magistrales y actividades sin límite no reservan)
+        if (
+            activity.activity_type in ["Conferencia", "Taller", "Curso"]
+            and activity.max_capacity is not None
+        ):
+            # Lectura sin bloqueo: si ya está lleno no se abre una escritura
+            full = get_registered_count(activity_id) >= activity.max_capacity
+            if full or not reserve_registration_slot(
+                activity_id, activity.max_capacity, session=session
+            ):
+                session.rollback()
+                return False, "Cupo lleno para esta actividad."
 
-            # Verificar si el estudiante ya tiene un registro (UniqueConstraint protege, pero mejor chequear)
-            existing = (
-                session.query(Registration)
-                .filter_by(student_id=student_id, activity_id=activity_id)
-                .first()
-            )
-            if existing:
-                # Si existe y está cancelado, reactivar
-                if existing.status == "Cancelado":
-                    existing.status = "Registrado"
-                    existing.registration_date = db.func.now()
-                    existing.confirmation_date = None
-                    existing.attended = False
-                    session.add(existing)
-                    session.commit()
-                    return True, existing
-                else:
-                    return False, "Ya existe un preregistro para esta actividad"
-
-            # Crear nuevo preregistro
+        if existing:
+            # Si existe y está cancelado, reactivar
+            reg = existing
+            reg.status = "Registrado"
+            reg.registration_date = db.func.now()
+            reg.confirmation_date = None
+            reg.attended = False
+        else:
             reg = Registration()
             reg.student_id = student_id
             reg.activity_id = activity_id
             reg.status = "Registrado"
             session.add(reg)
-            # Commit de la transacción
-        # Si llegamos aquí, commit automático del context manager
+        session.commit()
         return True, reg
+    except IntegrityError:
+        # Otra petición creó el mismo preregistro primero
+        session.rollback()
+        return False, "Ya existe un preregistro para esta actividad"
     except Exception as e:
         try:
-            db.session.rollback()
+            session.rollback()
         except Exception:
             pass
         return False, str(e)
+
+
+# Estados que ocultan a un participante en el listado público
+_HIDDEN_REGISTRATION_STATUSES = ("Ausente", "Cancelado")
+
+
+def _encode_cursor(key):
+    import base64
+    import json
+
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    import base64
+    import json
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if isinstance(key, list) and len(key) == 5:
+            return key
+    except Exception:
+        pass
+    raise ValueError("cursor inválido")
+
+
+def _activity_participants_subquery(activity_id):
+    """UNION de preregistros vigentes y asistencias sin preregistro.
+
+    Cada fila expone las columnas del listado público más las llaves de
+    orden: ``cn_len``/``cn`` (número de control, ordenado por longitud y luego
+    lexicográficamente: equivale a rellenar con ceros a la izquierda),
+    ``sort_name``, ``source`` y ``row_id``; juntas forman una llave única
+    usable como cursor.
+    """
+    from app.models.attendance import Attendance
+    from app.models.student import Student
+
+    reg_student = db.aliased(Student)
+    att_student = db.aliased(Student)
+
+    visible_registration = db.or_(
+        Registration.status.is_(None),
+        ~Registration.status.in_(_HIDDEN_REGISTRATION_STATUSES),
+    )
+
+    reg_cn = db.func.coalesce(reg_student.control_number, "")
+    registrations = (
+        db.select(
+            db.literal("registration").label("source"),
+            Registration.id.label("row_id"),
+            Registration.id.label("registration_id"),
+            Attendance.id.label("attendance_id"),
+            reg_student.id.label("student_id"),
+            reg_student.control_number.label("control_number"),
+            reg_student.full_name.label("student_name"),
+            reg_student.email.label("email"),
+            db.type_coerce(Registration.status, db.String).label("status"),
+            Registration.attended.label("attended"),
+            Registration.registration_date.label("registration_date"),
+            Attendance.check_in_time.label("check_in_time"),
+            db.func.length(reg_cn).label("cn_len"),
+            reg_cn.label("cn"),
+            db.func.coalesce(reg_student.full_name, "").label("sort_name"),
+        )
+        .select_from(Registration)
+        .outerjoin(reg_student, reg_student.id == Registration.student_id)
+        .outerjoin(
+            Attendance,
+            db.and_(
+                Attendance.student_id == Registration.student_id,
+                Attendance.activity_id == Registration.activity_id,
+            ),
+        )
+        .where(Registration.activity_id == activity_id, visible_registration)
+    )
+
+    has_visible_registration = (
+        db.select(Registration.id)
+        .where(
+            Registration.activity_id == Attendance.activity_id,
+            Registration.student_id == Attendance.student_id,
+            visible_registration,
+        )
+        .exists()
+    )
+    att_cn = db.func.coalesce(att_student.control_number, "")
+    attendances = (
+        db.select(
+            db.literal("attendance").label("source"),
+            Attendance.id.label("row_id"),
+            db.null().label("registration_id"),
+            Attendance.id.label("attendance_id"),
+            att_student.id.label("student_id"),
+            att_student.control_number.label("control_number"),
+            att_student.full_name.label("student_name"),
+            att_student.email.label("email"),
+            db.type_coerce(Attendance.status, db.String).label("status"),
+            db.true().label("attended"),
+            db.null().label("registration_date"),
+            Attendance.check_in_time.label("check_in_time"),
+            db.func.length(att_cn).label("cn_len"),
+            att_cn.label("cn"),
+            db.func.coalesce(att_student.full_name, "").label("sort_name"),
+        )
+        .select_from(Attendance)
+        .outerjoin(att_student, att_student.id == Attendance.student_id)
+        .where(
+            Attendance.activity_id == activity_id,
+            db.or_(Attendance.status.is_(None), Attendance.status != "Ausente"),
+            ~has_visible_registration,
+        )
+    )
+
+    # ``status`` mezcla dos Enum distintos: se expone como texto plano
+    return db.union_all(registrations, attendances).subquery("participants")
+
+
+def list_activity_participants(activity_id, q=None, page=1, per_page=20, cursor=None):
+    """Lista paginada de participantes (preregistros + asistencias) de una actividad.
+
+    El filtrado (``q`` sobre número de control o nombre), el orden y la
+    paginación se resuelven en SQL, así que el costo por página no depende
+    del tamaño de la actividad.
+
+    Args:
+        activity_id: ID de la actividad
+        q: Texto a buscar (subcadena, sin distinguir mayúsculas)
+        page: Página (base 1) cuando no se usa ``cursor``
+        per_page: Tamaño de página
+        cursor: ``next_cursor`` de una respuesta previa (paginación keyset);
+            si se indica, ``page`` se ignora
+
+    Returns:
+        dict con ``items`` (filas como dict), ``total`` y ``next_cursor``
+        (None en la última página)
+
+    Raises:
+        ValueError: Si ``cursor`` no es válido
+    """
+    from app.utils.datetime_utils import safe_iso
+
+    p = _activity_participants_subquery(activity_id)
+    sort_cols = (p.c.cn_len, p.c.cn, p.c.sort_name, p.c.source, p.c.row_id)
+
+    filters = []
+    q = (q or "").strip()
+    if q:
+        pattern = f"%{q.lower()}%"
+        filters.append(
+            db.or_(
+                db.func.lower(p.c.cn).like(pattern),
+                db.func.lower(p.c.sort_name).like(pattern),
+            )
+        )
+
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(p).where(*filters)
+    ).scalar_one()
+
+    stmt = db.select(p).where(*filters).order_by(*sort_cols)
+    if cursor:
+        stmt = stmt.where(db.tuple_(*sort_cols) > db.tuple_(*_decode_cursor(cursor)))
+    else:
+        stmt = stmt.offset(max(page - 1, 0) * per_page)
+    # Pedir una fila extra para saber si hay siguiente página
+    rows = db.session.execute(stmt.limit(per_page + 1)).mappings().all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = _encode_cursor(
+            (
+                last["cn_len"],
+                last["cn"],
+                last["sort_name"],
+                last["source"],
+                last["row_id"],
+            )
+        )
+
+    items = []
+    for r in rows:
+        items.append(
+            {
+                "id": r["registration_id"],
+                "registration_id": r["registration_id"],
+                "attendance_id": r["attendance_id"],
+                "student_id": r["student_id"],
+                "control_number": r["control_number"],
+                "student_name": r["student_name"],
+                "email": r["email"],
+                "status": r["status"],
+                "attended": bool(r["attended"]),
+                "registration_date": safe_iso(r["registration_date"]),
+                "check_in_time": safe_iso(r["check_in_time"]),
+                "notes": None,
+                "source": r["source"],
+            }
+        )
+
+    return {"items": items, "total": total, "next_cursor": next_cursor}
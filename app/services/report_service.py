@@ -0,0 +1,281 @@
+"""Reportes agregados con caché en memoria.
+
+La matriz de participación (carrera × generación / semestre) se calcula
+leyendo solo las columnas necesarias de los estudiantes distintos con un
+preregistro válido y contando por grupo, en lugar de hidratar pares
+``(Registration, Student)`` completos.
+
+El resultado se guarda por ``(event_id, activity_id)`` durante
+``PARTICIPATION_MATRIX_CACHE_SECONDS`` (300 s por defecto; 0 desactiva la
+caché). Al confirmar (commit) una escritura sobre preregistros, estudiantes,
+actividades o eventos se vacía la caché local y se incrementa la generación
+compartida ``participation_matrix`` (tabla ``cache_generations``); cada worker
+la compara antes de servir una entrada, así que los demás workers también
+recalculan en la siguiente petición. Las escrituras Core que no pasan por los
+eventos del ORM (p. ej. ``student_service.upsert_students``) llaman a
+``mark_participation_matrix_dirty``.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.activity import Activity
+from app.models.cache_generation import CacheGeneration
+from app.models.event import Event
+from app.models.registration import Registration
+from app.models.student import Student
+from app.utils.datetime_utils import get_app_timezone, localize_naive_datetime
+from app.utils.ttl_cache import TTLCache
+
+DEFAULT_MATRIX_CACHE_SECONDS = 300
+
+# Estados que no cuentan como participación
+EXCLUDED_STATUSES = ("Ausente", "Cancelado")
+
+# Generación: primeros dos dígitos consecutivos del número de control
+_GENERATION_RE = re.compile(r"(\d{2})")
+
+_DIRTY_KEY = "participation_matrix_dirty"
+_GENERATION_NAME = "participation_matrix"
+_WATCHED = (Registration, Student, Activity, Event)
+
+
+# (generación compartida, matriz) por (event_id, activity_id); local al proceso
+_matrix_cache = TTLCache(ttl=DEFAULT_MATRIX_CACHE_SECONDS, maxsize=128)
+
+
+def invalidate_participation_matrix() -> None:
+    """Descarta todas las matrices en caché (de este proceso)."""
+    _matrix_cache.clear()
+
+
+def mark_participation_matrix_dirty(session=None) -> None:
+    """Invalida la matriz al confirmar la transacción actual.
+
+    Para escrituras que no pasan por los eventos del ORM (sentencias Core
+    sobre ``session.connection()``).
+    """
+    (session or db.session).info[_DIRTY_KEY] = True
+
+
+def _read_generation() -> Optional[int]:
+    try:
+        return CacheGeneration.current(_GENERATION_NAME)
+    except Exception as e:
+        # Sin la generación se sirve la caché hasta su TTL
+        current_app.logger.warning(f"[report_service] Cannot read generation: {e}")
+        return None
+
+
+def _bump_generation() -> None:
+    """Avisa a los demás workers. Conexión propia y corta: la fila no queda
+    bloqueada mientras dura la transacción que hizo el cambio."""
+    try:
+        with db.engine.begin() as conn:
+            CacheGeneration.bump(_GENERATION_NAME, conn)
+    except Exception as e:
+        current_app.logger.warning(f"[report_service] Cannot bump generation: {e}")
+
+
+# --- Invalidación por cambios en la base de datos ---------------------------
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _mark_dirty_on_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _WATCHED):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+@sa_event.listens_for(Session, "do_orm_execute")
+def _mark_dirty_on_bulk(orm_execute_state):
+    # UPDATE/DELETE/INSERT en bloque no pasan por el flush
+    if not (
+        orm_execute_state.is_update
+        or orm_execute_state.is_delete
+        or orm_execute_state.is_insert
+    ):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, _WATCHED):
+        orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        invalidate_participation_matrix()
+        _bump_generation()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+# --- Cálculo ----------------------------------------------------------------
+
+
+def _reference_date(event_id, activity_id):
+    """Inicio de la actividad o del evento (aware); ahora si no hay filtro."""
+    start = None
+    if activity_id:
+        start = db.session.scalar(
+            db.select(Activity.start_datetime).where(Activity.id == activity_id)
+        )
+    elif event_id:
+        start = db.session.scalar(
+            db.select(Event.start_date).where(Event.id == event_id)
+        )
+    if start is not None:
+        ref_date = localize_naive_datetime(start, get_app_timezone())
+        if ref_date is not None:
+            return ref_date
+    return datetime.now(timezone.utc)
+
+
+def semester_for_generation(gen: str, ref_date) -> str:
+    """Semestre estimado para una generación ("23") a la fecha de referencia.
+
+    Semestre 1 = Ago-Dic del año de ingreso; semestre 2 = Ene-Jun siguiente.
+    """
+    if not gen:
+        return ""
+    ingreso_year = 2000 + int(gen)
+    event_sem_offset = 1 if 8 <= ref_date.month <= 12 else 2
+    years_since = max(0, ref_date.year - ingreso_year)
+    return str(years_since * 2 + event_sem_offset)
+
+
+def _participant_rows(event_id, activity_id):
+    """(career, control_number) de cada estudiante distinto que participa."""
+    query = (
+        db.select(Student.id, Student.career, Student.control_number)
+        .join(Registration, Registration.student_id == Student.id)
+        .where(
+            db.or_(
+                Registration.status.is_(None),
+                Registration.status.notin_(EXCLUDED_STATUSES),
+            )
+        )
+        .distinct()
+    )
+    if activity_id:
+        query = query.where(Registration.activity_id == activity_id)
+    elif event_id:
+        query = query.join(Activity, Activity.id == Registration.activity_id).where(
+            Activity.event_id == event_id
+        )
+    return db.session.execute(query)
+
+
+def compute_participation_matrix(
+    event_id: Optional[int] = None, activity_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Calcula la matriz de participación sin usar la caché.
+
+    Cuenta estudiantes únicos por carrera × generación y carrera × semestre.
+    ``activity_id`` tiene prioridad sobre ``event_id``; sin ninguno se
+    consideran todos los preregistros.
+    """
+    ref_date = _reference_date(event_id, activity_id)
+
+    # Cada fila es un estudiante distinto: contar filas = contar únicos
+    by_generation: Counter = Counter()
+    for _student_id, career, control_number in _participant_rows(event_id, activity_id):
+        m = _GENERATION_RE.search(control_number or "")
+        by_generation[(career or "Sin Especificar", m.group(1) if m else "")] += 1
+
+    # El semestre solo depende de la generación: se calcula una vez por grupo
+    semester_of = {
+        gen: semester_for_generation(gen, ref_date) for _, gen in by_generation
+    }
+    by_semester: Counter = Counter()
+    for (career, gen), count in by_generation.items():
+        if semester_of[gen]:
+            by_semester[(career, semester_of[gen])] += count
+
+    matrix: Dict[str, Dict[str, int]] = {}
+    for (career, gen), count in by_generation.items():
+        matrix.setdefault(career, {})[gen] = count
+    matrix_semester: Dict[str, Dict[str, int]] = {}
+    for (career, sem), count in by_semester.items():
+        matrix_semester.setdefault(career, {})[sem] = count
+
+    careers = sorted(matrix)
+    generations_set = set(semester_of)
+    # Ordenar generaciones numéricamente; la vacía va primero
+    generations = sorted((g for g in generations_set if g != ""), key=int)
+    if "" in generations_set:
+        generations.insert(0, "")
+    semesters = sorted({sem for _, sem in by_semester}, key=int)
+
+    # Subtotales por carrera y por columna (semestre si hay, si no generación)
+    matrix_headers = semesters if semesters else generations
+    source = matrix_semester if semesters else matrix
+    rowSubtotals = {}
+    columnSubtotals = {h: 0 for h in matrix_headers}
+    matrix_rows = []
+    for career in careers:
+        values = [source.get(career, {}).get(h, 0) for h in matrix_headers]
+        for h, v in zip(matrix_headers, values):
+            columnSubtotals[h] += v
+        rowSubtotals[career] = sum(values)
+        matrix_rows.append([career, *values, rowSubtotals[career]])
+    grandTotal = sum(rowSubtotals.values())
+
+    matrix_footer: List[Any] = [
+        "Total",
+        *(columnSubtotals[h] for h in matrix_headers),
+        grandTotal,
+    ]
+
+    return {
+        "careers": careers,
+        "generations": generations,
+        "matrix": matrix,
+        "semesters": semesters,
+        "matrix_semester": matrix_semester,
+        "rowSubtotals": rowSubtotals,
+        "columnSubtotals": columnSubtotals,
+        "grandTotal": grandTotal,
+        # simplified table structure for frontend
+        "matrix_headers": matrix_headers,
+        "matrix_rows": matrix_rows,
+        "matrix_footer": matrix_footer,
+    }
+
+
+def get_participation_matrix(
+    event_id: Optional[int] = None, activity_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Matriz de participación, desde la caché cuando está vigente."""
+    ttl = float(
+        current_app.config.get(
+            "PARTICIPATION_MATRIX_CACHE_SECONDS", DEFAULT_MATRIX_CACHE_SECONDS
+        )
+        or 0
+    )
+    if ttl <= 0:
+        return compute_participation_matrix(event_id, activity_id)
+
+    key = (event_id, activity_id)
+    # Leída antes de calcular: si otro worker la incrementa mientras tanto,
+    # la entrada queda con la generación anterior y se recalcula después
+    shared = _read_generation()
+    entry = _matrix_cache.get(key, ttl=ttl)
+    if entry is not None and entry[0] == shared:
+        return entry[1]
+
+    generation = _matrix_cache.generation
+    payload = compute_participation_matrix(event_id, activity_id)
+    _matrix_cache.set(key, (shared, payload), generation=generation)
+    return payload
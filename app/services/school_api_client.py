@@ -0,0 +1,243 @@
+"""Shared HTTP client for the school API (``apps.tecvalles.mx:8091``).
+
+Every call to the school API (student validation, login, search) goes
+through one ``SchoolApiClient`` per app:
+
+- a keep-alive ``requests.Session`` with a bounded connection pool, so calls
+  reuse TCP connections instead of opening one each time;
+- per-endpoint ``(connect, read)`` timeouts;
+- a circuit breaker: after ``failure_threshold`` consecutive failures
+  (transport errors or HTTP 5xx) calls fail fast with ``SchoolApiUnavailable``
+  for ``reset_seconds``; then a single trial call decides whether to close it
+  again. During an outage workers are not tied up waiting for timeouts;
+- per-endpoint call/error/latency counters (``stats()``, per process).
+
+Callers handle ``SchoolApiUnavailable`` (answer 503 or record the error) and
+read the returned ``requests.Response`` as before.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "http://apps.tecvalles.mx:8091"
+
+# Endpoint name -> path
+ENDPOINTS = {
+    "validate": "/api/validate/student",  # GET ?username= (lookup)
+    "login": "/api/validate/student",  # POST {username, password}
+    "search": "/api/estudiantes",  # GET ?search=
+}
+
+# Endpoint name -> (connect, read) timeout in seconds
+DEFAULT_TIMEOUTS = {
+    "validate": (2.0, 6.0),
+    "login": (2.0, 8.0),
+    "search": (2.0, 8.0),
+}
+
+Timeout = Union[float, Tuple[float, float]]
+
+_init_lock = threading.Lock()
+_default_client: Optional["SchoolApiClient"] = None
+
+
+class SchoolApiUnavailable(Exception):
+    """The school API could not be reached (or the circuit is open)."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if now - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (one trial call when half-open)."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                # Trial failed or threshold reached: (re)open
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class _EndpointStats:
+    __slots__ = ("calls", "errors", "rejected", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def to_dict(self) -> dict:
+        completed = self.calls - self.rejected
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_ms / completed, 1) if completed else None,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class SchoolApiClient:
+    """Pooled, circuit-broken client for the school API (thread-safe)."""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = 10,
+        timeouts: Optional[Dict[str, Timeout]] = None,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, int(pool_size)), max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stats: Dict[str, _EndpointStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def url(self, endpoint: str) -> str:
+        return self.base_url + ENDPOINTS[endpoint]
+
+    def get(self, endpoint: str, timeout: Optional[Timeout] = None, **kwargs):
+        return self.request("GET", endpoint, timeout=timeout, **kwargs)
+
+    def post(self, endpoint: str, timeout: Optional[Timeout] = None, **kwargs):
+        return self.request("POST", endpoint, timeout=timeout, **kwargs)
+
+    def request(
+        self, method: str, endpoint: str, timeout: Optional[Timeout] = None, **kwargs
+    ) -> requests.Response:
+        """Send a request to a named endpoint.
+
+        ``timeout`` overrides the endpoint default. Raises
+        ``SchoolApiUnavailable`` on transport errors or when the circuit is
+        open; HTTP error statuses are returned to the caller (5xx also count
+        as failures for the breaker).
+        """
+        if not self.breaker.allow():
+            self._record(endpoint, rejected=True)
+            raise SchoolApiUnavailable(
+                "Servicio externo no disponible (circuito abierto)"
+            )
+
+        started = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method,
+                self.url(endpoint),
+                timeout=timeout if timeout is not None else self.timeouts[endpoint],
+                **kwargs,
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            self._record(endpoint, started=started, error=True)
+            raise SchoolApiUnavailable(str(e)) from e
+
+        failed = resp.status_code >= 500
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._record(endpoint, started=started, error=failed)
+        return resp
+
+    def _record(self, endpoint, started=None, error=False, rejected=False) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.rejected += int(rejected)
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def stats(self) -> dict:
+        """Per-endpoint counters plus the breaker state (this process only)."""
+        with self._stats_lock:
+            endpoints = {name: s.to_dict() for name, s in self._stats.items()}
+        return {"circuit": self.breaker.state, "endpoints": endpoints}
+
+
+def get_school_api(app=None) -> SchoolApiClient:
+    """The app's shared client (created on first use from the app config).
+
+    Outside an app context a process-wide client with the defaults is used.
+    """
+    global _default_client
+    if app is None:
+        from flask import current_app, has_app_context
+
+        if not has_app_context():
+            with _init_lock:
+                if _default_client is None:
+                    _default_client = SchoolApiClient()
+                return _default_client
+        app = current_app._get_current_object()
+    client = app.extensions.get("school_api")
+    if client is None:
+        with _init_lock:
+            client = app.extensions.get("school_api")
+            if client is None:
+                config = app.config
+                client = SchoolApiClient(
+                    base_url=config.get("SCHOOL_API_BASE_URL", DEFAULT_BASE_URL),
+                    pool_size=config.get("SCHOOL_API_POOL_SIZE", 10),
+                    timeouts=config.get("SCHOOL_API_TIMEOUTS"),
+                    failure_threshold=config.get("SCHOOL_API_FAILURE_THRESHOLD", 5),
+                    reset_seconds=config.get("SCHOOL_API_RESET_SECONDS", 30),
+                )
+                app.extensions["school_api"] = client
+    return client
@@ -1,6 +1,9 @@
 """Settings manager service for hierarchical configuration (ENV > BD > Cache > Defaults)."""
 
 import os
+import threading
+import time
+import weakref
 from typing import Any, Optional
 from datetime import datetime
 from flask import current_app
@@ -17,15 +20,41 @@ class SettingsManager:
 
     Features:
     - Automatic locking if ENV variable is set (UI cannot override)
-    - In-memory caché with configurable TTL (default 10 seconds)
+    - In-memory snapshot of all settings, loaded with one query per refresh
+      and kept for a TTL (default 10 seconds)
+    - Cross-worker invalidation: ``set_in_db`` bumps the generation counter in
+      ``app_settings_version``; workers compare it (once per request, or every
+      ``_version_check_interval_seconds`` outside requests) and reload the
+      snapshot as soon as it changes
+    - Hit/miss metrics via ``cache_stats()``
     - Automatic fallback to defaults if BD unavailable
     - Type conversion (string, integer, boolean, timezone)
     - Input validation before storing in BD
     """
 
-    # In-memory cache: {key: (value, timestamp)}
+    # In-memory snapshot of BD settings: {key: (value, timestamp)}
     _cache = {}
     _cache_ttl_seconds = 10
+    # When the snapshot was loaded (None = never / invalidated)
+    _cache_loaded_at: Optional[datetime] = None
+    # Generation (app_settings_version.version) the snapshot corresponds to
+    _cache_version: Optional[int] = None
+    # Weak reference to the Flask app the snapshot was loaded for: tests and
+    # CLI scripts may create several apps (and databases) in one process
+    _cache_owner = None
+    # Outside a request context, re-check the generation at most this often
+    _version_check_interval_seconds = 1.0
+    _last_version_check: Optional[float] = None
+    _lock = threading.RLock()
+    _stats = {
+        "hits": 0,
+        "misses": 0,
+        "refreshes": 0,
+        "version_checks": 0,
+        "invalidations": 0,
+    }
+    # request.environ marker: generation already checked for this request
+    _REQUEST_MARKER = "eventostec.settings_version_checked"
 
     @classmethod
     def get(cls, key: str, default: Any = None) -> Any:
@@ -104,17 +133,18 @@ class SettingsManager:
         # Validate the value according to its type
         cls._validate_value(value, setting.data_type)
 
-        # Update BD
+        # Update BD (value + generation counter in the same transaction)
         try:
             setting.value = str(value)
             setting.updated_at = datetime.utcnow()
             setting.updated_by_user_id = user_id
+            cls._bump_version()
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             raise RuntimeError(f"Failed to update setting '{key}': {e}")
 
-        # Invalidate cache for this key
+        # Invalidate the local snapshot; other workers notice the new version
         cls._invalidate_cache(key)
 
         current_app.logger.info(
@@ -123,40 +153,192 @@ class SettingsManager:
 
         return True
 
+    @classmethod
+    def is_locked_by_env(cls, key: str) -> bool:
+        """Return True if an environment variable overrides ``key``."""
+        return os.environ.get(cls._env_key_for(key)) is not None
+
+    @classmethod
+    def cache_stats(cls, reset: bool = False) -> dict:
+        """Return cache metrics for this worker.
+
+        ``hits``: reads served from the snapshot; ``misses``: reads that had
+        to reload it; ``refreshes``: full reloads (one query each);
+        ``version_checks``: generation lookups; ``invalidations``: local
+        invalidations (``set_in_db`` or explicit).
+        """
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats["size"] = len(cls._cache)
+            stats["version"] = cls._cache_version
+            stats["ttl_seconds"] = cls._cache_ttl_seconds
+            stats["age_seconds"] = (
+                (datetime.utcnow() - cls._cache_loaded_at).total_seconds()
+                if cls._cache_loaded_at is not None
+                else None
+            )
+            if reset:
+                for k in cls._stats:
+                    cls._stats[k] = 0
+        return stats
+
     @classmethod
     def _get_from_cache(cls, key: str) -> Optional[Any]:
-        """Get value from cache if fresh, else read from BD and cache."""
+        """Get value from the settings snapshot, reloading it when stale.
+
+        The snapshot is reloaded (all settings in one query) when it was never
+        loaded, when the entry (or, for keys absent from BD, the snapshot) is
+        older than the TTL, or when another worker bumped the generation.
+        """
         now = datetime.utcnow()
 
-        # Return cached value if still fresh
-        if key in cls._cache:
-            cached_value, cached_time = cls._cache[key]
-            if (now - cached_time).total_seconds() < cls._cache_ttl_seconds:
-                return cached_value
+        with cls._lock:
+            app = current_app._get_current_object()
+            owner = cls._cache_owner() if cls._cache_owner is not None else None
+            if owner is not app:
+                cls._reset_snapshot()
+                cls._cache_owner = weakref.ref(app)
+
+            entry = cls._cache.get(key)
+            loaded_at = entry[1] if entry is not None else cls._cache_loaded_at
+            stale = (
+                loaded_at is None
+                or (now - loaded_at).total_seconds() >= cls._cache_ttl_seconds
+            )
+            if not stale and cls._version_check_due():
+                stale = cls._read_version() != cls._cache_version
+
+            if not stale:
+                cls._stats["hits"] += 1
+                return entry[0] if entry is not None else None
+
+            cls._stats["misses"] += 1
+            if not cls._refresh(now):
+                return None
+            entry = cls._cache.get(key)
+            return entry[0] if entry is not None else None
 
-        # Cache stale or missing: read from BD
+    @classmethod
+    def _refresh(cls, now: datetime) -> bool:
+        """Reload the whole snapshot from BD. Returns False if BD failed."""
         from app.models.app_setting import AppSetting
 
         try:
-            setting = AppSetting.find_by_key(key)
+            # Read the generation first: a concurrent bump makes the next
+            # check reload again instead of keeping a stale snapshot
+            version = cls._read_version()
+            settings = AppSetting.query.all()
+        except Exception as e:
+            current_app.logger.warning(
+                f"[SettingsManager] Error reading settings from BD: {e}"
+            )
+            return False
+
+        snapshot = {}
+        for setting in settings:
+            if setting.value is None:
+                continue
+            try:
+                snapshot[setting.key] = (
+                    cls._parse_value(setting.value, setting.data_type),
+                    now,
+                )
+            except Exception as e:
+                current_app.logger.warning(
+                    f"[SettingsManager] Invalid value for '{setting.key}' in BD: {e}"
+                )
+
+        cls._cache = snapshot
+        cls._cache_loaded_at = now
+        cls._cache_version = version
+        cls._last_version_check = time.monotonic()
+        cls._stats["refreshes"] += 1
+        return True
+
+    @classmethod
+    def _version_check_due(cls) -> bool:
+        """Whether the generation counter should be compared now.
+
+        Once per request (so an edit in another worker applies on the next
+        request) and, outside requests, every
+        ``_version_check_interval_seconds``.
+        """
+        from flask import has_request_context, request
+
+        if has_request_context():
+            if request.environ.get(cls._REQUEST_MARKER):
+                return False
+            request.environ[cls._REQUEST_MARKER] = True
+            return True
+
+        now = time.monotonic()
+        if (
+            cls._last_version_check is None
+            or now - cls._last_version_check >= cls._version_check_interval_seconds
+        ):
+            cls._last_version_check = now
+            return True
+        return False
 
-            if setting and setting.value is not None:
-                parsed_value = cls._parse_value(setting.value, setting.data_type)
-                cls._cache[key] = (parsed_value, now)
-                return parsed_value
+    @classmethod
+    def _read_version(cls) -> Optional[int]:
+        """Current generation from ``app_settings_version`` (0 if no row)."""
+        from app.models.app_setting import AppSettingsVersion
+        from app import db
+
+        cls._stats["version_checks"] += 1
+        try:
+            version = (
+                db.session.query(AppSettingsVersion.version)
+                .filter(AppSettingsVersion.id == 1)
+                .scalar()
+            )
         except Exception as e:
             current_app.logger.warning(
-                f"[SettingsManager] Error reading setting '{key}' from BD: {e}"
+                f"[SettingsManager] Error reading settings version: {e}"
             )
+            return cls._cache_version
+        return int(version or 0)
 
-        return None
+    @classmethod
+    def _bump_version(cls) -> None:
+        """Increment the generation counter in the current transaction."""
+        from app.models.app_setting import AppSettingsVersion
+        from app import db
+
+        result = db.session.execute(
+            db.update(AppSettingsVersion)
+            .where(AppSettingsVersion.id == 1)
+            .values(
+                version=AppSettingsVersion.version + 1,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        if not result.rowcount:
+            row = AppSettingsVersion()
+            row.id = 1
+            row.version = 1
+            db.session.add(row)
 
     @classmethod
-    def _invalidate_cache(cls, key: str) -> None:
-        """Remove key from cache, forcing reload from BD on next get()."""
-        if key in cls._cache:
-            del cls._cache[key]
-            current_app.logger.debug(f"[SettingsManager] Cache invalidated for '{key}'")
+    def _reset_snapshot(cls) -> None:
+        cls._cache = {}
+        cls._cache_loaded_at = None
+        cls._cache_version = None
+        cls._last_version_check = None
+
+    @classmethod
+    def _invalidate_cache(cls, key: Optional[str] = None) -> None:
+        """Drop the snapshot, forcing a reload from BD on next get().
+
+        The snapshot is all-or-nothing, so ``key`` is only used for logging.
+        """
+        with cls._lock:
+            cls._reset_snapshot()
+            cls._stats["invalidations"] += 1
+        current_app.logger.debug(
+            f"[SettingsManager] Cache invalidated ({key or 'all settings'})"
+        )
 
     @classmethod
     def _parse_value(cls, value: str, data_type: str) -> Any:
@@ -0,0 +1,446 @@
+"""External student lookup engine (concurrent, deduplicated and mirrored).
+
+Batch imports may need to resolve hundreds of control numbers against the
+school's validation API. Resolving them one by one (and through our own
+``/api/students/validate`` proxy) pins a worker for minutes, so this module:
+
+- deduplicates the requested control numbers,
+- resolves them with a bounded thread pool and a per-host concurrency limit,
+- normalizes the external payload in-process (no HTTP hop to our own proxy),
+- coalesces concurrent lookups of the same control number within a worker
+  (single-flight): kiosks asking at the same moment share one call.
+
+``lookup_students`` is the entry point: it serves lookups from the
+``external_students`` mirror table. Fresh rows are answered locally; missing
+or stale ones are fetched and stored, with separate max ages for positive and
+negative answers, so re-uploads and dry-run -> commit cycles do not repeat
+network calls. Transport errors are never stored, and a stale row is still
+served when the API fails.
+``prefetch_external_students`` (see ``tools/prefetch_external_students.py``
+and ``POST /api/students/external-mirror/prefetch``) fills the mirror ahead of
+an event so the check-in desk does not depend on the school API.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from flask import current_app
+
+from app.utils.single_flight import SingleFlight
+from app.utils.upsert import upsert
+
+# Lookup statuses
+FOUND = "found"
+INCOMPLETE = "incomplete"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+
+def unwrap_external_payload(obj):
+    """Normalize the envelope shapes returned by external student APIs.
+
+    - If obj is a dict and contains a 'data' dict, return that dict.
+    - If obj is a dict and contains a 'student' dict, return that dict.
+    - If obj is a list whose first item is a dict, return that first dict.
+    - Otherwise return an empty dict or the dict itself when appropriate.
+    """
+    if isinstance(obj, dict):
+        # common wrapper: {"success": true, "data": {...}}
+        if isinstance(obj.get("data"), dict):
+            return obj.get("data")
+        # proxy shape: {"student": {...}}
+        if isinstance(obj.get("student"), dict):
+            return obj.get("student")
+        # already a useful dict
+        return obj
+    if isinstance(obj, list) and len(obj) > 0 and isinstance(obj[0], dict):
+        return obj[0]
+    return {}
+
+
+def normalize_external_student(raw, fallback_control=None) -> Dict[str, Any]:
+    """Return ``{control_number, full_name, career, email}`` from an external payload.
+
+    Same normalization the public ``/api/students/validate`` proxy applies,
+    available in-process so callers do not need an HTTP round trip to it.
+    """
+    d = unwrap_external_payload(raw)
+    if not isinstance(d, dict):
+        d = {}
+
+    career = d.get("career") or d.get("carrera") or None
+    if isinstance(career, dict):
+        career_name = career.get("name") or career.get("nombre") or None
+    else:
+        career_name = career
+
+    return {
+        "control_number": d.get("username")
+        or d.get("control_number")
+        or fallback_control,
+        "full_name": d.get("full_name") or d.get("name") or d.get("nombre"),
+        "career": career_name,
+        "email": d.get("email") or "",
+    }
+
+
+class ExternalStudentLookup:
+    """Concurrent resolver for the external student validation API.
+
+    Results are plain dicts::
+
+        {
+            "control_number": str,   # the candidate that was looked up
+            "status": "found" | "incomplete" | "not_found" | "error",
+            "student": {...} | None, # normalized payload (found/incomplete)
+            "error": str | None,
+            "cached": bool,          # True when answered from the mirror
+        }
+    """
+
+    # Concurrency limits
+    max_workers = 8
+    per_host_limit = 4
+    _host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+    _host_lock = threading.Lock()
+
+    # None: the school API client's per-endpoint timeout
+    default_timeout = None
+
+    # Concurrent lookups of the same control number share one network call
+    _in_flight = SingleFlight()
+
+    @classmethod
+    def fetch_many(
+        cls, control_numbers: List[str], timeout: Optional[float] = None
+    ) -> Dict[str, dict]:
+        """Resolve already deduplicated control numbers over the network.
+
+        Runs with a bounded thread pool and the per-host limit; nothing is
+        stored (``lookup_students`` keeps the answers in the mirror table).
+        Returns ``{control_number: result}``.
+        """
+        from app.services.school_api_client import get_school_api
+
+        timeout = cls.default_timeout if timeout is None else timeout
+        # Resolved here: pool threads run without an app context
+        client = get_school_api()
+        if len(control_numbers) == 1:
+            fetched = [cls._fetch(control_numbers[0], timeout, client)]
+        else:
+            workers = max(1, min(cls.max_workers, len(control_numbers)))
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="student-lookup"
+            ) as pool:
+                fetched = list(
+                    pool.map(lambda c: cls._fetch(c, timeout, client), control_numbers)
+                )
+        return dict(zip(control_numbers, fetched))
+
+    @classmethod
+    def _semaphore_for(cls, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with cls._host_lock:
+            sem = cls._host_semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(max(1, cls.per_host_limit))
+                cls._host_semaphores[host] = sem
+            return sem
+
+    @classmethod
+    def _fetch(cls, control_number: str, timeout, client) -> dict:
+        """Network lookup, coalesced per control number: threads
+        asking for a number already in flight wait for that call's result."""
+        return cls._in_flight.do(
+            control_number, lambda: cls._request(control_number, timeout, client)
+        )
+
+    @classmethod
+    def _request(cls, control_number: str, timeout, client) -> dict:
+        """Single call to the validation endpoint."""
+        result = {
+            "control_number": control_number,
+            "status": ERROR,
+            "student": None,
+            "error": None,
+            "cached": False,
+        }
+
+        try:
+            with cls._semaphore_for(client.url("validate")):
+                resp = client.get(
+                    "validate", params={"username": control_number}, timeout=timeout
+                )
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+
+        if resp.status_code == 404:
+            result["status"] = NOT_FOUND
+            return result
+        if resp.status_code != 200:
+            result["error"] = f"Error desde servicio externo (HTTP {resp.status_code})"
+            return result
+
+        try:
+            raw = resp.json() if resp.text else {}
+        except Exception:
+            raw = {}
+
+        student = normalize_external_student(raw, fallback_control=control_number)
+        result["student"] = student
+        if student.get("full_name") and student.get("career"):
+            result["status"] = FOUND
+        else:
+            result["status"] = INCOMPLETE
+        return result
+
+
+# --- Mirror table (external_students) -----------------------------------------
+
+# Control numbers per mirror query / per prefetch network batch
+_MIRROR_CHUNK_SIZE = 200
+_PREFETCH_BATCH_SIZE = 50
+# Statuses worth storing (transport errors are never mirrored)
+_MIRRORED_STATUSES = (FOUND, INCOMPLETE, NOT_FOUND)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _clean_control_numbers(control_numbers: Iterable[str]) -> List[str]:
+    cleaned = (str(cn or "").strip() for cn in control_numbers)
+    return [cn for cn in dict.fromkeys(cleaned) if cn]
+
+
+def _max_age(status: str) -> timedelta:
+    # Only complete answers keep the long age: not-found and incomplete ones
+    # (including a 200 with an empty or unparseable body) are refetched soon
+    key = (
+        "EXTERNAL_STUDENT_MAX_AGE_SECONDS"
+        if status == FOUND
+        else "EXTERNAL_STUDENT_NEGATIVE_MAX_AGE_SECONDS"
+    )
+    return timedelta(seconds=float(current_app.config.get(key, 0) or 0))
+
+
+def _mirror_result(row, source: str) -> dict:
+    return {
+        "control_number": row.control_number,
+        "status": row.status,
+        "student": None if row.status == NOT_FOUND else row.to_student_dict(),
+        "error": None,
+        "cached": True,
+        "source": source,
+    }
+
+
+def _read_mirror(control_numbers: List[str]) -> Dict[str, Any]:
+    """Mirror rows keyed by control number (reloaded: the mirror is written
+    on its own connection)."""
+    from app import db
+    from app.models.external_student import ExternalStudent
+
+    rows = {}
+    for i in range(0, len(control_numbers), _MIRROR_CHUNK_SIZE):
+        chunk = control_numbers[i : i + _MIRROR_CHUNK_SIZE]
+        for row in db.session.execute(
+            db.select(ExternalStudent).where(ExternalStudent.control_number.in_(chunk)),
+            execution_options={"populate_existing": True},
+        ).scalars():
+            rows[row.control_number] = row
+    return rows
+
+
+def _is_fresh(row, now: datetime) -> bool:
+    return row.fetched_at is not None and now - row.fetched_at < _max_age(row.status)
+
+
+def store_external_students(results: Iterable[dict]) -> int:
+    """Write lookup results into the mirror; returns the number of rows stored.
+
+    Uses its own connection and transaction: lookups happen before the
+    request's own writes, and a mirrored answer is worth keeping even when
+    that request later rolls back. Failures are logged, never raised.
+    """
+    from app import db
+    from app.models.external_student import ExternalStudent
+
+    now = _utcnow()
+    rows = {}
+    for result in results:
+        if result.get("status") not in _MIRRORED_STATUSES:
+            continue
+        cn = result["control_number"]
+        student = result.get("student") or {}
+        rows[cn] = {
+            "control_number": cn,
+            "status": result["status"],
+            "full_name": (student.get("full_name") or None),
+            "career": (student.get("career") or None),
+            "email": (student.get("email") or None),
+            "fetched_at": now,
+        }
+    if not rows:
+        return 0
+
+    try:
+        with db.engine.begin() as conn:
+            upsert(
+                conn,
+                ExternalStudent.__table__,
+                rows.values(),
+                key_columns=("control_number",),
+                update_columns=("status", "full_name", "career", "email", "fetched_at"),
+            )
+    except Exception as e:
+        current_app.logger.warning(f"[external_students] Could not store rows: {e}")
+        return 0
+    return len(rows)
+
+
+def lookup_students(
+    control_numbers: Iterable[str], timeout: Optional[float] = None
+) -> Dict[str, dict]:
+    """Resolve control numbers mirror-first (same result shape as
+    ``ExternalStudentLookup``, plus ``source``).
+
+    - fresh mirror row -> answered locally (``source='mirror'``);
+    - missing or stale -> fetched from the API and stored (``source='network'``);
+    - API error with a stale row -> the stale row (``source='stale'``).
+    """
+    control_numbers = _clean_control_numbers(control_numbers)
+    if not control_numbers:
+        return {}
+
+    now = _utcnow()
+    mirrored = _read_mirror(control_numbers)
+    results: Dict[str, dict] = {}
+    pending = []
+    for cn in control_numbers:
+        row = mirrored.get(cn)
+        if row is not None and _is_fresh(row, now):
+            results[cn] = _mirror_result(row, "mirror")
+        else:
+            pending.append(cn)
+    if not pending:
+        return results
+
+    fetched = ExternalStudentLookup.fetch_many(pending, timeout=timeout)
+    store_external_students(fetched.values())
+    for cn in pending:
+        result = {**fetched[cn], "source": "network"}
+        if result["status"] == ERROR and cn in mirrored:
+            result = _mirror_result(mirrored[cn], "stale")
+        results[cn] = result
+    return results
+
+
+def lookup_student(control_number: str, timeout: Optional[float] = None) -> dict:
+    """Single control number version of ``lookup_students``."""
+    cn = str(control_number or "").strip()
+    return lookup_students([cn], timeout=timeout).get(cn) or {
+        "control_number": cn,
+        "status": NOT_FOUND,
+        "student": None,
+        "error": None,
+        "cached": False,
+        "source": "mirror",
+    }
+
+
+def prefetch_external_students(
+    control_numbers: Iterable[str],
+    refresh: bool = False,
+    progress: Optional[Callable[..., None]] = None,
+    timeout: Optional[float] = None,
+) -> dict:
+    """Fill the mirror for ``control_numbers`` ahead of time.
+
+    Only missing or stale entries are fetched unless ``refresh=True``. Works
+    as a background job function (``progress(summary, processed=, total=)``).
+    Returns a summary with the number of fresh/fetched/found/incomplete/
+    not_found/error entries.
+    """
+    control_numbers = _clean_control_numbers(control_numbers)
+    summary = {
+        "requested": len(control_numbers),
+        "fresh": 0,
+        "fetched": 0,
+        FOUND: 0,
+        INCOMPLETE: 0,
+        NOT_FOUND: 0,
+        "errors": 0,
+    }
+
+    pending = control_numbers
+    if not refresh:
+        now = _utcnow()
+        mirrored = _read_mirror(control_numbers)
+        pending = [
+            cn
+            for cn in control_numbers
+            if cn not in mirrored or not _is_fresh(mirrored[cn], now)
+        ]
+        summary["fresh"] = len(control_numbers) - len(pending)
+
+    if progress:
+        progress(summary, processed=summary["fresh"], total=summary["requested"])
+    for i in range(0, len(pending), _PREFETCH_BATCH_SIZE):
+        fetched = ExternalStudentLookup.fetch_many(
+            pending[i : i + _PREFETCH_BATCH_SIZE], timeout=timeout
+        )
+        store_external_students(fetched.values())
+        for result in fetched.values():
+            summary["fetched"] += 1
+            if result["status"] in _MIRRORED_STATUSES:
+                summary[result["status"]] += 1
+            else:
+                summary["errors"] += 1
+        if progress:
+            progress(
+                summary,
+                processed=summary["fresh"] + summary["fetched"],
+                total=summary["requested"],
+            )
+    return summary
+
+
+def event_control_numbers(event_id: int) -> List[str]:
+    """Control numbers of the students registered in an event's activities."""
+    from app import db
+    from app.models.activity import Activity
+    from app.models.registration import Registration
+    from app.models.student import Student
+
+    return list(
+        db.session.execute(
+            db.select(Student.control_number)
+            .join(Registration, Registration.student_id == Student.id)
+            .join(Activity, Activity.id == Registration.activity_id)
+            .where(Activity.event_id == event_id)
+            .distinct()
+        ).scalars()
+    )
+
+
+def prefetch_roster(file_stream, progress=None, refresh: bool = False) -> dict:
+    """Job function: prefetch the control numbers listed in an uploaded roster
+    (first column of an XLSX or one per line in a TXT)."""
+    from app.utils.upload_utils import iter_first_column
+
+    control_numbers = [value for _row, value in iter_first_column(file_stream)]
+    return prefetch_external_students(
+        control_numbers, refresh=refresh, progress=progress
+    )
+
+
+def prefetch_event(event_id: int, progress=None, refresh: bool = False) -> dict:
+    """Job function: prefetch the students registered in an event."""
+    return prefetch_external_students(
+        event_control_numbers(event_id), refresh=refresh, progress=progress
+    )
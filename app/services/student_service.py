@@ -0,0 +1,130 @@
+"""Alta/actualización de estudiantes a partir del directorio externo.
+
+Varias rutas (walk-in, búsqueda pública, importación individual o por lote)
+crean el ``Student`` local tras consultar la API de la escuela, a menudo para
+el mismo número de control desde varios kioscos a la vez. En lugar de
+insertar y recuperarse del ``IntegrityError``, se hace un upsert por
+``control_number`` dentro de la transacción de la petición (no hace commit).
+
+``authenticate_student`` valida credenciales contra la API de la escuela y
+deja al estudiante dado de alta. Lo usan el login de estudiantes y el
+registro in situ, en proceso: sin peticiones HTTP de la app hacia sí misma
+que ocupen un segundo worker durante la llamada externa.
+"""
+
+from typing import Dict, Iterable, Mapping, Optional
+
+from app import db
+from app.models.student import Student
+from app.services.report_service import mark_participation_matrix_dirty
+from app.services.school_api_client import SchoolApiUnavailable, get_school_api
+from app.services.student_lookup_service import normalize_external_student
+from app.utils.upsert import upsert
+
+_STUDENT_FIELDS = ("full_name", "career", "email")
+
+
+def upsert_students(records: Iterable[Mapping]) -> Dict[str, Student]:
+    """Crea o actualiza estudiantes ``{control_number, full_name, career, email}``.
+
+    Se omiten los registros sin número de control o sin nombre. Un campo
+    vacío en el registro no borra el valor que ya tenía el estudiante.
+    Retorna ``{control_number: Student}`` recargados de la BD.
+    """
+    rows = {}
+    for record in records:
+        control_number = str(record.get("control_number") or "").strip()
+        if not control_number or not record.get("full_name"):
+            continue
+        rows[control_number] = {
+            "control_number": control_number,
+            **{f: (record.get(f) or None) for f in _STUDENT_FIELDS},
+        }
+    if not rows:
+        return {}
+
+    upsert(
+        db.session.connection(),
+        Student.__table__,
+        rows.values(),
+        key_columns=("control_number",),
+        update_columns=_STUDENT_FIELDS,
+        keep_existing_on_null=True,
+        touch_column="updated_at",
+    )
+    # Sentencia Core: los eventos del ORM no la ven
+    mark_participation_matrix_dirty()
+
+    students = {}
+    keys = list(rows)
+    for i in range(0, len(keys), 500):
+        for student in db.session.execute(
+            db.select(Student).where(Student.control_number.in_(keys[i : i + 500])),
+            execution_options={"populate_existing": True},
+        ).scalars():
+            students[student.control_number] = student
+    return students
+
+
+def upsert_student(record: Mapping) -> Optional[Student]:
+    """Versión de un solo estudiante de ``upsert_students``."""
+    control_number = str(record.get("control_number") or "").strip()
+    return upsert_students([record]).get(control_number)
+
+
+class StudentAuthError(Exception):
+    """Fallo al autenticar; ``status_code`` es el código HTTP a responder."""
+
+    def __init__(self, message: str, status_code: int, error: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.error = error
+
+
+def authenticate_student(control_number: str, password: str) -> Student:
+    """Valida credenciales en el sistema externo y crea/actualiza el estudiante.
+
+    No hace commit. Lanza ``StudentAuthError`` (401 credenciales inválidas,
+    503 sistema externo caído o con error).
+    """
+    try:
+        resp = get_school_api().post(
+            "login", json={"username": control_number, "password": password}
+        )
+    except SchoolApiUnavailable as e:
+        raise StudentAuthError(
+            "Error de conexión con sistema externo", 503, str(e)
+        ) from e
+
+    if resp.status_code == 401:
+        raise StudentAuthError("Credenciales inválidas", 401)
+    if resp.status_code != 200:
+        raise StudentAuthError("Error en la validación con sistema externo", 503)
+
+    payload = resp.json()
+    if not (
+        isinstance(payload, dict) and payload.get("success") and payload.get("data")
+    ):
+        raise StudentAuthError("Credenciales inválidas", 401)
+
+    record = {
+        **normalize_external_student(payload["data"], control_number),
+        "control_number": control_number,
+    }
+    if record.get("full_name"):
+        return upsert_student(record)
+
+    # Credenciales válidas pero sin nombre: se conserva el nombre local o,
+    # si es su primer acceso, se da de alta con nombre vacío
+    student = Student.query.filter_by(control_number=control_number).first()
+    if student is not None:
+        return upsert_student({**record, "full_name": student.full_name}) or student
+    student = Student()
+    student.control_number = control_number
+    student.full_name = ""
+    student.career = record.get("career") or ""
+    student.email = record.get("email") or ""
+    db.session.add(student)
+    db.session.flush()
+    return student
@@ -97,6 +97,8 @@ function attendancesAdmin() {
     batchUploadError: null,
     batchUploadUploading: false,
     batchUploadProgress: 0,
+    // Estado del trabajo en servidor (queued/running/succeeded/failed)
+    batchUploadJobStatus: null,
     batchUploadView: "file",
     // UI helpers
     selectAllForSync: false,
@@ -1253,6 +1255,7 @@ function attendancesAdmin() {
       this.batchUploadReport = null;
       this.batchUploadError = null;
       this.batchUploadProgress = 0;
+      this.batchUploadJobStatus = null;
       this.batchUploadView = "file";
       this.showBatchUploadModal = true;
     },
@@ -1264,6 +1267,7 @@ function attendancesAdmin() {
       this.batchUploadReport = null;
       this.batchUploadError = null;
       this.batchUploadProgress = 0;
+      this.batchUploadJobStatus = null;
     },
 
     onBatchUploadFileChange(e) {
@@ -1292,6 +1296,156 @@ function attendancesAdmin() {
       );
     },
 
+    // Normaliza la respuesta de /api/attendances/batch (o el resultado de un
+    // trabajo en segundo plano) y muestra el reporte
+    applyBatchUploadResult(report) {
+      report = report || {};
+      this.batchUploadReport = report.report || report || {};
+      // Normalize shape so templates can iterate safely
+      this.batchUploadReport.details = this.batchUploadReport.details || [];
+      this.batchUploadReport.errors = this.batchUploadReport.errors || [];
+      // Compute occurrences of control_number within this report
+      try {
+        const occ = {};
+        (this.batchUploadReport.details || []).forEach((d) => {
+          const cn = String(d.control_number || "").trim();
+          if (!cn) return;
+          occ[cn] = (occ[cn] || 0) + 1;
+        });
+        (this.batchUploadReport.details || []).forEach((d) => {
+          const cn = String(d.control_number || "").trim();
+          d.__occurrences = occ[cn] || 0;
+        });
+      } catch (e) {
+        // ignore
+      }
+      // Recompute aggregate counters from details to keep stats consistent
+      try {
+        const counts = {
+          created: 0,
+          skipped: 0,
+          not_found: 0,
+          unmatched: 0,
+          mark_absent: 0,
+          invalid: 0,
+        };
+        (this.batchUploadReport.details || []).forEach((d) => {
+          const a = String(d.action || "").toLowerCase();
+          if (a === "created") counts.created += 1;
+          else if (a === "skipped") counts.skipped += 1;
+          else if (a === "not_found") counts.not_found += 1;
+          else if (a === "unmatched") counts.unmatched += 1;
+          else if (a === "mark_absent") counts.mark_absent += 1;
+          else if (a === "invalid") counts.invalid += 1;
+        });
+
+        // Determine header values depending on mode
+        if ((this.batchUploadMode || "entry") === "exit") {
+          // For exit mode, consider 'Aplicadas' = planned mark_absent (even in dry-run)
+          this.batchUploadReport.created = counts.mark_absent;
+          this.batchUploadReport.skipped = counts.skipped;
+          // Not found includes both 'not_found' (no attendance) and 'unmatched' (no student)
+          this.batchUploadReport.not_found =
+            counts.not_found + counts.unmatched;
+          this.batchUploadReport.invalid = counts.invalid;
+        } else {
+          // Entry mode: map to original counters
+          this.batchUploadReport.created = counts.created;
+          this.batchUploadReport.skipped = counts.skipped;
+          this.batchUploadReport.not_found = counts.not_found;
+          this.batchUploadReport.invalid =
+            counts.invalid + counts.unmatched;
+        }
+      } catch (e) {
+        // ignore
+      }
+      // Prefer server-provided dry_run flag when available; fallback to top-level report or client value
+      try {
+        const serverDry =
+          report &&
+          (report.report &&
+          typeof report.report.dry_run !== "undefined"
+            ? report.report.dry_run
+            : typeof report.dry_run !== "undefined"
+              ? report.dry_run
+              : undefined);
+        this.batchUploadReport.dry_run =
+          typeof serverDry !== "undefined"
+            ? !!serverDry
+            : !!this.batchUploadDryRun;
+      } catch (e) {
+        this.batchUploadReport.dry_run = !!this.batchUploadDryRun;
+      }
+      this.batchUploadReport.created =
+        typeof this.batchUploadReport.created === "number"
+          ? this.batchUploadReport.created
+          : 0;
+      // Normalize fields across 'entry' and 'exit' reports
+      this.batchUploadReport.created =
+        typeof this.batchUploadReport.created === "number"
+          ? this.batchUploadReport.created
+          : typeof report.applied === "number"
+            ? report.applied
+            : 0;
+      this.batchUploadReport.skipped =
+        typeof this.batchUploadReport.skipped === "number"
+          ? this.batchUploadReport.skipped
+          : 0;
+      this.batchUploadReport.not_found =
+        typeof this.batchUploadReport.not_found === "number"
+          ? this.batchUploadReport.not_found
+          : typeof report.not_found === "number"
+            ? report.not_found
+            : 0;
+      // 'unmatched' controls (no student) map to 'invalid' count in UI
+      this.batchUploadReport.invalid =
+        typeof this.batchUploadReport.invalid === "number"
+          ? this.batchUploadReport.invalid
+          : typeof report.unmatched === "number"
+            ? report.unmatched
+            : 0;
+      this.batchUploadView = "report";
+      // If this was not a dry run and attendances were created, reload list
+      if (
+        !this.batchUploadDryRun &&
+        this.batchUploadReport &&
+        this.batchUploadReport.created &&
+        this.batchUploadReport.created > 0
+      ) {
+        this.refresh();
+      }
+      window.showToast &&
+        window.showToast("Importación procesada", "success");
+    },
+
+    // Consulta el estado de un trabajo hasta que termine; actualiza la barra
+    // de progreso con processed/total
+    async pollBatchUploadJob(jobId, intervalMs = 1000) {
+      this.batchUploadJobStatus = "queued";
+      this.batchUploadProgress = 0;
+      for (;;) {
+        const res = await this.sf(`/api/jobs/${encodeURIComponent(jobId)}`, {
+          method: "GET",
+        });
+        if (!res.ok) {
+          throw new Error(`Error ${res.status} al consultar el progreso`);
+        }
+        const data = await res.json();
+        const job = (data && data.job) || {};
+        this.batchUploadJobStatus = job.status || null;
+        if (job.total > 0) {
+          this.batchUploadProgress = Math.min(
+            100,
+            Math.round(((job.processed || 0) / job.total) * 100),
+          );
+        }
+        if (job.status === "succeeded" || job.status === "failed") {
+          return job;
+        }
+        await new Promise((r) => setTimeout(r, intervalMs));
+      }
+    },
+
     async submitBatchUpload() {
       if (!this.batchUploadActivityId) {
         this.batchUploadError = "Seleccione una actividad para la carga";
@@ -1317,8 +1471,10 @@ function attendancesAdmin() {
         if ((this.batchUploadMode || "entry") === "exit") {
           fd.append("action", "mark_absent");
         }
+        // Procesar en segundo plano; el progreso se consulta en /api/jobs/<id>
+        fd.append("async", "1");
 
-        await new Promise((resolve, reject) => {
+        const accepted = await new Promise((resolve, reject) => {
           const xhr = new XMLHttpRequest();
           xhr.open("POST", "/api/attendances/batch", true);
           // Inject Authorization header if token is present
@@ -1346,126 +1502,15 @@ function attendancesAdmin() {
             this.batchUploadUploading = false;
             if (xhr.status >= 200 && xhr.status < 300) {
               try {
-                const report = JSON.parse(xhr.responseText || "{}");
-                this.batchUploadReport = report.report || report || {};
-                // Normalize shape so templates can iterate safely
-                this.batchUploadReport.details =
-                  this.batchUploadReport.details || [];
-                this.batchUploadReport.errors =
-                  this.batchUploadReport.errors || [];
-                // Compute occurrences of control_number within this report
-                try {
-                  const occ = {};
-                  (this.batchUploadReport.details || []).forEach((d) => {
-                    const cn = String(d.control_number || "").trim();
-                    if (!cn) return;
-                    occ[cn] = (occ[cn] || 0) + 1;
-                  });
-                  (this.batchUploadReport.details || []).forEach((d) => {
-                    const cn = String(d.control_number || "").trim();
-                    d.__occurrences = occ[cn] || 0;
-                  });
-                } catch (e) {
-                  // ignore
-                }
-                // Recompute aggregate counters from details to keep stats consistent
-                try {
-                  const counts = {
-                    created: 0,
-                    skipped: 0,
-                    not_found: 0,
-                    unmatched: 0,
-                    mark_absent: 0,
-                    invalid: 0,
-                  };
-                  (this.batchUploadReport.details || []).forEach((d) => {
-                    const a = String(d.action || "").toLowerCase();
-                    if (a === "created") counts.created += 1;
-                    else if (a === "skipped") counts.skipped += 1;
-                    else if (a === "not_found") counts.not_found += 1;
-                    else if (a === "unmatched") counts.unmatched += 1;
-                    else if (a === "mark_absent") counts.mark_absent += 1;
-                    else if (a === "invalid") counts.invalid += 1;
-                  });
-
-                  // Determine header values depending on mode
-                  if ((this.batchUploadMode || "entry") === "exit") {
-                    // For exit mode, consider 'Aplicadas' = planned mark_absent (even in dry-run)
-                    this.batchUploadReport.created = counts.mark_absent;
-                    this.batchUploadReport.skipped = counts.skipped;
-                    // Not found includes both 'not_found' (no attendance) and 'unmatched' (no student)
-                    this.batchUploadReport.not_found =
-                      counts.not_found + counts.unmatched;
-                    this.batchUploadReport.invalid = counts.invalid;
-                  } else {
-                    // Entry mode: map to original counters
-                    this.batchUploadReport.created = counts.created;
-                    this.batchUploadReport.skipped = counts.skipped;
-                    this.batchUploadReport.not_found = counts.not_found;
-                    this.batchUploadReport.invalid =
-                      counts.invalid + counts.unmatched;
-                  }
-                } catch (e) {
-                  // ignore
-                }
-                // Prefer server-provided dry_run flag when available; fallback to top-level report or client value
-                try {
-                  const serverDry =
-                    report &&
-                    (report.report &&
-                    typeof report.report.dry_run !== "undefined"
-                      ? report.report.dry_run
-                      : typeof report.dry_run !== "undefined"
-                        ? report.dry_run
-                        : undefined);
-                  this.batchUploadReport.dry_run =
-                    typeof serverDry !== "undefined"
-                      ? !!serverDry
-                      : !!this.batchUploadDryRun;
-                } catch (e) {
-                  this.batchUploadReport.dry_run = !!this.batchUploadDryRun;
+                const payload = JSON.parse(xhr.responseText || "{}");
+                if (xhr.status === 202 && payload.job_id) {
+                  // Importación en segundo plano: seguir con polling del job
+                  this.batchUploadUploading = true;
+                  resolve(payload);
+                  return;
                 }
-                this.batchUploadReport.created =
-                  typeof this.batchUploadReport.created === "number"
-                    ? this.batchUploadReport.created
-                    : 0;
-                // Normalize fields across 'entry' and 'exit' reports
-                this.batchUploadReport.created =
-                  typeof this.batchUploadReport.created === "number"
-                    ? this.batchUploadReport.created
-                    : typeof report.applied === "number"
-                      ? report.applied
-                      : 0;
-                this.batchUploadReport.skipped =
-                  typeof this.batchUploadReport.skipped === "number"
-                    ? this.batchUploadReport.skipped
-                    : 0;
-                this.batchUploadReport.not_found =
-                  typeof this.batchUploadReport.not_found === "number"
-                    ? this.batchUploadReport.not_found
-                    : typeof report.not_found === "number"
-                      ? report.not_found
-                      : 0;
-                // 'unmatched' controls (no student) map to 'invalid' count in UI
-                this.batchUploadReport.invalid =
-                  typeof this.batchUploadReport.invalid === "number"
-                    ? this.batchUploadReport.invalid
-                    : typeof report.unmatched === "number"
-                      ? report.unmatched
-                      : 0;
-                this.batchUploadView = "report";
-                // If this was not a dry run and attendances were created, reload list
-                if (
-                  !this.batchUploadDryRun &&
-                  this.batchUploadReport &&
-                  this.batchUploadReport.created &&
-                  this.batchUploadReport.created > 0
-                ) {
-                  this.refresh();
-                }
-                window.showToast &&
-                  window.showToast("Importación procesada", "success");
-                resolve();
+                this.applyBatchUploadResult(payload);
+                resolve(null);
               } catch (e) {
                 reject(new Error("Respuesta inválida del servidor"));
               }
@@ -1484,6 +1529,16 @@ function attendancesAdmin() {
 
           xhr.send(fd);
         });
+
+        if (accepted && accepted.job_id) {
+          const job = await this.pollBatchUploadJob(accepted.job_id);
+          this.batchUploadUploading = false;
+          if (job.status !== "succeeded") {
+            throw new Error(job.error || "La importación falló en el servidor");
+          }
+          const result = job.result || {};
+          this.applyBatchUploadResult({ report: result, dry_run: result.dry_run });
+        }
       } catch (err) {
         this.batchUploadUploading = false;
         this.batchUploadError = err.message || String(err);
@@ -1,29 +1,106 @@
 # app/utils/auth_helpers.py
-from flask_jwt_extended import get_jwt_identity
+from typing import NamedTuple, Optional
+
+from flask_jwt_extended import create_access_token, get_jwt
 from app.models.user import User
 from app.models.student import Student
-from flask import jsonify
+from flask import g, has_request_context, jsonify, request
 from app import db
 
+ADMIN = "admin"
+STUDENT = "student"
 
-def get_current_user():
-    """Obtener el usuario actual basado en el token JWT"""
-    try:
-        user_id = int(get_jwt_identity())
 
-        # Buscar en User (administradores)
-        user = db.session.get(User, user_id)
-        if user:
-            return user, "admin"
+class Principal(NamedTuple):
+    """Identidad autenticada tal como viene en el token (sin consultar la BD)."""
+
+    id: int
+    type: str
+    role: Optional[str] = None
+
+
+def create_admin_token(user) -> str:
+    """Token JWT de administrador con el tipo y rol en los claims"""
+    return create_access_token(
+        identity=str(user.id), additional_claims={"type": ADMIN, "role": user.role}
+    )
+
+
+def create_student_token(student) -> str:
+    """Token JWT de estudiante con el tipo en los claims"""
+    return create_access_token(
+        identity=str(student.id), additional_claims={"type": STUDENT}
+    )
+
+
+def _memoized(name, token_id, factory):
+    """Valor por token guardado en ``flask.g`` (se calcula una vez por petición).
+
+    Se indexa por el ``jti`` y la petición en curso para no reutilizarlo si el
+    mismo contexto de aplicación atiende varias peticiones (p. ej. en tests).
+    """
+    current = request._get_current_object() if has_request_context() else None
+    cached = g.get(name)
+    if cached is not None and cached[0] == token_id and cached[1] is current:
+        return cached[2]
+    value = factory()
+    setattr(g, name, (token_id, current, value))
+    return value
+
+
+def _load_legacy_principal(user_id):
+    """Tokens sin claim ``type`` (emitidos antes): se busca en User y luego en Student"""
+    user = db.session.get(User, user_id)
+    if user:
+        return user, ADMIN
+    student = db.session.get(Student, user_id)
+    if student:
+        return student, STUDENT
+    return None, None
+
 
-        # Buscar en Student (estudiantes)
-        student = db.session.get(Student, user_id)
-        if student:
-            return student, "student"
+def get_current_principal() -> Optional[Principal]:
+    """Identidad actual a partir de los claims del JWT.
 
+    Con el claim ``type`` no se consulta la BD y el id se interpreta en la
+    tabla correcta (un User y un Student pueden compartir id).
+    """
+    claims = get_jwt()
+    token_id = claims.get("jti")
+
+    def resolve():
+        try:
+            user_id = int(claims.get("sub"))
+        except (ValueError, TypeError):
+            return None
+
+        user_type = claims.get("type")
+        if user_type in (ADMIN, STUDENT):
+            return Principal(user_id, user_type, claims.get("role"))
+
+        obj, user_type = _load_legacy_principal(user_id)
+        if obj is None:
+            return None
+        _memoized("_auth_user", token_id, lambda: obj)
+        return Principal(obj.id, user_type, getattr(obj, "role", None))
+
+    return _memoized("_auth_principal", token_id, resolve)
+
+
+def get_current_user():
+    """Obtener el usuario actual basado en el token JWT (objeto completo de la BD)"""
+    principal = get_current_principal()
+    if principal is None:
         return None, None
-    except (ValueError, TypeError):
+
+    def load():
+        model = User if principal.type == ADMIN else Student
+        return db.session.get(model, principal.id)
+
+    user = _memoized("_auth_user", get_jwt().get("jti"), load)
+    if not user:
         return None, None
+    return user, principal.type
 
 
 def require_admin(func):
@@ -32,12 +109,12 @@ def require_admin(func):
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        user, user_type = get_current_user()
+        principal = get_current_principal()
 
-        if not user:
+        if not principal:
             return jsonify({"message": "Usuario no encontrado"}), 404
 
-        if user_type != "admin":
+        if principal.type != ADMIN:
             return jsonify(
                 {"message": "Acceso denegado. Se requiere rol de administrador."}
             ), 403
@@ -53,12 +130,12 @@ def require_student(func):
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        user, user_type = get_current_user()
+        principal = get_current_principal()
 
-        if not user:
+        if not principal:
             return jsonify({"message": "Usuario no encontrado"}), 404
 
-        if user_type != "student":
+        if principal.type != STUDENT:
             return jsonify(
                 {"message": "Acceso denegado. Se requiere rol de estudiante."}
             ), 403
@@ -69,10 +146,14 @@ def require_student(func):
 
 
 def get_user_or_403():
-    """Obtener usuario actual o retornar error 403"""
-    user, user_type = get_current_user()
+    """Obtener la identidad actual (``Principal``) o retornar error 403.
 
-    if not user:
+    Solo expone ``id``/``type``/``role``; quien necesite el objeto completo
+    usa ``get_current_user``.
+    """
+    principal = get_current_principal()
+
+    if not principal:
         return None, None, (jsonify({"message": "Usuario no encontrado"}), 404)
 
-    return user, user_type, None
+    return principal, principal.type, None
@@ -1,7 +1,14 @@
-from datetime import datetime, timezone
+from datetime import datetime, timezone, tzinfo
+from functools import lru_cache
+from flask import g, has_request_context, request
 from marshmallow import ValidationError
 from app.services.settings_manager import AppSettings
 
+DEFAULT_APP_TIMEZONE = "America/Mexico_City"
+
+# Atributo de ``g`` con la zona horaria resuelta: (request, tz)
+_G_APP_TZ = "_app_timezone"
+
 
 def parse_datetime_with_timezone(dt_string):
     """Parsea una cadena de fecha o datetime y asegura que tenga zona horaria UTC.
@@ -35,13 +42,60 @@ def parse_datetime_with_timezone(dt_string):
     raise ValidationError(f"Valor de fecha no reconocido: {dt_string}")
 
 
-def localize_naive_datetime(dt, app_timezone="America/Mexico_City"):
+@lru_cache(maxsize=64)
+def get_zoneinfo(name):
+    """Devuelve ``zoneinfo.ZoneInfo(name)`` reutilizando la instancia por nombre.
+
+    Lanza la excepción de zoneinfo si el nombre no es válido (no se cachea).
+    """
+    import zoneinfo
+
+    return zoneinfo.ZoneInfo(name)
+
+
+def _resolve_app_timezone():
+    try:
+        name = AppSettings.app_timezone()
+    except Exception:
+        name = DEFAULT_APP_TIMEZONE
+    try:
+        return get_zoneinfo(name)
+    except Exception:
+        # Se conserva el nombre para que localize_naive_datetime intente pytz
+        return name
+
+
+def get_app_timezone():
+    """Zona horaria de la aplicación, resuelta una sola vez por petición.
+
+    Dentro de una petición el resultado se guarda en ``g`` (ligado al objeto
+    request, porque el contexto de app, y con él ``g``, puede sobrevivir a
+    varias peticiones, p. ej. en tests). Fuera de una petición se resuelve en
+    cada llamada.
+
+    Returns:
+        tzinfo, o el nombre configurado si zoneinfo no lo reconoce.
+    """
+    if not has_request_context():
+        return _resolve_app_timezone()
+
+    req = request._get_current_object()
+    cached = g.get(_G_APP_TZ)
+    if cached is not None and cached[0] is req:
+        return cached[1]
+    tz = _resolve_app_timezone()
+    setattr(g, _G_APP_TZ, (req, tz))
+    return tz
+
+
+def localize_naive_datetime(dt, app_timezone=DEFAULT_APP_TIMEZONE):
     """
     Localiza un datetime naive al timezone de la aplicación y lo convierte a UTC.
 
     Args:
         dt: datetime object (puede ser naive o timezone-aware)
-        app_timezone: string con el nombre del timezone (default: America/Mexico_City)
+        app_timezone: nombre del timezone (default: America/Mexico_City) o un
+            objeto tzinfo ya resuelto (p. ej. de get_app_timezone())
 
     Returns:
         datetime objeto timezone-aware en UTC
@@ -58,28 +112,29 @@ def localize_naive_datetime(dt, app_timezone="America/Mexico_City"):
         return dt.astimezone(timezone.utc)
 
     # Si es naive, localizarlo al timezone de la app
-    try:
-        import zoneinfo
-
-        tz = zoneinfo.ZoneInfo(app_timezone)
-    except (ImportError, Exception):
-        # Fallback: usar pytz si zoneinfo no está disponible (Python < 3.9)
+    if isinstance(app_timezone, tzinfo):
+        tz = app_timezone
+    else:
         try:
-            import pytz
+            tz = get_zoneinfo(app_timezone)
+        except Exception:
+            # Fallback: usar pytz si zoneinfo no está disponible (Python < 3.9)
+            try:
+                import pytz
 
-            tz = pytz.timezone(app_timezone)
-            localized = tz.localize(dt)
-            return localized.astimezone(timezone.utc)
-        except ImportError:
-            # Si no hay pytz ni zoneinfo, asumir UTC (no ideal pero es el fallback)
-            return dt.replace(tzinfo=timezone.utc)
+                tz = pytz.timezone(app_timezone)
+                localized = tz.localize(dt)
+                return localized.astimezone(timezone.utc)
+            except ImportError:
+                # Si no hay pytz ni zoneinfo, asumir UTC (no ideal pero es el fallback)
+                return dt.replace(tzinfo=timezone.utc)
 
     # Localizar y convertir a UTC
     localized = dt.replace(tzinfo=tz)
     return localized.astimezone(timezone.utc)
 
 
-def safe_iso(dt):
+def safe_iso(dt, app_tz=None):
     """Return an ISO 8601 string for a datetime-like value in a safe way.
 
     Behavior:
@@ -88,20 +143,19 @@ def safe_iso(dt):
       - If dt is an aware datetime -> convert to UTC and isoformat
       - For strings, try to parse with fromisoformat and treat accordingly; otherwise return the original string trimmed
       - On unexpected errors, return None
+
+    ``app_tz`` lets callers pass an already resolved timezone; by default it
+    is resolved (once per request) only when a naive value needs it.
     """
     if not dt:
         return None
 
     try:
-        app_tz = None
-        try:
-            app_tz = AppSettings.app_timezone()
-        except Exception:
-            app_tz = "America/Mexico_City"
-
         # python datetime
         if isinstance(dt, datetime):
             if dt.tzinfo is None:
+                if app_tz is None:
+                    app_tz = get_app_timezone()
                 localized_dt = localize_naive_datetime(dt, app_tz)
                 if localized_dt is None:
                     return None
@@ -116,6 +170,8 @@ def safe_iso(dt):
             try:
                 parsed = datetime.fromisoformat(s)
                 if parsed.tzinfo is None:
+                    if app_tz is None:
+                        app_tz = get_app_timezone()
                     parsed = localize_naive_datetime(parsed, app_tz)
                     if parsed is None:
                         return s
@@ -138,3 +194,17 @@ def safe_iso(dt):
             return None
     except Exception:
         return None
+
+
+def safe_iso_many(values, app_tz=None):
+    """Versión de ``safe_iso`` para listas: resuelve la zona horaria una vez.
+
+    Devuelve una lista con el mismo orden y longitud que ``values``.
+    """
+    values = list(values)
+    if app_tz is None and any(
+        isinstance(v, (datetime, str)) and v and getattr(v, "tzinfo", None) is None
+        for v in values
+    ):
+        app_tz = get_app_timezone()
+    return [safe_iso(v, app_tz) for v in values]
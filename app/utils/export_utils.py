@@ -0,0 +1,389 @@
+"""Exportación de reportes en streaming (XLSX, CSV y NDJSON).
+
+Complemento de ``upload_utils``: en lugar de construir un ``Workbook`` de
+openpyxl (o un DataFrame de pandas) completo en memoria y copiarlo a un
+``BytesIO``, el XLSX se escribe fila por fila directamente dentro del ZIP y
+los bytes se entregan al cliente conforme se generan. Alimentado con una
+consulta ``yield_per`` la memoria es constante sin importar el número de filas
+y la descarga empieza de inmediato.
+
+Solo cubre lo que usan los reportes: una hoja, encabezados con estilo, anchos
+de columna y celdas combinadas por fila. Las cadenas se escriben como
+``inlineStr`` para no tener que acumular la tabla de cadenas compartidas.
+
+Para integraciones (p. ej. el sistema de créditos) los mismos reportes se
+pueden pedir como CSV o NDJSON (``?format=csv|ndjson``): cada fila de la
+consulta se serializa directamente, sin construir libro ni estilos.
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, NamedTuple, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from flask import Response, current_app, request, stream_with_context
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIMETYPE = "text/csv; charset=utf-8"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Formatos aceptados en ``?format=``; el primero es el predeterminado
+EXPORT_FORMATS = ("xlsx", "csv", "ndjson")
+
+# Filas por lote al recorrer consultas con yield_per
+EXPORT_BATCH_SIZE = 500
+
+# Bytes acumulados antes de entregar un fragmento al cliente
+_FLUSH_BYTES = 64 * 1024
+
+# Estilos disponibles (índice en cellXfs de styles.xml)
+STYLES = {
+    None: 0,
+    "header": 1,  # negrita, centrado
+    "header_fill": 2,  # blanco negrita sobre índigo, centrado
+    "title": 3,  # negrita 14, centrado
+    "center": 4,
+    "total": 5,  # negrita, alineado a la derecha
+}
+
+# Caracteres de control no permitidos en XML 1.0
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class StyledRow(NamedTuple):
+    """Fila con estilo y, opcionalmente, combinada de A hasta ``merge_to``."""
+
+    values: Sequence
+    style: Optional[str] = None
+    merge_to: Optional[int] = None
+
+
+def styled(values, style=None, merge_to=None) -> StyledRow:
+    return StyledRow(list(values), style, merge_to)
+
+
+def column_letter(index: int) -> str:
+    """1 -> 'A', 27 -> 'AA'."""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def iter_query_rows(query, batch_size: int = EXPORT_BATCH_SIZE):
+    """Recorre una consulta en lotes (cursor del lado del servidor cuando el
+    driver lo soporta) sin materializar todas las filas.
+
+    Acepta un ``Select`` (2.0) o un ``Query`` legado. La consulta se ejecuta
+    al llamar a la función, no al iterar: llamarla en la vista antes de
+    devolver la respuesta hace que un error de la consulta llegue al
+    ``try/except`` de la vista en lugar de cortar la descarga ya iniciada.
+    """
+    from sqlalchemy.orm import Query
+    from app import db
+
+    if isinstance(query, Query):
+        return iter(query.yield_per(batch_size))
+    return iter(db.session.execute(query.execution_options(yield_per=batch_size)))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino no posicionable para ``zipfile``: acumula los bytes escritos
+    hasta que el generador los entrega."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _cell_xml(ref: str, value, style: int) -> str:
+    s = f' s="{style}"' if style else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"{s}><v>{int(value)}</v></c>'
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return (
+        f'<c r="{ref}" t="inlineStr"{s}><is><t xml:space="preserve">{text}</t></is></c>'
+    )
+
+
+def _row_xml(row_num: int, values: Sequence, style: int) -> str:
+    cells = "".join(
+        _cell_xml(f"{column_letter(col)}{row_num}", value, style)
+        for col, value in enumerate(values, 1)
+        if value is not None
+    )
+    return f'<row r="{row_num}">{cells}</row>'
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="4">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="14"/><name val="Calibri"/></font>'
+    "</fonts>"
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF4F46E5"/>'
+    '<bgColor rgb="FF4F46E5"/></patternFill></fill>'
+    "</fills>"
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="6">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '<xf numFmtId="0" fontId="2" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="3" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="right"/></xf>'
+    "</cellXfs>"
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+
+def _workbook_xml(sheet_title: str) -> str:
+    # Excel limita el nombre de la hoja a 31 caracteres sin []:*?/\
+    title = re.sub(r"[\[\]:*?/\\]", "", sheet_title or "Hoja1")[:31] or "Hoja1"
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(title, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    )
+
+
+def iter_xlsx(
+    rows: Iterable,
+    sheet_title: str = "Hoja1",
+    column_widths: Optional[Sequence[float]] = None,
+) -> Iterator[bytes]:
+    """Genera un XLSX de una hoja como fragmentos de bytes.
+
+    Args:
+        rows: iterable de filas; cada fila es una secuencia de valores o un
+            ``StyledRow`` (ver ``styled``). Una fila vacía deja un renglón en
+            blanco. ``None`` deja la celda vacía.
+        sheet_title: nombre de la hoja.
+        column_widths: anchos de columna (A, B, ...).
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _workbook_xml(sheet_title))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _STYLES)
+        yield sink.drain()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as fh:
+            head = [
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            ]
+            if column_widths:
+                head.append("<cols>")
+                head.extend(
+                    f'<col min="{i}" max="{i}" width="{w}" customWidth="1"/>'
+                    for i, w in enumerate(column_widths, 1)
+                )
+                head.append("</cols>")
+            head.append("<sheetData>")
+            fh.write("".join(head).encode("utf-8"))
+
+            merges = []
+            row_num = 0
+            for row in rows:
+                row_num += 1
+                if isinstance(row, StyledRow):
+                    values, style, merge_to = row
+                else:
+                    values, style, merge_to = row, None, None
+                if merge_to:
+                    merges.append(f"A{row_num}:{column_letter(merge_to)}{row_num}")
+                fh.write(_row_xml(row_num, values, STYLES[style]).encode("utf-8"))
+                if sink.size >= _FLUSH_BYTES:
+                    yield sink.drain()
+
+            tail = ["</sheetData>"]
+            if merges:
+                tail.append(f'<mergeCells count="{len(merges)}">')
+                tail.extend(f'<mergeCell ref="{ref}"/>' for ref in merges)
+                tail.append("</mergeCells>")
+            tail.append("</worksheet>")
+            fh.write("".join(tail).encode("utf-8"))
+        yield sink.drain()
+    # Directorio central del ZIP
+    yield sink.drain()
+
+
+def _logged_stream(chunks: Iterable[bytes], filename: str) -> Iterator[bytes]:
+    """Registra en el log los errores ocurridos a mitad de la transmisión.
+
+    Para entonces ya se enviaron el estado 200 y parte del archivo, así que
+    la vista no puede responder con un 500: el cliente recibe un archivo
+    truncado y el error queda en el log.
+    """
+    try:
+        yield from chunks
+    except Exception:
+        current_app.logger.exception("Error transmitiendo la exportación %s", filename)
+        raise
+
+
+def xlsx_response(rows: Iterable, filename: str, **kwargs) -> Response:
+    """Respuesta de Flask que transmite el XLSX conforme se genera.
+
+    ``rows`` se consume después de que la vista retorna (dentro del contexto
+    de la petición). Las consultas deben ejecutarse en la vista con
+    ``iter_query_rows`` para que sus errores produzcan la respuesta de error
+    de la vista; los que ocurran después se registran en el log.
+    """
+    resp = Response(
+        stream_with_context(_logged_stream(iter_xlsx(rows, **kwargs), filename)),
+        mimetype=XLSX_MIMETYPE,
+    )
+    # Con nombres no ASCII Werkzeug agrega filename*=UTF-8''...
+    resp.headers.set("Content-Disposition", "attachment", filename=filename)
+    return resp
+
+
+def get_export_format(default: str = "xlsx") -> Optional[str]:
+    """Formato pedido en ``?format=``; ``None`` si no está soportado."""
+    fmt = (request.args.get("format") or default).strip().lower()
+    return fmt if fmt in EXPORT_FORMATS else None
+
+
+def _plain_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(header: Sequence[str], records: Iterable) -> Iterator[bytes]:
+    """Genera un CSV (UTF-8, separado por comas) como fragmentos de bytes.
+
+    ``records`` es un iterable de secuencias de valores en el orden de
+    ``header``; ``None`` se escribe como celda vacía.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\r\n")
+    writer.writerow(header)
+    for record in records:
+        writer.writerow([_plain_value(v) for v in record])
+        if buf.tell() >= _FLUSH_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(keys: Sequence[str], records: Iterable) -> Iterator[bytes]:
+    """Genera un objeto JSON por línea con las claves ``keys``."""
+    chunk = []
+    size = 0
+    for record in records:
+        line = json.dumps(
+            {k: _plain_value(v) for k, v in zip(keys, record)},
+            ensure_ascii=False,
+            default=str,
+        )
+        chunk.append(line)
+        size += len(line) + 1
+        if size >= _FLUSH_BYTES:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+            size = 0
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+
+def tabular_response(
+    fmt: str, columns: Sequence[tuple], records: Iterable, filename: str
+) -> Response:
+    """Respuesta en streaming en CSV o NDJSON.
+
+    Args:
+        fmt: ``"csv"`` o ``"ndjson"``.
+        columns: pares ``(clave, encabezado)``; la clave se usa en NDJSON y el
+            encabezado en la primera fila del CSV.
+        records: iterable de secuencias de valores en el orden de ``columns``.
+        filename: nombre del archivo sin extensión.
+    """
+    if fmt == "csv":
+        body = iter_csv([label for _, label in columns], records)
+        mimetype = CSV_MIMETYPE
+    elif fmt == "ndjson":
+        body = iter_ndjson([key for key, _ in columns], records)
+        mimetype = NDJSON_MIMETYPE
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    resp = Response(
+        stream_with_context(_logged_stream(body, f"{filename}.{fmt}")),
+        mimetype=mimetype,
+    )
+    resp.headers.set("Content-Disposition", "attachment", filename=f"{filename}.{fmt}")
+    return resp
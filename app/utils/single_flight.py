@@ -0,0 +1,67 @@
+"""Coalescencia de llamadas concurrentes idénticas (single-flight).
+
+Si varios hilos del mismo proceso piden la misma clave al mismo tiempo, solo
+el primero ejecuta la función; los demás esperan y reciben su resultado (o su
+excepción). Al terminar la llamada la clave se libera: no es una caché, las
+peticiones posteriores vuelven a ejecutar la función.
+"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes por clave dentro de un proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        # Llamadas que se resolvieron esperando a otra (para métricas/tests)
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Ejecuta ``func()`` o espera a la ejecución en curso para ``key``.
+
+        Quienes esperan reciben una copia superficial del resultado, así que
+        pueden modificarlo sin afectar a los demás.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.copy(call.result)
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,66 @@
+"""Caché en memoria con expiración (TTL) para resultados de consultas costosas.
+
+Es local al proceso: cada worker de gunicorn mantiene su propia copia, así que
+solo debe usarse para datos donde unos segundos de desfase son aceptables
+(estadísticas, tableros). ``ttl <= 0`` desactiva la caché.
+"""
+
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Diccionario acotado cuyos valores expiran tras ``ttl`` segundos."""
+
+    def __init__(self, ttl: float = 5.0, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict = {}
+        self._lock = threading.Lock()
+        # Se incrementa en cada clear(); ver set(generation=...)
+        self.generation = 0
+
+    def get(self, key: Hashable, default: Any = None, ttl: Optional[float] = None):
+        """Devuelve el valor vigente para ``key`` o ``default``.
+
+        ``ttl`` permite acortar la vigencia en la lectura (p. ej. cuando el
+        valor viene de la configuración de la app).
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            stored_at, value = entry
+            if time.monotonic() - stored_at > ttl:
+                self._data.pop(key, None)
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Guarda ``value``.
+
+        Con ``generation`` (leída de ``self.generation`` antes de calcular el
+        valor) no se guarda nada si hubo un ``clear()`` mientras tanto: el
+        valor pudo calcularse con datos ya invalidados.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if len(self._data) >= self.maxsize and key not in self._data:
+                # Descartar la entrada más antigua (orden de inserción)
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic(), value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,137 @@
+"""Lectores en streaming para archivos subidos (XLSX / TXT).
+
+Las cargas batch solo necesitan recorrer filas una vez, así que en lugar de
+cargar el archivo completo en un DataFrame de pandas se itera con openpyxl en
+modo ``read_only`` (o línea por línea para TXT). El tipo se detecta por el
+contenido (firma ZIP de los .xlsx) y no por ensayo y error.
+"""
+
+from typing import Iterator, Optional, Tuple
+
+XLSX = "xlsx"
+TEXT = "text"
+
+# Todos los .xlsx son contenedores ZIP
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+def _rewind(file_stream) -> None:
+    try:
+        file_stream.seek(0)
+    except Exception:
+        pass
+
+
+def sniff_upload_kind(file_stream) -> str:
+    """Devuelve ``'xlsx'`` o ``'text'`` según la firma del contenido.
+
+    Lee solo los primeros bytes y deja el puntero al inicio.
+    """
+    _rewind(file_stream)
+    head = file_stream.read(len(_ZIP_MAGIC))
+    _rewind(file_stream)
+    if isinstance(head, str):
+        return TEXT
+    return XLSX if head == _ZIP_MAGIC else TEXT
+
+
+def cell_to_str(value) -> str:
+    """Convierte una celda a texto sin arrastrar decimales de números enteros.
+
+    openpyxl entrega ``21010001.0`` cuando la celda es numérica con formato
+    general; para números de control queremos ``'21010001'``.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _iter_text_lines(file_stream) -> Iterator[Tuple[int, str]]:
+    for line_no, raw in enumerate(file_stream, start=1):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="ignore")
+        if line_no == 1:
+            raw = raw.lstrip("\ufeff")
+        val = raw.strip()
+        if val:
+            yield line_no, val
+
+
+def _open_workbook(file_stream):
+    from openpyxl import load_workbook
+
+    _rewind(file_stream)
+    return load_workbook(file_stream, read_only=True, data_only=True)
+
+
+def iter_first_column(
+    file_stream, kind: Optional[str] = None
+) -> Iterator[Tuple[int, str]]:
+    """Itera ``(fila, valor)`` de la primera columna (XLSX) o de cada línea (TXT).
+
+    ``fila`` es el número de fila/línea real del archivo (base 1); las celdas
+    o líneas vacías se omiten.
+    """
+    kind = kind or sniff_upload_kind(file_stream)
+    if kind == TEXT:
+        _rewind(file_stream)
+        yield from _iter_text_lines(file_stream)
+        return
+
+    wb = _open_workbook(file_stream)
+    try:
+        ws = wb.worksheets[0]
+        for row_no, row in enumerate(
+            ws.iter_rows(min_col=1, max_col=1, values_only=True), start=1
+        ):
+            val = cell_to_str(row[0] if row else None)
+            if val:
+                yield row_no, val
+    finally:
+        wb.close()
+
+
+def iter_sheet_records(file_stream) -> Tuple[list, Iterator[Tuple[int, dict]]]:
+    """Lee la primera hoja de un XLSX como ``(encabezados, filas)``.
+
+    ``filas`` es un iterador perezoso de ``(fila_excel, {encabezado: valor})``
+    que omite filas completamente vacías. Los encabezados vacíos se nombran
+    ``'Unnamed: n'`` y los repetidos ``'nombre.1'``, igual que pandas.
+    """
+    wb = _open_workbook(file_stream)
+    ws = wb.worksheets[0]
+    rows = ws.iter_rows(values_only=True)
+
+    try:
+        header_row = next(rows)
+    except StopIteration:
+        wb.close()
+        return [], iter(())
+
+    headers = []
+    seen = {}
+    for i, h in enumerate(header_row):
+        name = cell_to_str(h) or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        headers.append(name)
+
+    def _records():
+        try:
+            for row_no, row in enumerate(rows, start=2):
+                values = [
+                    None if (isinstance(v, str) and not v.strip()) else v for v in row
+                ]
+                values += [None] * (len(headers) - len(values))
+                if all(v is None for v in values):
+                    continue
+                yield row_no, dict(zip(headers, values))
+        finally:
+            wb.close()
+
+    return headers, _records()
@@ -0,0 +1,82 @@
+"""``INSERT ... ON DUPLICATE KEY UPDATE`` / ``ON CONFLICT DO UPDATE`` portable.
+
+Para filas identificadas por una clave única (p. ej. ``control_number``) que
+pueden crearse desde varias peticiones a la vez: en lugar de insertar y
+recuperarse del ``IntegrityError``, la BD resuelve el choque en la misma
+sentencia.
+"""
+
+from typing import Iterable, List, Mapping, Optional, Sequence
+
+from sqlalchemy import func
+
+
+def upsert(
+    conn,
+    table,
+    rows: Iterable[Mapping],
+    key_columns: Sequence[str],
+    update_columns: Sequence[str],
+    keep_existing_on_null: bool = False,
+    touch_column: Optional[str] = None,
+) -> int:
+    """Inserta ``rows`` o actualiza ``update_columns`` de las que ya existen.
+
+    - ``keep_existing_on_null``: un valor nulo no borra el que ya estaba
+      (``COALESCE(nuevo, actual)``).
+    - ``touch_column``: columna que se pone a ``now()`` al actualizar (p. ej.
+      ``updated_at``; el ``onupdate`` del ORM no aplica a estas sentencias).
+
+    MySQL, SQLite y PostgreSQL lo hacen en una sentencia; otros dialectos
+    caen a UPDATE + INSERT fila por fila. Retorna el número de filas enviadas.
+    """
+    rows: List[Mapping] = list(rows)
+    if not rows:
+        return 0
+    dialect = conn.dialect.name
+
+    def new_value(source, column):
+        if keep_existing_on_null:
+            return func.coalesce(source[column], table.c[column])
+        return source[column]
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table)
+        values = {c: new_value(stmt.inserted, c) for c in update_columns}
+        if touch_column:
+            values[touch_column] = func.now()
+        conn.execute(stmt.on_duplicate_key_update(values), rows)
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table)
+        values = {c: new_value(stmt.excluded, c) for c in update_columns}
+        if touch_column:
+            values[touch_column] = func.now()
+        conn.execute(
+            stmt.on_conflict_do_update(index_elements=list(key_columns), set_=values),
+            rows,
+        )
+    else:
+        for row in rows:
+            values = {
+                c: row[c]
+                for c in update_columns
+                if c in row and not (keep_existing_on_null and row[c] is None)
+            }
+            if touch_column:
+                values[touch_column] = func.now()
+            key = {k: row[k] for k in key_columns}
+            result = conn.execute(
+                table.update()
+                .where(*(table.c[k] == v for k, v in key.items()))
+                .values(values or key)
+            )
+            if result.rowcount == 0:
+                conn.execute(table.insert().values(dict(row)))
+    return len(rows)
@@ -56,6 +56,43 @@ class Config:
     # This should match the timezone where the app is deployed and users are located
     # Default: America/Mexico_City (UTC-6 in winter, UTC-5 in DST)
     APP_TIMEZONE = os.environ.get("APP_TIMEZONE", "America/Mexico_City")
+    # Worker threads per process for background batch imports (/api/jobs)
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+    # Seconds the attendances listing stats are cached per filter set (0 = off)
+    ATTENDANCE_STATS_CACHE_SECONDS = float(
+        os.environ.get("ATTENDANCE_STATS_CACHE_SECONDS", "5")
+    )
+    # Seconds the /api/stats/ dashboard overview is cached (0 = off)
+    GENERAL_STATS_CACHE_SECONDS = float(
+        os.environ.get("GENERAL_STATS_CACHE_SECONDS", "10")
+    )
+    # Seconds the participation matrix is cached per event/activity (0 = off);
+    # commits that touch registrations or students also invalidate it in every
+    # worker (shared generation in cache_generations)
+    PARTICIPATION_MATRIX_CACHE_SECONDS = float(
+        os.environ.get("PARTICIPATION_MATRIX_CACHE_SECONDS", "300")
+    )
+    # Seconds a mirrored external student (external_students) is served
+    # without asking the school API again; stale rows are still served when
+    # the API fails
+    EXTERNAL_STUDENT_MAX_AGE_SECONDS = float(
+        os.environ.get("EXTERNAL_STUDENT_MAX_AGE_SECONDS", str(7 * 24 * 3600))
+    )
+    # Same for "not found" and incomplete answers (refetched sooner)
+    EXTERNAL_STUDENT_NEGATIVE_MAX_AGE_SECONDS = float(
+        os.environ.get("EXTERNAL_STUDENT_NEGATIVE_MAX_AGE_SECONDS", "3600")
+    )
+    # School API client (app/services/school_api_client.py): keep-alive pool
+    # size, and the circuit breaker opens after this many consecutive
+    # failures for SCHOOL_API_RESET_SECONDS
+    SCHOOL_API_BASE_URL = os.environ.get(
+        "SCHOOL_API_BASE_URL", "http://apps.tecvalles.mx:8091"
+    )
+    SCHOOL_API_POOL_SIZE = int(os.environ.get("SCHOOL_API_POOL_SIZE", "10"))
+    SCHOOL_API_FAILURE_THRESHOLD = int(
+        os.environ.get("SCHOOL_API_FAILURE_THRESHOLD", "5")
+    )
+    SCHOOL_API_RESET_SECONDS = float(os.environ.get("SCHOOL_API_RESET_SECONDS", "30"))
 
 
 class DevelopmentConfig(Config):
@@ -68,6 +105,10 @@ class TestingConfig(Config):
     # Usar base de datos sqlite en disco para tests para evitar problemas de conexiones
     SQLALCHEMY_DATABASE_URI = "sqlite:///test_eventostec.db"
     WTF_CSRF_ENABLED = False  # Deshabilitar CSRF para tests
+    # Sin caché de estadísticas: cada test parte de una BD nueva
+    ATTENDANCE_STATS_CACHE_SECONDS = 0
+    PARTICIPATION_MATRIX_CACHE_SECONDS = 0
+    GENERAL_STATS_CACHE_SECONDS = 0
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,98 @@
+"""Create activity_counters and backfill it from registrations/attendances."""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_activity_counters"
+down_revision = "20261016_app_settings_version"
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = (
+    "registered",
+    "confirmed",
+    "attended",
+    "absent",
+    "cancelled",
+    "attendances_present",
+    "attendances_partial",
+    "attendances_absent",
+    "walkins",
+)
+
+
+def upgrade():
+    """Create activity_counters with one row per existing activity."""
+    op.create_table(
+        "activity_counters",
+        sa.Column("activity_id", sa.Integer(), nullable=False),
+        *(
+            sa.Column(name, sa.Integer(), nullable=False, server_default="0")
+            for name in COUNTER_COLUMNS
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.ForeignKeyConstraint(["activity_id"], ["activities.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("activity_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO activity_counters (
+            activity_id, registered, confirmed, attended, absent, cancelled,
+            attendances_present, attendances_partial, attendances_absent, walkins
+        )
+        SELECT
+            a.id,
+            COALESCE(r.registered, 0),
+            COALESCE(r.confirmed, 0),
+            COALESCE(r.attended, 0),
+            COALESCE(r.absent, 0),
+            COALESCE(r.cancelled, 0),
+            COALESCE(t.attendances_present, 0),
+            COALESCE(t.attendances_partial, 0),
+            COALESCE(t.attendances_absent, 0),
+            COALESCE(t.walkins, 0)
+        FROM activities a
+        LEFT JOIN (
+            SELECT
+                activity_id,
+                SUM(CASE WHEN status = 'Registrado' THEN 1 ELSE 0 END) AS registered,
+                SUM(CASE WHEN status = 'Confirmado' THEN 1 ELSE 0 END) AS confirmed,
+                SUM(CASE WHEN status = 'Asistió' THEN 1 ELSE 0 END) AS attended,
+                SUM(CASE WHEN status = 'Ausente' THEN 1 ELSE 0 END) AS absent,
+                SUM(CASE WHEN status = 'Cancelado' THEN 1 ELSE 0 END) AS cancelled
+            FROM registrations
+            GROUP BY activity_id
+        ) r ON r.activity_id = a.id
+        LEFT JOIN (
+            SELECT
+                t.activity_id,
+                SUM(CASE WHEN t.status = 'Asistió' THEN 1 ELSE 0 END)
+                    AS attendances_present,
+                SUM(CASE WHEN t.status = 'Parcial' THEN 1 ELSE 0 END)
+                    AS attendances_partial,
+                SUM(CASE WHEN t.status = 'Ausente' THEN 1 ELSE 0 END)
+                    AS attendances_absent,
+                SUM(
+                    CASE WHEN NOT EXISTS (
+                        SELECT 1 FROM registrations x
+                        WHERE x.student_id = t.student_id
+                          AND x.activity_id = t.activity_id
+                    ) THEN 1 ELSE 0 END
+                ) AS walkins
+            FROM attendances t
+            GROUP BY t.activity_id
+        ) t ON t.activity_id = a.id
+        """
+    )
+
+
+def downgrade():
+    """Drop activity_counters table."""
+    op.drop_table("activity_counters")
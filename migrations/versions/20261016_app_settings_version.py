@@ -0,0 +1,33 @@
+"""Create app_settings_version generation counter."""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_app_settings_version"
+down_revision = "20261016_create_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the single-row version table and seed it."""
+    table = op.create_table(
+        "app_settings_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(table, [{"id": 1, "version": 0}])
+
+
+def downgrade():
+    """Drop app_settings_version table."""
+    op.drop_table("app_settings_version")
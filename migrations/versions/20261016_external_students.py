@@ -0,0 +1,34 @@
+"""Create external_students (local mirror of the school student directory)."""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_external_students"
+down_revision = "20261016_activity_counters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create external_students table."""
+    op.create_table(
+        "external_students",
+        sa.Column("control_number", sa.String(length=20), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("full_name", sa.String(length=100), nullable=True),
+        sa.Column("career", sa.String(length=100), nullable=True),
+        sa.Column("email", sa.String(length=100), nullable=True),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("control_number"),
+    )
+    op.create_index(
+        "ix_external_students_fetched_at", "external_students", ["fetched_at"]
+    )
+
+
+def downgrade():
+    """Drop external_students table."""
+    op.drop_index("ix_external_students_fetched_at", table_name="external_students")
+    op.drop_table("external_students")
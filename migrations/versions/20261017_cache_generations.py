@@ -0,0 +1,33 @@
+"""Create cache_generations shared counters for in-memory caches."""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_cache_generations"
+down_revision = "20261016_external_students"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the counters table and seed the participation matrix row."""
+    table = op.create_table(
+        "cache_generations",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(table, [{"name": "participation_matrix", "version": 0}])
+
+
+def downgrade():
+    """Drop cache_generations table."""
+    op.drop_table("cache_generations")
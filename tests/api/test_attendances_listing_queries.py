@@ -0,0 +1,164 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+
+
+@pytest.fixture
+def listing_data(app, sample_data):
+    activities = []
+    for n in range(2):
+        activity = Activity(
+            event_id=sample_data["event_id"],
+            department="TEST",
+            name=f"Taller listado {n}",
+            start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 11, 0, 0),
+            duration_hours=1.0,
+            activity_type="Taller",
+            location="Sala",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        activities.append(activity)
+    db.session.flush()
+
+    for i in range(30):
+        student = Student(
+            control_number=f"2202{i:04d}",
+            full_name=f"Alumno {i}",
+            career="ISC",
+        )
+        db.session.add(student)
+        db.session.flush()
+        activity = activities[i % 2]
+        # Las primeras 12 asistieron; el resto queda como 'Ausente' (default)
+        attended = i < 12
+        db.session.add(
+            Attendance(
+                student_id=student.id,
+                activity_id=activity.id,
+                status="Asistió" if attended else "Ausente",
+                attendance_percentage=100.0 if attended else 0.0,
+            )
+        )
+        # Un tercio no tiene preregistro (walk-ins)
+        if i % 3:
+            db.session.add(
+                Registration(
+                    student_id=student.id,
+                    activity_id=activity.id,
+                    status="Asistió",
+                    attended=True,
+                )
+            )
+    db.session.commit()
+    return activities
+
+
+def _list(count_queries, client, headers, per_page):
+    # Vaciar el identity map para que la petición no reutilice objetos del setup
+    db.session.expunge_all()
+    # Las lecturas de app_settings (zona horaria en safe_iso) no dependen del
+    # listado; se cuentan aparte
+    with count_queries(exclude="app_settings") as statements:
+        resp = client.get(f"/api/attendances/?per_page={per_page}", headers=headers)
+    assert resp.status_code == 200
+    return resp.get_json(), len(statements)
+
+
+def test_listing_query_count_is_independent_of_page_size(
+    client, auth_headers, listing_data, count_queries
+):
+    small, small_count = _list(count_queries, client, auth_headers, 5)
+    large, large_count = _list(count_queries, client, auth_headers, 30)
+
+    assert len(small["attendances"]) == 5
+    assert len(large["attendances"]) == 30
+    assert large_count == small_count
+    # auth + estadísticas (incluye total) + página + preregistros
+    assert large_count <= 5
+
+
+def test_listing_attaches_registration_and_related_objects(
+    client, auth_headers, listing_data, count_queries
+):
+    body, _ = _list(count_queries, client, auth_headers, 30)
+
+    with_registration = [a for a in body["attendances"] if a.get("registration")]
+    assert len(with_registration) == 20
+    for att in body["attendances"]:
+        assert att["student_name"].startswith("Alumno")
+        assert att["event_name"] == "Evento de prueba"
+        reg = att.get("registration")
+        if reg:
+            assert reg["student_id"] == att["student_id"]
+            assert reg["activity_id"] == att["activity_id"]
+            assert reg["activity"]["id"] == att["activity_id"]
+            assert reg["student"]["control_number"] == att["student_identifier"]
+
+
+def test_listing_stats_single_aggregate(
+    client, auth_headers, listing_data, count_queries
+):
+    body, _ = _list(count_queries, client, auth_headers, 5)
+
+    assert body["total"] == 30
+    # walk-ins: i % 3 == 0 -> 10; convertidas: con preregistro y 'Asistió'
+    # (i < 12 and i % 3) -> 8; errores: 'Ausente' -> 18
+    assert body["stats"] == {
+        "today": 30,
+        "walkins": 10,
+        "converted": 8,
+        "errors": 18,
+    }
+
+
+def test_listing_stats_cache_keeps_total_exact(
+    app, client, auth_headers, listing_data, monkeypatch, count_queries
+):
+    from app.api import attendances_bp
+
+    monkeypatch.setitem(app.config, "ATTENDANCE_STATS_CACHE_SECONDS", 60)
+    attendances_bp._listing_stats_cache.clear()
+    try:
+        first, _ = _list(count_queries, client, auth_headers, 5)
+        for att in Attendance.query.filter_by(status="Ausente").limit(3).all():
+            db.session.delete(att)
+        db.session.commit()
+        second, _ = _list(count_queries, client, auth_headers, 5)
+    finally:
+        attendances_bp._listing_stats_cache.clear()
+
+    # Estadísticas servidas desde caché; el total siempre se recalcula
+    assert second["stats"] == first["stats"]
+    assert second["total"] == first["total"] - 3
+
+
+def test_listing_resolves_timezone_once_per_request(
+    client, auth_headers, listing_data, monkeypatch, count_queries
+):
+    from app.services.settings_manager import AppSettings
+
+    calls = []
+    original = AppSettings.app_timezone
+
+    def counting_app_timezone():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(AppSettings, "app_timezone", counting_app_timezone)
+    db.session.expunge_all()
+    with count_queries() as statements:
+        resp = client.get("/api/attendances/?per_page=30", headers=auth_headers)
+    settings_statements = [s for s in statements if "app_settings" in s]
+
+    assert resp.status_code == 200
+    assert len(calls) <= 1
+    # Verificación de versión y, como mucho, una recarga del snapshot
+    assert len(settings_statements) <= 2
@@ -42,8 +42,8 @@ def test_student_login_external_api_mock(client, mocker):
         },
     }
 
-    # El código hace requests.post, no get
-    mocker.patch("requests.post", return_value=mock_response)
+    # El código hace un POST con la sesión del cliente de la API escolar
+    mocker.patch("requests.Session.request", return_value=mock_response)
 
     response = client.post(
         "/api/auth/student-login",
@@ -51,3 +51,81 @@ def test_student_login_external_api_mock(client, mocker):
     )
 
     assert response.status_code == 200
+
+
+def test_login_tokens_carry_type_claims(client, mocker):
+    from flask_jwt_extended import decode_token
+
+    from app import db
+    from app.models.user import User
+
+    user = User(username="claims", email="claims@test.com", role="Admin")
+    user.set_password("testpass")
+    db.session.add(user)
+    db.session.commit()
+
+    resp = client.post(
+        "/api/auth/login", json={"username": "claims", "password": "testpass"}
+    )
+    claims = decode_token(resp.get_json()["access_token"])
+    assert (claims["type"], claims["role"]) == ("admin", "Admin")
+
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"success": True, "data": {"name": "Ana"}}
+    mocker.patch("requests.Session.request", return_value=mock_response)
+    resp = client.post(
+        "/api/auth/student-login",
+        json={"control_number": "90070", "password": "testpass"},
+    )
+    assert decode_token(resp.get_json()["access_token"])["type"] == "student"
+
+
+def test_admin_check_uses_claims_without_db_lookup(client, app, count_queries):
+    from app import db
+    from app.models.student import Student
+    from app.models.user import User
+    from app.utils.auth_helpers import create_admin_token, create_student_token
+
+    user = User(username="collide", email="collide@test.com", role="Admin")
+    user.set_password("x")
+    db.session.add(user)
+    db.session.commit()
+    # Un estudiante con el mismo id que el administrador
+    student = Student(id=user.id, control_number="90071", full_name="Ana")
+    db.session.add(student)
+    db.session.commit()
+
+    admin = {"Authorization": f"Bearer {create_admin_token(user)}"}
+    pupil = {"Authorization": f"Bearer {create_student_token(student)}"}
+    with count_queries() as statements:
+        assert client.get("/api/stats/school-api", headers=admin).status_code == 200
+    assert statements == []
+
+    # Con el claim, el token del estudiante no se confunde con el admin
+    assert client.get("/api/stats/school-api", headers=pupil).status_code == 403
+    resp = client.get("/api/auth/profile", headers=pupil)
+    assert resp.get_json()["student"]["control_number"] == "90071"
+
+
+def test_student_login_without_name_creates_student(client, mocker):
+    from app.models.student import Student
+
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    # Credenciales válidas, pero la API no devuelve el nombre
+    mock_response.json.return_value = {
+        "success": True,
+        "data": {"career": {"name": "Sistemas"}, "email": "x@example.com"},
+    }
+    mocker.patch("requests.Session.request", return_value=mock_response)
+
+    response = client.post(
+        "/api/auth/student-login",
+        json={"control_number": "90080", "password": "testpass"},
+    )
+
+    assert response.status_code == 200
+    student = Student.query.filter_by(control_number="90080").one()
+    assert (student.full_name, student.career) == ("", "Sistemas")
+    assert response.get_json()["student"]["id"] == student.id
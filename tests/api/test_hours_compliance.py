@@ -0,0 +1,121 @@
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+
+
+@pytest.fixture
+def hours_data(app, sample_data):
+    event_id = sample_data["event_id"]
+    activities = []
+    for n, hours in enumerate((2.0, 3.0, 1.5)):
+        activity = Activity(
+            event_id=event_id,
+            department="TEST",
+            name=f"Actividad {n}",
+            start_datetime=datetime(2024, 1, 1, 9 + n, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 10 + n, 0, 0),
+            duration_hours=hours,
+            activity_type="Taller",
+            location="Sala",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        activities.append(activity)
+
+    students = [
+        Student(control_number="6606001", full_name="Beatriz Solís", career="ISC"),
+        Student(control_number="6606002", full_name="Andrés Peña", career="IGE"),
+        Student(control_number="6606003", full_name="Carla 100%", career=None),
+    ]
+    db.session.add_all(students)
+    db.session.flush()
+    a0, a1, a2 = activities
+    s0, s1, s2 = students
+
+    # s0: preregistro confirmado y asistencia en a0 (cuenta una vez) + walk-in a1
+    db.session.add(Registration(student_id=s0.id, activity_id=a0.id, status="Asistió"))
+    db.session.add(Attendance(student_id=s0.id, activity_id=a0.id, status="Asistió"))
+    db.session.add(Attendance(student_id=s0.id, activity_id=a1.id, status="Asistió"))
+    # s1: confirmado en a2; preregistro sin confirmar en a1 no cuenta
+    db.session.add(
+        Registration(student_id=s1.id, activity_id=a2.id, status="Confirmado")
+    )
+    db.session.add(
+        Registration(student_id=s1.id, activity_id=a1.id, status="Registrado")
+    )
+    # s2: asistencia parcial no cuenta; confirmada en a1
+    db.session.add(Attendance(student_id=s2.id, activity_id=a0.id, status="Parcial"))
+    db.session.add(Attendance(student_id=s2.id, activity_id=a1.id, status="Asistió"))
+    db.session.commit()
+    return event_id
+
+
+def _report(client, headers, **params):
+    resp = client.get(
+        "/api/reports/hours_compliance", headers=headers, query_string=params
+    )
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_hours_dedupes_pairs_and_sorts_by_name(client, auth_headers, hours_data):
+    body = _report(client, auth_headers, event_id=hours_data)
+
+    rows = [(s["full_name"], s["total_hours"], s["career"]) for s in body["students"]]
+    assert rows == [
+        ("Andrés Peña", 1.5, "IGE"),
+        ("Beatriz Solís", 5.0, "ISC"),
+        ("Carla 100%", 3.0, "Sin especificar"),
+    ]
+    assert body["total"] == 3
+
+
+def test_hours_filters_in_sql(client, auth_headers, hours_data):
+    def names(**params):
+        body = _report(client, auth_headers, event_id=hours_data, **params)
+        return [s["full_name"] for s in body["students"]]
+
+    assert names(career="ISC") == ["Beatriz Solís"]
+    assert names(career="Sin especificar") == ["Carla 100%"]
+    assert names(search="andr") == ["Andrés Peña"]
+    assert names(search="6606003") == ["Carla 100%"]
+    # Los comodines de LIKE se buscan literalmente
+    assert names(search="100%") == ["Carla 100%"]
+    assert names(min_hours=3) == ["Beatriz Solís", "Carla 100%"]
+
+
+def test_hours_pagination(client, auth_headers, hours_data):
+    first = _report(client, auth_headers, event_id=hours_data, page=1, per_page=2)
+    second = _report(client, auth_headers, event_id=hours_data, page=2, per_page=2)
+
+    assert first["total"] == second["total"] == 3
+    assert first["pages"] == 2
+    assert [s["full_name"] for s in first["students"]] == [
+        "Andrés Peña",
+        "Beatriz Solís",
+    ]
+    assert [s["full_name"] for s in second["students"]] == ["Carla 100%"]
+
+
+def test_hours_excel_uses_same_aggregate(client, auth_headers, hours_data):
+    resp = client.get(
+        "/api/reports/hours_compliance_excel",
+        headers=auth_headers,
+        query_string={"event_id": hours_data, "min_hours": 2},
+    )
+
+    assert resp.status_code == 200
+    ws = load_workbook(BytesIO(resp.data)).active
+    rows = list(ws.iter_rows(min_row=2, values_only=True))
+    assert rows == [
+        (1, "6606001", "Beatriz Solís", "ISC", 5.0),
+        (2, "6606003", "Carla 100%", "Sin especificar", 3.0),
+    ]
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+
+def _create_activity(app, event_id):
+    from app import db
+    from app.models.activity import Activity
+
+    start = datetime.now(timezone.utc)
+    activity = Activity(
+        name="Actividad job test",
+        event_id=event_id,
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=1),
+        duration_hours=1.0,
+        activity_type="Taller",
+        department="General",
+        location="Sala 1",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.commit()
+    return activity.id
+
+
+def _wait_for_job(client, headers, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = client.get(f"/api/jobs/{job_id}", headers=headers)
+        assert resp.status_code == 200
+        job = resp.get_json()["job"]
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_async_batch_upload_returns_job_and_report(
+    client, app, sample_data, auth_headers
+):
+    from app.models.attendance import Attendance
+
+    activity_id = _create_activity(app, sample_data["event_id"])
+    txt_file = BytesIO(b"12345678\nnot-valid\n")
+
+    resp = client.post(
+        "/api/attendances/batch",
+        data={
+            "activity_id": str(activity_id),
+            "dry_run": "0",
+            "async": "1",
+            "file": (txt_file, "controls.txt"),
+        },
+        headers=auth_headers,
+        content_type="multipart/form-data",
+    )
+
+    assert resp.status_code == 202
+    body = resp.get_json()
+    assert body["job_id"]
+    assert body["job"]["status"] == "queued"
+
+    job = _wait_for_job(client, auth_headers, body["job_id"])
+    assert job["status"] == "succeeded", job.get("error")
+    assert job["kind"] == "attendances_batch"
+    report = job["result"]
+    assert report["created"] == 1
+    assert report["invalid"] == 1
+    assert report["dry_run"] is False
+    assert job["progress"]["created"] == 1
+    assert job["processed"] == job["total"] == 2
+
+    assert (
+        Attendance.query.filter_by(
+            student_id=sample_data["student_id"], activity_id=activity_id
+        ).count()
+        == 1
+    )
+
+
+def test_job_failure_is_reported(client, app, auth_headers):
+    from app.services.job_service import submit_job
+
+    def _boom(progress=None):
+        raise RuntimeError("boom")
+
+    job = submit_job("test", _boom)
+    result = _wait_for_job(client, auth_headers, job.id)
+
+    assert result["status"] == "failed"
+    assert "boom" in result["error"]
+
+
+def test_unknown_job_returns_404(client, auth_headers):
+    resp = client.get("/api/jobs/doesnotexist", headers=auth_headers)
+    assert resp.status_code == 404
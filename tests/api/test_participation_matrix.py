@@ -0,0 +1,212 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.registration import Registration
+from app.models.student import Student
+
+
+@pytest.fixture
+def matrix_data(app, sample_data):
+    activities = []
+    for n in range(2):
+        activity = Activity(
+            event_id=sample_data["event_id"],
+            department="TEST",
+            name=f"Taller {n}",
+            start_datetime=datetime(2024, 9, 2, 10 + n, 0, 0),
+            end_datetime=datetime(2024, 9, 2, 11 + n, 0, 0),
+            duration_hours=1.0,
+            activity_type="Taller",
+            location="Sala",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        activities.append(activity)
+
+    students = [
+        Student(control_number="L23010001", full_name="A", career="ISC"),
+        Student(control_number="23010002", full_name="B", career="ISC"),
+        Student(control_number="22010003", full_name="C", career="IGE"),
+        Student(control_number="SINDIGITOS", full_name="D", career=None),
+        Student(control_number="21010005", full_name="E", career="ISC"),
+    ]
+    db.session.add_all(students)
+    db.session.flush()
+    a0, a1 = activities
+    s0, s1, s2, s3, s4 = students
+
+    # s0 en ambas actividades: cuenta una sola vez en el evento
+    db.session.add(Registration(student_id=s0.id, activity_id=a0.id))
+    db.session.add(
+        Registration(student_id=s0.id, activity_id=a1.id, status="Confirmado")
+    )
+    db.session.add(Registration(student_id=s1.id, activity_id=a0.id))
+    db.session.add(Registration(student_id=s2.id, activity_id=a1.id, status="Asistió"))
+    db.session.add(Registration(student_id=s3.id, activity_id=a0.id))
+    # Cancelado no cuenta
+    db.session.add(
+        Registration(student_id=s4.id, activity_id=a0.id, status="Cancelado")
+    )
+    db.session.commit()
+    return sample_data["event_id"], a0.id, s4.id
+
+
+def _matrix(client, headers, **params):
+    resp = client.get(
+        "/api/reports/participation_matrix", headers=headers, query_string=params
+    )
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_matrix_counts_unique_students(client, auth_headers, matrix_data):
+    event_id, _, _ = matrix_data
+    body = _matrix(client, auth_headers, event_id=event_id)
+
+    assert body["careers"] == ["IGE", "ISC", "Sin Especificar"]
+    assert body["generations"] == ["", "22", "23"]
+    assert body["matrix"] == {
+        "ISC": {"23": 2},
+        "IGE": {"22": 1},
+        "Sin Especificar": {"": 1},
+    }
+    # Referencia: inicio del evento (enero 2024)
+    assert body["semesters"] == ["4", "6"]
+    assert body["matrix_semester"] == {"ISC": {"4": 2}, "IGE": {"6": 1}}
+    assert body["matrix_headers"] == ["4", "6"]
+    assert body["matrix_rows"] == [
+        ["IGE", 0, 1, 1],
+        ["ISC", 2, 0, 2],
+        ["Sin Especificar", 0, 0, 0],
+    ]
+    assert body["matrix_footer"] == ["Total", 2, 1, 3]
+    assert body["rowSubtotals"] == {"IGE": 1, "ISC": 2, "Sin Especificar": 0}
+    assert body["grandTotal"] == 3
+
+
+def test_matrix_by_activity(client, auth_headers, matrix_data):
+    _, activity_id, _ = matrix_data
+    body = _matrix(client, auth_headers, activity_id=activity_id)
+
+    assert body["matrix"] == {"ISC": {"23": 2}, "Sin Especificar": {"": 1}}
+    # Referencia: inicio de la actividad (septiembre 2024)
+    assert body["matrix_semester"] == {"ISC": {"3": 2}}
+
+
+def test_matrix_cache_invalidated_on_registration_change(
+    app, client, auth_headers, matrix_data
+):
+    from app.services import report_service
+
+    app.config["PARTICIPATION_MATRIX_CACHE_SECONDS"] = 300
+    report_service.invalidate_participation_matrix()
+    event_id, activity_id, cancelled_student = matrix_data
+    first = _matrix(client, auth_headers, event_id=event_id)
+
+    calls = []
+    original = report_service.compute_participation_matrix
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    report_service.compute_participation_matrix = counting
+    try:
+        assert _matrix(client, auth_headers, event_id=event_id) == first
+        assert calls == []
+
+        # Actualización en bloque (sin flush de objetos)
+        db.session.execute(
+            db.update(Registration)
+            .where(Registration.student_id == cancelled_student)
+            .values(status="Registrado")
+        )
+        db.session.commit()
+
+        body = _matrix(client, auth_headers, event_id=event_id)
+        assert len(calls) == 1
+        assert body["matrix"]["ISC"] == {"21": 1, "23": 2}
+
+        # Cambio de carrera vía ORM
+        student = db.session.get(Student, cancelled_student)
+        student.career = "IGE"
+        db.session.commit()
+
+        body = _matrix(client, auth_headers, event_id=event_id)
+        assert len(calls) == 2
+        assert body["matrix"]["IGE"] == {"21": 1, "22": 1}
+    finally:
+        report_service.compute_participation_matrix = original
+        report_service.invalidate_participation_matrix()
+
+
+def test_matrix_cache_follows_shared_generation(app, client, auth_headers, matrix_data):
+    from app.models.cache_generation import CacheGeneration
+    from app.services import report_service
+
+    app.config["PARTICIPATION_MATRIX_CACHE_SECONDS"] = 300
+    report_service.invalidate_participation_matrix()
+    event_id, _, _ = matrix_data
+
+    calls = []
+    original = report_service.compute_participation_matrix
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    report_service.compute_participation_matrix = counting
+    try:
+        _matrix(client, auth_headers, event_id=event_id)
+        _matrix(client, auth_headers, event_id=event_id)
+        assert len(calls) == 1
+
+        # Commit en otro worker: solo cambia la generación compartida, la
+        # caché local de este proceso sigue intacta
+        with db.engine.begin() as conn:
+            CacheGeneration.bump("participation_matrix", conn)
+
+        _matrix(client, auth_headers, event_id=event_id)
+        assert len(calls) == 2
+        _matrix(client, auth_headers, event_id=event_id)
+        assert len(calls) == 2
+
+        # Un commit local también incrementa la generación
+        before = CacheGeneration.current("participation_matrix")
+        student = db.session.get(Student, matrix_data[2])
+        student.career = "IGE"
+        db.session.commit()
+        assert CacheGeneration.current("participation_matrix") == before + 1
+    finally:
+        report_service.compute_participation_matrix = original
+        report_service.invalidate_participation_matrix()
+
+
+def test_matrix_cache_invalidated_by_student_upsert(
+    app, client, auth_headers, matrix_data
+):
+    from app.services import report_service
+    from app.services.student_service import upsert_students
+
+    app.config["PARTICIPATION_MATRIX_CACHE_SECONDS"] = 300
+    report_service.invalidate_participation_matrix()
+    event_id, _, _ = matrix_data
+    try:
+        assert _matrix(client, auth_headers, event_id=event_id)["matrix"]["ISC"] == {
+            "23": 2
+        }
+
+        # Importación que corrige la carrera (upsert Core, sin flush del ORM)
+        upsert_students(
+            [{"control_number": "23010002", "full_name": "B", "career": "IGE"}]
+        )
+        db.session.commit()
+
+        body = _matrix(client, auth_headers, event_id=event_id)
+        assert body["matrix"]["ISC"] == {"23": 1}
+        assert body["matrix"]["IGE"] == {"22": 1, "23": 1}
+    finally:
+        report_service.invalidate_participation_matrix()
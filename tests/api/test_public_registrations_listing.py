@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+
+
+@pytest.fixture
+def participants(app, sample_data):
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Magistral pública",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 12, 0, 0),
+        duration_hours=2.0,
+        activity_type="Magistral",
+        location="Auditorio",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.flush()
+
+    def _student(cn, name):
+        s = Student(control_number=cn, full_name=name, career="ISC")
+        db.session.add(s)
+        db.session.flush()
+        return s
+
+    # Preregistro con asistencia
+    s1 = _student("21010003", "Ana López")
+    db.session.add(Registration(student_id=s1.id, activity_id=activity.id))
+    db.session.add(
+        Attendance(student_id=s1.id, activity_id=activity.id, status="Asistió")
+    )
+    # Preregistro sin asistencia
+    s2 = _student("21010001", "Beto Ruiz")
+    db.session.add(Registration(student_id=s2.id, activity_id=activity.id))
+    # Walk-in (asistencia sin preregistro), número con prefijo
+    s3 = _student("B21010002", "Carla Díaz")
+    db.session.add(
+        Attendance(student_id=s3.id, activity_id=activity.id, status="Parcial")
+    )
+    # Preregistro cancelado con asistencia -> aparece como fila de asistencia
+    s4 = _student("21010004", "Dora Paz")
+    db.session.add(
+        Registration(student_id=s4.id, activity_id=activity.id, status="Cancelado")
+    )
+    db.session.add(
+        Attendance(student_id=s4.id, activity_id=activity.id, status="Asistió")
+    )
+    # Asistencia marcada como ausente -> oculta
+    s5 = _student("21010005", "Eva Sol")
+    db.session.add(
+        Attendance(student_id=s5.id, activity_id=activity.id, status="Ausente")
+    )
+    db.session.commit()
+    return activity.id
+
+
+def _get(client, **params):
+    resp = client.get("/api/public/registrations", query_string=params)
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()
+
+
+def test_merges_sources_and_orders_by_control_number(client, participants):
+    body = _get(client, activity_id=participants)
+
+    assert body["total"] == 4
+    rows = body["registrations"]
+    assert [r["control_number"] for r in rows] == [
+        "21010001",
+        "21010003",
+        "21010004",
+        "B21010002",
+    ]
+    by_cn = {r["control_number"]: r for r in rows}
+    assert by_cn["21010001"]["source"] == "registration"
+    assert by_cn["21010001"]["attendance_id"] is None
+    assert by_cn["21010003"]["source"] == "registration"
+    assert by_cn["21010003"]["attendance_id"] is not None
+    assert by_cn["21010004"]["source"] == "attendance"
+    assert by_cn["21010004"]["registration_id"] is None
+    assert by_cn["B21010002"]["attended"] is True
+    assert body["next_cursor"] is None
+
+
+def test_search_filters_in_sql(client, participants):
+    body = _get(client, activity_id=participants, q="carla")
+    assert body["total"] == 1
+    assert body["registrations"][0]["control_number"] == "B21010002"
+
+    body = _get(client, activity_id=participants, q="1000")
+    assert body["total"] == 4
+
+
+def test_keyset_cursor_matches_offset_pages(client, participants):
+    offset_rows = []
+    for page in (1, 2):
+        body = _get(client, activity_id=participants, per_page=2, page=page)
+        offset_rows += [r["control_number"] for r in body["registrations"]]
+
+    first = _get(client, activity_id=participants, per_page=2)
+    assert first["next_cursor"]
+    second = _get(
+        client, activity_id=participants, per_page=2, cursor=first["next_cursor"]
+    )
+    cursor_rows = [
+        r["control_number"] for r in first["registrations"] + second["registrations"]
+    ]
+
+    assert cursor_rows == offset_rows
+    assert second["next_cursor"] is None
+
+
+def test_invalid_cursor_returns_400(client, participants):
+    resp = client.get(
+        "/api/public/registrations",
+        query_string={"activity_id": participants, "cursor": "not-a-cursor"},
+    )
+    assert resp.status_code == 400
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.student import Student
+
+
+@pytest.fixture
+def long_activity(app, sample_data):
+    """Actividad capturada con 4 h cuando en realidad duró 2 h."""
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Magistral mal capturada",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 14, 0, 0),
+        duration_hours=4.0,
+        activity_type="Magistral",
+        location="Auditorio",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.flush()
+    ids = []
+    for i, minutes in enumerate((120, 90, 30)):
+        student = Student(control_number=f"5505{i:04d}", full_name=f"Alumno {i}")
+        db.session.add(student)
+        db.session.flush()
+        att = Attendance(
+            student_id=student.id,
+            activity_id=activity.id,
+            check_in_time=datetime(2024, 1, 1, 10, 0, 0),
+            check_out_time=datetime(2024, 1, 1, 10 + minutes // 60, minutes % 60, 0),
+            attendance_percentage=round(minutes / 240 * 100, 2),
+            status="Parcial",
+        )
+        db.session.add(att)
+        db.session.flush()
+        ids.append(att.id)
+    # Asistencia abierta: el recálculo no la cierra
+    open_student = Student(control_number="55059999", full_name="Abierta")
+    db.session.add(open_student)
+    db.session.flush()
+    db.session.add(
+        Attendance(
+            student_id=open_student.id,
+            activity_id=activity.id,
+            check_in_time=datetime(2024, 1, 1, 10, 0, 0),
+        )
+    )
+    db.session.commit()
+    return activity.id, ids
+
+
+def test_recalculate_all_after_fixing_duration(client, auth_headers, long_activity):
+    activity_id, ids = long_activity
+    activity = db.session.get(Activity, activity_id)
+    activity.duration_hours = 2.0
+    activity.end_datetime = datetime(2024, 1, 1, 12, 0, 0)
+    db.session.commit()
+
+    preview = client.post(
+        f"/api/activities/{activity_id}/recalculate-all",
+        headers=auth_headers,
+        json={"dry_run": True},
+    )
+    assert preview.status_code == 200
+    assert preview.get_json()["summary"]["changed"] == 3
+    db.session.expire_all()
+    assert db.session.get(Attendance, ids[0]).attendance_percentage == 50.0
+
+    resp = client.post(
+        f"/api/activities/{activity_id}/recalculate-all", headers=auth_headers
+    )
+
+    assert resp.status_code == 200
+    summary = resp.get_json()["summary"]
+    assert summary["processed"] == 3
+    assert summary["updated"] == 3
+    db.session.expire_all()
+    results = [
+        (
+            db.session.get(Attendance, i).attendance_percentage,
+            db.session.get(Attendance, i).status,
+        )
+        for i in ids
+    ]
+    assert results == [(100.0, "Asistió"), (75.0, "Parcial"), (25.0, "Parcial")]
+    assert (
+        Attendance.query.filter_by(activity_id=activity_id, check_out_time=None).count()
+        == 1
+    )
+
+
+def test_recalculate_all_requires_existing_activity(client, auth_headers):
+    resp = client.post("/api/activities/999999/recalculate-all", headers=auth_headers)
+    assert resp.status_code == 404
+
+
+def test_recalculate_all_requires_auth(client, long_activity):
+    activity_id, _ = long_activity
+    resp = client.post(f"/api/activities/{activity_id}/recalculate-all")
+    assert resp.status_code == 401
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.student import Student
+
+
+def _fake_school_login(mocker, status_code=200, data=None):
+    """Patch the HTTP session; returns the list of requested URLs."""
+    urls = []
+
+    def fake_request(method, url, **kwargs):
+        urls.append(url)
+        resp = mocker.Mock()
+        resp.status_code = status_code
+        resp.json.return_value = {"success": data is not None, "data": data}
+        return resp
+
+    mocker.patch("requests.Session.request", side_effect=fake_request)
+    return urls
+
+
+def _open_activity(event_id):
+    start = datetime.now() + timedelta(hours=1)
+    activity = Activity(
+        event_id=event_id,
+        department="TEST",
+        name="Conferencia abierta",
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=2),
+        duration_hours=2.0,
+        activity_type="Magistral",
+        location="Auditorio",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.commit()
+    return activity.id
+
+
+def test_self_register_authenticates_in_process(client, sample_data, mocker):
+    from app.services.school_api_client import get_school_api
+
+    activity_id = _open_activity(sample_data["event_id"])
+    urls = _fake_school_login(
+        mocker,
+        data={"name": "Ana López", "career": {"name": "ISC"}, "email": "a@x.mx"},
+    )
+
+    resp = client.post(
+        "/api/registrations/self",
+        json={
+            "control_number": "90060",
+            "password": "secreto",
+            "activity_id": activity_id,
+        },
+    )
+
+    assert resp.status_code == 201
+    # Una sola llamada, al sistema externo; ninguna a la propia app
+    assert urls == [get_school_api().url("login")]
+    student = Student.query.filter_by(control_number="90060").one()
+    assert (student.full_name, student.career) == ("Ana López", "ISC")
+    assert (
+        Attendance.query.filter_by(
+            student_id=student.id, activity_id=activity_id
+        ).count()
+        == 1
+    )
+
+
+def test_self_register_rejects_invalid_credentials(client, sample_data, mocker):
+    activity_id = _open_activity(sample_data["event_id"])
+    _fake_school_login(mocker, status_code=401)
+
+    resp = client.post(
+        "/api/registrations/self",
+        json={"control_number": "90061", "password": "x", "activity_id": activity_id},
+    )
+
+    assert resp.status_code == 401
+    assert Student.query.filter_by(control_number="90061").first() is None
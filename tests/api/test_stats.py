@@ -225,3 +225,91 @@ def test_get_stats_today_attendances_only_counts_today(client, sample_data, app)
     assert data["today_attendances"] == today_count
     # Pero total_attendances debe incluir todas
     assert data["total_attendances"] >= 2
+
+
+def test_get_stats_many_counts_per_event_in_one_query(app, sample_data, count_queries):
+    """Contadores exactos por evento con una sola consulta agrupada."""
+    from app.models.student import Student
+
+    event1 = db.session.get(Event, sample_data["event_id"])
+    empty = Event(
+        name="Sin actividades",
+        start_date=datetime(2024, 3, 1),
+        end_date=datetime(2024, 3, 2),
+    )
+    db.session.add(empty)
+    activities = [
+        Activity(
+            event_id=event1.id,
+            department="TEST",
+            name=f"Actividad {n}",
+            start_datetime=datetime(2024, 1, 1, 10 + n, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 11 + n, 0, 0),
+            duration_hours=1.0,
+            activity_type="Taller",
+            location="Aula",
+            modality="Presencial",
+        )
+        for n in range(2)
+    ]
+    other = Student(control_number="99009900", full_name="Otro")
+    db.session.add_all([*activities, other])
+    db.session.flush()
+    for act in activities:
+        db.session.add(
+            Registration(student_id=sample_data["student_id"], activity_id=act.id)
+        )
+        db.session.add(
+            Attendance(
+                student_id=sample_data["student_id"],
+                activity_id=act.id,
+                status="Asistió",
+            )
+        )
+    db.session.add(Registration(student_id=other.id, activity_id=activities[0].id))
+    db.session.add(
+        Attendance(student_id=other.id, activity_id=activities[0].id, status="Parcial")
+    )
+    db.session.commit()
+    event_id, empty_id = event1.id, empty.id
+
+    with count_queries() as statements:
+        stats = Event.get_stats_many([event_id, empty_id])
+
+    assert len(statements) == 1
+    assert stats[event_id] == {
+        "total_activities": 2,
+        "total_registrations": 3,
+        "total_attendances": 2,
+        "total_students": 2,
+    }
+    # Sin preregistros no se usa el total global de estudiantes
+    assert stats[empty_id] == {
+        "total_activities": 0,
+        "total_registrations": 0,
+        "total_attendances": 0,
+        "total_students": 0,
+    }
+    assert Event.get_stats(event_id) == stats[event_id]
+
+
+def test_get_stats_is_cached_briefly(client, sample_data, app):
+    """Con caché activa, el resumen no se recalcula en cada petición."""
+    app.config["GENERAL_STATS_CACHE_SECONDS"] = 60
+    from app.api import stats_bp
+
+    stats_bp._general_stats_cache.clear()
+    try:
+        first = client.get("/api/stats/").get_json()
+        event = db.session.get(Event, sample_data["event_id"])
+        event.is_active = False
+        db.session.commit()
+
+        assert client.get("/api/stats/").get_json() == first
+
+        app.config["GENERAL_STATS_CACHE_SECONDS"] = 0
+        assert client.get("/api/stats/").get_json()["active_events"] == (
+            first["active_events"] - 1
+        )
+    finally:
+        stats_bp._general_stats_cache.clear()
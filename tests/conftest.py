@@ -5,7 +5,9 @@ from app import create_app, db
 import pytest
 import sys
 import os
+from contextlib import contextmanager
 from datetime import datetime
+from sqlalchemy import event as sa_event
 
 # Asegurar que el cwd está en sys.path para imports relativos en tests (igual que antes)
 sys.path.insert(0, os.path.abspath("."))
@@ -63,6 +65,33 @@ def app():
         pass
 
 
+@pytest.fixture
+def count_queries(app):
+    """Registrar las sentencias SQL ejecutadas dentro de un bloque.
+
+    ``with count_queries() as statements:``. Con ``exclude`` se omiten las
+    sentencias que contienen ese texto (p. ej. las lecturas de
+    ``app_settings`` que no dependen del código medido).
+    """
+
+    @contextmanager
+    def _count(exclude=None):
+        statements = []
+
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if exclude is None or exclude not in statement:
+                statements.append(statement)
+
+        engine = db.engine
+        sa_event.listen(engine, "before_cursor_execute", _before)
+        try:
+            yield statements
+        finally:
+            sa_event.remove(engine, "before_cursor_execute", _before)
+
+    return _count
+
+
 @pytest.fixture
 def client(app):
     """Cliente de test"""
@@ -0,0 +1,151 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.activity_counter import ActivityCounter
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+from app.services.activity_counter_service import (
+    get_activity_counters,
+    rebuild_activity_counters,
+)
+from app.services.attendance_service import batch_checkout
+
+
+@pytest.fixture
+def counter_data(app, sample_data):
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Taller con contadores",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 12, 0, 0),
+        duration_hours=2.0,
+        activity_type="Taller",
+        location="Sala",
+        modality="Presencial",
+        max_capacity=2,
+    )
+    students = [
+        Student(control_number=f"3303{i:04d}", full_name=f"Alumno {i}")
+        for i in range(4)
+    ]
+    db.session.add(activity)
+    db.session.add_all(students)
+    db.session.commit()
+    return activity.id, [s.id for s in students]
+
+
+def _counters(activity_id):
+    return get_activity_counters([activity_id])[activity_id]
+
+
+def _assert_matches_source(activity_id):
+    assert rebuild_activity_counters([activity_id])["fixed"] == []
+
+
+def test_new_activity_gets_zero_row(counter_data):
+    activity_id, _ = counter_data
+    row = db.session.get(ActivityCounter, activity_id)
+    assert row is not None
+    assert row.active_registrations == 0
+
+
+def test_counters_follow_orm_writes(counter_data):
+    activity_id, (s0, s1, s2, _) = counter_data
+
+    db.session.add(Registration(student_id=s0, activity_id=activity_id))
+    db.session.add(
+        Registration(student_id=s1, activity_id=activity_id, status="Confirmado")
+    )
+    # Walk-in: asistencia sin preregistro
+    db.session.add(Attendance(student_id=s2, activity_id=activity_id, status="Parcial"))
+    db.session.commit()
+
+    c = _counters(activity_id)
+    assert (c["registered"], c["confirmed"], c["active_registrations"]) == (1, 1, 2)
+    assert (c["attendances_partial"], c["walkins"]) == (1, 1)
+
+    # Cambio de estado sobre un objeto expirado (valor anterior no cargado)
+    reg = Registration.query.filter_by(student_id=s0).one()
+    db.session.commit()
+    reg.status = "Cancelado"
+    # El walk-in se preregistra: deja de contar como walk-in
+    db.session.add(Registration(student_id=s2, activity_id=activity_id))
+    db.session.commit()
+
+    c = _counters(activity_id)
+    assert (c["registered"], c["cancelled"], c["walkins"]) == (1, 1, 0)
+
+    # Borrar el preregistro vuelve a dejar la asistencia como walk-in
+    db.session.delete(Registration.query.filter_by(student_id=s2).one())
+    db.session.commit()
+
+    assert _counters(activity_id)["walkins"] == 1
+    _assert_matches_source(activity_id)
+
+
+def test_rollback_discards_counter_changes(counter_data):
+    activity_id, (s0, *_) = counter_data
+
+    db.session.add(Registration(student_id=s0, activity_id=activity_id))
+    db.session.flush()
+    assert _counters(activity_id)["registered"] == 1
+    db.session.rollback()
+
+    assert _counters(activity_id)["registered"] == 0
+
+
+def test_bulk_service_writes_refresh_counters(counter_data):
+    activity_id, students = counter_data
+    for sid in students:
+        db.session.add(Registration(student_id=sid, activity_id=activity_id))
+        db.session.add(
+            Attendance(
+                student_id=sid,
+                activity_id=activity_id,
+                check_in_time=datetime(2024, 1, 1, 10, 0, 0),
+                check_out_time=datetime(2024, 1, 1, 12, 0, 0),
+            )
+        )
+    db.session.commit()
+    assert _counters(activity_id)["attendances_absent"] == 4
+
+    # UPDATE en bloque: no pasa por el flush del ORM
+    batch_checkout(activity_id, dry_run=False)
+
+    assert _counters(activity_id)["attendances_present"] == 4
+    _assert_matches_source(activity_id)
+
+
+def test_rebuild_fixes_drift(counter_data):
+    activity_id, (s0, *_) = counter_data
+    db.session.add(Registration(student_id=s0, activity_id=activity_id))
+    db.session.commit()
+    db.session.execute(
+        db.update(ActivityCounter)
+        .where(ActivityCounter.activity_id == activity_id)
+        .values(registered=42)
+    )
+
+    report = rebuild_activity_counters()
+
+    assert activity_id in report["fixed"]
+    assert _counters(activity_id)["registered"] == 1
+
+
+def test_capacity_check_reads_counter(client, auth_headers, counter_data):
+    from app.services.registration_service import is_registration_allowed
+
+    activity_id, (s0, s1, s2, _) = counter_data
+    db.session.add(Registration(student_id=s0, activity_id=activity_id))
+    db.session.add(Registration(student_id=s1, activity_id=activity_id))
+    db.session.commit()
+
+    assert is_registration_allowed(activity_id) is False
+
+    resp = client.get(f"/api/activities/{activity_id}", headers=auth_headers)
+    assert resp.get_json()["activity"]["current_capacity"] == 2
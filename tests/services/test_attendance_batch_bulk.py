@@ -0,0 +1,107 @@
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+from app.services.attendance_service import (
+    create_attendances_from_file,
+    process_exit_from_file,
+)
+
+
+@pytest.fixture
+def batch_setup(app, sample_data):
+    with app.app_context():
+        activity = Activity(
+            event_id=sample_data["event_id"],
+            department="TEST",
+            name="Magistral bulk",
+            start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 11, 0, 0),
+            duration_hours=1.0,
+            activity_type="Magistral",
+            location="Auditorio",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        db.session.flush()
+
+        controls = []
+        for i in range(40):
+            s = Student(
+                control_number=f"2101{i:04d}",
+                full_name=f"Alumno {i}",
+                career="ISC",
+            )
+            db.session.add(s)
+            controls.append(s.control_number)
+        db.session.flush()
+
+        # Half of them pre-registered, one already attended
+        students = Student.query.filter(Student.control_number.in_(controls)).all()
+        for s in students[:20]:
+            db.session.add(Registration(student_id=s.id, activity_id=activity.id))
+        db.session.add(
+            Attendance(
+                student_id=students[0].id,
+                activity_id=activity.id,
+                status="Asistió",
+                attendance_percentage=100.0,
+            )
+        )
+        db.session.commit()
+        return {"activity_id": activity.id, "controls": controls}
+
+
+def test_batch_import_uses_constant_number_of_queries(app, batch_setup, count_queries):
+    activity_id = batch_setup["activity_id"]
+    # 'B' prefixed rows are resolved through their digits-only variant
+    lines = [f"B{c}" if i % 2 else c for i, c in enumerate(batch_setup["controls"])]
+    content = ("\n".join(lines) + "\n").encode()
+
+    with app.app_context():
+        with count_queries() as statements:
+            report = create_attendances_from_file(
+                BytesIO(content), activity_id, dry_run=False
+            )
+
+        assert report["created"] == 39
+        assert report["skipped"] == 1
+        assert report["not_found"] == 0
+        # activity + students IN + attendances IN + insert + update + commit
+        assert len(statements) <= 8
+
+        assert Attendance.query.filter_by(activity_id=activity_id).count() == 40
+        attended = Registration.query.filter_by(
+            activity_id=activity_id, attended=True
+        ).count()
+        assert attended == 19
+
+
+def test_exit_import_applies_in_bulk(app, batch_setup, count_queries):
+    activity_id = batch_setup["activity_id"]
+    controls = batch_setup["controls"]
+
+    with app.app_context():
+        create_attendances_from_file(
+            BytesIO("\n".join(controls).encode()), activity_id, dry_run=False
+        )
+        content = ("\n".join(controls[:30] + ["99999999"])).encode()
+
+        with count_queries() as statements:
+            report = process_exit_from_file(
+                BytesIO(content), activity_id, dry_run=False, action="mark_absent"
+            )
+
+        assert report["applied"] == 30
+        assert report["unmatched"] == 1
+        assert len(statements) <= 8
+        absent = Attendance.query.filter_by(
+            activity_id=activity_id, status="Ausente"
+        ).count()
+        assert absent == 30
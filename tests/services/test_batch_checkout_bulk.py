@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.student import Student
+from app.services.attendance_service import (
+    batch_checkout,
+    calculate_attendance_percentage,
+)
+
+
+# (check_in, check_out, pause, resume) relativos a una actividad 10:00-12:00
+CASES = [
+    ((10, 0), (12, 0), None, None),  # completa
+    ((10, 30), (12, 0), None, None),  # llegó tarde
+    ((9, 0), (13, 0), None, None),  # fuera de la ventana programada
+    ((10, 0), (11, 0), None, None),  # se fue temprano
+    ((10, 0), (12, 0), (10, 30), (11, 0)),  # pausa de 30 min
+    ((10, 0), (12, 0), (10, 30), None),  # pausa sin reanudar
+    ((10, 0), (12, 0), (8, 0), (10, 30)),  # pausa más larga que la actividad
+    ((12, 30), (13, 0), None, None),  # fuera de horario
+]
+
+
+def _dt(hm):
+    return datetime(2024, 1, 1, hm[0], hm[1], 0) if hm else None
+
+
+@pytest.fixture
+def checkout_data(app, sample_data):
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Magistral cierre",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 12, 0, 0),
+        duration_hours=2.0,
+        activity_type="Magistral",
+        location="Auditorio",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.flush()
+    ids = []
+    for i, (check_in, check_out, pause, resume) in enumerate(CASES):
+        student = Student(control_number=f"4404{i:04d}", full_name=f"Alumno {i}")
+        db.session.add(student)
+        db.session.flush()
+        att = Attendance(
+            student_id=student.id,
+            activity_id=activity.id,
+            check_in_time=_dt(check_in),
+            check_out_time=_dt(check_out),
+            pause_time=_dt(pause),
+            resume_time=_dt(resume),
+        )
+        db.session.add(att)
+        db.session.flush()
+        ids.append(att.id)
+    db.session.commit()
+    return activity.id, ids
+
+
+def test_batch_checkout_matches_single_calculation(checkout_data):
+    activity_id, ids = checkout_data
+
+    expected = {}
+    for att_id in ids:
+        percentage = calculate_attendance_percentage(att_id)
+        expected[att_id] = (percentage, db.session.get(Attendance, att_id).status)
+    db.session.rollback()
+
+    preview = batch_checkout(activity_id, dry_run=True)
+    summary = batch_checkout(activity_id, dry_run=False)
+
+    assert preview == summary
+    assert summary["processed"] == summary["updated"] == len(CASES)
+    db.session.expire_all()
+    for detail in summary["details"]:
+        att = db.session.get(Attendance, detail["attendance_id"])
+        assert detail["percentage"] == expected[att.id][0]
+        assert (att.attendance_percentage, att.status) == expected[att.id]
+
+
+def test_batch_checkout_single_transaction(checkout_data, count_queries):
+    activity_id, ids = checkout_data
+    # Dejar algunas sin salida para que el cierre asigne check_out_time
+    Attendance.query.filter(Attendance.id.in_(ids[:3])).update(
+        {"check_out_time": None}, synchronize_session=False
+    )
+    db.session.commit()
+    db.session.expunge_all()
+
+    with count_queries(exclude="app_settings") as statements:
+        summary = batch_checkout(activity_id, dry_run=False)
+
+    assert summary["updated"] == len(CASES)
+    # actividad + asistencias + relacionadas + UPDATE en bloque (+ BEGIN/COMMIT)
+    assert len(statements) <= 7
+    closed = Attendance.query.filter(Attendance.id.in_(ids[:3])).all()
+    assert all(a.check_out_time is not None for a in closed)
+
+
+def test_kernel_handles_many_activities_at_once(app):
+    from app.services.attendance_service import compute_attendance_percentages
+
+    start = datetime(2024, 1, 1, 10, 0, 0)
+    rows = [
+        (start, _dt((11, 0)), None, None, start, 1.0),
+        (start, _dt((11, 0)), None, None, start, 2.0),
+        (start, _dt((11, 0)), _dt((10, 15)), _dt((10, 30)), start, 1.0),
+        (start, None, None, None, start, 1.0),
+        (start, _dt((11, 0)), None, None, None, None),
+    ]
+
+    assert compute_attendance_percentages(rows) == [
+        (100.0, "Asistió"),
+        (50.0, "Parcial"),
+        (75.0, "Parcial"),
+        None,
+        (100.0, "Asistió"),
+    ]
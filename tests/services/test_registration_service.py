@@ -23,3 +23,199 @@ def test_is_registration_allowed_magistral(app, sample_data):
 
         allowed = is_registration_allowed(activity.id)
         assert allowed is True
+
+
+def _workshop(event_id, capacity):
+    activity = Activity(
+        event_id=event_id,
+        department="TEST",
+        name="Taller con cupo",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 12, 0, 0),
+        duration_hours=2.0,
+        activity_type="Taller",
+        location="Sala",
+        modality="Presencial",
+        max_capacity=capacity,
+    )
+    db.session.add(activity)
+    db.session.commit()
+    return activity.id
+
+
+def _students(n):
+    from app.models.student import Student
+
+    students = [
+        Student(control_number=f"4404{i:04d}", full_name=f"Alumno {i}")
+        for i in range(n)
+    ]
+    db.session.add_all(students)
+    db.session.commit()
+    return [s.id for s in students]
+
+
+def test_atomic_registration_reserves_until_full(app, sample_data):
+    from app.models.registration import Registration
+    from app.services.activity_counter_service import (
+        get_registered_count,
+        rebuild_activity_counters,
+    )
+    from app.services.registration_service import create_registration_atomic
+
+    activity_id = _workshop(sample_data["event_id"], capacity=2)
+    s0, s1, s2 = _students(3)
+
+    assert create_registration_atomic(s0, activity_id)[0] is True
+    assert create_registration_atomic(s1, activity_id)[0] is True
+    assert create_registration_atomic(s2, activity_id) == (
+        False,
+        "Cupo lleno para esta actividad.",
+    )
+    assert create_registration_atomic(s0, activity_id) == (
+        False,
+        "Ya existe un preregistro para esta actividad",
+    )
+    assert get_registered_count(activity_id) == 2
+
+    # Cancelar libera el lugar; reactivar vuelve a reservarlo
+    reg = Registration.query.filter_by(student_id=s1, activity_id=activity_id).one()
+    reg.status = "Cancelado"
+    db.session.commit()
+    assert create_registration_atomic(s2, activity_id)[0] is True
+    assert create_registration_atomic(s1, activity_id)[0] is False
+    assert get_registered_count(activity_id) == 2
+    assert rebuild_activity_counters([activity_id])["fixed"] == []
+
+
+def test_atomic_registration_under_concurrency(app, sample_data):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.services.activity_counter_service import rebuild_activity_counters
+    from app.services.registration_service import create_registration_atomic
+
+    activity_id = _workshop(sample_data["event_id"], capacity=3)
+    student_ids = _students(12)
+    # El mismo estudiante también intenta inscribirse varias veces a la vez
+    attempts = student_ids + [student_ids[0]] * 4
+    barrier = threading.Barrier(len(attempts))
+
+    def sign_up(student_id):
+        with app.app_context():
+            barrier.wait(timeout=10)
+            return create_registration_atomic(student_id, activity_id)
+
+    with ThreadPoolExecutor(max_workers=len(attempts)) as pool:
+        results = list(pool.map(sign_up, attempts))
+
+    accepted = [r for ok, r in results if ok]
+    rejected = {r for ok, r in results if not ok}
+    assert len(accepted) == 3
+    assert rejected <= {
+        "Cupo lleno para esta actividad.",
+        "Ya existe un preregistro para esta actividad",
+    }
+    db.session.rollback()
+    # Los rechazos devolvieron su reserva: el contador coincide con las tablas
+    assert rebuild_activity_counters([activity_id])["fixed"] == []
+
+
+def _activity(name, start, end, **kwargs):
+    return Activity(
+        name=name,
+        department="TEST",
+        start_datetime=start,
+        end_datetime=end,
+        duration_hours=1.0,
+        activity_type=kwargs.pop("activity_type", "Taller"),
+        location="Sala",
+        modality="Presencial",
+        **kwargs,
+    )
+
+
+def test_schedule_index_matches_daily_overlap_rules():
+    from app.services.registration_service import ScheduleIndex
+
+    week = _activity(
+        "Curso semanal", datetime(2024, 10, 21, 9, 0), datetime(2024, 10, 25, 11, 0)
+    )
+    night = _activity(
+        "Guardia nocturna", datetime(2024, 10, 21, 22, 0), datetime(2024, 10, 23, 2, 0)
+    )
+    index = ScheduleIndex([week, night])
+
+    def conflict(start, end):
+        found = index.find_conflict(_activity("Nueva", start, end))
+        return found.name if found else None
+
+    # Mismo día y horario dentro de la sesión diaria del curso
+    assert conflict(datetime(2024, 10, 23, 10, 0), datetime(2024, 10, 23, 12, 0)) == (
+        "Curso semanal"
+    )
+    # Dentro del rango total pero fuera del horario diario
+    assert (
+        conflict(datetime(2024, 10, 22, 12, 0), datetime(2024, 10, 22, 14, 0)) is None
+    )
+    # Bordes que sólo se tocan no chocan
+    assert (
+        conflict(datetime(2024, 10, 24, 11, 0), datetime(2024, 10, 24, 12, 0)) is None
+    )
+    # Sesión que cruza la medianoche
+    assert conflict(datetime(2024, 10, 21, 23, 0), datetime(2024, 10, 21, 23, 30)) == (
+        "Guardia nocturna"
+    )
+    # Actividad multi-día contra otra multi-día en días distintos
+    assert conflict(datetime(2024, 10, 28, 9, 0), datetime(2024, 10, 30, 11, 0)) is None
+
+
+def test_find_schedule_conflicts_checks_many_students(app, sample_data):
+    from app.models.registration import Registration
+    from app.services.registration_service import (
+        find_schedule_conflicts,
+        has_schedule_conflict,
+    )
+
+    event_id = sample_data["event_id"]
+    workshop = _activity(
+        "Taller de 3 días",
+        datetime(2024, 10, 21, 9, 0),
+        datetime(2024, 10, 23, 13, 0),
+        event_id=event_id,
+    )
+    talk = _activity(
+        "Conferencia",
+        datetime(2024, 10, 22, 12, 0),
+        datetime(2024, 10, 22, 14, 0),
+        event_id=event_id,
+        activity_type="Conferencia",
+    )
+    afternoon = _activity(
+        "Taller vespertino",
+        datetime(2024, 10, 22, 16, 0),
+        datetime(2024, 10, 22, 18, 0),
+        event_id=event_id,
+    )
+    db.session.add_all([workshop, talk, afternoon])
+    db.session.flush()
+    s0, s1, s2, s3 = _students(4)
+    db.session.add_all(
+        [
+            Registration(student_id=s0, activity_id=workshop.id),
+            Registration(student_id=s1, activity_id=afternoon.id),
+            Registration(student_id=s2, activity_id=workshop.id, status="Cancelado"),
+            # Ya inscrito a la candidata: no choca consigo misma
+            Registration(student_id=s3, activity_id=talk.id),
+        ]
+    )
+    db.session.commit()
+
+    conflicts = find_schedule_conflicts(talk.id)
+
+    assert conflicts == {s0: "Conflicto de horario con 'Taller de 3 días'"}
+    assert find_schedule_conflicts(talk.id, student_ids=[s1, s2]) == {}
+    for student_id in (s0, s1, s2, s3):
+        assert has_schedule_conflict(student_id, talk.id)[0] is (
+            student_id in conflicts
+        )
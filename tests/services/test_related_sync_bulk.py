@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.registration import Registration
+from app.models.student import Student
+from app.services.attendance_service import (
+    create_related_attendances_bulk,
+    sync_related_attendances_from_source,
+)
+
+
+def _activity(event_id, name):
+    activity = Activity(
+        event_id=event_id,
+        department="TEST",
+        name=name,
+        start_datetime=datetime(2024, 1, 1, 9, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        duration_hours=1.0,
+        activity_type="Magistral",
+        location="Auditorio",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    return activity
+
+
+@pytest.fixture
+def chained(app, sample_data):
+    """Magistral A con dos receptoras (B, C -> A) y 20 asistentes en A."""
+    source = _activity(sample_data["event_id"], "Magistral A")
+    targets = [
+        _activity(sample_data["event_id"], "Receptora B"),
+        _activity(sample_data["event_id"], "Receptora C"),
+    ]
+    db.session.flush()
+    for target in targets:
+        target.related_activities.append(source)
+
+    students = []
+    for i in range(20):
+        student = Student(control_number=f"3303{i:04d}", full_name=f"Alumno {i}")
+        db.session.add(student)
+        students.append(student)
+    db.session.flush()
+
+    for i, student in enumerate(students):
+        db.session.add(
+            Attendance(
+                student_id=student.id,
+                activity_id=source.id,
+                check_in_time=datetime(2024, 1, 1, 9, 0, 0),
+                check_out_time=datetime(2024, 1, 1, 10, 0, 0),
+                attendance_percentage=100.0,
+                status="Asistió",
+            )
+        )
+        # Preregistro en B para los pares; el primero ya tiene asistencia en B
+        if i % 2 == 0:
+            db.session.add(
+                Registration(student_id=student.id, activity_id=targets[0].id)
+            )
+    db.session.add(Attendance(student_id=students[0].id, activity_id=targets[0].id))
+    db.session.commit()
+    return source.id, [t.id for t in targets], [s.id for s in students]
+
+
+def test_sync_creates_missing_pairs_in_constant_queries(chained, count_queries):
+    source_id, target_ids, student_ids = chained
+
+    with count_queries(exclude="app_settings") as statements:
+        summary = sync_related_attendances_from_source(source_id)
+
+    assert summary["created"] == 39
+    assert summary["skipped"] == 1
+    assert len(summary["details"]) == 40
+    skipped = [d for d in summary["details"] if d["action"] == "skipped"]
+    assert skipped[0]["student_id"] == student_ids[0]
+    assert skipped[0]["target_activity_id"] == target_ids[0]
+    assert skipped[0]["reason"] == "already_exists"
+    assert summary["details"][1]["student_name"] == "Alumno 0"
+    # actividad + receptoras + anti-join + INSERT + UPDATE (+ BEGIN/COMMIT),
+    # independiente del número de estudiantes
+    assert len(statements) <= 8
+
+    synced = Attendance.query.filter(Attendance.activity_id.in_(target_ids)).all()
+    assert len(synced) == 40
+    created = [a for a in synced if a.student_id != student_ids[0]]
+    assert all(a.status == "Asistió" for a in created)
+    assert all(a.attendance_percentage == 100.0 for a in created)
+    assert all(a.check_in_time is not None for a in created)
+
+    regs = Registration.query.filter_by(activity_id=target_ids[0]).all()
+    # El preregistro del estudiante ya sincronizado antes no se toca
+    attended = {r.student_id for r in regs if r.attended}
+    assert attended == set(student_ids[2::2])
+    assert all(r.status == "Asistió" for r in regs if r.attended)
+
+
+def test_sync_dry_run_reports_without_writing(chained):
+    source_id, target_ids, _ = chained
+
+    summary = sync_related_attendances_from_source(
+        source_id, dry_run=True, target_activity_ids=[target_ids[1]]
+    )
+
+    assert summary["created"] == 20
+    assert summary["skipped"] == 0
+    assert Attendance.query.filter_by(activity_id=target_ids[1]).count() == 0
+
+
+def test_create_related_bulk_skips_existing(app, chained):
+    source_id, target_ids, student_ids = chained
+    # B apunta a A: al asistir a B se crea la asistencia automática en A
+    created = create_related_attendances_bulk(student_ids[:3], target_ids[0])
+    db.session.commit()
+
+    # Los tres ya tenían asistencia en A
+    assert created == 0
+
+    extra = Student(control_number="33039999", full_name="Nuevo")
+    db.session.add(extra)
+    db.session.commit()
+    created = create_related_attendances_bulk([extra.id, extra.id], target_ids[0])
+    db.session.commit()
+
+    assert created == 1
+    auto = Attendance.query.filter_by(student_id=extra.id, activity_id=source_id).one()
+    assert auto.status == "Asistió"
+    assert auto.check_in_time is None
@@ -0,0 +1,77 @@
+import pytest
+import requests
+
+from app.services.school_api_client import (
+    CircuitBreaker,
+    SchoolApiClient,
+    SchoolApiUnavailable,
+    get_school_api,
+)
+
+
+def _response(mocker, status_code=200):
+    resp = mocker.Mock()
+    resp.status_code = status_code
+    return resp
+
+
+def test_client_reuses_one_pooled_session(app, mocker):
+    send = mocker.patch("requests.Session.request", return_value=_response(mocker))
+
+    client = get_school_api()
+    assert get_school_api() is client
+
+    client.get("validate", params={"username": "1"})
+    client.post("login", json={"username": "1", "password": "x"}, timeout=3)
+
+    (method, url), kwargs = send.call_args_list[0]
+    assert (method, url) == ("GET", client.base_url + "/api/validate/student")
+    assert kwargs["timeout"] == client.timeouts["validate"]
+    assert send.call_args_list[1].kwargs["timeout"] == 3
+
+    stats = client.stats()
+    assert stats["circuit"] == "closed"
+    assert stats["endpoints"]["validate"]["calls"] == 1
+    assert stats["endpoints"]["login"]["errors"] == 0
+
+
+def test_circuit_opens_after_repeated_failures_and_recovers(mocker):
+    send = mocker.patch(
+        "requests.Session.request", side_effect=requests.ConnectionError("down")
+    )
+    client = SchoolApiClient(failure_threshold=3, reset_seconds=60)
+
+    for _ in range(3):
+        with pytest.raises(SchoolApiUnavailable):
+            client.get("validate")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Abierto: falla rápido sin tocar la red
+    with pytest.raises(SchoolApiUnavailable):
+        client.get("validate")
+    assert send.call_count == 3
+    assert client.stats()["endpoints"]["validate"]["rejected"] == 1
+
+    # Pasado el tiempo de espera, una llamada de prueba exitosa lo cierra
+    client.breaker.reset_seconds = 0
+    send.side_effect = None
+    send.return_value = _response(mocker)
+    assert client.get("validate").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_server_errors_count_as_failures(mocker):
+    mocker.patch("requests.Session.request", return_value=_response(mocker, 502))
+    client = SchoolApiClient(failure_threshold=2, reset_seconds=60)
+
+    # Las respuestas 5xx se devuelven al llamador, pero abren el circuito
+    assert client.get("search").status_code == 502
+    assert client.get("search").status_code == 502
+    with pytest.raises(SchoolApiUnavailable):
+        client.get("search")
+
+
+def test_school_api_stats_endpoint(client, auth_headers):
+    resp = client.get("/api/stats/school-api", headers=auth_headers)
+    assert resp.status_code == 200
+    assert resp.get_json()["circuit"] == "closed"
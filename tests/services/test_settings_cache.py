@@ -0,0 +1,107 @@
+import pytest
+
+from app import db
+from app.models.app_setting import AppSetting, AppSettingsVersion
+from app.services.settings_manager import SettingsManager
+
+
+@pytest.fixture
+def settings_rows(app, monkeypatch):
+    for env_key in (
+        "APP_TIMEZONE",
+        "APP_APP_TIMEZONE",
+        "APP_PUBLIC_CONFIRM_WINDOW_DAYS",
+    ):
+        monkeypatch.delenv(env_key, raising=False)
+    db.session.add_all(
+        [
+            AppSetting(key="app_timezone", value="UTC", data_type="timezone"),
+            AppSetting(
+                key="public_confirm_window_days", value="30", data_type="integer"
+            ),
+        ]
+    )
+    db.session.commit()
+    SettingsManager._invalidate_cache()
+    SettingsManager.cache_stats(reset=True)
+    yield
+    SettingsManager._invalidate_cache()
+
+
+def test_snapshot_loads_all_settings_in_one_query(settings_rows, count_queries):
+    with count_queries() as statements:
+        assert SettingsManager.get("app_timezone") == "UTC"
+        assert SettingsManager.get("public_confirm_window_days") == 30
+        # Claves ausentes en BD se resuelven con el mismo snapshot
+        assert SettingsManager.get("missing_key", "fallback") == "fallback"
+
+    settings_queries = [s for s in statements if "FROM app_settings " in s + " "]
+    assert len(settings_queries) == 1
+
+    stats = SettingsManager.cache_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+    assert stats["refreshes"] == 1
+    assert stats["size"] == 2
+
+
+def test_set_in_db_bumps_version_and_invalidates(settings_rows):
+    assert SettingsManager.get("app_timezone") == "UTC"
+    before = SettingsManager.cache_stats()["version"]
+
+    SettingsManager.set_in_db("app_timezone", "America/Mexico_City", user_id=1)
+
+    assert SettingsManager.get("app_timezone") == "America/Mexico_City"
+    assert SettingsManager.cache_stats()["version"] == before + 1
+    assert db.session.get(AppSettingsVersion, 1).version == before + 1
+
+
+def test_change_from_another_worker_applies_after_version_check(settings_rows):
+    assert SettingsManager.get("app_timezone") == "UTC"
+
+    # Simula a otro worker: cambia el valor y sube la generación sin pasar
+    # por la caché de este proceso
+    with db.engine.begin() as conn:
+        conn.execute(
+            db.update(AppSetting)
+            .where(AppSetting.key == "app_timezone")
+            .values(value="America/Mexico_City")
+        )
+        bumped = conn.execute(
+            db.update(AppSettingsVersion)
+            .where(AppSettingsVersion.id == 1)
+            .values(version=AppSettingsVersion.version + 1)
+        )
+        if not bumped.rowcount:
+            conn.execute(db.insert(AppSettingsVersion).values(id=1, version=1))
+    db.session.expire_all()
+
+    # Dentro del intervalo de verificación se sirve el snapshot local
+    SettingsManager._last_version_check = 10**12
+    assert SettingsManager.get("app_timezone") == "UTC"
+
+    SettingsManager._last_version_check = None
+    assert SettingsManager.get("app_timezone") == "America/Mexico_City"
+
+
+def test_version_checked_once_per_request(app, client, settings_rows):
+    assert SettingsManager.get("app_timezone") == "UTC"
+    checks = SettingsManager.cache_stats()["version_checks"]
+
+    with app.test_request_context("/"):
+        for _ in range(5):
+            SettingsManager.get("app_timezone")
+
+    assert SettingsManager.cache_stats()["version_checks"] == checks + 1
+
+
+def test_cache_stats_endpoint(client, auth_headers, settings_rows):
+    SettingsManager.get("app_timezone")
+
+    resp = client.get("/admin/api/settings/cache-stats", headers=auth_headers)
+
+    assert resp.status_code == 200
+    cache = resp.get_json()["cache"]
+    for field in ("hits", "misses", "refreshes", "version_checks", "size"):
+        assert field in cache
+    assert cache["refreshes"] >= 1
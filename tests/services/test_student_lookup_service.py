@@ -0,0 +1,269 @@
+from io import BytesIO
+from datetime import datetime
+
+from app import db
+from app.models.activity import Activity
+from app.models.attendance import Attendance
+from app.models.student import Student
+from app.services.student_lookup_service import (
+    ExternalStudentLookup,
+    normalize_external_student,
+)
+
+
+def _fake_external(mocker, directory):
+    """Patch the HTTP session to answer from ``directory`` {control: payload}."""
+    calls = []
+
+    def fake_request(method, url, params=None, timeout=None, **kwargs):
+        username = (params or {}).get("username")
+        calls.append(username)
+        resp = mocker.Mock()
+        if username in directory:
+            resp.status_code = 200
+            resp.text = "x"
+            resp.json.return_value = {"success": True, "data": directory[username]}
+        else:
+            resp.status_code = 404
+            resp.text = ""
+        return resp
+
+    mocker.patch("requests.Session.request", side_effect=fake_request)
+    return calls
+
+
+def test_normalize_external_student_shapes():
+    out = normalize_external_student(
+        {"data": {"username": "L2090", "name": "Ana", "career": {"name": "ISC"}}}
+    )
+    assert out == {
+        "control_number": "L2090",
+        "full_name": "Ana",
+        "career": "ISC",
+        "email": "",
+    }
+
+    out = normalize_external_student([{"nombre": "Luis", "carrera": "IGE"}], "77")
+    assert out["control_number"] == "77"
+    assert out["full_name"] == "Luis"
+    assert out["career"] == "IGE"
+
+
+def test_lookup_errors_are_not_mirrored(app, mocker):
+    from app.services.student_lookup_service import lookup_students
+
+    mocker.patch("requests.Session.request", side_effect=RuntimeError("timeout"))
+    first = lookup_students(["90003"])["90003"]
+    assert (first["status"], first["source"]) == ("error", "network")
+
+    lookup_students(["90003"])
+    import requests
+
+    assert requests.Session.request.call_count == 2
+
+
+def test_batch_import_resolves_external_without_proxy_hop(app, sample_data, mocker):
+    from app.services.attendance_service import create_attendances_from_file
+
+    calls = _fake_external(
+        mocker,
+        {
+            "90010": {"username": "90010", "name": "Ana", "career": "ISC"},
+            "90011": {"username": "90011", "name": "Sin Carrera"},
+        },
+    )
+
+    with app.app_context():
+        activity = Activity(
+            event_id=sample_data["event_id"],
+            department="TEST",
+            name="Magistral batch",
+            start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 11, 0, 0),
+            duration_hours=1.0,
+            activity_type="Magistral",
+            location="Auditorio",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+
+        content = b"90010\n90010\n90011\n12345678\n"
+        dry = create_attendances_from_file(BytesIO(content), activity_id, dry_run=True)
+        assert dry["created"] == 2  # 90010 (external) + local 12345678
+        assert dry["skipped"] == 1  # repeated 90010 row
+        assert dry["incomplete"] == 1
+
+        report = create_attendances_from_file(
+            BytesIO(content), activity_id, dry_run=False
+        )
+        assert report["created"] == 2
+        assert report["skipped"] == 1
+
+        # Only the external validate endpoint was used, each control once:
+        # the commit run was answered from the external_students mirror the
+        # dry run filled (including the incomplete 90011).
+        assert sorted(calls) == ["90010", "90011"]
+
+        student = Student.query.filter_by(control_number="90010").first()
+        assert student is not None and student.career == "ISC"
+        assert Attendance.query.filter_by(activity_id=activity_id).count() == 2
+
+
+def test_lookup_students_serves_from_mirror(app, mocker):
+    from app.models.external_student import ExternalStudent
+    from app.services.student_lookup_service import lookup_students
+
+    calls = _fake_external(
+        mocker, {"90020": {"username": "90020", "name": "Ana", "career": "ISC"}}
+    )
+
+    first = lookup_students(["90020", "90021", "90020"])
+    assert first["90020"]["source"] == "network"
+    assert first["90021"]["status"] == "not_found"
+    assert sorted(calls) == ["90020", "90021"]
+
+    # Positivos y negativos se responden desde la tabla espejo
+    again = lookup_students(["90020", "90021"])
+    assert again["90020"]["source"] == "mirror"
+    assert again["90020"]["student"]["career"] == "ISC"
+    assert again["90021"]["source"] == "mirror"
+    assert len(calls) == 2
+
+    # Entrada vencida + API caída: se sirve la copia vencida
+    db.session.execute(
+        db.update(ExternalStudent).values(fetched_at=datetime(2000, 1, 1))
+    )
+    db.session.commit()
+    mocker.patch("requests.Session.request", side_effect=RuntimeError("timeout"))
+    stale = lookup_students(["90020"])
+    assert stale["90020"]["status"] == "found"
+    assert stale["90020"]["source"] == "stale"
+
+
+def test_incomplete_mirror_rows_expire_with_negative_age(app, mocker):
+    from datetime import timedelta
+
+    from app.models.external_student import ExternalStudent
+    from app.services.student_lookup_service import lookup_students
+
+    # 200 sin carrera: respuesta incompleta
+    _fake_external(mocker, {"90025": {"username": "90025", "name": "Ana"}})
+    assert lookup_students(["90025"])["90025"]["status"] == "incomplete"
+    assert lookup_students(["90025"])["90025"]["source"] == "mirror"
+
+    # Más vieja que la edad negativa pero muy lejos de la positiva (7 días)
+    negative_age = app.config["EXTERNAL_STUDENT_NEGATIVE_MAX_AGE_SECONDS"]
+    db.session.execute(
+        db.update(ExternalStudent).values(
+            fetched_at=datetime.utcnow() - timedelta(seconds=negative_age + 60)
+        )
+    )
+    db.session.commit()
+
+    _fake_external(
+        mocker, {"90025": {"username": "90025", "name": "Ana", "career": "ISC"}}
+    )
+    again = lookup_students(["90025"])["90025"]
+    assert (again["status"], again["source"]) == ("found", "network")
+
+
+def test_prefetch_fills_mirror_for_validate_proxy(app, client, mocker):
+    from app.services.student_lookup_service import prefetch_external_students
+
+    _fake_external(
+        mocker,
+        {
+            "90030": {"username": "90030", "name": "Ana", "career": "ISC"},
+            "90031": {"username": "90031", "name": "Sin Carrera"},
+        },
+    )
+
+    summary = prefetch_external_students(["90030", "90031", "90032"])
+    assert (summary["found"], summary["incomplete"], summary["not_found"]) == (1, 1, 1)
+    assert prefetch_external_students(["90030", "90031"])["fresh"] == 2
+
+    # Con la API caída, el proxy del walk-in responde desde la copia local
+    mocker.patch("requests.Session.request", side_effect=RuntimeError("timeout"))
+    resp = client.get("/api/students/validate?control_number=90030")
+    assert resp.status_code == 200
+    assert resp.get_json()["student"]["full_name"] == "Ana"
+    assert client.get("/api/students/validate?control_number=90032").status_code == 404
+    assert client.get("/api/students/validate?control_number=90033").status_code == 503
+
+
+def test_concurrent_lookups_share_one_request(mocker):
+    import threading
+    import time
+
+    flight = ExternalStudentLookup._in_flight
+    waiting = 4
+    shared_before = flight.shared
+    calls = []
+
+    def slow_request(method, url, params=None, timeout=None, **kwargs):
+        calls.append(params["username"])
+        # Retener la llamada hasta que los demás hilos esperen por ella
+        deadline = time.monotonic() + 5
+        while flight.shared - shared_before < waiting and time.monotonic() < deadline:
+            time.sleep(0.01)
+        resp = mocker.Mock()
+        resp.status_code = 200
+        resp.text = "x"
+        resp.json.return_value = {
+            "success": True,
+            "data": {"username": "90040", "name": "Ana", "career": "ISC"},
+        }
+        return resp
+
+    mocker.patch("requests.Session.request", side_effect=slow_request)
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                ExternalStudentLookup.fetch_many(["90040"])["90040"]
+            )
+        )
+        for _ in range(waiting + 1)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["90040"]
+    assert [r["status"] for r in results] == ["found"] * (waiting + 1)
+    assert flight.in_flight() == 0
+
+
+def test_upsert_students_updates_existing_rows(app):
+    from app.services.student_service import upsert_student, upsert_students
+
+    db.session.add(
+        Student(control_number="90050", full_name="Ana", career="ISC", email="a@x.mx")
+    )
+    db.session.commit()
+
+    students = upsert_students(
+        [
+            {"control_number": "90050", "full_name": "Ana María", "career": ""},
+            {"control_number": "90051", "full_name": "Luis", "career": "IGE"},
+            {"control_number": "90052", "full_name": ""},
+        ]
+    )
+    db.session.commit()
+
+    assert sorted(students) == ["90050", "90051"]
+    ana = students["90050"]
+    assert ana.full_name == "Ana María"
+    # Un campo vacío no borra el valor existente
+    assert (ana.career, ana.email) == ("ISC", "a@x.mx")
+
+    # Repetir el alta no falla por el índice único
+    again = upsert_student({"control_number": "90051", "full_name": "Luis"})
+    db.session.commit()
+    assert again.id == students["90051"].id
+    assert again.career == "IGE"
+    assert Student.query.filter_by(control_number="90051").count() == 1
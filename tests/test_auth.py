@@ -42,8 +42,8 @@ def test_student_login_external_api_mock(client, mocker):
         },
     }
 
-    # El código hace requests.post, no get
-    mocker.patch("requests.post", return_value=mock_response)
+    # El código hace un POST con la sesión del cliente de la API escolar
+    mocker.patch("requests.Session.request", return_value=mock_response)
 
     response = client.post(
         "/api/auth/student-login",
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+from app.services.settings_manager import AppSettings
+from app.utils.datetime_utils import (
+    get_app_timezone,
+    get_zoneinfo,
+    safe_iso,
+    safe_iso_many,
+)
+
+
+def test_get_zoneinfo_reuses_instances():
+    assert get_zoneinfo("America/Mexico_City") is get_zoneinfo("America/Mexico_City")
+
+
+def test_safe_iso_many_matches_safe_iso(app):
+    values = [
+        datetime(2024, 1, 1, 10, 0, 0),
+        datetime(2024, 1, 1, 16, 0, 0, tzinfo=timezone.utc),
+        "2024-01-01T10:00:00",
+        "no es fecha",
+        None,
+    ]
+
+    assert safe_iso_many(values) == [safe_iso(v) for v in values]
+
+
+def test_app_timezone_resolved_once_per_request(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        AppSettings,
+        "app_timezone",
+        lambda: calls.append(1) or "America/Mexico_City",
+    )
+
+    with app.test_request_context("/"):
+        for _ in range(10):
+            safe_iso(datetime(2024, 1, 1, 10, 0, 0))
+        assert get_app_timezone() is get_zoneinfo("America/Mexico_City")
+    assert len(calls) == 1
+
+    # Una nueva petición vuelve a resolverla
+    with app.test_request_context("/"):
+        assert safe_iso(datetime(2024, 1, 1, 10, 0, 0)) == "2024-01-01T16:00:00+00:00"
+    assert len(calls) == 2
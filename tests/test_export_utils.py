@@ -0,0 +1,263 @@
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+from app import db
+from app.models.activity import Activity
+from app.models.registration import Registration
+from app.models.student import Student
+from app.utils.export_utils import (
+    column_letter,
+    iter_csv,
+    iter_ndjson,
+    iter_xlsx,
+    styled,
+    xlsx_response,
+)
+
+
+def _load(chunks):
+    return load_workbook(BytesIO(b"".join(chunks))).active
+
+
+def test_column_letter():
+    assert [column_letter(i) for i in (1, 26, 27, 52, 703)] == [
+        "A",
+        "Z",
+        "AA",
+        "AZ",
+        "AAA",
+    ]
+
+
+def test_iter_xlsx_roundtrip_with_styles_and_merges():
+    rows = [
+        styled(["Reporte <prueba> & más"], "title", merge_to=3),
+        [],
+        styled(["Nombre", "Horas", "Activo"], "header_fill"),
+        ["Ana\x07", Decimal("10.50"), True],
+        ["Luis", 3, None],
+        [],
+        styled(["Total: 2"], "total", merge_to=2),
+    ]
+
+    ws = _load(iter_xlsx(rows, sheet_title="Horas: evento", column_widths=[30, 10]))
+
+    assert ws.title == "Horas evento"
+    assert ws["A1"].value == "Reporte <prueba> & más"
+    assert ws["A1"].font.b and ws["A1"].font.sz == 14
+    assert ws["A3"].fill.fgColor.rgb == "FF4F46E5"
+    assert [c.value for c in ws[4]] == ["Ana", 10.5, True]
+    assert [c.value for c in ws[5]][:2] == ["Luis", 3]
+    assert ws["A7"].value == "Total: 2"
+    assert {str(r) for r in ws.merged_cells.ranges} == {"A1:C1", "A7:B7"}
+    assert ws.column_dimensions["A"].width == 30
+
+
+def test_iter_xlsx_streams_in_chunks():
+    def rows():
+        yield styled(["#", "texto"], "header")
+        for i in range(20000):
+            yield [i, f"fila {i:05d} con algo de texto para llenar"]
+
+    chunks = list(iter_xlsx(rows()))
+
+    # El archivo se entrega por partes conforme se generan las filas
+    assert len(chunks) > 3
+    ws = _load(chunks)
+    assert ws.max_row == 20001
+    assert ws["A20001"].value == 19999
+
+
+def test_activity_registrations_export_streams_rows(client, auth_headers, sample_data):
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Taller de exportación",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 11, 0, 0),
+        duration_hours=1.0,
+        activity_type="Taller",
+        location="Sala",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.flush()
+    for i, status in enumerate(("Registrado", "Cancelado", "Confirmado")):
+        student = Student(
+            control_number=f"7707{i:04d}",
+            full_name=f"Alumno {i}",
+            email=f"a{i}@test.com",
+            career="ISC",
+        )
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(
+            Registration(student_id=student.id, activity_id=activity.id, status=status)
+        )
+    db.session.commit()
+
+    resp = client.get(
+        f"/api/activities/{activity.id}/export_registrations.xlsx",
+        headers=auth_headers,
+    )
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert "taller-de-exportaci" in resp.headers["Content-Disposition"]
+    ws = load_workbook(BytesIO(resp.data)).active
+    assert ws.title == "registrations"
+    assert [c.value for c in ws[1]] == [
+        "control_number",
+        "full_name",
+        "email",
+        "career",
+    ]
+    assert ws.max_row == 4
+
+    resp = client.post(
+        "/api/public/registrations/export", json={"activity_id": activity.id}
+    )
+    assert resp.status_code == 200
+    ws = load_workbook(BytesIO(resp.data)).active
+    assert ws.title == "preregistros"
+    # Los cancelados no se exportan
+    assert [r[0].value for r in ws.iter_rows(min_row=2)] == ["77070000", "77070002"]
+
+
+def test_export_query_errors_return_500(client, auth_headers, sample_data, mocker):
+    activity = Activity(
+        event_id=sample_data["event_id"],
+        department="TEST",
+        name="Taller con error",
+        start_datetime=datetime(2024, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2024, 1, 1, 11, 0, 0),
+        duration_hours=1.0,
+        activity_type="Taller",
+        location="Sala",
+        modality="Presencial",
+    )
+    db.session.add(activity)
+    db.session.commit()
+    # La consulta falla antes de empezar a transmitir
+    mocker.patch(
+        "app.utils.export_utils.iter_query_rows",
+        side_effect=RuntimeError("conexión perdida"),
+    )
+
+    resp = client.get(
+        f"/api/activities/{activity.id}/export_registrations.xlsx",
+        headers=auth_headers,
+    )
+    assert resp.status_code == 500
+    assert resp.get_json()["error"] == "conexión perdida"
+
+    resp = client.post(
+        "/api/public/registrations/export", json={"activity_id": activity.id}
+    )
+    assert resp.status_code == 500
+    assert resp.get_json()["message"] == "Error generando XLSX"
+
+
+def test_errors_while_streaming_are_logged(app, mocker):
+    def rows():
+        yield ["ok"]
+        raise RuntimeError("conexión perdida")
+
+    log = mocker.patch.object(app.logger, "exception")
+    with app.test_request_context("/"):
+        resp = xlsx_response(rows(), "reporte.xlsx")
+        with pytest.raises(RuntimeError):
+            b"".join(resp.response)
+
+    log.assert_called_once()
+    assert "reporte.xlsx" in log.call_args.args
+
+
+def test_iter_csv_and_ndjson():
+    import csv
+    import json
+
+    records = [("001", "Peña, Ana", Decimal("10.50"), None), ("002", 'Luis "L"', 3, 1)]
+
+    text = b"".join(iter_csv(["a", "b", "c", "d"], records)).decode("utf-8")
+    assert list(csv.reader(text.splitlines())) == [
+        ["a", "b", "c", "d"],
+        ["001", "Peña, Ana", "10.5", ""],
+        ["002", 'Luis "L"', "3", "1"],
+    ]
+
+    lines = b"".join(iter_ndjson(["a", "b", "c", "d"], records)).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"a": "001", "b": "Peña, Ana", "c": 10.5, "d": None},
+        {"a": "002", "b": 'Luis "L"', "c": 3, "d": 1},
+    ]
+
+
+def test_export_format_param(client, auth_headers, sample_data):
+    student = Student(control_number="7708001", full_name="Ana", career="ISC")
+    db.session.add(student)
+    db.session.flush()
+    for n in range(3):
+        activity = Activity(
+            event_id=sample_data["event_id"],
+            department="TEST",
+            name=f"Taller {n}",
+            start_datetime=datetime(2024, 1, 1, 9 + n, 0, 0),
+            end_datetime=datetime(2024, 1, 1, 10 + n, 0, 0),
+            duration_hours=4.0,
+            activity_type="Taller",
+            location="Sala",
+            modality="Presencial",
+        )
+        db.session.add(activity)
+        db.session.flush()
+        db.session.add(
+            Registration(
+                student_id=student.id, activity_id=activity.id, status="Asistió"
+            )
+        )
+    db.session.commit()
+    query = {"event_id": sample_data["event_id"]}
+
+    resp = client.get(
+        "/api/students/complementary-credits/export",
+        headers=auth_headers,
+        query_string={**query, "format": "csv"},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+    assert ".csv" in resp.headers["Content-Disposition"]
+    lines = resp.get_data(as_text=True).splitlines()
+    assert lines[1] == "7708001,Ana,ISC,,12.0,3"
+
+    resp = client.get(
+        "/api/reports/hours_compliance",
+        headers=auth_headers,
+        query_string={**query, "format": "ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    assert resp.get_data(as_text=True) == (
+        '{"control_number": "7708001", "full_name": "Ana", '
+        '"career": "ISC", "total_hours": 12.0}\n'
+    )
+
+    resp = client.get(
+        f"/api/activities/{activity.id}/export_registrations",
+        headers=auth_headers,
+        query_string={"format": "csv"},
+    )
+    assert resp.get_data(as_text=True).splitlines() == [
+        "control_number,full_name,email,career",
+        "7708001,Ana,,ISC",
+    ]
+
+    resp = client.get(
+        "/api/reports/hours_compliance_excel",
+        headers=auth_headers,
+        query_string={**query, "format": "pdf"},
+    )
+    assert resp.status_code == 400
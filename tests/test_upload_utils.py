@@ -0,0 +1,60 @@
+from datetime import datetime
+from io import BytesIO
+
+import openpyxl
+
+from app.utils.upload_utils import (
+    iter_first_column,
+    iter_sheet_records,
+    sniff_upload_kind,
+)
+
+
+def _xlsx(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    bio = BytesIO()
+    wb.save(bio)
+    bio.seek(0)
+    return bio
+
+
+def test_sniff_upload_kind():
+    assert sniff_upload_kind(_xlsx([["1"]])) == "xlsx"
+    stream = BytesIO(b"21010001\n")
+    assert sniff_upload_kind(stream) == "text"
+    # pointer is left at the start
+    assert stream.read() == b"21010001\n"
+
+
+def test_iter_first_column_txt_keeps_line_numbers():
+    stream = BytesIO("\ufeff21010001\r\n\n  B21010002  \n".encode("utf-8"))
+    assert list(iter_first_column(stream)) == [(1, "21010001"), (3, "B21010002")]
+
+
+def test_iter_first_column_xlsx_numeric_cells():
+    stream = _xlsx([[21010001.0, "ignored"], [None], ["B21010002"], [21010003]])
+    assert list(iter_first_column(stream)) == [
+        (1, "21010001"),
+        (3, "B21010002"),
+        (4, "21010003"),
+    ]
+
+
+def test_iter_sheet_records_headers_and_blank_rows():
+    stream = _xlsx(
+        [
+            ["Nombre", "Nombre", None],
+            ["Taller A", "x", datetime(2025, 10, 8, 11, 0)],
+            [None, "  ", None],
+            ["Taller B"],
+        ]
+    )
+    headers, records = iter_sheet_records(stream)
+    assert headers == ["Nombre", "Nombre.1", "Unnamed: 2"]
+    records = list(records)
+    assert [r[0] for r in records] == [2, 4]
+    assert records[0][1]["Unnamed: 2"] == datetime(2025, 10, 8, 11, 0)
+    assert records[1][1] == {"Nombre": "Taller B", "Nombre.1": None, "Unnamed: 2": None}
@@ -0,0 +1,215 @@
+"""
+Concurrency benchmark for capacity-limited registrations.
+
+Simulates many students signing up for the same workshop at the same moment
+(e.g. when enrollment opens) and compares:
+
+  atomic  create_registration_atomic: conditional UPDATE on activity_counters
+  simple  create_registration_simple: read the counter, then insert
+
+For each strategy it reports elapsed time, accepted/rejected sign-ups,
+errors and whether the activity ended up over capacity.
+
+By default it runs against a throw-away SQLite file. Pass --database-url to
+use a MySQL stand-in; the schema is created with db.create_all() and the
+benchmark rows are removed at the end, so never point it at a real database.
+
+Usage:
+  python tools/bench_registration_capacity.py
+  python tools/bench_registration_capacity.py --students 500 --capacity 40 --workers 64
+  python tools/bench_registration_capacity.py --database-url mysql+pymysql://u:p@host/bench_db
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Ensure project root is on sys.path so `import app` works when invoking
+# this script as `python tools/bench_registration_capacity.py` from the repo root
+proj_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+STRATEGIES = ("atomic", "simple")
+
+
+def _setup(db, students, capacity):
+    from app.models.activity import Activity
+    from app.models.event import Event
+    from app.models.student import Student
+
+    event = Event(
+        name="Benchmark cupo",
+        start_date=datetime(2030, 1, 1, 8, 0, 0),
+        end_date=datetime(2030, 1, 2, 20, 0, 0),
+    )
+    db.session.add(event)
+    db.session.flush()
+    activity = Activity(
+        event_id=event.id,
+        department="BENCH",
+        name="Taller concurrido",
+        start_datetime=datetime(2030, 1, 1, 10, 0, 0),
+        end_datetime=datetime(2030, 1, 1, 12, 0, 0),
+        duration_hours=2.0,
+        activity_type="Taller",
+        location="Sala",
+        modality="Presencial",
+        max_capacity=capacity,
+    )
+    db.session.add(activity)
+    db.session.add_all(
+        Student(control_number=f"B{i:07d}", full_name=f"Alumno {i}")
+        for i in range(students)
+    )
+    db.session.commit()
+    student_ids = (
+        db.session.execute(
+            db.select(Student.id).where(Student.control_number.like("B%"))
+        )
+        .scalars()
+        .all()
+    )
+    return event.id, activity.id, student_ids
+
+
+def _reset(db, activity_id):
+    from app.models.registration import Registration
+    from app.services.activity_counter_service import rebuild_activity_counters
+
+    db.session.execute(
+        db.delete(Registration).where(Registration.activity_id == activity_id)
+    )
+    rebuild_activity_counters([activity_id])
+    db.session.commit()
+
+
+def _teardown(db, event_id, activity_id, student_ids):
+    from app.models.activity import Activity
+    from app.models.event import Event
+    from app.models.student import Student
+
+    _reset(db, activity_id)
+    db.session.delete(db.session.get(Activity, activity_id))
+    db.session.delete(db.session.get(Event, event_id))
+    db.session.execute(db.delete(Student).where(Student.id.in_(student_ids)))
+    db.session.commit()
+
+
+def _run(app, db, strategy, activity_id, student_ids, workers):
+    from app.models.registration import Registration
+    from app.services import registration_service
+    from app.services.activity_counter_service import get_registered_count
+
+    create = getattr(registration_service, f"create_registration_{strategy}")
+    start = threading.Barrier(min(workers, len(student_ids)))
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def sign_up(student_id):
+        with app.app_context():
+            try:
+                start.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            ok, result = create(student_id, activity_id)
+            key = "accepted" if ok else result
+            with lock:
+                outcomes[key] += 1
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(sign_up, student_ids))
+    elapsed = time.perf_counter() - began
+
+    stored = db.session.execute(
+        db.select(db.func.count(Registration.id)).where(
+            Registration.activity_id == activity_id,
+            Registration.status == "Registrado",
+        )
+    ).scalar_one()
+    counter = get_registered_count(activity_id)
+    db.session.rollback()
+    return elapsed, outcomes, stored, counter
+
+
+def run(database_url=None, students=500, capacity=50, workers=50, strategies=None):
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix="bench_capacity_")
+        # timeout: los escritores de SQLite esperan el lock en lugar de fallar
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}?timeout=30"
+    # La configuración lee DATABASE_URL al importarse
+    os.environ["DATABASE_URL"] = database_url
+
+    from app import create_app, db
+
+    app = create_app("development")
+    app.config["DEBUG"] = False
+    with app.app_context():
+        db.create_all()
+        event_id, activity_id, student_ids = _setup(db, students, capacity)
+        print(
+            f"{len(student_ids)} students, capacity {capacity}, "
+            f"{workers} workers, {db.engine.dialect.name}"
+        )
+        try:
+            for strategy in strategies or STRATEGIES:
+                _reset(db, activity_id)
+                elapsed, outcomes, stored, counter = _run(
+                    app, db, strategy, activity_id, student_ids, workers
+                )
+                accepted = outcomes.pop("accepted", 0)
+                full = outcomes.pop("Cupo lleno para esta actividad.", 0)
+                errors = sum(outcomes.values())
+                print(
+                    f"{strategy:>7}: {elapsed:7.3f}s "
+                    f"({len(student_ids) / elapsed:8.1f} sign-ups/s) "
+                    f"accepted={accepted} full={full} errors={errors} "
+                    f"stored={stored} counter={counter} "
+                    f"over_capacity={max(stored - capacity, 0)}"
+                )
+                for message, n in outcomes.most_common(3):
+                    print(f"         {n} x {message[:100]}")
+        finally:
+            _teardown(db, event_id, activity_id, student_ids)
+            db.session.remove()
+            db.engine.dispose()
+
+    if tmpdir:
+        import shutil
+
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Disposable database (default: SQLite)")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        action="append",
+        dest="strategies",
+        help="Only run this strategy (repeatable)",
+    )
+    args = parser.parse_args(argv)
+    run(
+        args.database_url,
+        students=args.students,
+        capacity=args.capacity,
+        workers=args.workers,
+        strategies=args.strategies,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Prefetch tool for the `external_students` mirror table.
+
+Resolves control numbers against the school validation API ahead of time so
+walk-ins, public lookups and batch imports are answered locally on event day.
+Only missing or stale entries are fetched unless --refresh is given.
+
+Usage:
+  python tools/prefetch_external_students.py --event-id 3
+  python tools/prefetch_external_students.py --file roster.xlsx
+  python tools/prefetch_external_students.py 20690001 20690002 --refresh
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure project root is on sys.path so `import app` works when invoking
+# this script as `python tools/prefetch_external_students.py` from the repo root
+proj_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+from app import create_app  # noqa: E402
+from app.services.student_lookup_service import (  # noqa: E402
+    event_control_numbers,
+    prefetch_external_students,
+)
+from app.utils.upload_utils import iter_first_column  # noqa: E402
+
+
+def _print_progress(summary, processed=None, total=None):
+    print(f"  {processed}/{total} resolved", flush=True)
+
+
+def run(control_numbers=(), event_ids=(), roster=None, refresh=False):
+    app = create_app()
+    with app.app_context():
+        wanted = list(control_numbers)
+        for event_id in event_ids or ():
+            wanted.extend(event_control_numbers(event_id))
+        if roster:
+            with open(roster, "rb") as fh:
+                wanted.extend(value for _row, value in iter_first_column(fh))
+
+        summary = prefetch_external_students(
+            wanted, refresh=refresh, progress=_print_progress
+        )
+        print(
+            f"Requested {summary['requested']}: {summary['fresh']} already fresh, "
+            f"{summary['fetched']} fetched ({summary['found']} found, "
+            f"{summary['incomplete']} incomplete, {summary['not_found']} not found, "
+            f"{summary['errors']} errors)"
+        )
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("control_numbers", nargs="*", help="Control numbers")
+    parser.add_argument(
+        "--event-id",
+        type=int,
+        action="append",
+        dest="event_ids",
+        help="Students registered in this event (repeatable)",
+    )
+    parser.add_argument("--file", help="Roster: XLSX (first column) or TXT")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Fetch fresh entries again too"
+    )
+    args = parser.parse_args(argv)
+    if not (args.control_numbers or args.event_ids or args.file):
+        parser.error("give control numbers, --event-id or --file")
+    run(args.control_numbers, args.event_ids, args.file, refresh=args.refresh)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Rebuild tool for the materialized `activity_counters` table.
+
+The counters are maintained incrementally by session events; this tool
+recomputes them from `registrations`/`attendances` and fixes any row that
+drifted (e.g. after manual SQL edits or bulk writes that skipped the hooks).
+
+Usage:
+  python tools/rebuild_activity_counters.py            # report drift only
+  python tools/rebuild_activity_counters.py --commit   # fix and commit
+  python tools/rebuild_activity_counters.py --activity-id 12 --activity-id 15 --commit
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure project root is on sys.path so `import app` works when invoking
+# this script as `python tools/rebuild_activity_counters.py` from the repo root
+proj_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+from app import create_app, db  # noqa: E402
+from app.services.activity_counter_service import rebuild_activity_counters  # noqa: E402
+
+
+def run(activity_ids=None, commit=False):
+    app = create_app()
+    with app.app_context():
+        report = rebuild_activity_counters(activity_ids or None)
+        print(f"Checked {report['checked']} activities")
+        if report["fixed"]:
+            print(
+                f"Drifted counters ({len(report['fixed'])}): "
+                + ", ".join(str(aid) for aid in report["fixed"])
+            )
+        else:
+            print("No drift found")
+
+        if commit:
+            db.session.commit()
+            print("Changes committed")
+        else:
+            db.session.rollback()
+            print("Dry run: no changes were committed (use --commit)")
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--activity-id",
+        type=int,
+        action="append",
+        dest="activity_ids",
+        help="Only rebuild this activity (repeatable)",
+    )
+    parser.add_argument(
+        "--commit", action="store_true", help="Write the rebuilt counters"
+    )
+    args = parser.parse_args(argv)
+    run(args.activity_ids, commit=args.commit)
+
+
+if __name__ == "__main__":
+    main()